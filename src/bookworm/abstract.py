@@ -53,3 +53,85 @@ class Runner(abc.ABC):
         """
         return NotImplemented
 
+
+
+class AsyncRunner(abc.ABC):
+    """
+    The ``AsyncRunner`` class is the asynchronous counterpart of ``Runner``.
+    Its methods are coroutines so that many actions can be in flight at once
+    on a single event loop.
+    """
+    @abc.abstractmethod
+    async def setup(self, command):
+        """
+        The ``setup`` coroutine performs the necessary actions to setup
+        execution of a ``Command``.
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    async def execute(self, command):
+        """
+        The ``execute`` coroutine executes a ``Command``.
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    async def cleanup(self, command):
+        """
+        The ``cleanup`` coroutine performs cleanup after execution. It is
+        typically used to gracefully handle failure or cancellation.
+        """
+        return NotImplemented
+
+
+class Observer(abc.ABC):
+    """
+    The ``Observer`` class receives notifications while actions run. Every
+    notification does nothing by default, so implementors only override the
+    ones they need. Notifications about single actions may arrive from
+    several worker threads at once.
+    """
+    def scheduled(self, count):
+        """
+        The ``scheduled`` method is called once before any action starts,
+        with the number of pages the run will report as finished.
+        """
+        return
+
+    def started(self, action):
+        """
+        The ``started`` method is called before an action is set up.
+        """
+        return
+
+    def finished(self, result):
+        """
+        The ``finished`` method is called with the ``ActionResult`` of an
+        action once it has succeeded or failed.
+        """
+        return
+
+    def progressed(self, action, pages):
+        """
+        The ``progressed`` method is called while an action that writes
+        several pages runs, each time ``pages`` more of them have finished.
+        The ``finished`` or ``retrying`` notification of the action still
+        follows.
+        """
+        return
+
+    def retrying(self, result, delay):
+        """
+        The ``retrying`` method is called instead of ``finished`` with the
+        ``ActionResult`` of an attempt that failed and will be run again
+        after ``delay`` seconds.
+        """
+        return
+
+    def closed(self, report):
+        """
+        The ``closed`` method is called with the ``Report`` of the run after
+        every action has finished.
+        """
+        return
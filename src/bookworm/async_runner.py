@@ -0,0 +1,253 @@
+import bookworm.abstract          as abstract
+import bookworm.change_resolution as change_resolution
+import bookworm.scheduler         as scheduler
+import bookworm.report            as report
+import bookworm.process           as process
+import bookworm.process_pdf       as process_pdf
+import bookworm.pack_pdf          as pack_pdf
+import bookworm.unpack_pdf        as unpack_pdf
+import asyncio
+import os
+import signal
+import subprocess
+
+
+# Commands whose runners do more than run their subprocess: they patch TIFF
+# tags, renumber pages, copy images or write a pdf in bookworm itself.
+IN_PROCESS_COMMANDS = (
+    change_resolution.ChangeResolution,
+    unpack_pdf.UnpackPDFShard,
+    unpack_pdf.ExtractImages,
+    pack_pdf.PackPDF,
+    process_pdf.ProcessPDF,
+)
+
+
+def runs_in_process(command, runner):
+    """
+    Whether executing ``command`` takes more than running its subprocess,
+    either because of its command type or because ``runner`` wraps another
+    runner, such as a cache or a journal.
+    """
+    return not isinstance(runner, type) or isinstance(command, IN_PROCESS_COMMANDS)
+
+
+async def wait(child, poll_interval=0.05):
+    """
+    Wait for a program started with ``process.start`` to exit without
+    blocking the event loop, and reap it, charging the resources it used to
+    the accounts of the current task. The event loop watches a pid file
+    descriptor for the exit where the kernel has them, and the program is
+    polled every ``poll_interval`` seconds elsewhere. Returns its exit
+    status.
+    """
+    try:
+        pidfd = os.pidfd_open(child.pid)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    if pidfd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+        return child.reap()
+
+    while child.reap(block=False) is None:
+        await asyncio.sleep(poll_interval)
+
+    return child.returncode
+
+
+class Runner(abstract.AsyncRunner):
+    """
+    Run a ``Command``'s subprocess on the event loop. Setup and cleanup are
+    delegated to the synchronous ``Runner`` of the command's module, since
+    they only touch the file system. Commands that run in process are
+    executed by the synchronous runner in a thread, and a cancelled one
+    keeps running until it finishes. The resources of every program are
+    charged to the accounts of the task that runs it, as the synchronous
+    runners charge them to their thread.
+    """
+    def __init__(self, runner):
+        self.runner = runner
+
+    async def setup(self, command):
+        self.runner.setup(command)
+
+    async def execute(self, command):
+        if runs_in_process(command, self.runner):
+            return await asyncio.to_thread(self.runner.execute, command)
+
+        limits = process.current_limits()
+        child = process.start(command.as_subprocess(), limits)
+        try:
+            returncode = await asyncio.wait_for(wait(child), limits.timeout)
+        except asyncio.TimeoutError:
+            if await self.stop(child, limits):
+                raise process.TimeLimitExceeded(child.args, limits.timeout, 'wall clock')
+            returncode = child.returncode
+        except asyncio.CancelledError:
+            # Do not leave the child running after its awaitable is cancelled.
+            child.signal_running(process.KILL_SIGNAL)
+            await wait(child)
+            raise
+
+        if process.ran_out_of_cpu_time(returncode, limits, child.usage):
+            raise process.TimeLimitExceeded(child.args, limits.cpu_time, 'CPU time')
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, child.args)
+
+    async def stop(self, child, limits):
+        """
+        Ask a process group that ran out of time to stop, and kill it if it
+        is still running after the grace period. Returns whether it had to
+        be stopped, rather than having exited just as its time ran out.
+        """
+        if not child.signal_running(signal.SIGTERM):
+            await wait(child)
+            return False
+
+        try:
+            await asyncio.wait_for(wait(child), limits.grace_period)
+        except asyncio.TimeoutError:
+            child.signal_running(process.KILL_SIGNAL)
+            await wait(child)
+
+        return True
+
+    async def cleanup(self, command):
+        self.runner.cleanup(command)
+
+    def __repr__(self):
+        return f'Runner({self.runner!r})'
+
+
+class Scheduler:
+    """
+    The ``Scheduler`` class runs actions on the event loop with at most
+    ``jobs`` of them executing at once. Every submitted action gets its own
+    awaitable, and pending actions can be cancelled as a group. The
+    ``observers`` are notified as actions start and finish.
+    """
+    def __init__(self, jobs=1, observers=()):
+        if jobs <= 0:
+            raise ValueError(f'Jobs must be positive. Got: {jobs}')
+
+        self.semaphore = asyncio.Semaphore(jobs)
+        self.observers = observers
+        self.tasks = []
+
+    async def run_action(self, action, runner):
+        """
+        Run a single action once a slot is free, returning an
+        ``ActionResult``. Cancellation is propagated after cleanup.
+        """
+        async with self.semaphore:
+            for observer in self.observers:
+                observer.started(action)
+            result = await self._run(action, runner)
+
+        scheduler.notify(self.observers, result)
+        return result
+
+    async def _run(self, action, runner):
+        try:
+            await runner.setup(action)
+        except Exception as e:
+            return report.ActionResult(action, runner, e)
+
+        try:
+            await runner.execute(action)
+        except asyncio.CancelledError:
+            await runner.cleanup(action)
+            raise
+        except Exception as e:
+            await runner.cleanup(action)
+            return report.ActionResult(action, runner, e)
+
+        return report.ActionResult(action, runner)
+
+    async def run_batch(self, action, runner):
+        """
+        Run an action whose runner executes many pages at once, such as a
+        batch runner, in a thread once a slot is free. Its ``run_batch``
+        method returns the ``ActionResult`` of every page, rerunning the
+        pages the batch failed on, and notifies the observers about them.
+        """
+        async with self.semaphore:
+            return await asyncio.to_thread(runner.run_batch, action, self.observers)
+
+    def submit(self, action, runner):
+        """
+        Schedule an action and return the task that resolves to its
+        ``ActionResult``, or to the ``ActionResult`` of every page when the
+        synchronous runner that ``runner`` wraps runs batches.
+        """
+        wrapped = getattr(runner, 'runner', None)
+        if hasattr(wrapped, 'run_batch'):
+            task = asyncio.ensure_future(self.run_batch(action, wrapped))
+        else:
+            task = asyncio.ensure_future(self.run_action(action, runner))
+        self.tasks.append((task, action, runner))
+
+        return task
+
+    def cancel(self):
+        """
+        Cancel every action that has not finished yet.
+        """
+        for task, _, _ in self.tasks:
+            task.cancel()
+
+    async def join(self):
+        """
+        Wait for every submitted action and collect the outcomes into a
+        ``Report``. Cancelled actions are reported as failures.
+        """
+        run_report = report.Report()
+        for task, action, runner in self.tasks:
+            try:
+                results = await task
+            except asyncio.CancelledError as e:
+                results = report.ActionResult(action, runner, e)
+                scheduler.notify(self.observers, results)
+            for result in (results if isinstance(results, list) else [results]):
+                run_report.add(result)
+
+        return run_report
+
+
+def make(runner):
+    """
+    The ``make`` factory method wraps a synchronous ``Runner`` in an
+    asynchronous one.
+    """
+    return Runner(runner)
+
+
+async def run_command(actions, jobs=1, observers=()):
+    """
+    The asynchronous counterpart of ``scheduler.run_command``. Page
+    actions are run as subprocesses on the event loop with at most ``jobs``
+    of them executing at once, and every observer is notified as actions
+    start and finish.
+    """
+    entries = list(scheduler.expand_actions(actions))
+    for observer in observers:
+        observer.scheduled(scheduler.count_pages(entries))
+
+    action_scheduler = Scheduler(jobs, observers)
+    for action, runner in entries:
+        action_scheduler.submit(action, make(runner))
+
+    run_report = await action_scheduler.join()
+    for observer in observers:
+        observer.closed(run_report)
+
+    return run_report
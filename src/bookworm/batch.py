@@ -0,0 +1,239 @@
+import bookworm.abstract          as abstract
+import bookworm.util              as util
+import bookworm.change_resolution as change_resolution
+import bookworm.process           as process
+import bookworm.report            as report
+import bookworm.scheduler         as scheduler
+import bookworm.trace             as trace
+import os
+import os.path
+import subprocess
+
+
+def dotted_path(path):
+    """
+    Prefix a relative path with ``./`` so that a file name starting with a
+    dash is not read as an option. Absolute paths are left as they are.
+    """
+    return path if os.path.isabs(path) else f'./{path}'
+
+
+class Batch(abstract.Command):
+    """
+    Apply the same operations to many pages with a single ``mogrify``
+    process, writing every page into one target directory under its source
+    file name. ImageMagick is started once per batch instead of once per page.
+    """
+    def __init__(self, actions):
+        self.command = 'mogrify'
+        self.path_flag = '-path'
+        self.actions = actions
+        self.target_path = actions[0].target_path
+
+    def operations(self):
+        return self.actions[0].operations()
+
+    def as_subprocess(self):
+        quoted_path = dotted_path(self.target_path)
+        quoted_sources = [dotted_path(action.source_file) for action in self.actions]
+
+        return (
+            [self.command, self.path_flag, quoted_path] +
+            self.operations() +
+            quoted_sources
+        )
+
+    def as_terminal_command(self):
+        quoted_path = util.quoted_string(dotted_path(self.target_path))
+        quoted_sources = [
+            util.quoted_string(dotted_path(action.source_file))
+            for action in self.actions
+        ]
+
+        return '{} {} {} {} {}'.format(
+            self.command,
+            self.path_flag,
+            quoted_path,
+            ' '.join(self.operations()),
+            ' '.join(quoted_sources)
+        )
+
+    def __repr__(self):
+        return f'Batch({len(self.actions)} pages in {self.target_path!r})'
+
+
+def is_batchable(action):
+    """
+    Page actions that run ``convert`` and keep the source file name can be
+    batched. Changing the resolution of a TIFF page rewrites its header
+    without starting ImageMagick at all, so those actions are left alone.
+    """
+    if isinstance(action, change_resolution.ChangeResolution):
+        return False
+
+    return (getattr(action, 'command', None) == 'convert' and
+            hasattr(action, 'operations') and
+            os.path.basename(action.source_file) ==
+            os.path.basename(action.target_file))
+
+
+def file_state(file_path):
+    try:
+        status = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+    return (status.st_ino, status.st_size, status.st_mtime_ns)
+
+
+def error_lines(stderr):
+    """
+    The lines of ImageMagick's diagnostics that report errors rather than
+    warnings.
+    """
+    return [
+        line for line in stderr.splitlines()
+        if '@ error/' in line or '@ fatal/' in line
+    ]
+
+
+class Runner(abstract.Runner):
+    """
+    A ``Runner`` that executes a ``Batch`` with ``mogrify``, and falls back
+    to running the pages that ``mogrify`` failed on one at a time with the
+    page ``runner``, so each failure is reported against its own page.
+    """
+    def __init__(self, runner):
+        self.runner = runner
+
+    def setup(self, command):
+        for action in command.actions:
+            self.runner.setup(action)
+
+    def execute(self, command):
+        """
+        Run ``mogrify`` over the batch and return the page actions that it
+        did not write, or that it reported an error for.
+        """
+        before = {
+            action.target_file: file_state(action.target_file)
+            for action in command.actions
+        }
+
+        # A batch that runs out of time is retried a page at a time, which
+        # isolates the page that stalled it.
+        try:
+            completed = process.run(
+                command.as_subprocess(),
+                check=False,
+                stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+        except (OSError, process.TimeLimitExceeded):
+            return list(command.actions)
+
+        process.show_output(completed.stderr)
+        errors = error_lines(completed.stderr)
+
+        failed = []
+        for action in command.actions:
+            state = file_state(action.target_file)
+            if state is None or state == before[action.target_file]:
+                failed.append(action)
+            elif any(action.source_file in line for line in errors):
+                failed.append(action)
+
+        return failed
+
+    def cleanup(self, command):
+        for action in command.actions:
+            self.runner.cleanup(action)
+
+    def run_batch(self, command, observers=()):
+        """
+        Run a batch and return one ``ActionResult`` per page. Observers are
+        notified about the pages, not the batch.
+        """
+        for action in command.actions:
+            for observer in observers:
+                observer.started(action)
+
+        results = {}
+        ready = []
+        for action in command.actions:
+            try:
+                with trace.span('setup', 'runner', page=trace.page_name(action)):
+                    self.runner.setup(action)
+            except Exception as e:
+                results[action.target_file] = report.ActionResult(
+                    action, self.runner, e
+                )
+            else:
+                ready.append(action)
+
+        failed = []
+        if ready:
+            with trace.span('execute batch', 'runner', pages=len(ready)):
+                failed = self.execute(Batch(ready))
+        for action in ready:
+            if action in failed:
+                result = scheduler.run_action(action, self.runner)
+            else:
+                result = report.ActionResult(action, self.runner)
+            results[action.target_file] = result
+
+        page_results = [results[action.target_file] for action in command.actions]
+        for result in page_results:
+            for observer in observers:
+                observer.finished(result)
+
+        return page_results
+
+    def __repr__(self):
+        return f'Runner({self.runner!r})'
+
+
+def make_batches(actions, batch_size, jobs=1):
+    """
+    Group the batchable pages of a multiple page action by their operations
+    and target directory, and split each group into batches of at most
+    ``batch_size`` pages. A group is split into about ``jobs`` batches when
+    it has enough pages, so the batches can run concurrently. Returns
+    the batches and a multiple page action of the pages left over.
+    """
+    groups = {}
+    rest = {}
+    for page in sorted(actions):
+        action = actions[page]
+        if is_batchable(action):
+            key = (type(action), tuple(action.operations()), action.target_path)
+            groups.setdefault(key, []).append(action)
+        else:
+            rest[page] = action
+
+    batches = []
+    for group in groups.values():
+        count = max(min(jobs, len(group)), -(-len(group) // batch_size))
+        size = -(-len(group) // count)
+        for start in range(0, len(group), size):
+            batches.append(Batch(group[start:start + size]))
+
+    return batches, rest
+
+
+def make(action, runner, batch_size, jobs=1):
+    """
+    The ``make`` factory method turns a pdf or page action and its runner
+    into a list of ``(action, runner)`` pairs in which the pages of a
+    multiple page action are batched. Single actions are returned as is.
+    """
+    if batch_size <= 0:
+        raise ValueError(f'Batch size must be positive. Got: {batch_size}')
+
+    if not isinstance(action, dict):
+        return [(action, runner)]
+
+    batches, rest = make_batches(action, batch_size, jobs)
+    batch_runner = Runner(runner)
+
+    return [(batch, batch_runner) for batch in batches] + [(rest, runner)]
@@ -0,0 +1,637 @@
+import bookworm.pdf     as pdf
+import bookworm.process as process
+import bookworm.render  as render
+import bookworm.tiff    as tiff
+import argparse
+import json
+import os
+import os.path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+
+COLOR_MODES = ('color', 'gray', 'bilevel')
+
+# The TIFF compression and photometric interpretation of a synthetic page.
+COMPRESSION_DEFLATE = 8
+PHOTOMETRIC = {'bilevel': 0, 'gray': 1, 'color': 2}
+BITS_PER_SAMPLE = {'bilevel': (1,), 'gray': (8,), 'color': (8, 8, 8)}
+
+# The fraction by which a result may be worse than its baseline before it
+# is reported as a regression.
+DEFAULT_TOLERANCE = 0.1
+
+
+class Corpus:
+    """
+    The ``Corpus`` class describes a synthetic book: ``pages`` pages of
+    ``width`` by ``height`` inches scanned at ``dpi`` in a color mode, kept
+    both as a pdf of page images and as a directory of TIFF pages.
+    """
+    def __init__(self, directory, pages=20, dpi=300, width=8.5, height=11.0,
+                 color_mode='gray'):
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f'Color mode must be one of {COLOR_MODES}. Got: {color_mode}')
+
+        for name, value in (('pages', pages), ('dpi', dpi), ('width', width), ('height', height)):
+            if value <= 0:
+                raise ValueError(f'\'{name}\' must be positive. Got: {value}')
+
+        self.directory = directory
+        self.pages = pages
+        self.dpi = dpi
+        self.width = width
+        self.height = height
+        self.color_mode = color_mode
+
+    @property
+    def source_pdf(self):
+        return os.path.join(self.directory, 'book.pdf')
+
+    @property
+    def page_dir(self):
+        return os.path.join(self.directory, 'pages')
+
+    @property
+    def pixels(self):
+        """
+        The width and height of every page in pixels.
+        """
+        return round(self.width * self.dpi), round(self.height * self.dpi)
+
+    def relative_to(self, directory):
+        """
+        The same corpus found by a path relative to ``directory``. The page
+        commands take relative paths only.
+        """
+        return Corpus(
+            os.path.relpath(self.directory, directory), self.pages, self.dpi,
+            self.width, self.height, self.color_mode
+        )
+
+    def as_dict(self):
+        return dict(
+            pages = self.pages,
+            dpi = self.dpi,
+            width = self.width,
+            height = self.height,
+            color_mode = self.color_mode
+        )
+
+    def __repr__(self):
+        return (
+            f'Corpus({self.directory!r}, {self.pages}, {self.dpi}, '
+            f'{self.width}, {self.height}, {self.color_mode!r})'
+        )
+
+
+def page_data(width, height, color_mode, dpi):
+    """
+    The uncompressed samples of a synthetic page: lines of dark word shaped
+    blocks on a white background, about as compressible as a page of text.
+    """
+    line_height = max(2, dpi // 6)
+    word = max(1, dpi // 6)
+    gap = max(1, dpi // 24)
+    margin = width // 10
+
+    if color_mode == 'bilevel':
+        # WhiteIsZero: set bits are black.
+        blank = bytes((width + 7) // 8)
+        bits = ('0' * margin + ('1' * word + '0' * gap) * width)[:width - margin]
+        bits = (bits + '0' * margin).ljust(-(-width // 8) * 8, '0')
+        text = int(bits, 2).to_bytes(len(bits) // 8, 'big')
+    else:
+        channels = 3 if color_mode == 'color' else 1
+        ink = b'\x20\x20\x60' if channels == 3 else b'\x20'
+        paper = b'\xff' * channels
+        blank = paper * width
+        row = (paper * margin + (ink * word + paper * gap) * width)[:(width - margin) * channels]
+        text = row + paper * margin
+
+    rows = []
+    for y in range(height):
+        in_margin = y < height // 12 or y > height - height // 12
+        rows.append(blank if in_margin or y % line_height > line_height * 3 // 5 else text)
+
+    return b''.join(rows)
+
+
+def write_page_pdf(file_path, corpus, data):
+    """
+    Write the pdf of a corpus, every page a Flate encoded image of ``data``
+    that covers the page.
+    """
+    width, height = corpus.pixels
+    bits = BITS_PER_SAMPLE[corpus.color_mode]
+    dictionary = {
+        'Type': pdf.Name('XObject'),
+        'Subtype': pdf.Name('Image'),
+        'Width': width,
+        'Height': height,
+        'ColorSpace': pdf.Name('DeviceRGB' if len(bits) == 3 else 'DeviceGray'),
+        'BitsPerComponent': bits[0],
+        'Filter': pdf.Name('FlateDecode'),
+    }
+    if corpus.color_mode == 'bilevel':
+        dictionary['Decode'] = [1, 0]
+
+    compressed = zlib.compress(data)
+    media_width, media_height = corpus.width * 72, corpus.height * 72
+    content = b'q %s 0 0 %s 0 0 cm /Im0 Do Q' % (
+        pdf.serialize(float(media_width)), pdf.serialize(float(media_height))
+    )
+
+    part_file = file_path + '.part'
+    with open(part_file, 'wb') as handle:
+        writer = pdf.Writer(handle)
+        pages = writer.reserve()
+        kids = []
+        for _ in range(corpus.pages):
+            image = writer.reserve()
+            writer.write_stream(image, dictionary, [compressed])
+            contents = writer.reserve()
+            writer.write_stream(contents, {}, [content])
+            page = writer.reserve()
+            writer.write_object(page, {
+                'Type': pdf.Name('Page'),
+                'Parent': pages,
+                'MediaBox': [0, 0, float(media_width), float(media_height)],
+                'Resources': {'XObject': {'Im0': image}},
+                'Contents': contents,
+            })
+            kids.append(page)
+
+        writer.write_object(pages, {
+            'Type': pdf.Name('Pages'), 'Kids': kids, 'Count': len(kids),
+        })
+        catalog = writer.reserve()
+        writer.write_object(catalog, {'Type': pdf.Name('Catalog'), 'Pages': pages})
+        writer.close(catalog)
+    os.replace(part_file, file_path)
+
+
+def generate(corpus):
+    """
+    Write the pdf and the TIFF pages of a corpus. A corpus that has already
+    been generated is left as it is.
+    """
+    manifest_file = os.path.join(corpus.directory, 'corpus.json')
+    if os.path.isfile(manifest_file):
+        with open(manifest_file) as handle:
+            if json.load(handle) == corpus.as_dict():
+                return corpus
+
+    shutil.rmtree(corpus.page_dir, ignore_errors=True)
+    os.makedirs(corpus.page_dir)
+
+    width, height = corpus.pixels
+    data = page_data(width, height, corpus.color_mode, corpus.dpi)
+    strip = zlib.compress(data)
+    for page in range(1, corpus.pages + 1):
+        tiff.write_image(
+            os.path.join(corpus.page_dir, f'_Page_{page:04d}.tiff'),
+            width, height, BITS_PER_SAMPLE[corpus.color_mode],
+            PHOTOMETRIC[corpus.color_mode], COMPRESSION_DEFLATE, strip,
+            resolution=(corpus.dpi, corpus.dpi)
+        )
+
+    write_page_pdf(corpus.source_pdf, corpus, data)
+
+    with open(manifest_file, 'w') as handle:
+        json.dump(corpus.as_dict(), handle)
+
+    return corpus
+
+
+class Case:
+    """
+    A benchmark case: one bookworm subcommand run with one execution
+    strategy. ``arguments`` builds the command line arguments after the
+    subcommand from the corpus, the output path and the number of jobs.
+    """
+    def __init__(self, name, subcommand, strategy, arguments):
+        self.name = name
+        self.subcommand = subcommand
+        self.strategy = strategy
+        self.arguments = arguments
+
+    def args(self, corpus, output, jobs):
+        return [self.subcommand] + self.arguments(corpus, output, jobs)
+
+    def output(self, run_dir):
+        if self.subcommand == 'pack-pdf':
+            return os.path.join(run_dir, 'book.pdf')
+        return os.path.join(run_dir, 'pages')
+
+    def __repr__(self):
+        return f'Case({self.name!r})'
+
+
+def _dimensions(corpus, dpi):
+    """
+    A canvas an inch wider and taller than a page at ``dpi``.
+    """
+    return f'{round((corpus.width + 1) * dpi)}x{round((corpus.height + 1) * dpi)}'
+
+
+def _unpack(corpus, output, jobs):
+    return [
+        '-i', corpus.source_pdf, '-o', output, '-r', str(corpus.dpi),
+        '--color-mode', corpus.color_mode, '-j', str(jobs)
+    ]
+
+
+def _change_resolution(corpus, output, jobs):
+    return [
+        '-i', corpus.page_dir, '-o', output, '-r', str(corpus.dpi * 2),
+        '-u', 'PixelsPerInch', '-j', str(jobs)
+    ]
+
+
+def _resample(corpus, output, jobs):
+    return [
+        '-i', corpus.page_dir, '-o', output, '-r', str(corpus.dpi // 2),
+        '-u', 'PixelsPerInch', '-j', str(jobs)
+    ]
+
+
+def _expand(corpus, output, jobs):
+    return [
+        '-i', corpus.page_dir, '-o', output,
+        '-d', _dimensions(corpus, corpus.dpi), '-j', str(jobs)
+    ]
+
+
+def _normalize(corpus, output, jobs):
+    return [
+        '-i', corpus.page_dir, '-o', output, '-r', str(corpus.dpi),
+        '-s', str(corpus.dpi // 2), '-d', _dimensions(corpus, corpus.dpi // 2),
+        '-j', str(jobs)
+    ]
+
+
+def _process(corpus, output, jobs):
+    return [
+        '-i', corpus.source_pdf, '-o', output, '-r', str(corpus.dpi),
+        '-s', str(corpus.dpi // 2), '-d', _dimensions(corpus, corpus.dpi // 2),
+        '--color-mode', corpus.color_mode, '-j', str(jobs)
+    ]
+
+
+def _pack(corpus, output, jobs):
+    return ['-i', corpus.page_dir, '-o', output]
+
+
+def _serial(arguments):
+    return lambda corpus, output, jobs: arguments(corpus, output, 1)
+
+
+def _with(arguments, *extra):
+    return lambda corpus, output, jobs: arguments(corpus, output, jobs) + list(extra)
+
+
+def _auto(arguments):
+    def auto_arguments(corpus, output, jobs):
+        args = arguments(corpus, output, jobs)
+        args[args.index('-j') + 1] = 'auto'
+        return args
+
+    return auto_arguments
+
+
+# Every subcommand with every execution strategy it supports: ``serial`` runs
+# one page at a time, ``pool`` runs ``jobs`` pages at once, ``auto`` lets the
+# thread plan choose, ``batch`` runs pages through a few mogrify processes,
+# ``fused`` does several steps in one pass, and ``in-process`` does the work
+# in Python without starting an image program for it.
+CASES = [
+    Case('unpack-pdf/serial', 'unpack-pdf', 'serial', _serial(_unpack)),
+    Case('unpack-pdf/pool', 'unpack-pdf', 'pool', _unpack),
+    Case('unpack-pdf/in-process', 'unpack-pdf', 'in-process', _with(_unpack, '--passthrough')),
+    Case('change-resolution/serial', 'change-resolution', 'in-process', _serial(_change_resolution)),
+    Case('change-resolution/pool', 'change-resolution', 'pool', _change_resolution),
+    Case('resample-page/serial', 'resample-page', 'serial', _serial(_resample)),
+    Case('resample-page/pool', 'resample-page', 'pool', _resample),
+    Case('resample-page/auto', 'resample-page', 'auto', _auto(_resample)),
+    Case('resample-page/batch', 'resample-page', 'batch', _with(_resample, '--batch')),
+    Case('expand-page/serial', 'expand-page', 'serial', _serial(_expand)),
+    Case('expand-page/pool', 'expand-page', 'pool', _expand),
+    Case('expand-page/batch', 'expand-page', 'batch', _with(_expand, '--batch')),
+    Case('normalize-page/serial', 'normalize-page', 'fused', _serial(_normalize)),
+    Case('normalize-page/pool', 'normalize-page', 'fused', _normalize),
+    Case('normalize-page/batch', 'normalize-page', 'batch', _with(_normalize, '--batch')),
+    Case('process-pdf/pool', 'process-pdf', 'fused', _process),
+    Case('pack-pdf/in-process', 'pack-pdf', 'in-process', _pack),
+]
+
+
+def find_cases(names=None):
+    """
+    The cases called ``names``, or whose names start with one of them, such
+    as ``resample-page`` for every strategy of that subcommand. Every case
+    is returned when ``names`` is empty.
+    """
+    if not names:
+        return list(CASES)
+
+    cases = [
+        case for case in CASES
+        if any(case.name == name or case.name.startswith(name + '/') for name in names)
+    ]
+    if not cases:
+        raise ValueError(f'No benchmark case matches: {", ".join(names)}')
+
+    return cases
+
+
+class Measurement:
+    """
+    The wall clock time, CPU time and peak resident memory of a program and
+    every program it ran.
+    """
+    def __init__(self, seconds, cpu_seconds, peak_rss, returncode):
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.peak_rss = peak_rss
+        self.returncode = returncode
+
+    def __repr__(self):
+        return (
+            f'Measurement({self.seconds:.3f}, {self.cpu_seconds:.3f}, '
+            f'{self.peak_rss}, {self.returncode})'
+        )
+
+
+def measure(args, log_file, env=None, cwd=None):
+    """
+    Run ``args`` to completion and measure it. The resource usage reported
+    when the program is reaped covers the programs it waited for, such as
+    Ghostscript and ImageMagick. Output goes to ``log_file``.
+    """
+    with open(log_file, 'wb') as log:
+        start = time.perf_counter()
+        child = subprocess.Popen(
+            args, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=cwd
+        )
+        _, status, usage = os.wait4(child.pid, 0)
+        seconds = time.perf_counter() - start
+        child.returncode = os.waitstatus_to_exitcode(status)
+
+    return Measurement(
+        seconds, usage.ru_utime + usage.ru_stime,
+        process.rss_bytes(usage.ru_maxrss), child.returncode
+    )
+
+
+def bookworm_args(case_args):
+    """
+    The command line that runs bookworm with ``case_args`` in a new
+    interpreter.
+    """
+    return [
+        sys.executable, '-c',
+        'import sys, bookworm_main.bookworm_main as main; main.main(sys.argv)'
+    ] + case_args
+
+
+def bookworm_environment():
+    """
+    The environment of a benchmarked run, in which the bookworm being
+    benchmarked can be imported.
+    """
+    source_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in (source_root, env.get('PYTHONPATH')) if path
+    )
+
+    return env
+
+
+def run_case(case, corpus, work_dir, jobs=None, repeat=1):
+    """
+    Run a case ``repeat`` times on a fresh output, and return its result as a
+    dictionary. The fastest run is reported, since slower runs measure noise
+    from the rest of the host. Cases run in ``work_dir``.
+    """
+    if jobs is None:
+        jobs = render.cpu_count()
+
+    work_dir = os.path.abspath(work_dir)
+    run_name = case.name.replace('/', '_')
+    run_dir = os.path.join(work_dir, run_name)
+    log_file = run_dir + '.log'
+    args = case.args(corpus.relative_to(work_dir), case.output(run_name), jobs)
+    result = dict(name=case.name, subcommand=case.subcommand, strategy=case.strategy,
+                  args=args, pages=corpus.pages)
+
+    best = None
+    for _ in range(repeat):
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.makedirs(run_dir)
+        measurement = measure(
+            bookworm_args(args), log_file, bookworm_environment(), work_dir
+        )
+        if measurement.returncode != 0:
+            with open(log_file, errors='replace') as handle:
+                lines = handle.read().strip().splitlines()
+            error = lines[-1] if lines else f'exit status {measurement.returncode}'
+            result.update(succeeded=False, error=error)
+            shutil.rmtree(run_dir, ignore_errors=True)
+            return result
+        if best is None or measurement.seconds < best.seconds:
+            best = measurement
+
+    shutil.rmtree(run_dir, ignore_errors=True)
+    result.update(
+        succeeded = True,
+        seconds = best.seconds,
+        pages_per_second = corpus.pages / best.seconds if best.seconds > 0 else None,
+        cpu_seconds = best.cpu_seconds,
+        peak_rss = best.peak_rss
+    )
+
+    return result
+
+
+def run_benchmark(corpus, cases=None, jobs=None, repeat=1, work_dir=None):
+    """
+    Generate a corpus and run every case on it. Returns the results as a
+    dictionary that can be written as JSON, with a description of the host.
+    """
+    if jobs is None:
+        jobs = render.cpu_count()
+
+    generate(corpus)
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        results = [
+            run_case(case, corpus, temp_dir, jobs, repeat)
+            for case in find_cases(cases)
+        ]
+
+    return dict(
+        host = dict(
+            platform = platform.platform(),
+            python = platform.python_version(),
+            cpus = render.cpu_count(),
+            memory = render.memory_size()
+        ),
+        corpus = corpus.as_dict(),
+        jobs = jobs,
+        repeat = repeat,
+        results = results
+    )
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the results of two benchmark runs, case by case. A case regresses
+    when its throughput drops, or its CPU time or peak memory grows, by more
+    than ``tolerance`` of the baseline, or when it fails where it used to
+    succeed. Returns a list of lines describing the regressions.
+    """
+    baseline_results = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        before = baseline_results.get(result['name'])
+        if before is None or not before.get('succeeded'):
+            continue
+
+        if not result.get('succeeded'):
+            regressions.append(f'{result["name"]}: failed ({result.get("error")})')
+            continue
+
+        checks = (
+            ('pages_per_second', -1, 'pages/sec'),
+            ('cpu_seconds', 1, 'CPU seconds'),
+            ('peak_rss', 1, 'peak RSS'),
+        )
+        for key, direction, label in checks:
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction > tolerance:
+                regressions.append(
+                    f'{result["name"]}: {label} {old:.4g} -> {new:.4g} ({change:+.1%})'
+                )
+
+    return regressions
+
+
+def check_size(value):
+    """
+    Parse a page size in inches such as ``8.5x11``.
+    """
+    try:
+        width, height = (float(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} needs to be a size such as 8.5x11')
+
+    return width, height
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('--pages', help='The number of pages (default 20)', type=int, default=20)
+    parser.add_argument('--dpi', help='The scan resolution (default 300)', type=int, default=300)
+    parser.add_argument(
+        '--size', help='The page size in inches (default 8.5x11)',
+        type=check_size, default=(8.5, 11.0)
+    )
+    parser.add_argument(
+        '--color-mode', help='The color mode of the pages (default gray)',
+        choices=COLOR_MODES, default='gray'
+    )
+
+
+def make_corpus(args, directory):
+    width, height = args.size
+    return Corpus(directory, args.pages, args.dpi, width, height, args.color_mode)
+
+
+def arg_processor():
+    parser = argparse.ArgumentParser(
+        prog='python -m bookworm.benchmark',
+        description='Benchmark bookworm on a synthetic book.'
+    )
+    subparsers = parser.add_subparsers(dest='action')
+
+    parser_generate = subparsers.add_parser('generate', help='Generate a corpus')
+    parser_generate.add_argument('directory', help='The directory to write the corpus to')
+    add_corpus_arguments(parser_generate)
+
+    parser_run = subparsers.add_parser('run', help='Time every case on a corpus')
+    parser_run.add_argument(
+        '--corpus', help='The directory to keep the corpus in (default temporary)'
+    )
+    parser_run.add_argument(
+        '--case', help='Run only this case, or every case of a subcommand',
+        action='append', dest='cases'
+    )
+    parser_run.add_argument('-j', '--jobs', help='The jobs of a pool run', type=int)
+    parser_run.add_argument('--repeat', help='Runs per case (default 1)', type=int, default=1)
+    parser_run.add_argument('-o', '--output', help='Write the results to this JSON file')
+    add_corpus_arguments(parser_run)
+
+    parser_compare = subparsers.add_parser(
+        'compare', help='Report the regressions of a run against a baseline'
+    )
+    parser_compare.add_argument('baseline', help='The baseline results')
+    parser_compare.add_argument('results', help='The results to check')
+    parser_compare.add_argument(
+        '--tolerance', help='The allowed relative change (default 0.1)',
+        type=float, default=DEFAULT_TOLERANCE
+    )
+
+    return parser
+
+
+def main(argv=sys.argv):
+    """
+    Generate a corpus, run the benchmark and print its results as JSON, or
+    compare two results and exit with a failure on regressions.
+    """
+    parser = arg_processor()
+    args = parser.parse_args(argv[1:])
+
+    if args.action == 'generate':
+        generate(make_corpus(args, args.directory))
+
+    elif args.action == 'run':
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = make_corpus(args, args.corpus or os.path.join(temp_dir, 'corpus'))
+            results = run_benchmark(corpus, args.cases, args.jobs, args.repeat)
+
+        text = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as handle:
+                handle.write(text + '\n')
+        else:
+            print(text)
+
+    elif args.action == 'compare':
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        with open(args.results) as handle:
+            current = json.load(handle)
+
+        regressions = compare(baseline, current, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION: {line}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions.')
+
+    else:
+        parser.print_help()
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
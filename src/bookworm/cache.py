@@ -0,0 +1,243 @@
+import bookworm.abstract as abstract
+import bookworm.manifest as manifest
+import bookworm.util     as util
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import stat
+import tempfile
+import threading
+
+
+def default_cache_dir():
+    """
+    The cache directory used when none is given: ``$BOOKWORM_CACHE_DIR`` if
+    it is set, and ``~/.cache/bookworm`` otherwise.
+    """
+    return os.environ.get(
+        'BOOKWORM_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.cache', 'bookworm')
+    )
+
+
+class Cache:
+    """
+    The ``Cache`` class is an on-disk store of page outputs keyed by the
+    contents of the input page, the type of the command and its parameters.
+    Objects are written to a temporary file and renamed into place, so
+    several bookworm processes can share one cache. When the objects grow
+    past ``max_size`` bytes, the least recently used ones are evicted.
+    """
+    def __init__(self, cache_dir, max_size, hardlink=False):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.max_size = max_size
+        self.hardlink = hardlink
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.size = None
+
+    def key(self, action):
+        """
+        The cache key of a page action.
+        """
+        data = json.dumps([
+            manifest.file_hash(action.source_file),
+            manifest.parameters(action),
+            os.path.splitext(action.target_file)[1].lower()
+        ])
+
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def object_file(self, key):
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def fetch(self, key, target_file):
+        """
+        Copy or link the object ``key`` to ``target_file``, returning whether
+        the object was in the cache. Using an object marks it as recently
+        used.
+        """
+        object_file = self.object_file(key)
+        try:
+            try:
+                os.utime(object_file)
+            except PermissionError:
+                # Objects stored by another user keep their access order.
+                pass
+            if os.path.lexists(target_file):
+                os.remove(target_file)
+            if self.hardlink:
+                try:
+                    os.link(object_file, target_file)
+                except OSError:
+                    shutil.copyfile(object_file, target_file)
+            else:
+                shutil.copyfile(object_file, target_file)
+        except FileNotFoundError:
+            # The object was never stored, or another process evicted it.
+            with self.lock:
+                self.misses += 1
+            return False
+
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, source_file):
+        """
+        Store a copy of ``source_file`` as the object ``key``. Objects are
+        read only, since a hit may hand out a hard link to them.
+        """
+        object_file = self.object_file(key)
+        object_dir = os.path.dirname(object_file)
+        util.make_directory(object_dir)
+
+        handle, temp_file = tempfile.mkstemp(dir=object_dir, prefix='.tmp-')
+        os.close(handle)
+        try:
+            shutil.copyfile(source_file, temp_file)
+            os.chmod(temp_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temp_file, object_file)
+        except Exception:
+            os.remove(temp_file)
+            raise
+
+        with self.lock:
+            if self.size is None:
+                self.size = self.disk_size()
+            else:
+                self.size += os.path.getsize(object_file)
+            over_budget = self.size > self.max_size
+
+        if over_budget:
+            self.evict()
+
+    def objects(self):
+        """
+        The ``(mtime, size, path)`` of every object in the cache.
+        """
+        found = []
+        if not os.path.isdir(self.objects_dir):
+            return found
+
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(prefix_dir, name)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((status.st_mtime, status.st_size, path))
+
+        return found
+
+    def disk_size(self):
+        return sum(size for _, size, _ in self.objects())
+
+    def evict(self):
+        """
+        Remove the least recently used objects until the cache fits in
+        ``max_size`` bytes. Objects that another process removes first are
+        skipped. Outputs hard linked to an evicted object no longer share it
+        with the cache, so they are made writable again.
+        """
+        objects = sorted(self.objects())
+        size = sum(object_size for _, object_size, _ in objects)
+        for _, object_size, path in objects:
+            if size <= self.max_size:
+                break
+            try:
+                status = os.stat(path)
+                if status.st_nlink > 1:
+                    try:
+                        os.chmod(path, status.st_mode | stat.S_IWUSR)
+                    except PermissionError:
+                        # Objects stored by another user keep their mode.
+                        pass
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= object_size
+
+        with self.lock:
+            self.size = size
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def is_cacheable(action):
+    """
+    Page actions that write a separate target file can be cached. Actions
+    that rewrite their own source page, and pdf actions, are not.
+    """
+    try:
+        source_file = action.source_file
+        target_file = action.target_file
+    except AttributeError:
+        return False
+
+    return (hasattr(action, 'operations') and
+            os.path.abspath(source_file) != os.path.abspath(target_file))
+
+
+class Runner(abstract.Runner):
+    """
+    A ``Runner`` that consults a ``Cache`` before executing a page action
+    with another runner, and stores the output after a miss.
+    """
+    def __init__(self, runner, cache):
+        self.runner = runner
+        self.cache = cache
+
+    def setup(self, command):
+        self.runner.setup(command)
+
+    def execute(self, command):
+        if not is_cacheable(command):
+            return self.runner.execute(command)
+
+        key = self.cache.key(command)
+        if self.cache.fetch(key, command.target_file):
+            return
+
+        # A target linked to a cache object from an earlier hit must not be
+        # overwritten in place, or the object would change with it. Once the
+        # object is evicted, the target may be left read only.
+        if os.path.isfile(command.target_file):
+            status = os.stat(command.target_file)
+            if status.st_nlink > 1 or not status.st_mode & stat.S_IWUSR:
+                os.remove(command.target_file)
+
+        self.runner.execute(command)
+        self.cache.store(key, command.target_file)
+
+    def cleanup(self, command):
+        self.runner.cleanup(command)
+
+    def __repr__(self):
+        return f'Runner({self.runner!r})'
+
+
+def make(runner, cache_dir=None, max_size=10 * 1024 ** 3, hardlink=False):
+    """
+    The ``make`` factory method wraps ``runner`` in a caching ``Runner``.
+    """
+    if max_size <= 0:
+        raise ValueError(f'Cache size must be positive. Got: {max_size}')
+
+    if not cache_dir:
+        cache_dir = default_cache_dir()
+
+    return Runner(runner, Cache(cache_dir, max_size, hardlink))
@@ -1,8 +1,10 @@
 import bookworm.abstract as abstract
 import bookworm.util     as util
+import bookworm.tiff     as tiff
+import bookworm.process  as process
 import os
 import os.path
-import subprocess
+import shutil
 
 from bookworm.resolution import Resolution
 
@@ -36,6 +38,25 @@ class ChangeResolution(abstract.Command):
             quoted_target
         ]
 
+    def operations(self):
+        """
+        The ImageMagick options that carry out this action, without the
+        program name or the input and output files.
+        """
+        return self.transform_operations()
+
+    def transform_operations(self):
+        """
+        The ImageMagick options that change the page's resolution. They do
+        not touch the pixels, so the page keeps its bit depth.
+        """
+        return [
+            self.density_flag,
+            self.density,
+            self.units_flag,
+            self.units
+        ]
+
     def as_terminal_command(self):
         return '{} {} {} {} {}'.format(
             self.command,
@@ -55,20 +76,52 @@ class Runner(abstract.Runner):
         Prepare an action for execution by setting up folders and I/O.
         """
         if os.path.isfile(command.source_file):
-            if not os.path.isdir(command.target_path):
-                os.mkdir(command.target_path)
+            util.make_directory(command.target_path)
         else:
             raise FileNotFoundError(
                 f'File does not exist: {command.source_file}'
             )
 
     def execute(command):
-        subprocess.run(command.as_subprocess())
+        """
+        Change the resolution by rewriting the page's TIFF resolution tags,
+        falling back to ImageMagick for pages that cannot be patched.
+        """
+        try:
+            patch_resolution(command)
+        except tiff.TIFFError:
+            process.run(command.as_subprocess())
 
     def cleanup(command):
         return
 
 
+def patch_resolution(command):
+    """
+    Change a page's resolution without decoding its pixels. The page is
+    copied to a temporary file next to the target, its resolution tags are
+    rewritten, and the result replaces the target. A page that is its own
+    target is patched in place.
+    """
+    target_ext = os.path.splitext(command.target_file)[1].lower()
+    if target_ext not in ('.tif', '.tiff'):
+        raise tiff.TIFFError(f'Target is not a TIFF file: {command.target_file}')
+
+    if os.path.abspath(command.source_file) == os.path.abspath(command.target_file):
+        tiff.set_resolution(command.target_file, command.resolution)
+        return
+
+    temp_file = command.target_file + '.part'
+    shutil.copyfile(command.source_file, temp_file)
+    try:
+        tiff.set_resolution(temp_file, command.resolution)
+    except Exception:
+        os.remove(temp_file)
+        raise
+
+    os.replace(temp_file, command.target_file)
+
+
 def make(resolution, source_file, target_file=''):
     """
     The ``make`` factory method creates a ``ChangePageResolution`` 
@@ -91,7 +144,9 @@ def multi_change_page_resolution(resolution, source_path, source_files, target):
     actions = {}
     for source_file in source_files:
         action = make(
-            resolution, os.path.join(source_path, source_file), target
+            resolution,
+            os.path.join(source_path, source_file),
+            util.target_file_in(target, source_file)
         )
         actions[source_file] = action
 
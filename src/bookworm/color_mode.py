@@ -0,0 +1,214 @@
+import bookworm.tiff    as tiff
+import bookworm.process as process
+import subprocess
+
+
+COLOR = 'color'
+GRAY = 'gray'
+BILEVEL = 'bilevel'
+AUTO = 'auto'
+
+COLOR_MODES = (AUTO, COLOR, GRAY, BILEVEL)
+
+# The Ghostscript TIFF device that renders pages in each color mode.
+DEVICES = {
+    COLOR: 'tiff24nc',
+    GRAY: 'tiffgray',
+    BILEVEL: 'tiffg4',
+}
+
+# Pages are classified from a rendering at this resolution.
+SAMPLE_RESOLUTION = 36
+
+# A pixel is neutral when its channels differ by at most this much.
+CHROMA_TOLERANCE = 24
+
+# A pixel is ink or paper when it is this close to black or white.
+BILEVEL_MARGIN = 64
+
+# The fraction of pixels that may be colored, or of neutral pixels that may
+# be neither ink nor paper, before a page counts as color or gray. It allows
+# for specks and scanner noise.
+NOISE_FRACTION = 0.005
+
+
+# Tables for ``bytes.translate`` that map a byte to 1 where it passes a test
+# and to 0 elsewhere, so that a whole page is tested at once.
+_ABOVE_TOLERANCE = bytes(int(value > CHROMA_TOLERANCE) for value in range(256))
+_BELOW_TOLERANCE = bytes(int(value < 256 - CHROMA_TOLERANCE) for value in range(256))
+_MIDTONE = bytes(
+    int(BILEVEL_MARGIN < value < 255 - BILEVEL_MARGIN) for value in range(256)
+)
+
+
+def _flags(samples, table):
+    return int.from_bytes(samples.translate(table), 'big')
+
+
+def _count(flags):
+    return bin(flags).count('1')
+
+
+def _differs(first, second):
+    """
+    The flags, one bit per sample, of the samples of ``first`` that differ
+    from those of ``second`` by more than ``CHROMA_TOLERANCE``. The samples
+    are widened to 16 bit lanes of one big integer, and ``256 + first -
+    second`` is computed in every lane at once: its high byte is 1 where
+    ``first`` is not less than ``second``, and its low byte is the
+    difference modulo 256.
+    """
+    count = len(first)
+    wide_first = bytearray(2 * count)
+    wide_first[1::2] = first
+    wide_second = bytearray(2 * count)
+    wide_second[1::2] = second
+
+    lanes = (
+        int.from_bytes(wide_first, 'big') +
+        int.from_bytes(b'\x01\x00' * count, 'big') -
+        int.from_bytes(wide_second, 'big')
+    ).to_bytes(2 * count, 'big')
+    not_less = int.from_bytes(lanes[0::2], 'big')
+    less = not_less ^ int.from_bytes(b'\x01' * count, 'big')
+    differences = lanes[1::2]
+
+    return (
+        (not_less & _flags(differences, _ABOVE_TOLERANCE)) |
+        (less & _flags(differences, _BELOW_TOLERANCE))
+    )
+
+
+def classify(pixels):
+    """
+    Classify a page from its RGB samples, given as bytes with three samples
+    per pixel, as ``COLOR``, ``GRAY`` or ``BILEVEL``. Every pixel is tested
+    at once with big integer and ``bytes.translate`` operations, since a
+    loop over the pixels of every page would hold up the start of a run.
+    """
+    count = len(pixels) // 3
+    if count == 0:
+        return BILEVEL
+
+    red = pixels[0:3 * count:3]
+    green = pixels[1:3 * count:3]
+    blue = pixels[2:3 * count:3]
+    allowed = count * NOISE_FRACTION
+
+    colored = 0
+    if not red == green == blue:
+        colored = _differs(red, green) | _differs(green, blue) | _differs(red, blue)
+        if _count(colored) > allowed:
+            return COLOR
+
+    neutral = colored ^ int.from_bytes(b'\x01' * count, 'big')
+    midtones = _count(_flags(green, _MIDTONE) & neutral)
+
+    return GRAY if midtones > allowed else BILEVEL
+
+
+def _read_token(stream):
+    """
+    Read one whitespace separated token of a PPM header, skipping comments.
+    Returns ``b''`` at the end of the stream.
+    """
+    token = b''
+    while True:
+        char = stream.read(1)
+        if not char:
+            return token
+        if char == b'#':
+            while char not in (b'\n', b''):
+                char = stream.read(1)
+            continue
+        if char.isspace():
+            if token:
+                return token
+            continue
+        token += char
+
+
+def read_ppm_pages(stream):
+    """
+    Read the RGB samples of every image in a stream of concatenated binary
+    PPM images, one image at a time.
+    """
+    while True:
+        magic = _read_token(stream)
+        if not magic:
+            return
+        if magic != b'P6':
+            raise ValueError(f'Expected a binary PPM image. Got: {magic!r}')
+
+        width = int(_read_token(stream))
+        height = int(_read_token(stream))
+        max_value = int(_read_token(stream))
+        if max_value > 255:
+            raise ValueError('Only eight bit PPM images are supported.')
+
+        size = width * height * 3
+        pixels = stream.read(size)
+        if len(pixels) < size:
+            raise ValueError('PPM image is cut short.')
+
+        yield pixels
+
+
+def sample_args(source_pdf):
+    """
+    The Ghostscript command line that renders a pdf at the sample resolution
+    to standard output. Anti-aliasing is off so that black text stays black
+    and white.
+    """
+    return [
+        'gs', '-q', '-dNOPAUSE', '-dBATCH', '-dSAFER',
+        '-sDEVICE=ppmraw', f'-r{SAMPLE_RESOLUTION}',
+        '-dTextAlphaBits=1', '-dGraphicsAlphaBits=1',
+        '-sOutputFile=-', source_pdf
+    ]
+
+
+def page_modes(source_pdf):
+    """
+    Render every page of a pdf at a low resolution and classify it. Returns
+    one color mode per page, in page order.
+    """
+    child = process.start(
+        sample_args(source_pdf),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    with process.Watchdog(child) as watchdog:
+        try:
+            modes = [classify(pixels) for pixels in read_ppm_pages(child.stdout)]
+        finally:
+            child.stdout.close()
+            returncode = child.reap()
+
+    watchdog.check()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, sample_args(source_pdf))
+
+    return modes
+
+
+def depth_operations(source_file):
+    """
+    The ImageMagick options that keep a gray or bilevel page at its bit depth
+    through resampling and expansion, which would otherwise produce gray
+    levels or full color. Color pages, and files that are not TIFF files,
+    need none.
+    """
+    try:
+        header = tiff.read_header(source_file)
+    except (OSError, tiff.TIFFError):
+        return []
+
+    # Palette images have one sample per pixel too, but they are in color.
+    if header.samples_per_pixel != 1 or header.photometric not in (0, 1):
+        return []
+
+    if header.bits_per_sample == (1,):
+        return ['-threshold', '50%', '-type', 'Bilevel', '-compress', 'Group4']
+
+    return ['-type', 'Grayscale']
@@ -0,0 +1,144 @@
+import bookworm.tiff  as tiff
+import bookworm.trace as trace
+import os.path
+
+
+# The seconds a page costs per pixel of its estimate, when a run has a
+# recorded page to compare with but no recorded page with an estimate to
+# scale by: a 300dpi letter page takes about a second.
+SECONDS_PER_PIXEL = 1 / (2550 * 3300)
+
+
+def file_size(file_path):
+    """
+    The size of the input ``file_path``: the pixels of a TIFF page, read
+    from its header, or the bytes of any other file. Missing files are
+    estimated at zero.
+    """
+    try:
+        header = tiff.read_header(file_path)
+        return header.width * header.height
+    except (OSError, tiff.TIFFError):
+        pass
+
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def estimate(action):
+    """
+    Estimate the work of a page action from the size of its source page. An
+    action that renders several pages, such as a pdf shard, is estimated by
+    its source times its number of pages.
+    """
+    source_file = getattr(action, 'source_file', None) or getattr(action, 'source_pdf', None)
+    if source_file is None:
+        return 0
+
+    pages = getattr(action, 'pages', None)
+    return file_size(source_file) * (len(pages) if pages is not None else 1)
+
+
+def pages_of(action):
+    """
+    The page actions of ``action``: the pages of a batch, or the action
+    itself.
+    """
+    return list(action.actions) if hasattr(action, 'actions') else [action]
+
+
+class CostModel:
+    """
+    The ``CostModel`` class estimates how long each action of a run will
+    take, so that the scheduler can start the longest ones first and the
+    run does not end waiting on one large foldout page. Actions are
+    estimated from the size of their source pages. Pages that an earlier run
+    recorded in the telemetry ``records`` are estimated at the seconds they
+    took then, and the other pages of the same kind of action are scaled to
+    seconds by the ratio of the recorded seconds to their estimates. Kinds
+    of action with no recorded pages are scaled by that ratio over every
+    recorded page, so that all the costs of a run are in seconds.
+    """
+    def __init__(self, records=()):
+        self.history = {}
+        for entry in records:
+            if entry.get('succeeded') and not entry.get('retried'):
+                self.history[(entry['action'], entry['page'])] = entry['seconds']
+
+    def recorded(self, page):
+        return self.history.get((type(page).__name__, trace.page_name(page)))
+
+    def costs(self, actions):
+        """
+        The estimated cost of every action in ``actions``, in order.
+        """
+        estimates = {}
+        totals = {}
+        timed = False
+        for action in actions:
+            for page in pages_of(action):
+                estimates[id(page)] = estimate(page)
+                seconds = self.recorded(page) if self.history else None
+                timed = timed or seconds is not None
+                if seconds is not None and estimates[id(page)]:
+                    recorded, estimated = totals.get(type(page), (0.0, 0))
+                    totals[type(page)] = (recorded + seconds, estimated + estimates[id(page)])
+
+        scales = {
+            kind: recorded / estimated for kind, (recorded, estimated) in totals.items()
+        }
+        default_scale = 1
+        if totals:
+            default_scale = (
+                sum(recorded for recorded, _ in totals.values()) /
+                sum(estimated for _, estimated in totals.values())
+            )
+        elif timed:
+            default_scale = SECONDS_PER_PIXEL
+
+        def page_cost(page):
+            seconds = self.recorded(page) if self.history else None
+            if seconds is not None:
+                return seconds
+
+            return estimates[id(page)] * scales.get(type(page), default_scale)
+
+        return [sum(page_cost(page) for page in pages_of(action)) for action in actions]
+
+    def order(self, entries):
+        """
+        Sort the scheduler's pending ``entries`` so that the costliest
+        actions come first. Actions of equal cost keep their order.
+        """
+        entries = list(entries)
+        costs = self.costs([entry[0] for entry in entries])
+        ranked = sorted(range(len(entries)), key=lambda index: -costs[index])
+
+        return [entries[index] for index in ranked]
+
+    def __repr__(self):
+        return f'CostModel({len(self.history)} pages recorded)'
+
+
+# The cost model of the run, replaced from the command line with one that
+# knows the telemetry of earlier runs.
+_model = CostModel()
+
+
+def set_model(model):
+    global _model
+    _model = model
+
+
+def current_model():
+    return _model
+
+
+def make(records=()):
+    """
+    The ``make`` factory method constructs a ``CostModel`` from the records
+    of a telemetry file.
+    """
+    return CostModel(records)
@@ -2,7 +2,12 @@ import bookworm.unpack_pdf        as unpack_pdf
 import bookworm.expand_page       as expand_page
 import bookworm.change_resolution as change_resolution
 import bookworm.resample_page     as resample_page
-import subprocess
+import bookworm.normalize_page    as normalize_page
+import bookworm.process_pdf       as process_pdf
+import bookworm.pack_pdf          as pack_pdf
+import bookworm.telemetry         as telemetry
+import bookworm.scheduler         as scheduler
+import bookworm.manifest          as manifest
 import os
 
 
@@ -11,6 +16,10 @@ ALLOWED_COMMANDS = {
     'change-resolution': change_resolution,
     'expand-page': expand_page,
     'resample-page': resample_page,
+    'normalize-page': normalize_page,
+    'process-pdf': process_pdf,
+    'pack-pdf': pack_pdf,
+    'stats': telemetry,
 }
 
 
@@ -41,18 +50,24 @@ def process_command(command_dict):
     except:
         raise ValueError(f'Invalid arguments. Got: {arg_dict}')
 
+    if arg_dict.get('resume'):
+        # Only the pages that an earlier journaled run did not finish need
+        # to run.
+        action = manifest.resumable_actions(action)
+    elif arg_dict.get('incremental'):
+        # Only the pages whose outputs are stale or missing need to run.
+        action = manifest.stale_actions(action)
+
     return (action, module.Runner)
 
 
-def run_command(actions):
+def run_command(actions, jobs=1, observers=(), retry=None, budget=None, model=None):
     """
-    Run a pdf or page action catching for runtime errors.
+    Run a pdf or page action catching for runtime errors. With more than one
+    job, the page actions run concurrently in a pool of ``jobs`` workers. The
+    results and failures from every page are collected into one ``Report``.
+    Pages that run out of time are retried as the ``retry`` policy allows,
+    and pages only start while their memory fits in the ``budget``. The
+    costliest pages under the cost ``model`` start first.
     """
-    for action, runner in actions:
-        try:
-            runner.setup(action)
-            runner.execute(action)
-        except subprocess.CalledProcessError as e:
-            runner.cleanup(action)
-            raise e
-
+    return scheduler.run_command(actions, jobs, observers, retry, budget, model)
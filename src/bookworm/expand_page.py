@@ -1,8 +1,10 @@
 import bookworm.abstract as abstract
 import bookworm.util     as util
+import bookworm.tiff     as tiff
+import bookworm.color_mode as color_mode
+import bookworm.process    as process
 import os.path
 import os
-import subprocess
 
 
 class ExpandPageWithFill(abstract.Command):
@@ -24,6 +26,7 @@ class ExpandPageWithFill(abstract.Command):
         self.target_path = os.path.split(target_file)[0]
         self.width = width
         self.height = height
+        self.depth_operations = color_mode.depth_operations(source_file)
 
     def as_subprocess(self):
         quoted_source = f'{self.source_file}'
@@ -38,16 +41,40 @@ class ExpandPageWithFill(abstract.Command):
             self.background,
             self.gravity_flag,
             self.gravity,
+            *self.depth_operations,
             quoted_source,
             final_arg
         ]
 
+    def operations(self):
+        """
+        The ImageMagick options that carry out this action, without the
+        program name or the input and output files. Gray and bilevel pages
+        keep their bit depth.
+        """
+        return self.transform_operations() + self.depth_operations
+
+    def transform_operations(self):
+        """
+        The ImageMagick options that expand the page. The background and
+        gravity settings come first since they must be in effect before the
+        extent is applied.
+        """
+        return [
+            self.background_flag,
+            self.background,
+            self.gravity_flag,
+            self.gravity,
+            self.extent_flag,
+            self.extent
+        ]
+
     def as_terminal_command(self):
         quoted_source = util.quoted_string(f'./{self.source_file}')
         quoted_target = util.quoted_string(f'./{self.target_file}')
         final_arg = f'{quoted_target}[{self.width}x{self.height}]'
         
-        return '{} {} {} {} {} {} {} {} {}'.format(
+        return '{} {} {} {} {} {} {} {}{} {}'.format(
             self.command,
             self.extent_flag,
             self.extent,
@@ -55,6 +82,7 @@ class ExpandPageWithFill(abstract.Command):
             self.background,
             self.gravity_flag,
             self.gravity,
+            ''.join(f'{arg} ' for arg in self.depth_operations),
             quoted_source,
             final_arg
         )
@@ -67,15 +95,14 @@ class Runner(abstract.Runner):
         Prepare an action for execution by setting up folders and I/O.
         """
         if os.path.isfile(command.source_file):
-            if not os.path.isdir(command.target_path):
-                os.mkdir(command.target_path)
+            util.make_directory(command.target_path)
         else:
             raise FileNotFoundError(
                 f'File does not exist: {command.source_file}'
             )
 
     def execute(command):
-        subprocess.run(command.as_subprocess())
+        process.run(command.as_subprocess())
 
     def cleanup(command):
         return
@@ -103,13 +130,39 @@ def multi_expand_page(width, height, source_path, source_files, target):
     actions = {}
     for source_file in source_files:
         action = make(
-            width, height, os.path.join(source_path, source_file), target
+            width,
+            height,
+            os.path.join(source_path, source_file),
+            util.target_file_in(target, source_file)
         )
         actions[source_file] = action
 
     return actions
 
 
+def auto_dimensions(input, jobs=None):
+    """
+    Find the smallest dimensions that contain every page in ``input``, which
+    is either a page or a directory of pages. Only the TIFF headers of the
+    pages are read, ``jobs`` of them at a time.
+    """
+    if os.path.isdir(input):
+        files_dict = {'path': input, 'files': os.listdir(input)}
+        tiff_files_dict = util.with_extension('.tiff', files_dict)
+        source_files = [
+            os.path.join(input, source_file)
+            for source_file in tiff_files_dict['files']
+        ]
+    elif os.path.isfile(input):
+        source_files = [input]
+    else:
+        raise FileNotFoundError(f'File or directory does not exist: {input}')
+
+    headers = tiff.read_headers(source_files, jobs)
+
+    return tiff.max_dimensions(list(headers.values()))
+
+
 def process_args(arg_dict):
     """
     The ``process_args`` factory method parses the command line arguments in
@@ -121,6 +174,9 @@ def process_args(arg_dict):
     except KeyError as e:
         raise e
 
+    if dimensions == 'auto':
+        dimensions = auto_dimensions(input, arg_dict.get('jobs'))
+
     try: 
         width  = dimensions[0]
         height = dimensions[1]
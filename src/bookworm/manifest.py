@@ -0,0 +1,496 @@
+import bookworm.abstract    as abstract
+import bookworm.util        as util
+import bookworm.unpack_pdf  as unpack_pdf
+import bookworm.passthrough as passthrough
+import bookworm.pdf         as pdf
+import bookworm.scheduler   as scheduler
+import hashlib
+import json
+import os
+import os.path
+import re
+import shutil
+import threading
+
+
+MANIFEST_FILE = '.bookworm_manifest.jsonl'
+
+UNPACK_PDF_IGNORED_ARGS = (
+    '-sOutputFile=', '-dFirstPage=', '-dLastPage=', '-dNumRenderingThreads=',
+    '-dBufferSpace=', '-dMaxBitmap=', '-dBandHeight='
+)
+
+
+def file_hash(file_path):
+    """
+    The SHA-256 digest of a file's contents as a hexadecimal string.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class PageSource:
+    """
+    Page ``page`` of ``source_pdf``, the source of an unpacked page. It is
+    hashed by what draws the page rather than by the whole pdf, so that
+    changing other pages or the metadata of the pdf, or appending an update
+    to it, does not make the page stale.
+    """
+    def __init__(self, source_pdf, page):
+        self.source_pdf = source_pdf
+        self.page = page
+
+    def __eq__(self, other):
+        return (isinstance(other, PageSource) and
+                (self.source_pdf, self.page) == (other.source_pdf, other.page))
+
+    def __hash__(self):
+        return hash((self.source_pdf, self.page))
+
+    def __repr__(self):
+        return f'PageSource({self.source_pdf!r}, {self.page})'
+
+
+# The page digests of the pdf files read by a run, by path, size and
+# modification time, so that journaling page after page reads each pdf once.
+_page_digests = {}
+_page_digests_lock = threading.Lock()
+
+
+def page_digests(source_pdf):
+    """
+    The digest of every page of a pdf in order, or ``None`` for a pdf that
+    bookworm cannot read.
+    """
+    status = os.stat(source_pdf)
+    path = os.path.abspath(source_pdf)
+    key = (path, status.st_size, status.st_mtime_ns)
+    with _page_digests_lock:
+        if key in _page_digests:
+            return _page_digests[key]
+
+    try:
+        with pdf.Document(source_pdf) as document:
+            digests = [document.page_digest(page) for page in document.pages()]
+    except passthrough.READ_ERRORS:
+        digests = None
+
+    with _page_digests_lock:
+        for old_key in [old_key for old_key in _page_digests if old_key[0] == path]:
+            del _page_digests[old_key]
+        _page_digests[key] = digests
+
+    return digests
+
+
+def source_file(source):
+    """
+    The file that ``source``, a file name or a ``PageSource``, is read from.
+    """
+    return source.source_pdf if isinstance(source, PageSource) else source
+
+
+def source_hash(source):
+    """
+    The hash of the source of a page: the digest of a pdf page, or the
+    SHA-256 digest of any other file. The pages of a pdf that bookworm cannot
+    read are hashed by the whole file.
+    """
+    if isinstance(source, PageSource):
+        digests = page_digests(source.source_pdf)
+        if digests is not None and 1 <= source.page <= len(digests):
+            return digests[source.page - 1]
+
+    return file_hash(source_file(source))
+
+
+def parameters(action):
+    """
+    The parameters that determine an action's output, independent of which
+    files it reads and writes. Page ranges are left out of the parameters of
+    an unpacked page, so that a page rendered alone matches the same page
+    rendered with the rest of the pdf, and so are the Ghostscript options
+    that only affect rendering speed.
+    """
+    name = type(action).__name__
+    if hasattr(action, 'operations'):
+        return [name] + action.operations()
+
+    if isinstance(action, unpack_pdf.ExtractImages):
+        return ['ExtractImages']
+
+    if isinstance(action, unpack_pdf.UnpackPDF):
+        return ['UnpackPDF'] + [
+            arg for arg in action.args
+            if not arg.startswith(UNPACK_PDF_IGNORED_ARGS)
+        ]
+
+    if hasattr(action, 'page_action') and hasattr(action, 'unpack'):
+        page_action = action.page_action(action.unpack.page_file(1))
+        return [name] + parameters(action.unpack)[1:] + parameters(page_action)
+
+    raise TypeError(f'Cannot track the outputs of: {action!r}')
+
+
+def outputs(action):
+    """
+    The ``(target_file, source)`` pairs of the files an action writes. The
+    source of a page unpacked from a pdf is a ``PageSource``.
+    """
+    if isinstance(action, (unpack_pdf.UnpackPDFShard, unpack_pdf.ExtractImages)):
+        return [
+            (action.page_file(page), PageSource(action.source_pdf, page))
+            for page in action.pages
+        ]
+
+    if isinstance(action, unpack_pdf.UnpackPDF):
+        if not os.path.isdir(action.target_dir):
+            return []
+        pairs = []
+        for file in sorted(os.listdir(action.target_dir)):
+            match = re.fullmatch(r'_Page_(\d+)\.tiff', file)
+            if match:
+                pairs.append((
+                    os.path.join(action.target_dir, file),
+                    PageSource(action.source_pdf, int(match.group(1)))
+                ))
+        return pairs
+
+    if hasattr(action, 'page_action') and hasattr(action, 'unpack'):
+        return [
+            (util.target_file_in(action.page_dir, page_file), source)
+            for page_file, source in outputs(action.unpack)
+        ]
+
+    return [(action.target_file, action.source_file)]
+
+
+class Manifest:
+    """
+    The ``Manifest`` class records, for every page written to a directory,
+    the hash of the file or pdf page it was made from, the parameters used, and the hash
+    of the page itself. It is stored in the directory as a JSON lines journal
+    that is only ever appended to, so recording a page is cheap and safe from
+    several workers. Later records replace earlier ones for the same page.
+    A ``durable`` manifest forces every record to disk before going on, so
+    that the pages it lists survive a crash.
+    """
+    def __init__(self, directory, durable=False):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.entries = {}
+        self.durable = durable
+        self.lock = threading.Lock()
+
+        if os.path.isfile(self.path):
+            with open(self.path) as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash is ignored.
+                        continue
+                    self.entries[entry['target']] = entry
+
+    def is_current(self, target_file, source, params, hashes=None):
+        """
+        Determine whether ``target_file`` is up to date: it exists, it is
+        unchanged since it was recorded, and it was made from the current
+        contents of ``source`` with the same parameters. ``hashes`` caches
+        the hashes of files and pdf pages between calls.
+        """
+        if hashes is None:
+            hashes = {}
+
+        entry = self.entries.get(os.path.basename(target_file))
+        if entry is None or entry['parameters'] != params:
+            return False
+
+        if not (os.path.isfile(target_file) and os.path.isfile(source_file(source))):
+            return False
+
+        if source not in hashes:
+            hashes[source] = source_hash(source)
+        if target_file not in hashes:
+            hashes[target_file] = file_hash(target_file)
+
+        return (entry['source_hash'] == hashes[source] and
+                entry['target_hash'] == hashes[target_file])
+
+    def record(self, target_file, source, params):
+        """
+        Record that ``target_file`` was made from ``source``, a file or a
+        ``PageSource``. The source is hashed after the fact, so a page that
+        is its own target is current until it changes again.
+        """
+        entry = dict(
+            target = os.path.basename(target_file),
+            source_hash = source_hash(source),
+            parameters = params,
+            target_hash = file_hash(target_file)
+        )
+        line = json.dumps(entry) + '\n'
+
+        with self.lock:
+            util.make_directory(self.directory)
+            with open(self.path, 'a') as handle:
+                handle.write(line)
+                if self.durable:
+                    handle.flush()
+                    os.fsync(handle.fileno())
+            self.entries[entry['target']] = entry
+
+
+class Manifests:
+    """
+    The manifests of every directory touched by a run, loaded on demand.
+    """
+    def __init__(self, durable=False):
+        self.manifests = {}
+        self.durable = durable
+        self.lock = threading.Lock()
+
+    def for_file(self, target_file):
+        directory = os.path.dirname(os.path.abspath(target_file))
+        with self.lock:
+            if directory not in self.manifests:
+                self.manifests[directory] = Manifest(directory, self.durable)
+            return self.manifests[directory]
+
+    def is_current(self, action, hashes=None):
+        """
+        Determine whether every output of an action is up to date.
+        """
+        params = parameters(action)
+        pairs = outputs(action)
+        if not pairs:
+            return False
+
+        return all(
+            self.for_file(target_file).is_current(
+                target_file, source, params, hashes
+            )
+            for target_file, source in pairs
+        )
+
+
+class Recorder(abstract.Observer):
+    """
+    An ``Observer`` that records the outputs of every successful action in
+    the manifests of their directories.
+    """
+    def __init__(self, manifests=None):
+        self.manifests = manifests if manifests is not None else Manifests()
+
+    def finished(self, result):
+        if not result.succeeded:
+            return
+
+        # A journal has already recorded these pages one at a time.
+        if isinstance(result.runner, Journal) and result.runner.records(result.action):
+            return
+
+        params = parameters(result.action)
+        for target_file, source in outputs(result.action):
+            if os.path.isfile(target_file):
+                self.manifests.for_file(target_file).record(
+                    target_file, source, params
+                )
+
+
+def _shards(action, pages):
+    """
+    The ``UnpackPDFShard`` actions that render ``pages`` of an unpack action,
+    one per run of consecutive pages.
+    """
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+
+    return {
+        f'{first_page:04d}-{last_page:04d}': unpack_pdf.UnpackPDFShard(
+            action.source_pdf, action.target_dir, first_page, last_page,
+            action.resolution, action.settings, action.device,
+            action.dimensions
+        )
+        for first_page, last_page in ranges
+    }
+
+
+def _unfinished_pages(action, pages, manifests, hashes):
+    """
+    The pages of an unpack action that are stale or missing.
+    """
+    params = parameters(action)
+    return [
+        page for page in pages
+        if not manifests.for_file(action.page_file(page)).is_current(
+            action.page_file(page), PageSource(action.source_pdf, page), params, hashes
+        )
+    ]
+
+
+def _stale_unpack_pdf(action, manifests, hashes):
+    """
+    Split an unpack action into shards covering only the pages that are
+    stale or missing. On the first run every page is unpacked as usual.
+    """
+    if not os.path.isfile(manifests.for_file(action.page_file(1)).path):
+        return action
+
+    pages = range(1, unpack_pdf.page_count(action.source_pdf) + 1)
+    return _shards(action, _unfinished_pages(action, pages, manifests, hashes))
+
+
+def stale_actions(action, manifests=None):
+    """
+    Reduce a pdf or page action to the part of it whose outputs are stale or
+    missing. A multiple page action keeps only its stale pages. An action
+    whose outputs are all up to date becomes an empty multiple page action.
+    """
+    if manifests is None:
+        manifests = Manifests()
+    hashes = {}
+
+    if isinstance(action, dict):
+        return {
+            page: page_action for page, page_action in action.items()
+            if not manifests.is_current(page_action, hashes)
+        }
+
+    if (isinstance(action, unpack_pdf.UnpackPDF) and
+            not isinstance(action, unpack_pdf.UnpackPDFShard)):
+        return _stale_unpack_pdf(action, manifests, hashes)
+
+    if manifests.is_current(action, hashes):
+        return {}
+
+    return action
+
+
+class Journal(abstract.Runner):
+    """
+    A ``Runner`` that journals every unpacked page in the manifest of its
+    directory as soon as Ghostscript has finished it, instead of once the
+    whole page range is done, so that a run that is killed can be resumed
+    from the last finished page. A failed page range keeps the pages it has
+    finished. Other actions are run by ``runner`` and recorded by the
+    ``Recorder``.
+    """
+    def __init__(self, runner, manifests):
+        self.runner = runner
+        self.manifests = manifests
+
+    def records(self, action):
+        return isinstance(action, unpack_pdf.UnpackPDFShard)
+
+    def setup(self, command):
+        if self.records(command):
+            # Pages left in the shard directory by an earlier run that was
+            # killed may be incomplete.
+            shutil.rmtree(command.shard_dir, ignore_errors=True)
+
+        self.runner.setup(command)
+
+    def execute(self, command):
+        if not self.records(command):
+            return self.runner.execute(command)
+
+        params = parameters(command)
+        report_page = scheduler.page_reporter()
+        pages = {command.page_file(page): page for page in command.pages}
+
+        def on_page(page_file):
+            self.manifests.for_file(page_file).record(
+                page_file, PageSource(command.source_pdf, pages[page_file]), params
+            )
+            report_page()
+
+        unpack_pdf.ShardRunner.stream(command, on_page)
+
+    def cleanup(self, command):
+        if not self.records(command):
+            return self.runner.cleanup(command)
+
+        shutil.rmtree(command.shard_dir, ignore_errors=True)
+
+    def __repr__(self):
+        return f'Journal({self.runner!r})'
+
+
+def _remove_partial_files(target_dir):
+    """
+    Remove the shard directories and partly written pages that a killed
+    unpack leaves behind in ``target_dir``.
+    """
+    if not os.path.isdir(target_dir):
+        return
+
+    for file in os.listdir(target_dir):
+        file_path = os.path.join(target_dir, file)
+        if file.startswith('.shard_') and os.path.isdir(file_path):
+            shutil.rmtree(file_path, ignore_errors=True)
+        elif file.endswith('.part') and os.path.isfile(file_path):
+            os.remove(file_path)
+
+
+def _resume_unpack_pdf(action, manifests, hashes):
+    """
+    Reduce an unpack action to the pages that are not in the journal, as
+    shards, or as an extraction of fewer pages.
+    """
+    if isinstance(action, (unpack_pdf.UnpackPDFShard, unpack_pdf.ExtractImages)):
+        pages = action.pages
+    else:
+        pages = range(1, unpack_pdf.page_count(action.source_pdf) + 1)
+
+    unfinished = _unfinished_pages(action, pages, manifests, hashes)
+    if not unfinished:
+        return {}
+
+    if isinstance(action, unpack_pdf.ExtractImages):
+        return {
+            f'{unfinished[0]:04d}-{unfinished[-1]:04d}': unpack_pdf.ExtractImages(
+                action.source_pdf, action.target_dir, unfinished
+            )
+        }
+
+    return _shards(action, unfinished)
+
+
+def resumable_actions(action, manifests=None):
+    """
+    Reduce a pdf or page action to the part of it that an earlier journaled
+    run did not finish. Page actions are resumed like ``stale_actions``.
+    Unpack actions are always split into shards, which a ``Journal`` runs
+    page by page, and are resumed from the pages missing from the journal
+    even when the directory already holds pages of the earlier run.
+    """
+    if manifests is None:
+        manifests = Manifests(durable=True)
+    hashes = {}
+
+    unpack_types = (unpack_pdf.UnpackPDF, unpack_pdf.ExtractImages)
+    actions = action if isinstance(action, dict) else {'': action}
+    for page_action in actions.values():
+        if isinstance(page_action, unpack_types):
+            _remove_partial_files(page_action.target_dir)
+
+    resumed = {}
+    for page, page_action in actions.items():
+        if isinstance(page_action, unpack_types):
+            resumed.update(_resume_unpack_pdf(page_action, manifests, hashes))
+        elif not manifests.is_current(page_action, hashes):
+            resumed[page] = page_action
+
+    if not isinstance(action, dict) and list(resumed) == ['']:
+        return action
+
+    return resumed
@@ -0,0 +1,178 @@
+import bookworm.tiff as tiff
+import contextlib
+import os.path
+import threading
+
+
+# ImageMagick keeps every sample of its pixel cache in a 16 bit quantum,
+# whatever depth the file stores it at.
+QUANTUM_BITS = 16
+
+# A conversion holds the page it reads and the page it writes.
+IMAGES_PER_ACTION = 2
+
+# The programs that take ``-limit`` options right after the program name.
+IMAGEMAGICK_PROGRAMS = ('convert', 'mogrify')
+
+
+def page_memory(file_path):
+    """
+    Estimate the peak memory in bytes that ImageMagick needs to convert the
+    TIFF page ``file_path``, from the width, height, channels and depth in
+    its header. Pages whose header cannot be read are estimated at zero.
+    """
+    try:
+        header = tiff.read_header(file_path)
+    except (OSError, tiff.TIFFError):
+        return 0
+
+    channels = max(header.samples_per_pixel, 1)
+    depth = max(max(header.bits_per_sample, default=1), QUANTUM_BITS)
+
+    return header.width * header.height * channels * depth // 8 * IMAGES_PER_ACTION
+
+
+def action_memory(action):
+    """
+    Estimate the peak memory of an action's ImageMagick process. A batch
+    converts its pages one at a time, so it needs as much as its largest
+    page. Actions that do not run ImageMagick, such as rendering with
+    Ghostscript, are estimated at zero.
+    """
+    if hasattr(action, 'actions'):
+        return max((action_memory(page) for page in action.actions), default=0)
+
+    if getattr(action, 'command', None) in IMAGEMAGICK_PROGRAMS:
+        return page_memory(action.source_file)
+
+    return 0
+
+
+class Budget:
+    """
+    The ``Budget`` class admits ImageMagick processes only while their
+    estimated memory fits in ``limit`` bytes together, or without bounds
+    when ``limit`` is ``None``. An action that needs more than the whole
+    budget is admitted alone, and is limited to the budget, so that
+    ImageMagick spills its pixel cache to disk instead of exhausting memory.
+    """
+    def __init__(self, limit=None):
+        if limit is not None and limit <= 0:
+            raise ValueError(f'Memory limit must be positive. Got: {limit}')
+
+        self.limit = limit
+        self.in_use = 0
+        self.condition = threading.Condition()
+
+    def estimate(self, action):
+        """
+        The memory reserved for an action, which is zero for an unbounded
+        budget so that no headers are read.
+        """
+        if self.limit is None:
+            return 0
+
+        return min(action_memory(action), self.limit)
+
+    def fits(self, amount):
+        return self.limit is None or self.in_use == 0 or self.in_use + amount <= self.limit
+
+    def try_acquire(self, amount):
+        """
+        Reserve ``amount`` bytes if they fit, and return whether they did.
+        """
+        with self.condition:
+            if not self.fits(amount):
+                return False
+            self.in_use += amount
+            return True
+
+    def acquire(self, amount):
+        """
+        Reserve ``amount`` bytes, waiting until they fit.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.fits(amount))
+            self.in_use += amount
+
+    def release(self, amount):
+        with self.condition:
+            self.in_use -= amount
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def reserved(self, action):
+        """
+        Run the body once the memory of ``action`` fits, with its
+        ImageMagick processes limited to that memory.
+        """
+        amount = self.estimate(action)
+        self.acquire(amount)
+        try:
+            with limited(amount or None):
+                yield amount
+        finally:
+            self.release(amount)
+
+    def __repr__(self):
+        return f'Budget({self.limit})'
+
+
+_budget = Budget()
+_local = threading.local()
+
+
+def set_budget(budget):
+    """
+    Set the ``Budget`` that ImageMagick processes are admitted under by
+    default. It is shared by every worker pool of a run.
+    """
+    global _budget
+    _budget = budget
+
+
+def current_budget():
+    return _budget
+
+
+@contextlib.contextmanager
+def limited(amount):
+    """
+    Limit the ImageMagick processes that the current thread starts to
+    ``amount`` bytes of memory, or lift the limit when it is ``None``.
+    """
+    previous = current_limit()
+    _local.limit = amount
+    try:
+        yield
+    finally:
+        _local.limit = previous
+
+
+def current_limit():
+    return getattr(_local, 'limit', None)
+
+
+def limit_options(amount):
+    """
+    The ImageMagick options that keep its pixel cache within ``amount``
+    bytes of memory and of memory mapped files.
+    """
+    return [
+        '-limit', 'memory', str(amount),
+        '-limit', 'map', str(amount),
+        '-limit', 'area', str(amount)
+    ]
+
+
+def with_limits(args):
+    """
+    Add the current thread's memory limit to the arguments of an ImageMagick
+    program. Other programs are returned as they are.
+    """
+    amount = current_limit()
+    if (amount is None or not isinstance(args, (list, tuple)) or not args or
+            os.path.basename(args[0]) not in IMAGEMAGICK_PROGRAMS):
+        return args
+
+    return [args[0]] + limit_options(amount) + list(args[1:])
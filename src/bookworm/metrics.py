@@ -0,0 +1,283 @@
+import bookworm.abstract  as abstract
+import bookworm.scheduler as scheduler
+import bookworm.telemetry as telemetry
+import bookworm.util      as util
+import os
+import os.path
+import subprocess
+import tempfile
+import threading
+import time
+
+
+# The upper bounds in seconds of the buckets of the latency histograms,
+# from a quick ``change-resolution`` of one page to a whole pdf.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# How often the metrics file is rewritten while a run goes on. The textfile
+# collector of node_exporter reads it whenever Prometheus scrapes.
+INTERVAL = 15.0
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    The ``Histogram`` class counts observations into cumulative buckets
+    with the upper bounds ``buckets``, as Prometheus histograms do.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def child_program(error):
+    """
+    The name of the external program that made an action fail, or ``None``
+    when the action failed in bookworm itself.
+    """
+    if not isinstance(error, subprocess.SubprocessError):
+        return None
+
+    cmd = getattr(error, 'cmd', None)
+    if isinstance(cmd, (list, tuple)) and cmd:
+        cmd = cmd[0]
+
+    return os.path.basename(str(cmd)) if cmd else None
+
+
+def find_cache(runner):
+    """
+    The ``Cache`` of ``runner`` or of a runner it wraps, if any.
+    """
+    while runner is not None:
+        if hasattr(runner, 'cache'):
+            return runner.cache
+        runner = getattr(runner, 'runner', None)
+
+    return None
+
+
+class Metrics(abstract.Observer):
+    """
+    An ``Observer`` that keeps Prometheus counters, gauges and histograms of
+    a run and writes them in the text exposition format to ``path``, for the
+    textfile collector of node_exporter. The file is replaced atomically
+    every ``interval`` seconds while the run goes on and once more when it
+    closes, so the collector never reads half of it. Every sample is
+    labelled with the bookworm ``command`` of the run. The pages of an action
+    that writes several are counted as they finish.
+    """
+    def __init__(self, path, command='', interval=INTERVAL):
+        self.path = path
+        self.command = command
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.running = {}
+        self.scheduled_pages = 0
+        self.pages = {}
+        self.reported = {}
+        self.latency = {}
+        self.bytes_written = 0
+        self.child_failures = {}
+        self.retries = 0
+        self.caches = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def scheduled(self, count):
+        with self.lock:
+            self.scheduled_pages += count
+
+        if self.thread is None and self.interval:
+            self.thread = threading.Thread(
+                target=self._report, name='metrics', daemon=True
+            )
+            self.thread.start()
+
+    def started(self, action):
+        with self.lock:
+            self.running[id(action)] = time.monotonic()
+
+    def _finish(self, result):
+        """
+        Count how long an attempt at an action took and why it failed,
+        returning its stage, the type of the action.
+        """
+        cache = find_cache(result.runner)
+        program = child_program(result.error)
+        stage = type(result.action).__name__
+        now = time.monotonic()
+
+        with self.lock:
+            start = self.running.pop(id(result.action), now)
+            self.latency.setdefault(stage, Histogram()).observe(now - start)
+            if cache is not None and all(cache is not other for other in self.caches):
+                self.caches.append(cache)
+            if program is not None:
+                key = (stage, program)
+                self.child_failures[key] = self.child_failures.get(key, 0) + 1
+
+        return stage
+
+    def progressed(self, action, pages):
+        key = (type(action).__name__, 'succeeded')
+        with self.lock:
+            self.reported[id(action)] = self.reported.get(id(action), 0) + pages
+            self.pages[key] = self.pages.get(key, 0) + pages
+
+    def finished(self, result):
+        stage = self._finish(result)
+        status = 'succeeded' if result.succeeded else 'failed'
+        total = scheduler.page_total(result.action)
+        written = 0
+        if result.succeeded:
+            written = telemetry.total_size(telemetry.output_files(result.action))
+
+        with self.lock:
+            pages = max(0, total - self.reported.pop(id(result.action), 0))
+            self.pages[(stage, status)] = self.pages.get((stage, status), 0) + pages
+            self.bytes_written += written
+
+    def retrying(self, result, delay):
+        self._finish(result)
+        with self.lock:
+            self.reported.pop(id(result.action), None)
+            self.retries += 1
+
+    def closed(self, report):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        self.write()
+
+    def samples(self):
+        """
+        The metrics as ``(name, type, help, [(labels, value)])`` families.
+        """
+        command = ('command', self.command)
+        with self.lock:
+            hits = sum(cache.hits for cache in self.caches)
+            misses = sum(cache.misses for cache in self.caches)
+            histograms = []
+            for stage, histogram in sorted(self.latency.items()):
+                labels = [command, ('stage', stage)]
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    histograms.append(('_bucket', labels + [('le', format_value(bound))], count))
+                histograms.append(('_sum', labels, histogram.sum))
+                histograms.append(('_count', labels, histogram.count))
+
+            return [
+                ('bookworm_pages_total', 'counter', 'Pages processed, by action and outcome.', [
+                    ([command, ('stage', stage), ('status', status)], count)
+                    for (stage, status), count in sorted(self.pages.items())
+                ]),
+                ('bookworm_pages_scheduled', 'gauge', 'Pages the run was asked to process.', [
+                    ([command], self.scheduled_pages)
+                ]),
+                ('bookworm_stage_duration_seconds', 'histogram',
+                 'Time from the start to the end of each attempt at an action.', histograms),
+                ('bookworm_in_flight_actions', 'gauge', 'Actions running right now.', [
+                    ([command], len(self.running))
+                ]),
+                ('bookworm_retries_total', 'counter', 'Attempts that ran out of time and were retried.', [
+                    ([command], self.retries)
+                ]),
+                ('bookworm_child_failures_total', 'counter',
+                 'Attempts that failed because an external program failed or ran out of time.', [
+                    ([command, ('stage', stage), ('program', program)], count)
+                    for (stage, program), count in sorted(self.child_failures.items())
+                ]),
+                ('bookworm_bytes_written_total', 'counter', 'Bytes of the files written by successful actions.', [
+                    ([command], self.bytes_written)
+                ]),
+                ('bookworm_cache_hits_total', 'counter', 'Pages copied from the result cache.', [
+                    ([command], hits)
+                ]),
+                ('bookworm_cache_misses_total', 'counter', 'Pages looked up in the result cache and not found.', [
+                    ([command], misses)
+                ]),
+                ('bookworm_cache_hit_ratio', 'gauge', 'Hits out of all result cache lookups.', [
+                    ([command], hits / (hits + misses) if hits + misses else 0.0)
+                ]),
+                ('bookworm_run_start_time_seconds', 'gauge', 'Unix time the run started.', [
+                    ([command], self.start_time)
+                ]),
+            ]
+
+    def exposition(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, kind, help, samples in self.samples():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample in samples:
+                if kind == 'histogram':
+                    suffix, labels, value = sample
+                else:
+                    (labels, value), suffix = sample, ''
+                lines.append(f'{name}{suffix}{format_labels(labels)} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """
+        Replace the metrics file with the current metrics. The new contents
+        are written to a temporary file in the same directory and renamed
+        over the old file.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        util.make_directory(directory)
+        # The collector only reads files ending in .prom, so it skips the
+        # temporary file.
+        handle, temp_file = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'w') as file:
+                file.write(self.exposition())
+            os.chmod(temp_file, 0o644)
+            os.replace(temp_file, self.path)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+
+    def _report(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                # The next write, or the one when the run closes, tries again.
+                continue
+
+    def __repr__(self):
+        return f'Metrics({self.path!r}, {self.command!r})'
@@ -0,0 +1,185 @@
+import bookworm.abstract          as abstract
+import bookworm.util              as util
+import bookworm.color_mode        as color_mode
+import bookworm.change_resolution as change_resolution
+import bookworm.resample_page     as resample_page
+import bookworm.expand_page       as expand_page
+import bookworm.process           as process
+import os
+import os.path
+
+from bookworm.resolution import Resolution
+
+
+class NormalizePage(abstract.Command):
+    """
+    Apply several page actions to a page with a single ``convert`` process.
+    The page is decoded once, every action's operations are applied in
+    order, and the result is encoded once. Gray and bilevel pages keep their
+    bit depth.
+    """
+    def __init__(self, source_file, target_file, steps):
+        self.command = 'convert'
+        self.source_file = source_file
+        self.target_file = target_file
+        self.target_path = os.path.split(target_file)[0]
+        self.steps = steps
+        self.depth_operations = color_mode.depth_operations(source_file)
+
+    def operations(self):
+        operations = []
+        for step in self.steps:
+            operations += step.transform_operations()
+
+        return operations + self.depth_operations
+
+    def as_subprocess(self):
+        quoted_source = f'./{self.source_file}'
+        quoted_target = f'./{self.target_file}'
+
+        return [self.command, quoted_source] + self.operations() + [quoted_target]
+
+    def as_terminal_command(self):
+        quoted_source = util.quoted_string(f'./{self.source_file}')
+        quoted_target = util.quoted_string(f'./{self.target_file}')
+
+        return '{} {} {} {}'.format(
+            self.command,
+            quoted_source,
+            ' '.join(self.operations()),
+            quoted_target
+        )
+
+
+class Runner(abstract.Runner):
+
+    def setup(command):
+        """
+        Prepare an action for execution by setting up folders and I/O.
+        """
+        if os.path.isfile(command.source_file):
+            util.make_directory(command.target_path)
+        else:
+            raise FileNotFoundError(
+                f'File does not exist: {command.source_file}'
+            )
+
+    def execute(command):
+        process.run(command.as_subprocess())
+
+    def cleanup(command):
+        return
+
+
+def make(source_file, target_file='', resolution=None, resample=None, dimensions=None):
+    """
+    The ``make`` factory method constructs a ``NormalizePage`` action. The
+    page's resolution is changed to ``resolution`` first, then the page is
+    resampled at ``resample``, and finally it is expanded to ``dimensions``.
+    Any of the three steps may be omitted, but not all of them.
+    """
+    if not target_file:
+        target_file = util.temp_file_name(source_file)
+
+    steps = []
+    if resolution is not None:
+        steps.append(change_resolution.make(resolution, source_file, target_file))
+
+    if resample is not None:
+        steps.append(resample_page.make(resample, source_file, target_file))
+
+    if dimensions is not None:
+        width, height = dimensions
+        steps.append(expand_page.make(width, height, source_file, target_file))
+
+    if not steps:
+        raise ValueError(
+            'Normalize page needs at least one of a resolution, '
+            'a resampling resolution, or page dimensions.'
+        )
+
+    return NormalizePage(source_file, target_file, steps)
+
+
+def multi_normalize_page(resolution, resample, dimensions, source_path, source_files, target):
+    """
+    Create multiple ``NormalizePage`` actions--one per page--in a single
+    directory.
+    """
+    actions = {}
+    for source_file in source_files:
+        action = make(
+            os.path.join(source_path, source_file),
+            util.target_file_in(target, source_file),
+            resolution,
+            resample,
+            dimensions
+        )
+        actions[source_file] = action
+
+    return actions
+
+
+def process_args(arg_dict):
+    """
+    The ``process_args`` factory method parses the command line arguments in
+    ``arg_dict`` and uses them to construct a ``NormalizePage`` command.
+    """
+    try:
+        input = arg_dict['input']
+    except KeyError as e:
+        raise e
+
+    unit_str = arg_dict.get('units')
+    resolution_val = arg_dict.get('resolution')
+    resample_val = arg_dict.get('resample')
+    dimensions = arg_dict.get('dimensions')
+
+    resolution = None
+    if resolution_val is not None:
+        resolution = Resolution.make(resolution_val, unit_str)
+
+    resample = None
+    if resample_val is not None:
+        resample = Resolution.make(resample_val, unit_str)
+
+    if dimensions == 'auto':
+        dimensions = expand_page.auto_dimensions(input, arg_dict.get('jobs'))
+
+    if dimensions is not None:
+        width, height = dimensions
+        if width <= 0 or height <= 0:
+            raise ValueError(
+                f'Dimensions must be positive integers: Got {width}x{height}'
+            )
+
+    if os.path.isdir(input):
+        try:
+            output = arg_dict['output']
+        except KeyError:
+            # Use input as the target directory.
+            output = input
+
+        files_dict = {'path': input, 'files': os.listdir(input)}
+        tiff_files_dict = util.with_extension('.tiff', files_dict)
+
+        return multi_normalize_page(
+            resolution,
+            resample,
+            dimensions,
+            tiff_files_dict['path'],
+            tiff_files_dict['files'],
+            output
+        )
+
+    elif os.path.isfile(input):
+        try:
+            output = arg_dict['output']
+        except KeyError:
+            # Use input as the target file.
+            output = input
+
+        return make(input, output, resolution, resample, dimensions)
+
+    else:
+        raise FileNotFoundError(f'File or directory does not exist: {input}')
@@ -0,0 +1,428 @@
+import bookworm.abstract as abstract
+import bookworm.pdf      as pdf
+import bookworm.process  as process
+import bookworm.tiff     as tiff
+import bookworm.util     as util
+import os
+import os.path
+import sys
+import tempfile
+import zlib
+
+
+# Image data is copied from the pages into the pdf in chunks of this size.
+CHUNK_SIZE = 1 << 20
+
+# Pages that do not record a resolution are assumed to be at this one.
+DEFAULT_RESOLUTION = 72
+
+COMPRESSION_NONE = 1
+COMPRESSION_CCITT_G4 = 4
+COMPRESSION_LZW = 5
+COMPRESSION_JPEG = 7
+COMPRESSION_DEFLATE = 8
+COMPRESSION_ADOBE_DEFLATE = 32946
+
+# The pdf color space for each TIFF photometric interpretation and number
+# of samples per pixel.
+COLOR_SPACES = {
+    (0, 1): 'DeviceGray',
+    (1, 1): 'DeviceGray',
+    (2, 3): 'DeviceRGB',
+    (5, 4): 'DeviceCMYK',
+    (6, 3): 'DeviceRGB',
+}
+
+
+class PageImage:
+    """
+    The ``PageImage`` class describes how a TIFF page is stored in a pdf as
+    an image XObject: the image dictionary, and the strips of the file that
+    make up the stream data. The data is either copied as it is, after an
+    optional ``prefix``, or compressed with Flate when the page is stored
+    uncompressed.
+    """
+    def __init__(self, source_file, width, height, resolution, dictionary,
+                 strips, prefix=b'', compress=False):
+        self.source_file = source_file
+        self.width = width
+        self.height = height
+        self.resolution = resolution
+        self.dictionary = dictionary
+        self.strips = strips
+        self.prefix = prefix
+        self.compress = compress
+
+    def page_size(self):
+        """
+        The width and height of the page in points.
+        """
+        x_resolution, y_resolution = self.resolution
+        return (self.width * 72 / x_resolution, self.height * 72 / y_resolution)
+
+    def raw_chunks(self):
+        """
+        Read the image strips of the page, one chunk at a time.
+        """
+        if self.prefix:
+            yield self.prefix
+
+        with open(self.source_file, 'rb') as handle:
+            for offset, length in self.strips:
+                handle.seek(offset)
+                while length > 0:
+                    chunk = handle.read(min(length, CHUNK_SIZE))
+                    if not chunk:
+                        raise tiff.TIFFError(f'Truncated image data in: {self.source_file}')
+                    length -= len(chunk)
+                    yield chunk
+
+    def chunks(self):
+        """
+        The stream data of the image, one chunk at a time.
+        """
+        if not self.compress:
+            yield from self.raw_chunks()
+            return
+
+        compressor = zlib.compressobj()
+        for chunk in self.raw_chunks():
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def __repr__(self):
+        return f'PageImage({self.source_file!r}, {self.dictionary.get("Filter")})'
+
+
+def resolution(tags):
+    """
+    The horizontal and vertical resolution of a page in pixels per inch.
+    """
+    unit = tags.get(tiff.TAG_RESOLUTION_UNIT, (2,))[0]
+    values = []
+    for tag in (tiff.TAG_X_RESOLUTION, tiff.TAG_Y_RESOLUTION):
+        rationals = tags.get(tag)
+        if not rationals or rationals[0][1] == 0 or rationals[0][0] == 0 or unit == 1:
+            values.append(DEFAULT_RESOLUTION)
+            continue
+        numerator, denominator = rationals[0]
+        value = numerator / denominator
+        values.append(value * 2.54 if unit == 3 else value)
+
+    return tuple(values)
+
+
+def page_image(source_file):
+    """
+    Describe how the TIFF page ``source_file`` is stored in a pdf without
+    decoding it. Group 4 fax, JPEG, LZW and Deflate data is copied as it is
+    when the page is a single strip, and uncompressed pages are compressed
+    strip by strip. A ``TIFFError`` explains why a page cannot be stored
+    this way.
+    """
+    tags = tiff.read_tags(source_file)
+
+    def value(tag, default=None):
+        return tags.get(tag, (default,))[0]
+
+    try:
+        width = value(tiff.TAG_IMAGE_WIDTH)
+        height = value(tiff.TAG_IMAGE_LENGTH)
+        offsets = tags[tiff.TAG_STRIP_OFFSETS]
+        byte_counts = tags[tiff.TAG_STRIP_BYTE_COUNTS]
+    except KeyError:
+        raise tiff.TIFFError(f'Page is not stored in strips: {source_file}')
+
+    if width is None or height is None or len(offsets) != len(byte_counts):
+        raise tiff.TIFFError(f'Page has no valid image layout: {source_file}')
+
+    samples = value(tiff.TAG_SAMPLES_PER_PIXEL, 1)
+    bits = tags.get(tiff.TAG_BITS_PER_SAMPLE, (1,) * samples)
+    photometric = value(tiff.TAG_PHOTOMETRIC)
+    compression = value(tiff.TAG_COMPRESSION, COMPRESSION_NONE)
+    predictor = value(tiff.TAG_PREDICTOR, 1)
+
+    if tiff.TAG_EXTRA_SAMPLES in tags or len(set(bits)) != 1 or bits[0] not in (1, 8):
+        raise tiff.TIFFError(f'Page has an alpha channel or unusual bit depth: {source_file}')
+    if samples > 1 and value(tiff.TAG_PLANAR_CONFIGURATION, 1) != 1:
+        raise tiff.TIFFError(f'Page stores its color planes separately: {source_file}')
+    if (photometric, samples) not in COLOR_SPACES:
+        raise tiff.TIFFError(f'Page has an unsupported color space: {source_file}')
+    if predictor not in (1, 2):
+        raise tiff.TIFFError(f'Page uses an unsupported predictor: {source_file}')
+
+    dictionary = {
+        'Type': pdf.Name('XObject'),
+        'Subtype': pdf.Name('Image'),
+        'Width': width,
+        'Height': height,
+        'ColorSpace': pdf.Name(COLOR_SPACES[(photometric, samples)]),
+        'BitsPerComponent': bits[0],
+    }
+    if photometric == 0:
+        dictionary['Decode'] = [1, 0]
+
+    strips = list(zip(offsets, byte_counts))
+    page_resolution = resolution(tags)
+    if compression == COMPRESSION_NONE:
+        if photometric == 6:
+            raise tiff.TIFFError(f'Page is stored as uncompressed YCbCr: {source_file}')
+        dictionary['Filter'] = pdf.Name('FlateDecode')
+        return PageImage(source_file, width, height, page_resolution,
+                         dictionary, strips, compress=True)
+
+    if len(strips) != 1:
+        raise tiff.TIFFError(f'Compressed page is stored in several strips: {source_file}')
+
+    if compression == COMPRESSION_CCITT_G4:
+        if (value(tiff.TAG_FILL_ORDER, 1) != 1 or
+                value(tiff.TAG_T6_OPTIONS, 0) & 2 or bits[0] != 1):
+            raise tiff.TIFFError(f'Page uses unsupported fax options: {source_file}')
+        # The fax data is decoded as black runs on white, so the image is
+        # described by BlackIs1 rather than by a Decode array.
+        dictionary.pop('Decode', None)
+        dictionary['Filter'] = pdf.Name('CCITTFaxDecode')
+        dictionary['DecodeParms'] = {
+            'K': -1, 'Columns': width, 'Rows': height, 'BlackIs1': photometric == 1,
+        }
+        return PageImage(source_file, width, height, page_resolution, dictionary, strips)
+
+    if compression == COMPRESSION_JPEG:
+        prefix = b''
+        tables = tags.get(tiff.TAG_JPEG_TABLES)
+        if tables:
+            # The abbreviated strip follows the shared tables, with the end
+            # of the tables and the start of the strip markers left out.
+            offset, length = strips[0]
+            prefix = bytes(tables[:-2])
+            strips = [(offset + 2, length - 2)]
+        dictionary['Filter'] = pdf.Name('DCTDecode')
+        if photometric == 2:
+            dictionary['DecodeParms'] = {'ColorTransform': 0}
+        return PageImage(source_file, width, height, page_resolution,
+                         dictionary, strips, prefix)
+
+    if photometric == 6:
+        raise tiff.TIFFError(f'Page is stored as YCbCr without JPEG: {source_file}')
+
+    if compression == COMPRESSION_LZW:
+        with open(source_file, 'rb') as handle:
+            handle.seek(strips[0][0])
+            # A strip starts with a nine bit clear code, which is 0x80 in
+            # the first byte unless the strip uses the old bit order.
+            if handle.read(1) != b'\x80':
+                raise tiff.TIFFError(f'Page uses old style LZW: {source_file}')
+        dictionary['Filter'] = pdf.Name('LZWDecode')
+    elif compression in (COMPRESSION_DEFLATE, COMPRESSION_ADOBE_DEFLATE):
+        dictionary['Filter'] = pdf.Name('FlateDecode')
+    else:
+        raise tiff.TIFFError(f'Page uses unsupported compression {compression}: {source_file}')
+
+    if predictor == 2:
+        dictionary['DecodeParms'] = {
+            'Predictor': 2, 'Colors': samples, 'BitsPerComponent': bits[0], 'Columns': width,
+        }
+
+    return PageImage(source_file, width, height, page_resolution, dictionary, strips)
+
+
+def rewrite_args(source_file, target_file):
+    """
+    The ImageMagick command that rewrites a page that cannot be stored in a
+    pdf as it is into one that can: a single strip, Group 4 fax compressed if
+    the page is bilevel and Deflate compressed otherwise.
+    """
+    try:
+        header = tiff.read_header(source_file)
+    except tiff.TIFFError:
+        header = None
+
+    if header is None:
+        options = ['-type', 'TrueColor']
+    elif header.bits_per_sample == (1,):
+        options = ['-compress', 'Group4']
+    elif header.samples_per_pixel == 1 and header.photometric in (0, 1):
+        options = ['-type', 'Grayscale']
+    else:
+        options = ['-type', 'TrueColor']
+
+    if options[0] == '-type':
+        options = ['-alpha', 'off', '-depth', '8'] + options + ['-compress', 'Zip']
+
+    height = header.height if header is not None else 2 ** 31 - 1
+
+    return [
+        'convert', source_file,
+        '-define', f'tiff:rows-per-strip={height}',
+        *options,
+        target_file
+    ]
+
+
+def write_page(writer, parent, source_file, temp_dir):
+    """
+    Write a page and its image to the pdf, returning a reference to the page.
+    Pages that cannot be stored as they are are rewritten by ImageMagick into
+    ``temp_dir`` first.
+    """
+    rewritten = None
+    try:
+        try:
+            image = page_image(source_file)
+        except tiff.TIFFError:
+            rewritten = os.path.join(temp_dir, 'page.tiff')
+            process.run(rewrite_args(source_file, rewritten))
+            image = page_image(rewritten)
+
+        image_reference = writer.reserve()
+        writer.write_stream(image_reference, image.dictionary, image.chunks())
+    finally:
+        if rewritten is not None and os.path.exists(rewritten):
+            os.remove(rewritten)
+
+    width, height = image.page_size()
+    content = b'q %s 0 0 %s 0 0 cm /Im0 Do Q' % (
+        pdf.serialize(float(width)), pdf.serialize(float(height))
+    )
+    content_reference = writer.reserve()
+    writer.write_stream(content_reference, {}, [content])
+
+    page_reference = writer.reserve()
+    writer.write_object(page_reference, {
+        'Type': pdf.Name('Page'),
+        'Parent': parent,
+        'MediaBox': [0, 0, float(width), float(height)],
+        'Resources': {'XObject': {'Im0': image_reference}},
+        'Contents': content_reference,
+    })
+
+    return page_reference
+
+
+def write_pdf(source_files, target_pdf):
+    """
+    Write the TIFF pages ``source_files`` to ``target_pdf``, one page after
+    another, so that only one page's image is being copied at any time. The
+    pdf is written to a temporary file first and renamed into place.
+    """
+    part_file = target_pdf + '.part'
+    with open(part_file, 'wb') as handle, tempfile.TemporaryDirectory() as temp_dir:
+        writer = pdf.Writer(handle)
+        pages = writer.reserve()
+        kids = [
+            write_page(writer, pages, source_file, temp_dir)
+            for source_file in source_files
+        ]
+        writer.write_object(pages, {
+            'Type': pdf.Name('Pages'), 'Kids': kids, 'Count': len(kids),
+        })
+
+        catalog = writer.reserve()
+        writer.write_object(catalog, {'Type': pdf.Name('Catalog'), 'Pages': pages})
+        writer.close(catalog)
+
+    os.replace(part_file, target_pdf)
+
+
+class PackPDF(abstract.Command):
+    """
+    Pack TIFF pages into a pdf with one page per file, in order, without
+    re-encoding the pages where their compression allows it.
+    """
+    def __init__(self, source_files, target_pdf):
+        self.command = sys.executable
+        self.source_files = source_files
+        self.target_pdf = target_pdf
+        self.target_path = os.path.split(target_pdf)[0]
+
+    def as_subprocess(self):
+        return [
+            self.command, '-m', 'bookworm.pack_pdf', self.target_pdf
+        ] + list(self.source_files)
+
+    def as_terminal_command(self):
+        return ' '.join(
+            util.quoted_string(arg) for arg in self.as_subprocess()
+        )
+
+
+class Runner(abstract.Runner):
+
+    def setup(command):
+        """
+        Check that every page exists and create the pdf's directory.
+        """
+        if not command.source_files:
+            raise FileNotFoundError('There are no pages to pack.')
+
+        for source_file in command.source_files:
+            if not os.path.isfile(source_file):
+                raise FileNotFoundError(f'File does not exist: {source_file}')
+
+        util.make_directory(command.target_path)
+
+    def execute(command):
+        write_pdf(command.source_files, command.target_pdf)
+
+    def cleanup(command):
+        """
+        Remove the partial pdf left by a failed run.
+        """
+        part_file = command.target_pdf + '.part'
+        if os.path.isfile(part_file):
+            os.remove(part_file)
+
+
+def make(source_files, target_pdf):
+    """
+    The ``make`` factory method creates a ``PackPDF`` action.
+    """
+    if not target_pdf:
+        raise ValueError('Pack PDF needs an output file.')
+
+    return PackPDF(list(source_files), target_pdf)
+
+
+def process_args(arg_dict):
+    """
+    The ``process_args`` factory method parses the command line arguments in
+    ``arg_dict`` and uses them to construct a ``PackPDF`` command. The input
+    is a directory of TIFF pages, packed in file name order, or a single
+    page. Without an output file, the pdf is named after the input.
+    """
+    try:
+        input = arg_dict['input']
+    except KeyError as e:
+        raise e
+
+    output = arg_dict.get('output')
+    if not output:
+        output = os.path.splitext(os.path.normpath(input))[0] + '.pdf'
+
+    if os.path.isdir(input):
+        files_dict = {'path': input, 'files': os.listdir(input)}
+        tiff_files_dict = util.with_extension('.tiff', files_dict)
+        source_files = [
+            os.path.join(input, source_file)
+            for source_file in sorted(tiff_files_dict['files'])
+        ]
+        return make(source_files, output)
+
+    elif os.path.isfile(input):
+        return make([input], output)
+
+    else:
+        raise FileNotFoundError(f'File or directory does not exist: {input}')
+
+
+def main(argv=sys.argv):
+    """
+    Pack pages from the command line: the pdf file, then the pages in order.
+    """
+    write_pdf(argv[2:], argv[1])
+
+
+if __name__ == '__main__':
+    main()
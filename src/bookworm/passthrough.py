@@ -0,0 +1,326 @@
+import bookworm.pdf  as pdf
+import bookworm.tiff as tiff
+import os.path
+import struct
+import sys
+
+
+# TIFF compression schemes for the pdf image filters that are copied as is.
+COMPRESSION_JPEG = 7
+COMPRESSION_CCITT_G4 = 4
+COMPRESSION_DEFLATE = 8
+
+PHOTOMETRIC_WHITE_IS_ZERO = 0
+PHOTOMETRIC_BLACK_IS_ZERO = 1
+PHOTOMETRIC_RGB = 2
+PHOTOMETRIC_YCBCR = 6
+
+# How far, in points, an image may fall short of covering the page.
+PAGE_TOLERANCE = 2.0
+
+# Errors that mark a page, or a whole pdf, as one to render instead.
+READ_ERRORS = (ValueError, KeyError, IndexError, TypeError, AttributeError, struct.error)
+
+
+class Image:
+    """
+    The ``Image`` class describes the image XObject that makes up a whole
+    page, and how its encoded data is stored in a TIFF file.
+    """
+    def __init__(self, stream, width, height, bits_per_sample, photometric,
+                 compression, resolution, tags=()):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.bits_per_sample = bits_per_sample
+        self.photometric = photometric
+        self.compression = compression
+        self.resolution = resolution
+        self.tags = tags
+
+    def write(self, file_path):
+        tiff.write_image(
+            file_path,
+            self.width,
+            self.height,
+            self.bits_per_sample,
+            self.photometric,
+            self.compression,
+            self.stream.raw,
+            self.resolution,
+            self.tags
+        )
+
+    def __repr__(self):
+        return (
+            f'Image({self.width}x{self.height}, '
+            f'compression={self.compression}, photometric={self.photometric})'
+        )
+
+
+def drawn_image(document, page):
+    """
+    Find the single image that a page's content stream draws, returning its
+    name and the transformation it is drawn with. Pages that draw anything
+    else are rejected.
+    """
+    parser = pdf.Parser(document.contents(page))
+    matrix = [1, 0, 0, 1, 0, 0]
+    saved = []
+    operands = []
+    drawn = None
+    while not parser.at_end():
+        token = parser.parse_object()
+        if not isinstance(token, pdf.Keyword):
+            operands.append(token)
+            continue
+
+        if token == b'q':
+            saved.append(matrix)
+        elif token == b'Q':
+            if saved:
+                matrix = saved.pop()
+        elif token == b'cm':
+            a, b, c, d, e, f = operands
+            ma, mb, mc, md, me, mf = matrix
+            matrix = [
+                a * ma + b * mc, a * mb + b * md,
+                c * ma + d * mc, c * mb + d * md,
+                e * ma + f * mc + me, e * mb + f * md + mf
+            ]
+        elif token == b'Do' and drawn is None:
+            drawn = (operands[0], matrix)
+        else:
+            raise pdf.PDFError(f'Page {page.number} draws more than one image.')
+        operands = []
+
+    if drawn is None:
+        raise pdf.PDFError(f'Page {page.number} does not draw an image.')
+
+    return drawn
+
+
+def covers_page(matrix, box):
+    """
+    Determine whether an image drawn with ``matrix`` covers the page box
+    upright and without margins.
+    """
+    a, b, c, d, e, f = matrix
+    x0, x1 = sorted(box[0::2])
+    y0, y1 = sorted(box[1::2])
+    return (abs(b) < 1e-6 and abs(c) < 1e-6 and a > 0 and d > 0 and
+            abs(e - x0) <= PAGE_TOLERANCE and abs(f - y0) <= PAGE_TOLERANCE and
+            abs(e + a - x1) <= PAGE_TOLERANCE and abs(f + d - y1) <= PAGE_TOLERANCE)
+
+
+def color_samples(document, image):
+    """
+    The number of color samples per pixel of an image in a gray or RGB color
+    space.
+    """
+    if image.get('ImageMask'):
+        return 1
+
+    color_space = document.resolve(image.get('ColorSpace'))
+    if isinstance(color_space, list) and color_space and color_space[0] == 'ICCBased':
+        return document.resolve(document.resolve(color_space[1]).get('N'))
+
+    samples = {'DeviceGray': 1, 'G': 1, 'DeviceRGB': 3, 'RGB': 3}
+    if color_space not in samples:
+        raise pdf.PDFError(f'Unsupported image color space: {color_space!r}')
+
+    return samples[color_space]
+
+
+def is_inverted(document, image, samples):
+    """
+    Determine whether an image's ``Decode`` array inverts it. Other decode
+    arrays are rejected.
+    """
+    decode = document.resolve(image.get('Decode'))
+    if decode is None or list(decode) == [0, 1] * samples:
+        return False
+    if samples == 1 and list(decode) == [1, 0]:
+        return True
+
+    raise pdf.PDFError(f'Unsupported image decode array: {decode!r}')
+
+
+def jpeg_frame(data):
+    """
+    Read the frame header of a JPEG stream, returning its width, height and
+    the sampling factors of each component, and whether an Adobe marker says
+    the color components are stored untransformed.
+    """
+    position = 2
+    untransformed = False
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            raise pdf.PDFError('Malformed JPEG stream.')
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        (length,) = struct.unpack('>H', data[position + 2:position + 4])
+        segment = data[position + 4:position + 2 + length]
+        if marker == 0xEE and segment[:5] == b'Adobe' and len(segment) >= 12:
+            untransformed = segment[11] == 0
+        if marker in (0xC0, 0xC1):
+            height, width, count = struct.unpack('>HHB', segment[1:6])
+            factors = [
+                (segment[7 + 3 * i] >> 4, segment[7 + 3 * i] & 0x0F)
+                for i in range(count)
+            ]
+            return width, height, factors, untransformed
+        if 0xC2 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise pdf.PDFError('Only baseline JPEG images can be copied.')
+        position += 2 + length
+
+    raise pdf.PDFError('JPEG stream has no frame header.')
+
+
+def page_image(document, page):
+    """
+    The ``Image`` that covers a page by itself, and whose encoded data can be
+    stored in a TIFF file unchanged. A ``PDFError`` explains why a page does
+    not qualify.
+    """
+    if page.rotate % 360:
+        raise pdf.PDFError(f'Page {page.number} is rotated.')
+
+    name, matrix = drawn_image(document, page)
+    xobjects = document.resolve(page.resources.get('XObject')) or {}
+    image = document.resolve(xobjects.get(name))
+    if not isinstance(image, pdf.Stream) or image.get('Subtype') != 'Image':
+        raise pdf.PDFError(f'Page {page.number} draws a form, not an image.')
+
+    if not covers_page(matrix, page.crop_box):
+        raise pdf.PDFError(f'The image on page {page.number} does not cover it.')
+
+    if 'SMask' in image or 'Mask' in image:
+        raise pdf.PDFError(f'The image on page {page.number} is masked.')
+
+    filters = pdf.as_list(document.resolve(image.get('Filter')))
+    if len(filters) != 1:
+        raise pdf.PDFError(f'The image on page {page.number} has {len(filters)} filters.')
+    parameters = pdf.as_list(document.resolve(image.get('DecodeParms')))
+    parameters = document.resolve(parameters[0]) if parameters else None
+    parameters = parameters or {}
+
+    width = document.resolve(image['Width'])
+    height = document.resolve(image['Height'])
+    bits = 1 if image.get('ImageMask') else document.resolve(image.get('BitsPerComponent'))
+    samples = color_samples(document, image)
+    inverted = is_inverted(document, image, samples)
+
+    x0, x1 = sorted(page.crop_box[0::2])
+    y0, y1 = sorted(page.crop_box[1::2])
+    resolution = (width * 72 / (x1 - x0), height * 72 / (y1 - y0))
+
+    kind = filters[0]
+    if kind in ('DCTDecode', 'DCT'):
+        frame_width, frame_height, factors, untransformed = jpeg_frame(image.raw)
+        if (frame_width, frame_height) != (width, height) or len(factors) != samples:
+            raise pdf.PDFError(f'The JPEG image on page {page.number} does not match its dictionary.')
+        if inverted or untransformed or samples not in (1, 3):
+            raise pdf.PDFError(f'The JPEG image on page {page.number} needs color conversion.')
+        if samples == 1:
+            return Image(image, width, height, (8,), PHOTOMETRIC_BLACK_IS_ZERO,
+                         COMPRESSION_JPEG, resolution)
+        horizontal, vertical = factors[0]
+        if (any(factor != (1, 1) for factor in factors[1:]) or
+                horizontal not in (1, 2, 4) or vertical not in (1, 2, 4)):
+            raise pdf.PDFError(f'The JPEG image on page {page.number} has unusual subsampling.')
+        return Image(
+            image, width, height, (8, 8, 8), PHOTOMETRIC_YCBCR,
+            COMPRESSION_JPEG, resolution,
+            [(tiff.TAG_YCBCR_SUBSAMPLING, tiff.TYPE_SHORT, [horizontal, vertical])]
+        )
+
+    if kind in ('CCITTFaxDecode', 'CCF'):
+        if (parameters.get('K', 0) >= 0 or parameters.get('EncodedByteAlign') or
+                parameters.get('Columns', 1728) != width):
+            raise pdf.PDFError(f'The fax image on page {page.number} is not Group 4.')
+        # TIFF fax images show white runs as white. The pdf shows them as
+        # white unless the image is inverted, by BlackIs1 or by Decode.
+        photometric = PHOTOMETRIC_WHITE_IS_ZERO
+        if bool(parameters.get('BlackIs1', False)) != inverted:
+            photometric = PHOTOMETRIC_BLACK_IS_ZERO
+        return Image(
+            image, width, height, (1,), photometric, COMPRESSION_CCITT_G4,
+            resolution, [(tiff.TAG_T6_OPTIONS, tiff.TYPE_LONG, [0])]
+        )
+
+    if kind in ('FlateDecode', 'Fl'):
+        predictor = parameters.get('Predictor', 1)
+        if bits not in (1, 8) or predictor not in (1, 2) or (predictor == 2 and bits != 8):
+            raise pdf.PDFError(f'The image on page {page.number} uses an unsupported predictor.')
+        tags = [(tiff.TAG_PREDICTOR, tiff.TYPE_SHORT, [2])] if predictor == 2 else []
+        if samples == 1:
+            photometric = (PHOTOMETRIC_WHITE_IS_ZERO if inverted
+                           else PHOTOMETRIC_BLACK_IS_ZERO)
+            return Image(image, width, height, (bits,), photometric,
+                         COMPRESSION_DEFLATE, resolution, tags)
+        if inverted or bits != 8:
+            raise pdf.PDFError(f'The color image on page {page.number} cannot be copied.')
+        return Image(image, width, height, (8, 8, 8), PHOTOMETRIC_RGB,
+                     COMPRESSION_DEFLATE, resolution, tags)
+
+    raise pdf.PDFError(f'The image on page {page.number} uses the {kind} filter.')
+
+
+def extractable_pages(source_pdf):
+    """
+    Find the pages of a pdf whose image can be copied out as it is. Returns
+    the page numbers and the number of pages in the pdf. A pdf that cannot
+    be read at all has no extractable pages and ``None`` pages.
+    """
+    try:
+        document = pdf.Document(source_pdf)
+    except READ_ERRORS:
+        return [], None
+
+    with document:
+        try:
+            pages = document.pages()
+        except READ_ERRORS:
+            return [], None
+
+        extractable = []
+        for page in pages:
+            try:
+                page_image(document, page)
+            except READ_ERRORS:
+                continue
+            extractable.append(page.number)
+
+        return extractable, len(pages)
+
+
+def extract_pages(source_pdf, page_files):
+    """
+    Copy the images of the pages in ``page_files``, a dictionary from page
+    number to TIFF file name, out of a pdf. Each page is written to a
+    temporary file first and renamed into place.
+    """
+    with pdf.Document(source_pdf) as document:
+        pages = document.pages()
+        for number, page_file in sorted(page_files.items()):
+            image = page_image(document, pages[number - 1])
+            part_file = page_file + '.part'
+            image.write(part_file)
+            os.replace(part_file, page_file)
+
+
+def main(argv=sys.argv):
+    """
+    Extract page images from the command line: the pdf file, the directory
+    to write the pages to with the page file name format, and page numbers.
+    """
+    source_pdf, page_format = argv[1], argv[2]
+    pages = [int(page) for page in argv[3:]]
+    extract_pages(source_pdf, {page: page_format % page for page in pages})
+
+
+if __name__ == '__main__':
+    main()
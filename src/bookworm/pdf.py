@@ -0,0 +1,773 @@
+import hashlib
+import mmap
+import re
+import zlib
+
+
+class PDFError(ValueError):
+    """
+    The ``PDFError`` exception is raised for pdf files, or parts of them,
+    that bookworm cannot read. Callers fall back to Ghostscript when they
+    see it.
+    """
+    pass
+
+
+WHITESPACE = b'\x00\t\n\x0c\r '
+DELIMITERS = b'()<>[]{}/%'
+
+_WHITESPACE_RE = re.compile(rb'(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)+')
+_NUMBER_RE = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_REGULAR_RE = re.compile(rb'[^\x00\t\n\x0c\r ()<>\[\]{}/%]*')
+_NAME_ESCAPE_RE = re.compile(rb'#([0-9A-Fa-f]{2})')
+_STRING_ESCAPES = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+    ord('f'): b'\f', ord('('): b'(', ord(')'): b')', ord('\\'): b'\\',
+}
+
+
+class Name(str):
+    """
+    A pdf name object, such as ``/Type``, without its leading slash.
+    """
+    def __repr__(self):
+        return f'/{self}'
+
+
+class Keyword(bytes):
+    """
+    A bare pdf keyword, such as ``obj``, ``R`` or a content stream operator.
+    """
+    pass
+
+
+class Reference:
+    """
+    An indirect reference to object ``number`` of generation ``generation``.
+    """
+    def __init__(self, number, generation):
+        self.number = number
+        self.generation = generation
+
+    def __eq__(self, other):
+        return (isinstance(other, Reference) and
+                (self.number, self.generation) == (other.number, other.generation))
+
+    def __hash__(self):
+        return hash((self.number, self.generation))
+
+    def __repr__(self):
+        return f'{self.number} {self.generation} R'
+
+
+class Stream:
+    """
+    A pdf stream: a dictionary and the encoded bytes that follow it. The bytes
+    are read from the file only when they are needed.
+    """
+    def __init__(self, dictionary, data, start, length):
+        self.dictionary = dictionary
+        self._data = data
+        self.start = start
+        self.length = length
+
+    @property
+    def raw(self):
+        return bytes(self._data[self.start:self.start + self.length])
+
+    def get(self, key, default=None):
+        return self.dictionary.get(key, default)
+
+    def __getitem__(self, key):
+        return self.dictionary[key]
+
+    def __contains__(self, key):
+        return key in self.dictionary
+
+    def __repr__(self):
+        return f'Stream({self.dictionary!r}, {self.length} bytes)'
+
+
+class Parser:
+    """
+    A reader of pdf objects from ``data``, starting at ``position``.
+    """
+    def __init__(self, data, position=0):
+        self.data = data
+        self.position = position
+
+    def skip_whitespace(self):
+        match = _WHITESPACE_RE.match(self.data, self.position)
+        if match:
+            self.position = match.end()
+
+    def at_end(self):
+        self.skip_whitespace()
+        return self.position >= len(self.data)
+
+    def next_token(self):
+        """
+        Read the next token: a number, name, string, keyword, or one of the
+        delimiters ``[``, ``]``, ``<<`` and ``>>`` as a ``Keyword``.
+        """
+        self.skip_whitespace()
+        data = self.data
+        position = self.position
+        if position >= len(data):
+            raise PDFError('Unexpected end of data.')
+
+        char = data[position:position + 1]
+        if char == b'/':
+            match = _REGULAR_RE.match(data, position + 1)
+            self.position = match.end()
+            name = _NAME_ESCAPE_RE.sub(
+                lambda escape: bytes([int(escape.group(1), 16)]), match.group()
+            )
+            return Name(name.decode('latin-1'))
+
+        if char == b'(':
+            return self._literal_string()
+
+        if char == b'<':
+            if data[position + 1:position + 2] == b'<':
+                self.position = position + 2
+                return Keyword(b'<<')
+            end = data.find(b'>', position)
+            if end < 0:
+                raise PDFError('Unterminated hex string.')
+            self.position = end + 1
+            digits = re.sub(rb'[^0-9A-Fa-f]', b'', bytes(data[position + 1:end]))
+            if len(digits) % 2:
+                digits += b'0'
+            return bytes.fromhex(digits.decode('ascii'))
+
+        if char == b'>':
+            if data[position + 1:position + 2] != b'>':
+                raise PDFError(f'Unexpected > at {position}.')
+            self.position = position + 2
+            return Keyword(b'>>')
+
+        if char in (b'[', b']', b'{', b'}'):
+            self.position = position + 1
+            return Keyword(char)
+
+        match = _NUMBER_RE.match(data, position)
+        if match:
+            end = match.end()
+            if end >= len(data) or data[end] in WHITESPACE or data[end] in DELIMITERS:
+                self.position = end
+                text = match.group()
+                return float(text) if b'.' in text else int(text)
+
+        match = _REGULAR_RE.match(data, position)
+        if match.end() == position:
+            raise PDFError(f'Unexpected character {char!r} at {position}.')
+        self.position = match.end()
+        keyword = match.group()
+        if keyword == b'true':
+            return True
+        if keyword == b'false':
+            return False
+        if keyword == b'null':
+            return None
+
+        return Keyword(keyword)
+
+    def _literal_string(self):
+        data = self.data
+        position = self.position + 1
+        depth = 1
+        result = bytearray()
+        while position < len(data):
+            byte = data[position]
+            position += 1
+            if byte == ord('\\'):
+                escaped = data[position]
+                position += 1
+                if escaped in _STRING_ESCAPES:
+                    result += _STRING_ESCAPES[escaped]
+                elif ord('0') <= escaped <= ord('7'):
+                    digits = bytes([escaped])
+                    while (len(digits) < 3 and position < len(data) and
+                           ord('0') <= data[position] <= ord('7')):
+                        digits += bytes([data[position]])
+                        position += 1
+                    result.append(int(digits, 8) & 0xFF)
+                elif escaped == ord('\r'):
+                    if data[position:position + 1] == b'\n':
+                        position += 1
+                elif escaped != ord('\n'):
+                    result.append(escaped)
+            elif byte == ord('('):
+                depth += 1
+                result.append(byte)
+            elif byte == ord(')'):
+                depth -= 1
+                if depth == 0:
+                    self.position = position
+                    return bytes(result)
+                result.append(byte)
+            else:
+                result.append(byte)
+
+        raise PDFError('Unterminated literal string.')
+
+    def parse_object(self):
+        """
+        Read the next complete object, combining ``n g R`` into a
+        ``Reference``.
+        """
+        token = self.next_token()
+        if token == b'[' and isinstance(token, Keyword):
+            array = []
+            while True:
+                self.skip_whitespace()
+                if self.data[self.position:self.position + 1] == b']':
+                    self.position += 1
+                    return array
+                array.append(self.parse_object())
+
+        if token == b'<<' and isinstance(token, Keyword):
+            dictionary = {}
+            while True:
+                key = self.next_token()
+                if isinstance(key, Keyword) and key == b'>>':
+                    return dictionary
+                if not isinstance(key, Name):
+                    raise PDFError(f'Expected a name as a dictionary key. Got: {key!r}')
+                dictionary[key] = self.parse_object()
+
+        if isinstance(token, int) and not isinstance(token, bool) and token >= 0:
+            saved = self.position
+            try:
+                generation = self.next_token()
+                keyword = self.next_token()
+                if (isinstance(generation, int) and not isinstance(generation, bool) and
+                        isinstance(keyword, Keyword) and keyword == b'R'):
+                    return Reference(token, generation)
+            except PDFError:
+                pass
+            self.position = saved
+
+        return token
+
+
+def png_unpredict(data, columns, colors=1, bits_per_component=8):
+    """
+    Undo the PNG row predictors that a ``FlateDecode`` filter applies with a
+    ``Predictor`` of 10 or more.
+    """
+    pixel_size = max(1, colors * bits_per_component // 8)
+    row_size = (columns * colors * bits_per_component + 7) // 8
+    result = bytearray()
+    previous = bytearray(row_size)
+    for start in range(0, len(data), row_size + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + 1 + row_size])
+        row += bytes(row_size - len(row))
+        for i in range(row_size):
+            left = row[i - pixel_size] if i >= pixel_size else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                upper_left = previous[i - pixel_size] if i >= pixel_size else 0
+                estimate = left + up - upper_left
+                distances = (abs(estimate - left), abs(estimate - up), abs(estimate - upper_left))
+                if distances[0] <= distances[1] and distances[0] <= distances[2]:
+                    predictor = left
+                elif distances[1] <= distances[2]:
+                    predictor = up
+                else:
+                    predictor = upper_left
+                row[i] = (row[i] + predictor) & 0xFF
+            elif kind != 0:
+                raise PDFError(f'Unknown PNG predictor: {kind}')
+        result += row
+        previous = row
+
+    return bytes(result)
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+class Page:
+    """
+    A page of a pdf with the attributes it inherits from the page tree
+    already filled in.
+    """
+    def __init__(self, number, dictionary, resources, media_box, crop_box, rotate):
+        self.number = number
+        self.dictionary = dictionary
+        self.resources = resources
+        self.media_box = media_box
+        self.crop_box = crop_box
+        self.rotate = rotate
+
+    def __repr__(self):
+        return f'Page({self.number})'
+
+
+class Document:
+    """
+    The ``Document`` class reads the cross-reference tables and objects of a
+    pdf file without loading it into memory. Both cross-reference tables and
+    cross-reference streams are understood, as well as objects kept in object
+    streams. Encrypted files are rejected.
+    """
+    INHERITED = ('Resources', 'MediaBox', 'CropBox', 'Rotate')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as handle:
+            try:
+                self.data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PDFError(f'File is empty: {file_path}')
+
+        self.xref = {}
+        self.trailer = {}
+        self.objects = {}
+        self.digests = {}
+        try:
+            self._read_xref()
+            if 'Encrypt' in self.trailer:
+                raise PDFError('Encrypted pdf files are not supported.')
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_xref(self):
+        start = self.data.rfind(b'startxref')
+        if start < 0:
+            raise PDFError('The pdf has no startxref.')
+
+        offset = Parser(self.data, start + len(b'startxref')).next_token()
+        visited = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if not isinstance(offset, int) or offset in visited:
+                continue
+            visited.add(offset)
+            if offset >= len(self.data):
+                raise PDFError(f'Cross-reference offset past the end of file: {offset}')
+
+            if self.data[offset:offset + 4] == b'xref':
+                trailer = self._read_xref_table(offset)
+                if 'XRefStm' in trailer:
+                    pending.insert(0, trailer['XRefStm'])
+            else:
+                trailer = self._read_xref_stream(offset)
+
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            if 'Prev' in trailer:
+                pending.append(trailer['Prev'])
+
+        if 'Root' not in self.trailer:
+            raise PDFError('The pdf trailer has no document catalog.')
+
+    def _read_xref_table(self, offset):
+        parser = Parser(self.data, offset + len(b'xref'))
+        while True:
+            token = parser.next_token()
+            if isinstance(token, Keyword) and token == b'trailer':
+                return parser.parse_object()
+            first, count = token, parser.next_token()
+            if not (isinstance(first, int) and isinstance(count, int)):
+                raise PDFError('Malformed cross-reference table.')
+            for number in range(first, first + count):
+                entry_offset = parser.next_token()
+                parser.next_token()
+                kind = parser.next_token()
+                if number in self.xref:
+                    continue
+                self.xref[number] = entry_offset if kind == b'n' else None
+
+    def _read_xref_stream(self, offset):
+        number, stream = self._parse_indirect(offset)
+        if not isinstance(stream, Stream) or stream.get('Type') != 'XRef':
+            raise PDFError(f'No cross-reference at offset {offset}.')
+
+        widths = stream['W']
+        index = stream.get('Index', [0, stream['Size']])
+        data = self.decode(stream)
+        position = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for number in range(first, first + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[position:position + width], 'big'))
+                    position += width
+                kind = fields[0] if widths[0] else 1
+                if number in self.xref:
+                    continue
+                if kind == 1:
+                    self.xref[number] = fields[1]
+                elif kind == 2:
+                    self.xref[number] = ('stream', fields[1], fields[2])
+                else:
+                    self.xref[number] = None
+
+        return stream.dictionary
+
+    def _parse_indirect(self, offset):
+        parser = Parser(self.data, offset)
+        number = parser.next_token()
+        parser.next_token()
+        keyword = parser.next_token()
+        if not (isinstance(number, int) and keyword == b'obj'):
+            raise PDFError(f'No object at offset {offset}.')
+
+        value = parser.parse_object()
+        saved = parser.position
+        token = parser.next_token() if not parser.at_end() else None
+        if not (isinstance(token, Keyword) and token == b'stream'):
+            parser.position = saved
+            return number, value
+
+        start = parser.position
+        if self.data[start:start + 2] == b'\r\n':
+            start += 2
+        elif self.data[start:start + 1] in (b'\n', b'\r'):
+            start += 1
+
+        length = self.resolve(value.get('Length'))
+        end = start + length if isinstance(length, int) else -1
+        if not (0 <= end <= len(self.data) and
+                Parser(self.data, end).next_token() == b'endstream'):
+            # Repair a missing or wrong /Length from the endstream keyword.
+            end = self.data.find(b'endstream', start)
+            if end < 0:
+                raise PDFError(f'Unterminated stream in object {number}.')
+            while end > start and self.data[end - 1:end] in (b'\n', b'\r'):
+                end -= 1
+
+        return number, Stream(value, self.data, start, end - start)
+
+    def _load_object_stream(self, stream_number):
+        stream = self.object(stream_number)
+        if not isinstance(stream, Stream):
+            raise PDFError(f'Object {stream_number} is not an object stream.')
+
+        data = self.decode(stream)
+        parser = Parser(data)
+        pairs = [(parser.next_token(), parser.next_token()) for _ in range(stream['N'])]
+        first = stream['First']
+        found = {}
+        for number, offset in pairs:
+            parser.position = first + offset
+            found[number] = parser.parse_object()
+
+        return found
+
+    def object(self, number):
+        """
+        The object ``number``, or ``None`` if the file does not have it.
+        """
+        if number in self.objects:
+            return self.objects[number]
+
+        entry = self.xref.get(number)
+        if entry is None:
+            value = None
+        elif isinstance(entry, tuple):
+            _, stream_number, _ = entry
+            found = self._load_object_stream(stream_number)
+            for found_number, found_value in found.items():
+                # Keep only the objects that the stream still holds, since a
+                # later update may have replaced some of them.
+                found_entry = self.xref.get(found_number)
+                if isinstance(found_entry, tuple) and found_entry[1] == stream_number:
+                    self.objects.setdefault(found_number, found_value)
+            value = found.get(number)
+        else:
+            found_number, value = self._parse_indirect(entry)
+            if found_number != number:
+                raise PDFError(f'Expected object {number} at offset {entry}.')
+
+        self.objects[number] = value
+        return value
+
+    def resolve(self, value):
+        """
+        Follow indirect references until a direct object is reached.
+        """
+        seen = set()
+        while isinstance(value, Reference):
+            if value.number in seen:
+                raise PDFError(f'Reference cycle at object {value.number}.')
+            seen.add(value.number)
+            value = self.object(value.number)
+
+        return value
+
+    def decode(self, stream):
+        """
+        The decoded contents of a stream. Only ``FlateDecode`` is supported,
+        since the other filters hold image data that is copied as it is.
+        """
+        data = stream.raw
+        filters = [self.resolve(item) for item in as_list(self.resolve(stream.get('Filter')))]
+        parameters = [self.resolve(item) for item in as_list(self.resolve(stream.get('DecodeParms')))]
+        for position, name in enumerate(filters):
+            if name not in ('FlateDecode', 'Fl'):
+                raise PDFError(f'Unsupported stream filter: {name}')
+            try:
+                data = zlib.decompressobj().decompress(data)
+            except zlib.error as e:
+                raise PDFError(f'Corrupt compressed stream: {e}')
+
+            parms = parameters[position] if position < len(parameters) else None
+            predictor = parms.get('Predictor', 1) if parms else 1
+            if predictor >= 10:
+                data = png_unpredict(
+                    data,
+                    parms.get('Columns', 1),
+                    parms.get('Colors', 1),
+                    parms.get('BitsPerComponent', 8)
+                )
+            elif predictor != 1:
+                raise PDFError(f'Unsupported predictor: {predictor}')
+
+        return data
+
+    def pages(self):
+        """
+        Every page of the document in order, found by walking the page tree.
+        """
+        catalog = self.resolve(self.trailer['Root'])
+        root = self.resolve(catalog.get('Pages'))
+        if not isinstance(root, dict):
+            raise PDFError('The pdf has no page tree.')
+
+        pages = []
+        visited = set()
+        stack = [(root, {})]
+        while stack:
+            node, inherited = stack.pop()
+            if id(node) in visited:
+                raise PDFError('The page tree has a cycle.')
+            visited.add(id(node))
+
+            attributes = dict(inherited)
+            for key in self.INHERITED:
+                if key in node:
+                    attributes[key] = self.resolve(node[key])
+
+            if node.get('Type') == 'Pages' or 'Kids' in node:
+                kids = [self.resolve(kid) for kid in self.resolve(node.get('Kids', []))]
+                for kid in reversed(kids):
+                    if isinstance(kid, dict):
+                        stack.append((kid, attributes))
+            else:
+                media_box = [self.resolve(value) for value in
+                             attributes.get('MediaBox', [0, 0, 612, 792])]
+                crop_box = [self.resolve(value) for value in
+                            attributes.get('CropBox', media_box)]
+                pages.append(Page(
+                    len(pages) + 1,
+                    node,
+                    attributes.get('Resources') or {},
+                    media_box,
+                    crop_box,
+                    attributes.get('Rotate', 0)
+                ))
+
+        return pages
+
+    def contents(self, page):
+        """
+        The decoded content stream of a page, with the parts of an array of
+        content streams joined.
+        """
+        parts = []
+        for item in as_list(self.resolve(page.dictionary.get('Contents'))):
+            stream = self.resolve(item)
+            if isinstance(stream, Stream):
+                parts.append(self.decode(stream))
+
+        return b'\n'.join(parts)
+
+    def page_digest(self, page):
+        """
+        The SHA-256 digest of everything that draws a page, as a hexadecimal
+        string: its content streams, resources and annotations, and the
+        attributes it inherits from the page tree, with every indirect
+        object they refer to followed. References to other pages, such as
+        the targets of links, are not followed, so the digest only changes
+        when the page itself does.
+        """
+        dictionary = {key: value for key, value in page.dictionary.items() if key != 'Parent'}
+        dictionary.update(
+            Resources=page.resources,
+            MediaBox=page.media_box,
+            CropBox=page.crop_box,
+            Rotate=page.rotate
+        )
+
+        return self._digest(dictionary, set()).hex()
+
+    def _digest(self, value, visiting):
+        if isinstance(value, Reference):
+            number = value.number
+            if number in self.digests:
+                return self.digests[number]
+
+            target = self.object(number)
+            if (number in visiting or
+                    (isinstance(target, dict) and target.get('Type') in ('Page', 'Pages'))):
+                return b'R%d' % number
+
+            visiting.add(number)
+            digest = self._digest(target, visiting)
+            visiting.discard(number)
+            self.digests[number] = digest
+            return digest
+
+        if isinstance(value, Stream):
+            parts = [b'stream', self._digest(value.dictionary, visiting), value.raw]
+        elif isinstance(value, dict):
+            parts = [b'dict']
+            for key in sorted(value):
+                parts += [serialize(Name(key)), self._digest(value[key], visiting)]
+        elif isinstance(value, list):
+            parts = [b'list'] + [self._digest(item, visiting) for item in value]
+        else:
+            return b'=' + serialize(value)
+
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(b'%d:' % len(part))
+            digest.update(part)
+
+        return digest.digest()
+
+
+def serialize(value):
+    """
+    The pdf syntax for a value built from the types the parser returns.
+    Strings are written as literal strings.
+    """
+    if value is None:
+        return b'null'
+    if value is True:
+        return b'true'
+    if value is False:
+        return b'false'
+    if isinstance(value, Keyword):
+        return bytes(value)
+    if isinstance(value, Name):
+        escaped = ''.join(
+            char if 0x21 <= ord(char) <= 0x7E and char.encode() not in DELIMITERS + b'#'
+            else f'#{ord(char):02X}'
+            for char in value
+        )
+        return b'/' + escaped.encode('latin-1')
+    if isinstance(value, Reference):
+        return b'%d %d R' % (value.number, value.generation)
+    if isinstance(value, int):
+        return b'%d' % value
+    if isinstance(value, float):
+        return (b'%.4f' % value).rstrip(b'0').rstrip(b'.')
+    if isinstance(value, bytes):
+        escaped = value.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        return b'(' + escaped.replace(b'\r', b'\\r') + b')'
+    if isinstance(value, list):
+        return b'[' + b' '.join(serialize(item) for item in value) + b']'
+    if isinstance(value, dict):
+        return b'<< ' + b' '.join(
+            serialize(Name(key)) + b' ' + serialize(item)
+            for key, item in value.items()
+        ) + b' >>'
+
+    raise TypeError(f'Cannot write {value!r} to a pdf.')
+
+
+class Writer:
+    """
+    The ``Writer`` class writes a pdf to ``handle`` one object at a time.
+    Object numbers are reserved before the objects are written, so objects
+    can refer to ones that come later in the file, and stream data is copied
+    from an iterable of chunks with its length written after it. Only the
+    offset of each object is kept in memory.
+    """
+    def __init__(self, handle, version='1.4'):
+        self.handle = handle
+        self.offsets = [None]
+        self.position = 0
+        self._write(b'%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n' % version.encode('ascii'))
+
+    def _write(self, data):
+        self.handle.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        """
+        Reserve the number of a new object.
+        """
+        self.offsets.append(None)
+        return Reference(len(self.offsets) - 1, 0)
+
+    def _begin(self, reference):
+        if self.offsets[reference.number] is not None:
+            raise PDFError(f'Object {reference} was already written.')
+        self.offsets[reference.number] = self.position
+        self._write(b'%d 0 obj\n' % reference.number)
+
+    def write_object(self, reference, value):
+        self._begin(reference)
+        self._write(serialize(value) + b'\nendobj\n')
+
+    def write_stream(self, reference, dictionary, chunks):
+        """
+        Write a stream object whose data is the concatenation of ``chunks``.
+        """
+        length = self.reserve()
+        self._begin(reference)
+        self._write(serialize(dict(dictionary, Length=length)) + b'\nstream\n')
+        start = self.position
+        for chunk in chunks:
+            self._write(chunk)
+        size = self.position - start
+        self._write(b'\nendstream\nendobj\n')
+        self.write_object(length, size)
+
+    def close(self, root, info=None):
+        """
+        Write the cross-reference table and the trailer, naming ``root`` as
+        the document catalog.
+        """
+        missing = [number for number, offset in enumerate(self.offsets) if number and offset is None]
+        if missing:
+            raise PDFError(f'Reserved objects were never written: {missing}')
+
+        xref_offset = self.position
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self._write(b'%010d 00000 n \n' % offset)
+
+        trailer = dict(Size=len(self.offsets), Root=root)
+        if info is not None:
+            trailer['Info'] = info
+        self._write(b'trailer\n' + serialize(trailer) + b'\nstartxref\n%d\n%%%%EOF\n' % xref_offset)
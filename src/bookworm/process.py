@@ -0,0 +1,586 @@
+import bookworm.memory as memory
+import bookworm.trace  as trace
+import contextlib
+import contextvars
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource limits, so CPU time limits are not enforced.
+    resource = None
+
+
+class TimeLimitExceeded(subprocess.SubprocessError):
+    """
+    The ``TimeLimitExceeded`` exception is raised when an external program
+    is stopped for running longer than its wall clock or CPU time limit.
+    Actions that fail with it may be retried.
+    """
+    def __init__(self, cmd, limit, kind):
+        self.cmd = cmd
+        self.limit = limit
+        self.kind = kind
+
+    def __str__(self):
+        return (
+            f'Command \'{self.cmd}\' was stopped after exceeding its '
+            f'{self.kind} limit of {self.limit:g} seconds.'
+        )
+
+
+class Limits:
+    """
+    The ``Limits`` class holds the limits of every external program bookworm
+    runs: ``timeout`` seconds of wall clock time, ``cpu_time`` seconds of
+    processor time, and the number of ``threads`` it may use, any of which
+    may be ``None`` for no limit. A program that runs out of time is asked
+    to stop, and is killed if it has not stopped ``grace_period`` seconds
+    later.
+    """
+    def __init__(self, timeout=None, cpu_time=None, grace_period=5.0, threads=None):
+        for name, value in (('timeout', timeout), ('cpu_time', cpu_time), ('threads', threads)):
+            if value is not None and value <= 0:
+                raise ValueError(f'\'{name}\' must be positive. Got: {value}')
+
+        self.timeout = timeout
+        self.cpu_time = cpu_time
+        self.grace_period = grace_period
+        self.threads = threads
+
+    def environment(self, env=None):
+        """
+        The environment of a child program: ``env``, or this process's
+        environment, with the thread limit of ImageMagick and OpenMP set.
+        Returns ``env`` unchanged when threads are not limited.
+        """
+        if self.threads is None:
+            return env
+
+        env = dict(os.environ if env is None else env)
+        for variable in THREAD_VARIABLES:
+            env[variable] = str(self.threads)
+
+        return env
+
+    def with_threads(self, threads):
+        """
+        The same limits with the number of ``threads`` replaced.
+        """
+        return Limits(self.timeout, self.cpu_time, self.grace_period, threads)
+
+    def __repr__(self):
+        return (
+            f'Limits({self.timeout}, {self.cpu_time}, {self.grace_period}, '
+            f'{self.threads})'
+        )
+
+
+# The environment variables that bound the threads of ImageMagick and of any
+# other OpenMP program.
+THREAD_VARIABLES = ('MAGICK_THREAD_LIMIT', 'OMP_NUM_THREADS')
+
+_limits = Limits()
+
+_limited = threading.local()
+
+_output = None
+
+# Windows has no SIGKILL; terminating a process there already kills it.
+KILL_SIGNAL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
+
+def set_limits(limits):
+    """
+    Set the ``Limits`` that external programs run under by default. They
+    apply to every worker thread of a run.
+    """
+    global _limits
+    _limits = limits
+
+
+def current_limits():
+    return getattr(_limited, 'limits', None) or _limits
+
+
+@contextlib.contextmanager
+def limited(limits):
+    """
+    Run the external programs that the current thread starts under
+    ``limits`` instead of the run's, such as the programs of one of several
+    worker pools that share the processors.
+    """
+    previous = getattr(_limited, 'limits', None)
+    _limited.limits = limits
+    try:
+        yield
+    finally:
+        _limited.limits = previous
+
+
+def set_output(write):
+    """
+    Collect the output of the external programs that are started without
+    a standard output or error of their own, and pass it to ``write`` once
+    each program exits, instead of letting them write to the terminal, where
+    they would tear a progress line that is being redrawn. ``None`` lets
+    them write to the terminal again.
+    """
+    global _output
+    _output = write
+
+
+def show_output(text):
+    """
+    Show the output ``text`` of an external program where ``set_output``
+    asks for it, or on the standard error.
+    """
+    if not text:
+        return
+
+    if _output is not None:
+        _output(text)
+    else:
+        sys.stderr.write(text)
+
+
+class Usage:
+    """
+    The resources used by one external program: its arguments, wall clock
+    seconds, user and system CPU seconds and peak resident memory in bytes,
+    including the programs it waited for, and its exit status. A program
+    run for several actions at once, such as a batch, is ``shared_by`` all
+    of them. Resources that could not be measured are ``None``.
+    """
+    def __init__(self, args, seconds, user_time, system_time, peak_rss,
+                 returncode, shared_by=1):
+        self.args = args
+        self.seconds = seconds
+        self.user_time = user_time
+        self.system_time = system_time
+        self.peak_rss = peak_rss
+        self.returncode = returncode
+        self.shared_by = shared_by
+
+    def as_dict(self):
+        return dict(
+            args = [str(arg) for arg in self.args],
+            seconds = self.seconds,
+            user_time = self.user_time,
+            system_time = self.system_time,
+            peak_rss = self.peak_rss,
+            returncode = self.returncode,
+            shared_by = self.shared_by
+        )
+
+    def __repr__(self):
+        return (
+            f'Usage({self.args!r}, {self.seconds}, {self.user_time}, '
+            f'{self.system_time}, {self.peak_rss}, {self.returncode}, {self.shared_by})'
+        )
+
+
+class Account(list):
+    """
+    An ``Account`` is the list of the ``Usage`` of the external programs
+    run for one action. A closed account is charged no more, whichever
+    thread it was opened in.
+    """
+    closed = False
+
+
+# The accounts open in the current thread, or in the current asyncio task,
+# since every task runs in a context of its own.
+_accounts = contextvars.ContextVar('accounts', default=())
+
+
+def current_accounts():
+    return [account for account in _accounts.get() if not account.closed]
+
+
+def open_account():
+    """
+    Open an account in the current thread or asyncio task, that the
+    ``Usage`` of every external program it runs is added to until it is
+    closed.
+    """
+    account = Account()
+    _accounts.set(current_accounts() + [account])
+    return account
+
+
+def close_account(account):
+    account.closed = True
+    _accounts.set(current_accounts())
+
+
+@contextlib.contextmanager
+def charging(accounts):
+    """
+    Charge the external programs the current thread runs to ``accounts``,
+    opened by another thread that handed work to this one.
+    """
+    previous = current_accounts()
+    _accounts.set(previous + list(accounts))
+    try:
+        yield
+    finally:
+        _accounts.set(previous)
+
+
+def charge(usage):
+    """
+    Add ``usage`` to every account open in the current thread or asyncio
+    task.
+    """
+    accounts = current_accounts()
+    usage.shared_by = max(1, len(accounts))
+    for account in accounts:
+        account.append(usage)
+
+
+def rss_bytes(max_rss):
+    """
+    Linux reports the peak resident set in kilobytes, macOS in bytes.
+    """
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class Process(subprocess.Popen):
+    """
+    A ``Popen`` whose program is reaped explicitly by ``reap``, which
+    measures the resources it used with ``wait4`` and charges them to the
+    accounts open in the thread or task that reaped it. A program reaped by
+    ``wait`` or ``poll`` instead is not charged. The ``usage`` of a reaped
+    program is kept. ``reap_lock`` is held while the program is reaped, so
+    that a thread holding it can signal the program's group knowing that its
+    pid has not been reaped and reused.
+    """
+    usage = None
+    log = None
+
+    def __init__(self, args, **kwargs):
+        self.start_time = time.monotonic()
+        self.reap_lock = threading.Lock()
+        super().__init__(args, **kwargs)
+
+    def exited(self):
+        """
+        Whether the program has exited, reaped or not. Call it holding
+        ``reap_lock``.
+        """
+        if self.returncode is not None:
+            return True
+
+        if not hasattr(os, 'waitid'):
+            return self.poll() is not None
+
+        try:
+            flags = os.WEXITED | os.WNOHANG | os.WNOWAIT
+            return os.waitid(os.P_PID, self.pid, flags) is not None
+        except ChildProcessError:
+            return True
+
+    def signal_running(self, signum):
+        """
+        Send ``signum`` to the program's process group unless the program
+        has exited, and return whether it was sent. The program cannot be
+        reaped, and its pid reused, in between.
+        """
+        with self.reap_lock:
+            if self.exited():
+                return False
+
+            signal_group(self, signum)
+            return True
+
+    def reap(self, block=True):
+        """
+        Wait for the program to exit, or only look whether it has without
+        ``block``, and return its exit status, or ``None`` while it runs.
+        Where there is no ``wait4``, the program is waited for uncharged.
+        """
+        if self.returncode is not None:
+            return self.returncode
+
+        if block and hasattr(os, 'waitid'):
+            # Wait for the program to exit without reaping it, so that the
+            # lock is only held for the moment it takes to reap it.
+            try:
+                os.waitid(os.P_PID, self.pid, os.WEXITED | os.WNOWAIT)
+            except ChildProcessError:
+                pass
+
+        with self.reap_lock:
+            returncode = self._reap(block)
+            if returncode is None:
+                return None
+
+            log, self.log = self.log, None
+
+        if log is not None:
+            with log:
+                log.seek(0)
+                show_output(log.read().decode(errors='replace'))
+
+        return returncode
+
+    def _reap(self, block):
+        if self.returncode is not None:
+            return self.returncode
+
+        if not hasattr(os, 'wait4'):
+            return self.wait() if block else self.poll()
+
+        try:
+            pid, status, usage = os.wait4(self.pid, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            # Another thread has reaped it with ``wait`` or ``poll``.
+            return self.wait() if block else self.poll()
+
+        if pid != self.pid:
+            return None
+
+        self.returncode = os.waitstatus_to_exitcode(status)
+        self.usage = Usage(
+            self.args,
+            time.monotonic() - self.start_time,
+            usage.ru_utime,
+            usage.ru_stime,
+            rss_bytes(usage.ru_maxrss),
+            self.returncode
+        )
+        charge(self.usage)
+
+        return self.returncode
+
+    def read_output(self):
+        """
+        Read the program's standard output and error to their ends, as
+        ``communicate`` does, but leave the program to be reaped. Streams
+        that are not pipes read as ``None``.
+        """
+        if self.stdin is not None:
+            self.stdin.close()
+
+        output = {}
+
+        def read(name, stream):
+            with stream:
+                output[name] = stream.read()
+
+        # Both pipes are read at once, so that the program cannot block on
+        # a full pipe that is not being read.
+        readers = [
+            threading.Thread(target=read, args=(name, stream), daemon=True)
+            for name, stream in (('stdout', self.stdout), ('stderr', self.stderr))
+            if stream is not None
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+
+        return output.get('stdout'), output.get('stderr')
+
+
+def signal_group(process, signum):
+    """
+    Send a signal to the process group of ``process``, which includes any
+    programs it started itself.
+    """
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signum)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def session_options():
+    """
+    The ``Popen`` options that start a program in a process group of its
+    own, so that it can be stopped along with any programs it starts.
+    """
+    return {'start_new_session': True} if hasattr(os, 'killpg') else {}
+
+
+def cpu_time_limits(limits):
+    """
+    The soft and hard ``RLIMIT_CPU`` limits in whole seconds for the CPU
+    time limit in ``limits``.
+    """
+    soft = int(limits.cpu_time + 0.999)
+    return soft, soft + max(1, int(limits.grace_period))
+
+
+def limit_cpu_time(pid, limits):
+    """
+    Apply the CPU time limit in ``limits`` to the running process ``pid``.
+    The soft limit sends SIGXCPU, which stops the program, and the hard
+    limit kills a program that ignores it.
+    """
+    if limits.cpu_time is None or resource is None or not hasattr(resource, 'prlimit'):
+        return
+
+    try:
+        resource.prlimit(pid, resource.RLIMIT_CPU, cpu_time_limits(limits))
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# The CPU time the kernel reports for a program it killed at the hard limit
+# can fall this many seconds short of the limit.
+CPU_TIME_RESOLUTION = 0.1
+
+
+def ran_out_of_cpu_time(returncode, limits, usage=None):
+    """
+    Whether a program that exited with ``returncode`` was stopped by the
+    CPU time limit in ``limits``: by SIGXCPU at the soft limit, or by
+    SIGKILL once its ``usage`` shows it ran up to the hard limit. A program
+    killed for any other reason, such as by the kernel when memory ran out,
+    was not.
+    """
+    if limits.cpu_time is None or returncode is None or returncode >= 0:
+        return False
+
+    if -returncode == getattr(signal, 'SIGXCPU', None):
+        return True
+
+    if -returncode != getattr(signal, 'SIGKILL', None) or usage is None:
+        return False
+
+    if usage.user_time is None or usage.system_time is None:
+        return False
+
+    _, hard = cpu_time_limits(limits)
+    return usage.user_time + usage.system_time >= hard - CPU_TIME_RESOLUTION
+
+
+def start(args, limits=None, **kwargs):
+    """
+    Start ``args`` in a process group of its own, with its CPU time and
+    threads limited when ``limits`` ask for it, and an ImageMagick program
+    limited to the memory reserved for the current thread. Other keyword
+    arguments go to ``Popen``. While ``set_output`` collects the output of
+    programs, the standard output and error that are not given are written
+    to a log that is shown when the program is reaped.
+    """
+    if limits is None:
+        limits = current_limits()
+
+    kwargs['env'] = limits.environment(kwargs.get('env'))
+    log = None
+    if _output is not None and not ('stdout' in kwargs and 'stderr' in kwargs):
+        log = tempfile.TemporaryFile()
+        kwargs.setdefault('stdout', log)
+        kwargs.setdefault('stderr', log)
+
+    try:
+        process = Process(memory.with_limits(args), **session_options(), **kwargs)
+    except BaseException:
+        if log is not None:
+            log.close()
+        raise
+
+    process.log = log
+    limit_cpu_time(process.pid, limits)
+
+    return process
+
+
+class Watchdog:
+    """
+    The ``Watchdog`` class stops a process group that runs past its wall
+    clock limit, first with SIGTERM and then, after the grace period, with
+    SIGKILL. It is used as a context manager around waiting for a process
+    started with ``start``, and ``check`` reports whether either time limit
+    stopped the process.
+    """
+    def __init__(self, process, limits=None):
+        self.process = process
+        self.limits = limits if limits is not None else current_limits()
+        self.expired = False
+        self.timers = []
+
+    def _start_timer(self, delay, function):
+        timer = threading.Timer(delay, function)
+        timer.daemon = True
+        self.timers.append(timer)
+        timer.start()
+
+    def _signal(self, signum, expire=False):
+        """
+        Send ``signum`` to the process group unless the process has already
+        exited, and return whether it was sent. A process that exits just
+        as its time runs out has finished in time, so it is only marked as
+        ``expire``-d when it is signalled.
+        """
+        with self.process.reap_lock:
+            if self.process.exited():
+                return False
+
+            self.expired = self.expired or expire
+            signal_group(self.process, signum)
+            return True
+
+    def _expire(self):
+        if self._signal(signal.SIGTERM, expire=True):
+            self._start_timer(self.limits.grace_period, self._kill)
+
+    def _kill(self):
+        self._signal(KILL_SIGNAL)
+
+    def __enter__(self):
+        if self.limits.timeout is not None:
+            self._start_timer(self.limits.timeout, self._expire)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for timer in self.timers:
+            timer.cancel()
+
+        if exc_type is not None:
+            # The caller is giving up on the process, for instance after a
+            # keyboard interrupt, so it must not outlive the run.
+            self._signal(KILL_SIGNAL)
+            self.process.reap()
+
+    def check(self):
+        """
+        Raise ``TimeLimitExceeded`` if the process was stopped by one of its
+        time limits.
+        """
+        if self.expired:
+            raise TimeLimitExceeded(self.process.args, self.limits.timeout, 'wall clock')
+
+        if ran_out_of_cpu_time(self.process.returncode, self.limits, self.process.usage):
+            raise TimeLimitExceeded(self.process.args, self.limits.cpu_time, 'CPU time')
+
+
+def run(args, check=True, limits=None, **kwargs):
+    """
+    Run ``args`` to completion like ``subprocess.run``, under ``limits`` or
+    the default limits. A program stopped by a time limit raises
+    ``TimeLimitExceeded``, and with ``check``, any other failure raises
+    ``CalledProcessError``.
+    """
+    with trace.span(os.path.basename(str(args[0])), 'program', args=[str(arg) for arg in args]):
+        process = start(args, limits, **kwargs)
+        with Watchdog(process, limits) as watchdog:
+            stdout, stderr = process.read_output()
+            process.reap()
+
+    watchdog.check()
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
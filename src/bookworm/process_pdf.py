@@ -0,0 +1,280 @@
+import bookworm.abstract       as abstract
+import bookworm.util           as util
+import bookworm.unpack_pdf     as unpack_pdf
+import bookworm.normalize_page as normalize_page
+import bookworm.report         as report
+import bookworm.scheduler      as scheduler
+import bookworm.color_mode     as color_mode
+import bookworm.memory         as memory
+import bookworm.process        as process
+import bookworm.threads        as threads
+import bookworm.trace          as trace
+import concurrent.futures
+import os
+import os.path
+import shutil
+import threading
+
+from bookworm.resolution import Resolution
+
+
+class ProcessPDF(abstract.Command):
+    """
+    Unpack a pdf and normalize its pages in one pipelined pass. Each page is
+    handed to a ``NormalizePage`` action as soon as Ghostscript has finished
+    writing it, so rasterization and ImageMagick work overlap. The unpacked
+    pages are written to the target directory, and the normalized pages to
+    its default subdirectory. The programs of the page actions may use
+    ``threads`` threads each, when given, so that they share the processors
+    with Ghostscript.
+    """
+    def __init__(self, source_pdf, target_dir, shards, jobs=1,
+                 resolution=None, resample=None, dimensions=None, settings=None,
+                 threads=None):
+        self.source_pdf = source_pdf
+        self.target_dir = target_dir
+        self.page_dir = util.temp_directory(target_dir)
+        self.unpack = unpack_pdf.make(source_pdf, target_dir, settings)
+        self.shards = shards
+        self.jobs = jobs
+        self.resolution = resolution
+        self.resample = resample
+        self.dimensions = dimensions
+        self.threads = threads
+
+    @property
+    def pages(self):
+        return [page for shard in self.shards for page in shard.pages]
+
+    def page_action(self, page_file):
+        """
+        The ``NormalizePage`` action for an unpacked page.
+        """
+        return normalize_page.make(
+            page_file,
+            util.target_file_in(self.page_dir, page_file),
+            self.resolution,
+            self.resample,
+            self.dimensions
+        )
+
+    def as_subprocess(self):
+        """
+        The Ghostscript command line of every page range. The page commands
+        are generated as the pages are unpacked.
+        """
+        return [shard.as_subprocess() for shard in self.shards]
+
+    def as_terminal_command(self):
+        return ' & '.join(shard.as_terminal_command() for shard in self.shards)
+
+
+class Runner(abstract.Runner):
+
+    def setup(command):
+        """
+        Prepare an action for execution by setting up folders and I/O.
+        """
+        unpack_pdf.Runner.setup(command.unpack)
+
+    def execute(command):
+        """
+        Render every page range concurrently, and run the page actions in a
+        pool of ``command.jobs`` workers as the pages arrive, as long as
+        their memory fits in the run's budget. The programs run by both
+        pools are charged to the accounts of the calling thread, and the
+        page programs are limited to ``command.threads`` threads. Every page
+        is reported to the observers of the run as it is normalized. A
+        failed page range or page does not stop the others: the pages that
+        were finished are kept, and every page that failed, or that its
+        range did not render, is raised together.
+        """
+        run_report = report.Report()
+        lock = threading.Lock()
+        page_futures = []
+        rendered = set()
+        budget = memory.current_budget()
+        accounts = process.current_accounts()
+        limits = process.current_limits()
+        if command.threads is not None:
+            limits = limits.with_threads(command.threads)
+        report_page = scheduler.page_reporter()
+
+        def run_page(action):
+            with process.charging(accounts), process.limited(limits):
+                with budget.reserved(action):
+                    result = scheduler.run_action(action, normalize_page.Runner)
+
+            if result.succeeded:
+                report_page()
+
+            return result
+
+        def render_shard(shard, on_page):
+            pages = list(shard.pages)
+            with process.charging(accounts), trace.span(
+                    'render', 'pipeline', first_page=pages[0], last_page=pages[-1]):
+                unpack_pdf.ShardRunner.stream(shard, on_page)
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=command.jobs, thread_name_prefix='page') as page_pool:
+
+            def on_page(page_file):
+                trace.instant('rendered', 'pipeline', page=os.path.basename(page_file))
+                action = command.page_action(page_file)
+                future = page_pool.submit(run_page, action)
+                with lock:
+                    rendered.add(page_file)
+                    page_futures.append(future)
+
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=len(command.shards),
+                    thread_name_prefix='render') as render_pool:
+                render_futures = [
+                    render_pool.submit(render_shard, shard, on_page)
+                    for shard in command.shards
+                ]
+                for shard, future in zip(command.shards, render_futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        Runner.report_unrendered(command, shard, rendered, e, run_report)
+
+            for future in page_futures:
+                run_report.add(future.result())
+
+        if run_report.failed:
+            raise RuntimeError(str(run_report))
+
+    def report_unrendered(command, shard, rendered, error, run_report):
+        """
+        Report the pages of a failed page range that were never handed to
+        a page action as failed with the range's ``error``, and remove the
+        pages it left in its shard directory. Its finished pages are left to
+        their page actions.
+        """
+        shutil.rmtree(shard.shard_dir, ignore_errors=True)
+        unrendered = [
+            shard.page_file(page) for page in shard.pages
+            if shard.page_file(page) not in rendered
+        ]
+        for page_file in unrendered:
+            run_report.add(report.ActionResult(
+                command.page_action(page_file), normalize_page.Runner, error
+            ))
+
+        if not unrendered:
+            run_report.add(report.ActionResult(shard, unpack_pdf.ShardRunner, error))
+
+    def cleanup(command):
+        """
+        Remove the shard directories of the page ranges that failed. The
+        pages that were finished, unpacked and normalized, are kept.
+        """
+        for shard in command.shards:
+            shutil.rmtree(shard.shard_dir, ignore_errors=True)
+
+
+def make(source_pdf, target_dir='', shards=1, jobs=1,
+         resolution=None, resample=None, dimensions=None, settings=None,
+         modes=None, threads=None):
+    """
+    The ``make`` factory method constructs a ``ProcessPDF`` action that
+    renders the pdf in ``shards`` page ranges. When the color mode of every
+    page is given in ``modes``, the ranges are also split where it changes.
+    """
+    if resolution is None and resample is None and dimensions is None:
+        raise ValueError(
+            'Process pdf needs at least one of a resolution, '
+            'a resampling resolution, or page dimensions.'
+        )
+
+    if not target_dir:
+        target_dir = util.temp_directory(os.path.dirname(source_pdf))
+
+    if modes is None:
+        modes = [color_mode.COLOR] * unpack_pdf.page_count(source_pdf)
+
+    shard_actions = [
+        unpack_pdf.UnpackPDFShard(
+            source_pdf, target_dir, first_page, last_page,
+            settings=settings, device=color_mode.DEVICES[mode]
+        )
+        for first_page, last_page, mode in unpack_pdf.mode_ranges(modes, shards)
+    ]
+
+    return ProcessPDF(
+        source_pdf, target_dir, shard_actions, jobs,
+        resolution, resample, dimensions, settings, threads
+    )
+
+
+def process_args(arg_dict):
+    """
+    The ``process_args`` factory method parses the command line arguments in
+    ``arg_dict`` and uses them to construct a ``ProcessPDF`` command.
+    """
+    try:
+        input = arg_dict['input']
+    except KeyError as e:
+        raise e
+
+    unit_str = arg_dict.get('units')
+    resolution_val = arg_dict.get('resolution')
+    resample_val = arg_dict.get('resample')
+    dimensions = arg_dict.get('dimensions')
+
+    resolution = None
+    if resolution_val is not None:
+        resolution = Resolution.make(resolution_val, unit_str)
+
+    resample = None
+    if resample_val is not None:
+        resample = Resolution.make(resample_val, unit_str)
+
+    if dimensions == 'auto':
+        raise ValueError(
+            'Process pdf cannot derive page dimensions before the pages '
+            'are unpacked.'
+        )
+
+    if dimensions is not None:
+        width, height = dimensions
+        if width <= 0 or height <= 0:
+            raise ValueError(
+                f'Dimensions must be positive integers: Got {width}x{height}'
+            )
+
+    if not os.path.isfile(input):
+        raise FileNotFoundError(f'File does not exist: {input}')
+
+    output = arg_dict.get('output')
+    if not output:
+        # Derive a default output directory from the input file.
+        output = util.temp_directory(os.path.dirname(input))
+
+    shards = arg_dict.get('shards') or 1
+    jobs = arg_dict.get('jobs') or 1
+
+    # Ghostscript and the page programs run at the same time, so they share
+    # one budget of threads.
+    render_plan, page_plan = threads.pipeline(
+        shards, jobs, render_threads=arg_dict.get('render_threads')
+    )
+
+    return make(
+        input,
+        output,
+        shards,
+        jobs,
+        resolution,
+        resample,
+        dimensions,
+        unpack_pdf.render_settings(
+            dict(arg_dict, render_threads=render_plan.threads), shards
+        ),
+        unpack_pdf.page_modes(
+            input, arg_dict.get('color_mode') or color_mode.COLOR
+        ),
+        page_plan.threads
+    )
@@ -0,0 +1,224 @@
+import bookworm.abstract  as abstract
+import bookworm.process   as process
+import bookworm.scheduler as scheduler
+import collections
+import json
+import sys
+import threading
+import time
+
+
+# Throughput is measured over the pages finished in the last ``WINDOW``
+# seconds, so that the rate and ETA follow a run that speeds up or slows
+# down instead of averaging over all of it.
+WINDOW = 30.0
+
+# How often the progress is shown: redrawn in place on a terminal, or
+# written as a JSON line to a log.
+TERMINAL_INTERVAL = 0.5
+LOG_INTERVAL = 10.0
+
+CLEAR_LINE = '\r\x1b[K'
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--'
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+
+    return f'{minutes:02d}:{seconds:02d}'
+
+
+class Snapshot:
+    """
+    The progress of a run at one moment: the pages finished out of
+    ``total``, how many of them failed, the attempts being retried, the
+    actions running, the pages per second over the recent window and the
+    estimated seconds left, or ``None`` while there is nothing to estimate
+    them from.
+    """
+    def __init__(self, elapsed, done, total, failed, retried, running, rate, eta):
+        self.elapsed = elapsed
+        self.done = done
+        self.total = total
+        self.failed = failed
+        self.retried = retried
+        self.running = running
+        self.rate = rate
+        self.eta = eta
+
+    def as_dict(self):
+        return dict(
+            elapsed = round(self.elapsed, 3),
+            done = self.done,
+            total = self.total,
+            failed = self.failed,
+            retried = self.retried,
+            running = self.running,
+            pages_per_second = None if self.rate is None else round(self.rate, 3),
+            eta = None if self.eta is None else round(self.eta, 1)
+        )
+
+    def __str__(self):
+        percent = 100 * self.done // self.total if self.total else 100
+        width = len(str(self.total))
+        rate = '-' if self.rate is None else f'{self.rate:.2f}'
+        line = (
+            f'[{self.done:>{width}}/{self.total}] {percent:>3}%  '
+            f'{rate} pages/s  ETA {format_duration(self.eta)}  '
+            f'{self.running} running'
+        )
+        if self.failed:
+            line += f'  {self.failed} failed'
+        if self.retried:
+            line += f'  {self.retried} retried'
+
+        return line
+
+
+class Progress(abstract.Observer):
+    """
+    An ``Observer`` that reports the progress of a run to ``stream``. On a
+    terminal the progress line is redrawn in place; otherwise a JSON line is
+    written every ``interval`` seconds, for logs and other programs to read.
+    Notifications only update counters, and a background thread does the
+    drawing, so the workers do not wait on the terminal. The pages of an
+    action that writes several are counted as they finish. While the line is
+    redrawn, the output of the external programs is collected and written
+    above it.
+    """
+    def __init__(self, stream=None, interval=None, window=WINDOW):
+        self.stream = stream if stream is not None else sys.stderr
+        self.terminal = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        if interval is None:
+            interval = TERMINAL_INTERVAL if self.terminal else LOG_INTERVAL
+
+        self.interval = interval
+        self.window = window
+        self.lock = threading.Lock()
+        self.drawing = threading.Lock()
+        self.start = time.monotonic()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.running = 0
+        self.reported = {}
+        self.finish_times = collections.deque()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def scheduled(self, count):
+        with self.lock:
+            self.start = time.monotonic()
+            self.total += count
+
+        if self.thread is None:
+            if self.terminal:
+                process.set_output(self.write)
+            self.thread = threading.Thread(
+                target=self._report, name='progress', daemon=True
+            )
+            self.thread.start()
+
+    def started(self, action):
+        with self.lock:
+            self.running += 1
+
+    def progressed(self, action, pages):
+        now = time.monotonic()
+        with self.lock:
+            self.reported[id(action)] = self.reported.get(id(action), 0) + pages
+            self.done += pages
+            self.finish_times.extend([now] * pages)
+
+    def finished(self, result):
+        total = scheduler.page_total(result.action)
+        now = time.monotonic()
+        with self.lock:
+            pages = max(0, total - self.reported.pop(id(result.action), 0))
+            self.running = max(0, self.running - 1)
+            self.done += pages
+            self.failed += 0 if result.succeeded else 1
+            self.finish_times.extend([now] * pages)
+
+    def retrying(self, result, delay):
+        with self.lock:
+            # The pages the attempt finished are written again by the next.
+            self.done -= self.reported.pop(id(result.action), 0)
+            self.running = max(0, self.running - 1)
+            self.retried += 1
+
+    def closed(self, report):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            if self.terminal:
+                process.set_output(None)
+
+        self._show(final=True)
+
+    def snapshot(self, now=None):
+        """
+        The ``Snapshot`` of the run at time ``now`` of ``time.monotonic``.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            while self.finish_times and self.finish_times[0] < now - self.window:
+                self.finish_times.popleft()
+
+            recent = len(self.finish_times)
+            span = min(self.window, now - self.start)
+            rate = recent / span if recent and span > 0 else None
+            remaining = max(0, self.total - self.done)
+            eta = remaining / rate if rate else (0.0 if not remaining else None)
+
+            return Snapshot(
+                now - self.start, self.done, self.total, self.failed,
+                self.retried, self.running, rate, eta
+            )
+
+    def write(self, text):
+        """
+        Write the output ``text`` of a program on the lines above the
+        progress line, and draw the line again below it.
+        """
+        if not text.endswith('\n'):
+            text += '\n'
+
+        if self.terminal:
+            text = CLEAR_LINE + text + str(self.snapshot())
+
+        self._write(text)
+
+    def _show(self, final=False):
+        snapshot = self.snapshot()
+        if self.terminal:
+            line = CLEAR_LINE + str(snapshot) + ('\n' if final else '')
+        else:
+            line = json.dumps(dict(snapshot.as_dict(), final=final)) + '\n'
+
+        self._write(line)
+
+    def _write(self, text):
+        with self.drawing:
+            try:
+                self.stream.write(text)
+                self.stream.flush()
+            except (OSError, ValueError):
+                # A closed or broken stream must not fail the run.
+                self.stopped.set()
+
+    def _report(self):
+        while not self.stopped.wait(self.interval):
+            self._show()
+
+    def __repr__(self):
+        return f'Progress({self.interval})'
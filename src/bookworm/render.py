@@ -0,0 +1,119 @@
+import os
+
+
+# A page raster larger than this is rendered in bands, so that several
+# threads can work on one page.
+BANDING_THRESHOLD = 8 * 1024 ** 2
+
+# The bounds on the band buffer of each rendering thread.
+MIN_BUFFER_SPACE = 4 * 1024 ** 2
+MAX_BUFFER_SPACE = 256 * 1024 ** 2
+
+
+def cpu_count():
+    """
+    The number of processors this process may run on.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_size():
+    """
+    The physical memory of the host in bytes, or ``None`` if it cannot be
+    determined.
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class RenderSettings:
+    """
+    The ``RenderSettings`` class holds the Ghostscript options that trade
+    memory for rendering speed. A page whose raster is larger than
+    ``max_bitmap`` bytes is rendered in bands of ``band_height`` lines, using
+    ``buffer_space`` bytes per band buffer, and the bands are rasterized by
+    ``threads`` threads. A ``downscale`` factor above one renders the page at
+    that multiple of the resolution and averages it back down, which smooths
+    text and line art at the cost of rendering time.
+    """
+    def __init__(self, threads=1, buffer_space=None, max_bitmap=None,
+                 band_height=None, downscale=1):
+        self.threads = threads
+        self.buffer_space = buffer_space
+        self.max_bitmap = max_bitmap
+        self.band_height = band_height
+        self.downscale = downscale
+
+    def args(self):
+        """
+        The Ghostscript options for these settings. Options left at
+        Ghostscript's defaults are omitted.
+        """
+        args = []
+        if self.threads > 1:
+            args.append(f'-dNumRenderingThreads={self.threads}')
+        if self.buffer_space is not None:
+            args.append(f'-dBufferSpace={self.buffer_space}')
+        if self.max_bitmap is not None:
+            args.append(f'-dMaxBitmap={self.max_bitmap}')
+        if self.band_height is not None:
+            args.append(f'-dBandHeight={self.band_height}')
+        if self.downscale > 1:
+            args.append(f'-dDownScaleFactor={self.downscale}')
+
+        return args
+
+    def __repr__(self):
+        return (
+            f'RenderSettings({self.threads}, {self.buffer_space}, '
+            f'{self.max_bitmap}, {self.band_height}, {self.downscale})'
+        )
+
+
+def make(threads=None, buffer_space=None, max_bitmap=None, band_height=None,
+         downscale=None, processes=1, cpus=None, memory=None):
+    """
+    The ``make`` factory method constructs ``RenderSettings``, filling in the
+    options that are not given from the host. The processors and half of the
+    memory are shared between ``processes`` concurrent Ghostscript processes.
+    With more than one thread per process, large pages are banded so that the
+    threads can share them; with one thread, a page is rendered in memory
+    whenever it fits.
+    """
+    if cpus is None:
+        cpus = cpu_count()
+
+    if memory is None:
+        memory = memory_size()
+
+    processes = max(1, processes)
+    if threads is None:
+        threads = max(1, cpus // processes)
+
+    process_memory = memory // (2 * processes) if memory else None
+
+    if buffer_space is None and process_memory is not None:
+        buffer_space = min(
+            max(process_memory // (4 * threads), MIN_BUFFER_SPACE),
+            MAX_BUFFER_SPACE
+        )
+
+    if max_bitmap is None:
+        if threads > 1:
+            max_bitmap = BANDING_THRESHOLD
+        elif process_memory is not None:
+            max_bitmap = process_memory // 2
+
+    if downscale is None:
+        downscale = 1
+
+    for name, value in (('threads', threads), ('downscale', downscale)):
+        if value <= 0:
+            raise ValueError(f'\'{name}\' must be a positive integer. Got: {value}')
+
+    return RenderSettings(threads, buffer_space, max_bitmap, band_height, downscale)
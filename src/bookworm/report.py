@@ -0,0 +1,48 @@
+class ActionResult:
+    """
+    The ``ActionResult`` class records the outcome of running a single pdf or
+    page action. An action succeeded when no error was recorded for it.
+    """
+    def __init__(self, action, runner, error=None):
+        self.action = action
+        self.runner = runner
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        return f'ActionResult({self.action!r}, {self.runner!r}, {self.error!r})'
+
+
+class Report:
+    """
+    The ``Report`` class collects the results of every action in a run so
+    that the failures from all pages can be reported together at the end.
+    """
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        self.results.append(result)
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.succeeded]
+
+    def __len__(self):
+        return len(self.results)
+
+    def __str__(self):
+        lines = [
+            f'{len(self.succeeded)} of {len(self.results)} actions succeeded.'
+        ]
+        for result in self.failed:
+            lines.append(f'FAILED: {result.action}: {result.error}')
+
+        return '\n'.join(lines)
@@ -1,8 +1,9 @@
 import bookworm.abstract as abstract
 import bookworm.util     as util
+import bookworm.color_mode as color_mode
+import bookworm.process    as process
 import os
 import os.path
-import subprocess
 
 from bookworm.resolution import Resolution
 
@@ -20,6 +21,7 @@ class ResamplePage(abstract.Command):
         self.source_file = source_file
         self.target_file = target_file
         self.target_path = os.path.split(target_file)[0]
+        self.depth_operations = color_mode.depth_operations(source_file)
 
     def as_subprocess(self):
         quoted_source = f'./{self.source_file}'
@@ -31,20 +33,41 @@ class ResamplePage(abstract.Command):
             self.resample,
             self.units_flag,
             self.units,
+            *self.depth_operations,
             quoted_source,
             quoted_target
         ]
 
+    def operations(self):
+        """
+        The ImageMagick options that carry out this action, without the
+        program name or the input and output files. Gray and bilevel pages
+        keep their bit depth.
+        """
+        return self.transform_operations() + self.depth_operations
+
+    def transform_operations(self):
+        """
+        The ImageMagick options that resample the page.
+        """
+        return [
+            self.resample_flag,
+            self.resample,
+            self.units_flag,
+            self.units
+        ]
+
     def as_terminal_command(self):
         quoted_source = util.quoted_string(f'./{self.source_file}')
         quoted_target = util.quoted_string(f'./{self.target_file}')
 
-        return '{} {} {} {} {} {} {}'.format(
+        return '{} {} {} {} {} {}{} {}'.format(
             self.command, 
             self.resample_flag,
             self.resample, 
             self.units_flag,
             self.units, 
+            ''.join(f'{arg} ' for arg in self.depth_operations),
             quoted_source, 
             quoted_target
         )
@@ -57,15 +80,14 @@ class Runner(abstract.Runner):
         Prepare an action for execution by setting up folders and I/O.
         """
         if os.path.isfile(command.source_file):
-            if not os.path.isdir(command.target_path):
-                os.mkdir(command.target_path)
+            util.make_directory(command.target_path)
         else:
             raise FileNotFoundError(
                 f'File does not exist: {command.source_file}'
             )
 
     def execute(command):
-        subprocess.run(command.as_subprocess())
+        process.run(command.as_subprocess())
 
     def cleanup(command):
         return
@@ -88,10 +110,10 @@ def multi_resample_page(resolution, source_path, source_files, target):
     """
     actions = {}
     for source_file in source_files:
-        action = resample_page(
+        action = make(
             resolution,
             os.path.join(source_path, source_file),
-            target
+            util.target_file_in(target, source_file)
         )
         actions[source_file] = action
 
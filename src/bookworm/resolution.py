@@ -27,6 +27,15 @@ class Resolution:
     def unit_str(self):
         return str(self.units)
 
+    def dots_per_inch(self):
+        """
+        The resolution in pixels per inch, whatever its units.
+        """
+        if self.units == ResolutionUnits.PixelsPerCentimeter:
+            return self.value * 2.54
+
+        return self.value
+
     def __repr__(self):
         return f'Resolution({self.value}, {self.units})'
 
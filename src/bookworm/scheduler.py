@@ -0,0 +1,291 @@
+import bookworm.cost    as cost
+import bookworm.memory  as memory
+import bookworm.report  as report
+import bookworm.process as process
+import bookworm.trace   as trace
+import collections
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+
+class Retry:
+    """
+    The ``Retry`` class is the policy for actions that fail because an
+    external program ran out of time: they are run again up to ``retries``
+    times, after a delay that starts at ``backoff`` seconds and doubles with
+    every attempt up to ``max_backoff`` seconds. Other failures are final.
+    """
+    def __init__(self, retries=0, backoff=1.0, max_backoff=30.0):
+        if retries < 0:
+            raise ValueError(f'Retries must not be negative. Got: {retries}')
+
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, result, attempt):
+        return (not result.succeeded and attempt <= self.retries and
+                isinstance(result.error, process.TimeLimitExceeded))
+
+    def delay(self, attempt):
+        """
+        The delay before running an action for the ``attempt + 1``-th time.
+        """
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+    def __repr__(self):
+        return f'Retry({self.retries}, {self.backoff}, {self.max_backoff})'
+
+
+def expand_actions(actions):
+    """
+    Flatten a list of ``(action, runner)`` pairs into one pair per page. A
+    multiple page action is a dictionary from page names to page actions, and
+    it is expanded in page name order.
+    """
+    for action, runner in actions:
+        if isinstance(action, dict):
+            for page in sorted(action):
+                yield (action[page], runner)
+        else:
+            yield (action, runner)
+
+
+def page_total(action):
+    """
+    The number of pages an action writes: the ``pages`` of an action that
+    renders a pdf or a range of its pages, or one. An action whose pages
+    cannot be counted, such as an unpack of a missing pdf, counts as one.
+    """
+    try:
+        pages = getattr(action, 'pages', None)
+    except (OSError, ValueError):
+        return 1
+
+    return len(pages) if pages is not None else 1
+
+
+def count_pages(entries):
+    """
+    The number of pages that the pending ``entries`` report as finished: the
+    pages of every action, where the pages of an action whose runner runs
+    batches are actions of their own.
+    """
+    return sum(
+        len(action.actions) if hasattr(runner, 'run_batch') else page_total(action)
+        for action, runner, *_ in entries
+    )
+
+
+_running = threading.local()
+
+
+@contextlib.contextmanager
+def reporting(action, observers):
+    """
+    Let the runner of ``action`` report its pages to ``observers`` through
+    ``page_reporter`` while the body runs in the current thread.
+    """
+    previous = getattr(_running, 'entry', None)
+    _running.entry = (action, observers)
+    try:
+        yield
+    finally:
+        _running.entry = previous
+
+
+def page_reporter():
+    """
+    A function that tells the observers of the action that the current
+    thread runs that one more of its pages has finished. It may be handed to
+    other threads, and it does nothing outside of a run.
+    """
+    action, observers = getattr(_running, 'entry', None) or (None, ())
+
+    def report_page():
+        for observer in observers:
+            observer.progressed(action, 1)
+
+    return report_page
+
+
+def notify(observers, result, retry=None, attempt=1):
+    """
+    Tell the observers how an attempt at an action ended: ``retrying`` when
+    the ``retry`` policy runs it again, and ``finished`` otherwise. It is
+    called in the thread that ran the attempt.
+    """
+    if retry is not None and retry.should_retry(result, attempt):
+        delay = retry.delay(attempt)
+        for observer in observers:
+            observer.retrying(result, delay)
+    else:
+        for observer in observers:
+            observer.finished(result)
+
+
+def run_action(action, runner, observers=(), retry=None, attempt=1):
+    """
+    Run a single pdf or page action, cleaning up after a failed execution.
+    A failed setup is not cleaned up, since it may have refused to touch an
+    existing target. The outcome is returned as an ``ActionResult`` instead
+    of being raised so that one failing page does not stop the others. When
+    the ``retry`` policy runs this ``attempt`` again, observers are told it
+    is retrying instead of finished. While it executes, the runner may
+    report the pages of the action as they finish through
+    ``page_reporter``.
+    """
+    for observer in observers:
+        observer.started(action)
+
+    try:
+        with trace.action_span(action):
+            with trace.span('setup', 'runner'):
+                runner.setup(action)
+            try:
+                with trace.span('execute', 'runner'), reporting(action, observers):
+                    runner.execute(action)
+            except Exception:
+                with trace.span('cleanup', 'runner'):
+                    runner.cleanup(action)
+                raise
+    except Exception as e:
+        result = report.ActionResult(action, runner, e)
+    else:
+        result = report.ActionResult(action, runner)
+
+    notify(observers, result, retry, attempt)
+
+    return result
+
+
+def run_actions(action, runner, observers=(), retry=None, attempt=1):
+    """
+    Run an action and return the ``ActionResult`` of every page in it. A
+    runner that executes many pages at once, such as a batch runner, reports
+    them through its ``run_batch`` method, and its results are final.
+    """
+    if hasattr(runner, 'run_batch'):
+        return runner.run_batch(action, observers)
+
+    return [run_action(action, runner, observers, retry, attempt)]
+
+
+def run_admitted(amount, action, runner, observers=(), retry=None, attempt=1):
+    """
+    Run an action whose ``amount`` bytes of memory were admitted, limiting
+    its ImageMagick processes to them.
+    """
+    with memory.limited(amount or None):
+        return run_actions(action, runner, observers, retry, attempt)
+
+
+def admit(pending, budget, block=False):
+    """
+    Take the first pending action whose memory fits in ``budget`` off the
+    queue, reserving its memory. With ``block``, wait for the action at the
+    front of the queue to fit when none does. Returns ``None`` when no
+    action was admitted.
+    """
+    for index, entry in enumerate(pending):
+        if budget.try_acquire(entry[3]):
+            del pending[index]
+            return entry
+
+    if not block:
+        return None
+
+    entry = pending.popleft()
+    budget.acquire(entry[3])
+
+    return entry
+
+
+def run_command(actions, jobs=1, observers=(), retry=None, budget=None, model=None):
+    """
+    Run a pdf or page action catching for runtime errors. The page actions
+    run in a pool of ``jobs`` workers. The results and failures from every
+    page are collected into one ``Report``, and every observer is notified
+    as actions start and finish. Actions whose programs ran out of time are
+    run again as the ``retry`` policy allows; while one waits out its delay,
+    the other actions keep running. An action only starts once its
+    estimated memory fits in the ``budget``, which defaults to the run's
+    budget; smaller actions further down the queue may start before it.
+    With more than one job, the actions start in order of their cost under
+    the cost ``model``, costliest first, so that the run does not end with
+    one large page left running on its own.
+    """
+    if retry is None:
+        retry = Retry()
+    if budget is None:
+        budget = memory.current_budget()
+    if model is None:
+        model = cost.current_model()
+
+    jobs = max(1, jobs)
+    entries = [
+        (action, runner, 1, budget.estimate(action))
+        for action, runner in expand_actions(actions)
+    ]
+    if jobs > 1:
+        entries = model.order(entries)
+    pending = collections.deque(entries)
+    for observer in observers:
+        observer.scheduled(count_pages(pending))
+
+    waiting = []
+    order = itertools.count()
+    running = {}
+    run_report = report.Report()
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix='worker') as pool:
+        while pending or waiting or running:
+            now = time.monotonic()
+            while waiting and waiting[0][0] <= now:
+                _, _, entry = heapq.heappop(waiting)
+                pending.append(entry)
+
+            while pending and len(running) < jobs:
+                entry = admit(pending, budget, block=not running)
+                if entry is None:
+                    break
+                action, runner, attempt, amount = entry
+                future = pool.submit(
+                    run_admitted, amount, action, runner, observers, retry, attempt
+                )
+                running[future] = entry
+
+            timeout = max(0.0, waiting[0][0] - now) if waiting else None
+            if not running:
+                time.sleep(timeout)
+                continue
+
+            done, _ = concurrent.futures.wait(
+                running, timeout, concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                action, runner, attempt, amount = running.pop(future)
+                budget.release(amount)
+                for result in future.result():
+                    if result.action is action and retry.should_retry(result, attempt):
+                        delay = retry.delay(attempt)
+                        trace.instant(
+                            'retry', 'scheduler', page=trace.page_name(action),
+                            attempt=attempt, delay=delay
+                        )
+                        heapq.heappush(waiting, (
+                            time.monotonic() + delay, next(order),
+                            (action, runner, attempt + 1, amount)
+                        ))
+                    else:
+                        run_report.add(result)
+
+    for observer in observers:
+        observer.closed(run_report)
+
+    return run_report
@@ -0,0 +1,286 @@
+import bookworm.abstract as abstract
+import bookworm.manifest as manifest
+import bookworm.process  as process
+import bookworm.trace    as trace
+import bookworm.util     as util
+import json
+import os
+import os.path
+import sys
+import threading
+import time
+
+
+def input_files(action):
+    """
+    The files an action reads.
+    """
+    if hasattr(action, 'source_files'):
+        return list(action.source_files)
+
+    for name in ('source_file', 'source_pdf'):
+        if hasattr(action, name):
+            return [getattr(action, name)]
+
+    return []
+
+
+def output_files(action):
+    """
+    The files an action writes, such as every page of an unpacked pdf.
+    """
+    try:
+        return [target_file for target_file, _ in manifest.outputs(action)]
+    except (AttributeError, TypeError):
+        target_pdf = getattr(action, 'target_pdf', None)
+        return [target_pdf] if target_pdf else []
+
+
+def total_size(file_paths):
+    return sum(
+        os.path.getsize(file_path) for file_path in file_paths
+        if os.path.isfile(file_path)
+    )
+
+
+def record(result, start_time, seconds, thread_time, usages, retried=False):
+    """
+    The telemetry record of one attempt at an action: how long it took, the
+    CPU time of the worker thread itself, the CPU time and peak memory of
+    the external programs it ran, the sizes of the files it read and wrote,
+    and every program with its arguments and exit status. The CPU time of a
+    program shared by several actions is split evenly between them.
+    """
+    action = result.action
+    return dict(
+        time = start_time,
+        action = type(action).__name__,
+        page = trace.page_name(action),
+        succeeded = result.succeeded,
+        retried = retried,
+        error = None if result.succeeded else str(result.error),
+        seconds = seconds,
+        thread_time = thread_time,
+        user_time = sum(
+            usage.user_time / usage.shared_by for usage in usages
+            if usage.user_time is not None
+        ),
+        system_time = sum(
+            usage.system_time / usage.shared_by for usage in usages
+            if usage.system_time is not None
+        ),
+        peak_rss = max(
+            (usage.peak_rss for usage in usages if usage.peak_rss is not None),
+            default=None
+        ),
+        bytes_read = total_size(input_files(action)),
+        bytes_written = total_size(output_files(action)),
+        children = [usage.as_dict() for usage in usages]
+    )
+
+
+class Telemetry(abstract.Observer):
+    """
+    An ``Observer`` that appends a JSON lines record of every action, and
+    of every attempt that is retried, to the file ``path``. Each record is
+    written as soon as its action finishes, so the file can be followed
+    during a run and keeps the finished actions of a run that is killed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.running = {}
+        self.handle = None
+
+    def started(self, action):
+        account = process.open_account()
+        with self.lock:
+            self.running[id(action)] = (
+                time.time(), time.monotonic(), time.thread_time(), account
+            )
+
+    def _write(self, result, retried=False):
+        with self.lock:
+            entry = self.running.pop(id(result.action), None)
+        if entry is None:
+            return
+
+        start_time, start, start_thread_time, account = entry
+        process.close_account(account)
+        line = json.dumps(record(
+            result, start_time, time.monotonic() - start,
+            time.thread_time() - start_thread_time, account, retried
+        ))
+
+        with self.lock:
+            if self.handle is None:
+                util.make_directory(os.path.dirname(os.path.abspath(self.path)))
+                self.handle = open(self.path, 'a')
+            self.handle.write(line + '\n')
+            self.handle.flush()
+
+    def finished(self, result):
+        self._write(result)
+
+    def retrying(self, result, delay):
+        self._write(result, retried=True)
+
+    def closed(self, report):
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+
+    def __repr__(self):
+        return f'Telemetry({self.path!r})'
+
+
+def read_records(file_path):
+    """
+    Read the records of a telemetry file. A line cut short by a crash is
+    skipped.
+    """
+    records = []
+    with open(file_path) as handle:
+        for line in handle:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return records
+
+
+def summarize(records, key):
+    """
+    Total the records that share the same ``key``, such as ``action`` or
+    ``page``: the number of attempts and failures, and the wall clock, CPU
+    time, peak memory and bytes of every attempt. Groups are ordered by CPU
+    time, in bookworm's worker threads and in the programs they ran, most
+    first.
+    """
+    fields = (
+        'seconds', 'thread_time', 'user_time', 'system_time', 'bytes_read',
+        'bytes_written'
+    )
+    groups = {}
+    for entry in records:
+        group = groups.setdefault(entry[key], dict(
+            dict.fromkeys(fields, 0), name=entry[key], runs=0, failed=0, peak_rss=0
+        ))
+        group['runs'] += 1
+        group['failed'] += 0 if entry['succeeded'] else 1
+        for field in fields:
+            group[field] += entry.get(field) or 0
+        group['peak_rss'] = max(group['peak_rss'], entry.get('peak_rss') or 0)
+
+    return sorted(
+        groups.values(),
+        key=lambda group: group['thread_time'] + group['user_time'] + group['system_time'],
+        reverse=True
+    )
+
+
+def format_size(size):
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+
+    return f'{size:.1f}T'
+
+
+def format_table(title, groups):
+    lines = [
+        title,
+        f'{"NAME":<32} {"RUNS":>6} {"FAILED":>6} {"WALL s":>10} {"THREAD s":>10} '
+        f'{"USER s":>10} {"SYS s":>10} {"PEAK RSS":>9} {"READ":>9} {"WRITTEN":>9}'
+    ]
+    for group in groups:
+        lines.append(
+            f'{group["name"][:32]:<32} {group["runs"]:>6} {group["failed"]:>6} '
+            f'{group["seconds"]:>10.2f} {group["thread_time"]:>10.2f} '
+            f'{group["user_time"]:>10.2f} {group["system_time"]:>10.2f} '
+            f'{format_size(group["peak_rss"]):>9} '
+            f'{format_size(group["bytes_read"]):>9} {format_size(group["bytes_written"]):>9}'
+        )
+
+    return '\n'.join(lines)
+
+
+def format_summary(records, top=10):
+    """
+    The summary of a telemetry file per kind of action, and for the ``top``
+    pages that used the most CPU time.
+    """
+    pages = summarize(records, 'page')
+    return '\n\n'.join([
+        format_table('Per action:', summarize(records, 'action')),
+        format_table(f'Per page (top {min(top, len(pages))} of {len(pages)} by CPU time):', pages[:top])
+    ])
+
+
+class Stats(abstract.Command):
+    """
+    Summarize a telemetry file per kind of action and per page.
+    """
+    def __init__(self, source_file, top=10):
+        self.command = sys.executable
+        self.source_file = source_file
+        self.top = top
+
+    def as_subprocess(self):
+        return [self.command, '-m', 'bookworm.telemetry', self.source_file, str(self.top)]
+
+    def as_terminal_command(self):
+        return ' '.join(
+            util.quoted_string(arg) for arg in self.as_subprocess()
+        )
+
+
+class Runner(abstract.Runner):
+
+    def setup(command):
+        if not os.path.isfile(command.source_file):
+            raise FileNotFoundError(f'File does not exist: {command.source_file}')
+
+    def execute(command):
+        print(format_summary(read_records(command.source_file), command.top))
+
+    def cleanup(command):
+        return
+
+
+def make(source_file, top=10):
+    """
+    The ``make`` factory method that generates a ``Stats`` command.
+    """
+    if top <= 0:
+        raise ValueError(f'The number of pages must be positive. Got: {top}')
+
+    return Stats(source_file, top)
+
+
+def process_args(arg_dict):
+    """
+    The ``process_args`` factory method parses the command line arguments in
+    ``arg_dict`` and uses them to construct a ``Stats`` command.
+    """
+    input = arg_dict['input']
+    if not os.path.isfile(input):
+        raise FileNotFoundError(f'File does not exist: {input}')
+
+    return make(input, arg_dict.get('top') or 10)
+
+
+def main(argv=sys.argv):
+    """
+    Summarize a telemetry file from the command line: the file, then the
+    number of pages to show.
+    """
+    top = int(argv[2]) if len(argv) > 2 else 10
+    print(format_summary(read_records(argv[1]), top))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import bookworm.pdf    as pdf
+import bookworm.render as render
+import bookworm.tiff   as tiff
+import os
+import os.path
+
+
+# ImageMagick's OpenMP loops only pay for their threads on pages with at
+# least this many pixels per thread; smaller pages are better spread over
+# more processes.
+PIXELS_PER_THREAD = 8 * 1024 ** 2
+
+
+class ThreadPlan:
+    """
+    The ``ThreadPlan`` class splits the processors of a run between
+    ``workers`` concurrent page actions and the ``threads`` that each of
+    their programs may use, so that together they do not use more threads
+    than there are processors.
+    """
+    def __init__(self, workers, threads):
+        for name, value in (('workers', workers), ('threads', threads)):
+            if value <= 0:
+                raise ValueError(f'\'{name}\' must be a positive integer. Got: {value}')
+
+        self.workers = workers
+        self.threads = threads
+
+    def __repr__(self):
+        return f'ThreadPlan({self.workers}, {self.threads})'
+
+
+def split(cpus, pixels=None, tasks=None):
+    """
+    Split ``cpus`` processors between workers and threads for pages of about
+    ``pixels`` pixels. A large page gets a thread for every
+    ``PIXELS_PER_THREAD`` pixels, and the remaining processors run more pages
+    at once. There are never more workers than ``tasks``, and processors
+    left over by fewer tasks become threads. Pages of unknown size get one
+    thread each.
+    """
+    threads = 1
+    if pixels:
+        threads = min(cpus, max(1, pixels // PIXELS_PER_THREAD))
+
+    workers = max(1, cpus // threads)
+    if tasks:
+        workers = min(workers, tasks)
+        threads = max(threads, cpus // workers)
+
+    return ThreadPlan(workers, threads)
+
+
+def make(jobs=None, cpus=None, pixels=None, tasks=None):
+    """
+    The ``make`` factory method constructs a ``ThreadPlan``. With a number of
+    ``jobs``, the processors are shared evenly between them; otherwise the
+    split is chosen from the page size in ``pixels`` and the number of
+    ``tasks``.
+    """
+    if cpus is None:
+        cpus = render.cpu_count()
+
+    if jobs is not None:
+        return ThreadPlan(jobs, max(1, cpus // jobs))
+
+    return split(cpus, pixels, tasks)
+
+
+def pipeline(shards, jobs, cpus=None, render_threads=None):
+    """
+    Split ``cpus`` processors between the ``shards`` Ghostscript processes
+    and the ``jobs`` page workers of a pipeline, which run at the same time,
+    in proportion to their number. Returns a ``ThreadPlan`` for each of the
+    two pools. Ghostscript processes given ``render_threads`` keep them,
+    and the page workers share the processors left.
+    """
+    if cpus is None:
+        cpus = render.cpu_count()
+
+    if render_threads is None:
+        render_threads = max(1, cpus * shards // (shards + jobs) // shards)
+
+    page_threads = max(1, (cpus - shards * render_threads) // jobs)
+
+    return ThreadPlan(shards, render_threads), ThreadPlan(jobs, page_threads)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def pdf_pixels(source_pdf, dots_per_inch):
+    """
+    The median number of pixels of the pages of a pdf rendered at
+    ``dots_per_inch``, and the number of pages.
+    """
+    with pdf.Document(source_pdf) as document:
+        sizes = []
+        for page in document.pages():
+            box = [float(value) for value in page.media_box]
+            width = abs(box[2] - box[0]) / 72 * dots_per_inch
+            height = abs(box[3] - box[1]) / 72 * dots_per_inch
+            sizes.append(int(width * height))
+
+    return median(sizes), len(sizes)
+
+
+def input_pixels(input, dots_per_inch=300):
+    """
+    The median number of pixels of the pages of ``input``, a pdf, a TIFF page
+    or a directory of TIFF pages, and the number of pages. Inputs that cannot
+    be read give ``(None, None)``, and leave the split to the defaults.
+    """
+    try:
+        if os.path.isdir(input):
+            file_paths = [
+                os.path.join(input, file) for file in os.listdir(input)
+                if file.endswith('.tiff')
+            ]
+            headers = tiff.read_headers(file_paths).values()
+            pixels = [header.width * header.height for header in headers]
+            return median(pixels), len(file_paths)
+
+        if input.lower().endswith('.pdf'):
+            return pdf_pixels(input, dots_per_inch)
+
+        header = tiff.read_header(input)
+        return header.width * header.height, 1
+    except (OSError, ValueError, TypeError, IndexError):
+        return None, None
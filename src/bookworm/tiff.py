@@ -0,0 +1,467 @@
+import concurrent.futures
+import fractions
+import os
+import struct
+
+from bookworm.resolution import ResolutionUnits
+
+
+class TIFFError(ValueError):
+    """
+    The ``TIFFError`` exception is raised for files that bookworm cannot read
+    or patch as TIFF files. Callers fall back to ImageMagick when they see it.
+    """
+    pass
+
+
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_FILL_ORDER = 266
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_X_RESOLUTION = 282
+TAG_Y_RESOLUTION = 283
+TAG_PLANAR_CONFIGURATION = 284
+TAG_T6_OPTIONS = 293
+TAG_RESOLUTION_UNIT = 296
+TAG_PREDICTOR = 317
+TAG_TILE_WIDTH = 322
+TAG_EXTRA_SAMPLES = 338
+TAG_JPEG_TABLES = 347
+TAG_YCBCR_SUBSAMPLING = 530
+
+TYPE_BYTE = 1
+TYPE_SHORT = 3
+TYPE_LONG = 4
+TYPE_RATIONAL = 5
+TYPE_UNDEFINED = 7
+
+# The size in bytes of one value of each TIFF field type.
+TYPE_SIZES = {
+    1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8,
+}
+
+# The TIFF ResolutionUnit value for each bookworm resolution unit.
+RESOLUTION_UNITS = {
+    ResolutionUnits.PixelsPerInch: 2,
+    ResolutionUnits.PixelsPerCentimeter: 3,
+}
+
+
+class Entry:
+    """
+    A single twelve byte entry in an image file directory. ``position`` is
+    the file offset of the entry itself.
+    """
+    def __init__(self, tag, type, count, raw, position):
+        self.tag = tag
+        self.type = type
+        self.count = count
+        self.raw = raw
+        self.position = position
+
+    @property
+    def size(self):
+        return TYPE_SIZES.get(self.type, 0) * self.count
+
+    @property
+    def value_position(self):
+        """
+        The file offset of the entry's four byte value field.
+        """
+        return self.position + 8
+
+
+class IFD:
+    """
+    An image file directory. ``pointer_position`` is the file offset of the
+    four byte pointer that refers to this directory, either in the header or
+    at the end of the previous directory. ``next_pointer_position`` is the
+    file offset of this directory's own pointer to the next one.
+    """
+    def __init__(self, offset, entries, next_offset, pointer_position, next_pointer_position):
+        self.offset = offset
+        self.entries = entries
+        self.next_offset = next_offset
+        self.pointer_position = pointer_position
+        self.next_pointer_position = next_pointer_position
+
+
+class Header:
+    """
+    The properties of the first image in a TIFF file that can be read from
+    its image file directory without decoding any pixels. Resolutions are
+    ``None`` when the file does not record them.
+    """
+    def __init__(self, width, height, bits_per_sample, samples_per_pixel,
+                 compression, photometric, x_resolution, y_resolution,
+                 resolution_unit):
+        self.width = width
+        self.height = height
+        self.bits_per_sample = bits_per_sample
+        self.samples_per_pixel = samples_per_pixel
+        self.compression = compression
+        self.photometric = photometric
+        self.x_resolution = x_resolution
+        self.y_resolution = y_resolution
+        self.resolution_unit = resolution_unit
+
+    @property
+    def bit_depth(self):
+        """
+        The number of bits per pixel summed over every sample.
+        """
+        return sum(self.bits_per_sample)
+
+    def __repr__(self):
+        return (
+            f'Header({self.width}x{self.height}, '
+            f'bits_per_sample={self.bits_per_sample}, '
+            f'compression={self.compression}, '
+            f'resolution={self.x_resolution}x{self.y_resolution})'
+        )
+
+
+def read_byte_order(handle):
+    """
+    Read the TIFF header, returning the ``struct`` byte order prefix and the
+    offset of the first image file directory.
+    """
+    handle.seek(0)
+    header = handle.read(8)
+    if len(header) < 8:
+        raise TIFFError('File is too short to be a TIFF file.')
+
+    if header[:2] == b'II':
+        order = '<'
+    elif header[:2] == b'MM':
+        order = '>'
+    else:
+        raise TIFFError('File does not have a TIFF byte order mark.')
+
+    magic, first_offset = struct.unpack(order + 'HI', header[2:])
+    if magic == 43:
+        raise TIFFError('BigTIFF files are not supported.')
+    elif magic != 42:
+        raise TIFFError(f'Invalid TIFF magic number: {magic}')
+
+    return order, first_offset
+
+
+def read_ifds(handle, order, first_offset):
+    """
+    Walk the chain of image file directories starting at ``first_offset``.
+    """
+    file_size = handle.seek(0, os.SEEK_END)
+    ifds = []
+    visited = set()
+    offset = first_offset
+    pointer_position = 4
+    while offset != 0:
+        if offset in visited or offset + 2 > file_size:
+            raise TIFFError(f'Invalid image file directory offset: {offset}')
+        visited.add(offset)
+
+        handle.seek(offset)
+        (count,) = struct.unpack(order + 'H', handle.read(2))
+        data = handle.read(12 * count + 4)
+        if len(data) < 12 * count + 4:
+            raise TIFFError('Truncated image file directory.')
+
+        entries = {}
+        for i in range(count):
+            raw = data[12 * i:12 * (i + 1)]
+            tag, type, value_count = struct.unpack(order + 'HHI', raw[:8])
+            entries[tag] = Entry(tag, type, value_count, raw, offset + 2 + 12 * i)
+
+        (next_offset,) = struct.unpack(order + 'I', data[12 * count:])
+        next_pointer_position = offset + 2 + 12 * count
+        ifds.append(IFD(
+            offset, entries, next_offset, pointer_position, next_pointer_position
+        ))
+
+        pointer_position = next_pointer_position
+        offset = next_offset
+
+    return ifds
+
+
+def read_values(handle, order, entry):
+    """
+    Read the values of an integer or rational entry. Rationals are returned
+    as ``(numerator, denominator)`` pairs.
+    """
+    formats = {1: 'B', 3: 'H', 4: 'I', 5: 'II', 6: 'b', 7: 'B', 8: 'h', 9: 'i', 10: 'ii'}
+    try:
+        format = formats[entry.type]
+    except KeyError:
+        raise TIFFError(f'Unsupported field type {entry.type} for tag {entry.tag}')
+
+    if entry.size <= 4:
+        data = entry.raw[8:8 + entry.size]
+    else:
+        (offset,) = struct.unpack(order + 'I', entry.raw[8:])
+        handle.seek(offset)
+        data = handle.read(entry.size)
+        if len(data) < entry.size:
+            raise TIFFError(f'Truncated value for tag {entry.tag}')
+
+    values = struct.unpack(order + format * entry.count, data)
+    if entry.type in (5, 10):
+        return tuple(zip(values[0::2], values[1::2]))
+
+    return values
+
+
+def read_header(file_path):
+    """
+    Read the ``Header`` of the first image in the TIFF file ``file_path``.
+    Only the header and the first image file directory are read.
+    """
+    with open(file_path, 'rb') as handle:
+        order, first_offset = read_byte_order(handle)
+        ifds = read_ifds(handle, order, first_offset)
+        if not ifds:
+            raise TIFFError(f'TIFF file has no images: {file_path}')
+
+        entries = ifds[0].entries
+
+        def values(tag, default=None):
+            if tag not in entries:
+                return default
+            return read_values(handle, order, entries[tag])
+
+        def resolution(tag):
+            rationals = values(tag)
+            if not rationals or rationals[0][1] == 0:
+                return None
+            numerator, denominator = rationals[0]
+            return numerator / denominator
+
+        try:
+            width = values(TAG_IMAGE_WIDTH)[0]
+            height = values(TAG_IMAGE_LENGTH)[0]
+        except TypeError:
+            raise TIFFError(f'TIFF file has no image dimensions: {file_path}')
+
+        samples_per_pixel = values(TAG_SAMPLES_PER_PIXEL, (1,))[0]
+
+        return Header(
+            width = width,
+            height = height,
+            bits_per_sample = values(TAG_BITS_PER_SAMPLE, (1,) * samples_per_pixel),
+            samples_per_pixel = samples_per_pixel,
+            compression = values(TAG_COMPRESSION, (1,))[0],
+            photometric = values(TAG_PHOTOMETRIC, (None,))[0],
+            x_resolution = resolution(TAG_X_RESOLUTION),
+            y_resolution = resolution(TAG_Y_RESOLUTION),
+            resolution_unit = values(TAG_RESOLUTION_UNIT, (2,))[0]
+        )
+
+
+def read_tags(file_path):
+    """
+    Read the integer, byte and rational valued tags of the first image in the
+    TIFF file ``file_path``, returning a dictionary from tag to its values.
+    Tags of other types, such as text, are left out.
+    """
+    with open(file_path, 'rb') as handle:
+        order, first_offset = read_byte_order(handle)
+        ifds = read_ifds(handle, order, first_offset)
+        if not ifds:
+            raise TIFFError(f'TIFF file has no images: {file_path}')
+
+        tags = {}
+        for tag, entry in ifds[0].entries.items():
+            try:
+                tags[tag] = read_values(handle, order, entry)
+            except TIFFError:
+                continue
+
+        return tags
+
+
+def read_headers(file_paths, jobs=None):
+    """
+    Read the headers of many TIFF files concurrently, returning a dictionary
+    from file path to ``Header``. ``jobs`` bounds the number of files read at
+    once, and defaults to the executor's own choice.
+    """
+    file_paths = list(file_paths)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        headers = pool.map(read_header, file_paths)
+        return dict(zip(file_paths, headers))
+
+
+def max_dimensions(headers):
+    """
+    The smallest page dimensions that contain every page in ``headers``.
+    """
+    if not headers:
+        raise ValueError('Cannot compute dimensions of an empty set of pages.')
+
+    width = max(header.width for header in headers)
+    height = max(header.height for header in headers)
+
+    return (width, height)
+
+
+def write_image(file_path, width, height, bits_per_sample, photometric,
+                compression, strip, resolution=None, tags=()):
+    """
+    Write a TIFF file holding one image stored as a single strip. ``strip``
+    is the image data already encoded with ``compression``, so compressed
+    image data can be moved into a TIFF file without decoding it. The
+    ``resolution`` is a pair of pixels per inch, and ``tags`` holds extra
+    ``(tag, type, values)`` entries.
+    """
+    entries = {
+        TAG_IMAGE_WIDTH: (TYPE_LONG, [width]),
+        TAG_IMAGE_LENGTH: (TYPE_LONG, [height]),
+        TAG_BITS_PER_SAMPLE: (TYPE_SHORT, list(bits_per_sample)),
+        TAG_COMPRESSION: (TYPE_SHORT, [compression]),
+        TAG_PHOTOMETRIC: (TYPE_SHORT, [photometric]),
+        TAG_STRIP_OFFSETS: (TYPE_LONG, [8]),
+        TAG_SAMPLES_PER_PIXEL: (TYPE_SHORT, [len(bits_per_sample)]),
+        TAG_ROWS_PER_STRIP: (TYPE_LONG, [height]),
+        TAG_STRIP_BYTE_COUNTS: (TYPE_LONG, [len(strip)]),
+        TAG_PLANAR_CONFIGURATION: (TYPE_SHORT, [1]),
+    }
+    if resolution is not None:
+        for tag, value in zip((TAG_X_RESOLUTION, TAG_Y_RESOLUTION), resolution):
+            rational = fractions.Fraction(value).limit_denominator(10000)
+            entries[tag] = (TYPE_RATIONAL, [(rational.numerator, rational.denominator)])
+        entries[TAG_RESOLUTION_UNIT] = (TYPE_SHORT, [RESOLUTION_UNITS[ResolutionUnits.PixelsPerInch]])
+
+    for tag, type, values in tags:
+        entries[tag] = (type, list(values))
+
+    ifd_offset = 8 + len(strip) + len(strip) % 2
+    data_offset = ifd_offset + 2 + 12 * len(entries) + 4
+    directory = struct.pack('<H', len(entries))
+    data = b''
+    for tag in sorted(entries):
+        type, values = entries[tag]
+        if type == TYPE_RATIONAL:
+            payload = b''.join(struct.pack('<II', *value) for value in values)
+        else:
+            code = {TYPE_BYTE: 'B', TYPE_SHORT: 'H', TYPE_UNDEFINED: 'B'}.get(type, 'I')
+            payload = struct.pack('<' + code * len(values), *values)
+
+        if len(payload) <= 4:
+            field = payload.ljust(4, b'\0')
+        else:
+            field = struct.pack('<I', data_offset + len(data))
+            data += payload + b'\0' * (len(payload) % 2)
+        directory += struct.pack('<HHI', tag, type, len(values)) + field
+    directory += struct.pack('<I', 0)
+
+    with open(file_path, 'wb') as handle:
+        handle.write(b'II' + struct.pack('<HI', 42, ifd_offset))
+        handle.write(strip)
+        handle.write(b'\0' * (len(strip) % 2))
+        handle.write(directory)
+        handle.write(data)
+
+
+def _resolution_entries(order, resolution, data_offset):
+    """
+    Build the raw entries and external rational data that record
+    ``resolution``, with the rationals stored from ``data_offset``.
+    """
+    unit = RESOLUTION_UNITS[resolution.units]
+    rational = struct.pack(order + 'II', resolution.value, 1)
+    entries = {
+        TAG_X_RESOLUTION: struct.pack(
+            order + 'HHII', TAG_X_RESOLUTION, TYPE_RATIONAL, 1, data_offset
+        ),
+        TAG_Y_RESOLUTION: struct.pack(
+            order + 'HHII', TAG_Y_RESOLUTION, TYPE_RATIONAL, 1, data_offset + 8
+        ),
+        TAG_RESOLUTION_UNIT: struct.pack(
+            order + 'HHIHH', TAG_RESOLUTION_UNIT, TYPE_SHORT, 1, unit, 0
+        ),
+    }
+
+    return entries, rational + rational
+
+
+def _can_patch_in_place(ifd):
+    for tag in (TAG_X_RESOLUTION, TAG_Y_RESOLUTION):
+        entry = ifd.entries.get(tag)
+        if entry is None or entry.type != TYPE_RATIONAL or entry.count != 1:
+            return False
+
+    entry = ifd.entries.get(TAG_RESOLUTION_UNIT)
+    return entry is not None and entry.type == TYPE_SHORT and entry.count == 1
+
+
+def _patch_in_place(handle, order, ifd, resolution):
+    unit = RESOLUTION_UNITS[resolution.units]
+    rational = struct.pack(order + 'II', resolution.value, 1)
+    for tag in (TAG_X_RESOLUTION, TAG_Y_RESOLUTION):
+        (offset,) = struct.unpack(order + 'I', ifd.entries[tag].raw[8:])
+        handle.seek(offset)
+        handle.write(rational)
+
+    handle.seek(ifd.entries[TAG_RESOLUTION_UNIT].value_position)
+    handle.write(struct.pack(order + 'H', unit))
+
+
+def _append_ifd(handle, order, ifd, resolution):
+    """
+    Write a copy of ``ifd`` with the resolution entries added at the end of
+    the file, and point the previous directory at the copy. Entries that
+    refer to data elsewhere in the file remain valid since nothing moves.
+    """
+    # A later directory may already have been moved, so the pointer to the
+    # next directory is read from the file rather than from ``ifd``.
+    handle.seek(ifd.next_pointer_position)
+    (next_offset,) = struct.unpack(order + 'I', handle.read(4))
+
+    end = handle.seek(0, os.SEEK_END)
+    new_offset = end + (end % 2)
+    entries = {tag: entry.raw for tag, entry in ifd.entries.items()}
+    count = len(set(entries) | {
+        TAG_X_RESOLUTION, TAG_Y_RESOLUTION, TAG_RESOLUTION_UNIT
+    })
+    data_offset = new_offset + 2 + 12 * count + 4
+    resolution_entries, data = _resolution_entries(order, resolution, data_offset)
+    entries.update(resolution_entries)
+
+    block = struct.pack(order + 'H', count)
+    for tag in sorted(entries):
+        block += entries[tag]
+    block += struct.pack(order + 'I', next_offset) + data
+
+    handle.seek(end)
+    handle.write(b'\0' * (new_offset - end) + block)
+    handle.seek(ifd.pointer_position)
+    handle.write(struct.pack(order + 'I', new_offset))
+
+
+def set_resolution(file_path, resolution):
+    """
+    Rewrite the XResolution, YResolution and ResolutionUnit tags of every
+    image in the TIFF file ``file_path`` without decoding any pixels. Tags
+    that are present are overwritten in place. Otherwise a new directory
+    with the tags added is appended to the file.
+    """
+    with open(file_path, 'r+b') as handle:
+        order, first_offset = read_byte_order(handle)
+        ifds = read_ifds(handle, order, first_offset)
+        if not ifds:
+            raise TIFFError(f'TIFF file has no images: {file_path}')
+
+        # Directories are appended last to first so that each one is linked
+        # from the directory before it, which has not been moved yet.
+        for ifd in reversed(ifds):
+            if _can_patch_in_place(ifd):
+                _patch_in_place(handle, order, ifd, resolution)
+            else:
+                _append_ifd(handle, order, ifd, resolution)
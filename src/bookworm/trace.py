@@ -0,0 +1,180 @@
+import bookworm.util as util
+import contextlib
+import json
+import os
+import os.path
+import threading
+import time
+
+
+class Tracer:
+    """
+    The ``Tracer`` class collects the spans of a run as Chrome trace events,
+    the JSON format that ``chrome://tracing`` and Perfetto open. Every thread
+    that records a span gets a lane of its own, so idle workers, stragglers
+    and slow programs show up side by side on one timeline.
+    """
+    def __init__(self, name='bookworm'):
+        self.name = name
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.lanes = {}
+        self.events = []
+
+    def timestamp(self, seconds=None):
+        """
+        The time ``seconds`` of ``time.perf_counter``, or now, in
+        microseconds since the tracer was created.
+        """
+        if seconds is None:
+            seconds = time.perf_counter()
+
+        return (seconds - self.origin) * 1e6
+
+    def _lane(self):
+        thread = threading.current_thread()
+        with self.lock:
+            if thread.ident not in self.lanes:
+                self.lanes[thread.ident] = (len(self.lanes), thread.name)
+
+            return self.lanes[thread.ident][0]
+
+    def complete(self, name, category, start, end, args=None):
+        """
+        Record a span of the current thread from ``start`` to ``end``, both
+        times of ``time.perf_counter``.
+        """
+        event = dict(
+            name = name,
+            cat = category,
+            ph = 'X',
+            pid = self.pid,
+            tid = self._lane(),
+            ts = self.timestamp(start),
+            dur = (end - start) * 1e6,
+        )
+        if args:
+            event['args'] = args
+
+        with self.lock:
+            self.events.append(event)
+
+    def instant(self, name, category, args=None):
+        """
+        Record a moment in the current thread, such as an action being
+        scheduled for a retry.
+        """
+        event = dict(
+            name = name,
+            cat = category,
+            ph = 'i',
+            s = 't',
+            pid = self.pid,
+            tid = self._lane(),
+            ts = self.timestamp(),
+        )
+        if args:
+            event['args'] = args
+
+        with self.lock:
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, category, args=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, time.perf_counter(), args)
+
+    def trace_events(self):
+        """
+        The recorded events, after the metadata events that name the process
+        and each of its lanes.
+        """
+        with self.lock:
+            metadata = [dict(
+                name='process_name', ph='M', pid=self.pid, tid=0,
+                args=dict(name=self.name)
+            )]
+            for lane, thread_name in self.lanes.values():
+                metadata.append(dict(
+                    name='thread_name', ph='M', pid=self.pid, tid=lane,
+                    args=dict(name=thread_name)
+                ))
+                metadata.append(dict(
+                    name='thread_sort_index', ph='M', pid=self.pid, tid=lane,
+                    args=dict(sort_index=lane)
+                ))
+
+            return metadata + sorted(self.events, key=lambda event: event['ts'])
+
+    def write(self, file_path):
+        util.make_directory(os.path.dirname(os.path.abspath(file_path)))
+        with open(file_path, 'w') as handle:
+            json.dump(
+                dict(traceEvents=self.trace_events(), displayTimeUnit='ms'),
+                handle
+            )
+
+    def __repr__(self):
+        return f'Tracer({self.name!r})'
+
+
+# The tracer of the run, or ``None`` when no trace was asked for, in which
+# case spans cost next to nothing.
+_tracer = None
+
+
+def set_tracer(tracer):
+    """
+    Set the tracer that every thread of the run records its spans to.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def current_tracer():
+    return _tracer
+
+
+def span(name, category='bookworm', **args):
+    """
+    A context manager that records the code it wraps as a span of the
+    current thread, with ``args`` shown alongside it in the trace viewer.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return contextlib.nullcontext()
+
+    return tracer.span(name, category, args)
+
+
+def instant(name, category='bookworm', **args):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.instant(name, category, args)
+
+
+def page_name(action):
+    """
+    The name a page or pdf action is reported under: the file it writes, or
+    the directory it writes its pages to.
+    """
+    for name in ('target_file', 'target_pdf', 'target_dir'):
+        if getattr(action, name, None):
+            return os.path.basename(os.path.normpath(getattr(action, name)))
+
+    return repr(action)
+
+
+def action_span(action):
+    """
+    A span named after the page of ``action``, that the spans of its
+    runner's ``setup``, ``execute`` and ``cleanup`` nest in.
+    """
+    if _tracer is None:
+        return contextlib.nullcontext()
+
+    return span(page_name(action), 'action', action=type(action).__name__)
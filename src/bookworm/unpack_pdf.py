@@ -1,22 +1,73 @@
 import bookworm.abstract as abstract
 import bookworm.util     as util
+import bookworm.render   as render
+import bookworm.color_mode as color_mode
+import bookworm.passthrough as passthrough
+import bookworm.pdf      as pdf
+import bookworm.process  as process
+import bookworm.scheduler as scheduler
 import subprocess
+import os
 import os.path
+import re
+import shutil
+import sys
+import time
+
+from bookworm.resolution import Resolution, ResolutionUnits
+
+
+# Ghostscript numbers the pages it writes from one in every run.
+PAGE_FILE_FORMAT = '_Page_%04d.tiff'
 
 
 class UnpackPDF(abstract.Command):
     """
     Unpack a pdf into a collection of TIFF files inside a target directory.
+    The Ghostscript tuning options in ``settings`` are passed along when
+    given. With supersampling, the pages are rendered at a multiple of the
+    resolution and downscaled to it. The pages are rendered in 24-bit color
+    unless another Ghostscript TIFF ``device`` is given. When ``dimensions``
+    are given, every page is scaled to fit a canvas of that many pixels and
+    centered on it, so the pages come out at their final size.
     """
-    def __init__(self, source_pdf, target_dir, resolution=300):
+    def __init__(self, source_pdf, target_dir, resolution=300, settings=None,
+                 device=color_mode.DEVICES[color_mode.COLOR], dimensions=None):
         self.command = 'gs'
         self.source_pdf = source_pdf
         self.target_dir = target_dir
+        self.resolution = resolution
+        self.settings = settings
+        self.device = device
+        self.dimensions = dimensions
+        self._page_count = None
+        scale = 1
+        settings_args = []
+        if settings is not None:
+            scale = settings.downscale
+            settings_args = settings.args()
+
+        render_resolution = resolution * scale
+        page_args = []
+        if dimensions is not None:
+            width, height = dimensions
+            page_args = [
+                f'-g{width * scale}x{height * scale}',
+                '-dFIXEDMEDIA', '-dPDFFitPage'
+            ]
+
+        # The G4 device always uses its own compression.
+        compression_args = ['-sCompression=lzw']
+        if device == color_mode.DEVICES[color_mode.BILEVEL]:
+            compression_args = []
+
         self.args = [
             '-q', '-dNOPAUSE',   '-dBATCH',
-            '-sDEVICE=tiff24nc', '-sCompression=lzw', 
-            f'-r{resolution}x{resolution}',
-            '-sOutputFile={}'.format(os.path.join(self.target_dir, '_Page_%04d.tiff'))
+            f'-sDEVICE={device}', *compression_args,
+            *settings_args,
+            f'-r{render_resolution:g}x{render_resolution:g}',
+            *page_args,
+            '-sOutputFile={}'.format(os.path.join(self.target_dir, PAGE_FILE_FORMAT))
         ]
 
     def as_subprocess(self):
@@ -33,6 +84,169 @@ class UnpackPDF(abstract.Command):
     def image_dir(self):
         return self.target_dir
 
+    @property
+    def pages(self):
+        """
+        The numbers of the pages of the pdf, counted once.
+        """
+        if self._page_count is None:
+            self._page_count = page_count(self.source_pdf)
+
+        return range(1, self._page_count + 1)
+
+    def page_file(self, page):
+        """
+        The file that page number ``page`` of the pdf is unpacked to.
+        """
+        return os.path.join(self.target_dir, PAGE_FILE_FORMAT % page)
+
+
+class UnpackPDFShard(UnpackPDF):
+    """
+    Unpack the pages ``first_page`` through ``last_page`` of a pdf. Several
+    shards of one pdf can run at once. Since Ghostscript numbers the pages of
+    every run from one, a shard renders into its own subdirectory of the
+    target directory, and its pages are renumbered into the target directory
+    afterwards.
+    """
+    def __init__(self, source_pdf, target_dir, first_page, last_page,
+                 resolution=300, settings=None,
+                 device=color_mode.DEVICES[color_mode.COLOR], dimensions=None):
+        super().__init__(
+            source_pdf, target_dir, resolution, settings, device, dimensions
+        )
+        self.first_page = first_page
+        self.last_page = last_page
+        self.shard_dir = os.path.join(target_dir, f'.shard_{first_page:04d}')
+        self.args = self.args[:-1] + [
+            f'-dFirstPage={first_page}',
+            f'-dLastPage={last_page}',
+            '-sOutputFile={}'.format(os.path.join(self.shard_dir, PAGE_FILE_FORMAT))
+        ]
+
+    @property
+    def pages(self):
+        return range(self.first_page, self.last_page + 1)
+
+    def shard_page_file(self, shard_page):
+        """
+        The file that Ghostscript writes the shard's ``shard_page``-th page
+        to, counting from one.
+        """
+        return os.path.join(self.shard_dir, PAGE_FILE_FORMAT % shard_page)
+
+    def move_page(self, shard_page):
+        """
+        Move a finished page from the shard directory into the target
+        directory under its page number in the whole pdf, returning the new
+        file name.
+        """
+        page_file = self.page_file(self.first_page + shard_page - 1)
+        os.replace(self.shard_page_file(shard_page), page_file)
+
+        return page_file
+
+
+class ExtractImages(abstract.Command):
+    """
+    Copy the embedded images of scanned pages out of a pdf into TIFF files,
+    without rendering the pages. Only pages that consist of a single image
+    that TIFF can store as it is are extracted; see ``passthrough``.
+    """
+    def __init__(self, source_pdf, target_dir, pages):
+        self.command = sys.executable
+        self.source_pdf = source_pdf
+        self.target_dir = target_dir
+        self.pages = pages
+
+    def page_file(self, page):
+        return os.path.join(self.target_dir, PAGE_FILE_FORMAT % page)
+
+    def as_subprocess(self):
+        return [
+            self.command, '-m', 'bookworm.passthrough',
+            self.source_pdf, os.path.join(self.target_dir, PAGE_FILE_FORMAT)
+        ] + [str(page) for page in self.pages]
+
+    def as_terminal_command(self):
+        return ' '.join(
+            util.quoted_string(arg) for arg in self.as_subprocess()
+        )
+
+
+class ExtractRunner(abstract.Runner):
+
+    def setup(command):
+        if not os.path.isfile(command.source_pdf):
+            raise FileNotFoundError(
+                f'Input file does not exist: {command.source_pdf}'
+            )
+
+        util.make_directory(command.target_dir)
+
+    def execute(command):
+        passthrough.extract_pages(
+            command.source_pdf,
+            {page: command.page_file(page) for page in command.pages}
+        )
+
+    def cleanup(command):
+        """
+        Remove the pages written by a failed extraction.
+        """
+        for page in command.pages:
+            for file_path in (command.page_file(page), command.page_file(page) + '.part'):
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+
+
+class ShardRunner(abstract.Runner):
+
+    def setup(command):
+        """
+        Prepare a shard for execution by creating its subdirectory.
+        """
+        if not os.path.isfile(command.source_pdf):
+            raise FileNotFoundError(
+                f'Input file does not exist: {command.source_pdf}'
+            )
+
+        util.make_directory(command.shard_dir)
+
+    def execute(command):
+        """
+        Execute a shard, reporting each page as it is finished.
+        """
+        report_page = scheduler.page_reporter()
+        ShardRunner.stream(command, lambda page_file: report_page())
+
+    def stream(command, on_page, poll_interval=0.05):
+        """
+        Execute a shard, calling ``on_page`` with the file name of each page
+        as soon as Ghostscript has finished writing it. The last page of a
+        failed run may be incomplete, so it is left in the shard directory.
+        """
+        ShardRunner.setup(command)
+
+        def on_shard_page(shard_page):
+            on_page(command.move_page(shard_page))
+
+        stream_pages(
+            command.as_subprocess(), command.shard_page_file, on_shard_page,
+            poll_interval
+        )
+        shutil.rmtree(command.shard_dir)
+
+    def cleanup(command):
+        """
+        Remove the pages of a failed shard. The pages of the other shards
+        are left alone, since they may still be running.
+        """
+        shutil.rmtree(command.shard_dir, ignore_errors=True)
+        for page in command.pages:
+            if os.path.isfile(command.page_file(page)):
+                os.remove(command.page_file(page))
+
 
 class Runner(abstract.Runner):
 
@@ -40,6 +254,12 @@ class Runner(abstract.Runner):
         """
         Prepare an action for execution by setting up folders and I/O.
         """
+        if isinstance(command, UnpackPDFShard):
+            return ShardRunner.setup(command)
+
+        if isinstance(command, ExtractImages):
+            return ExtractRunner.setup(command)
+
         # The input file does not exist.
         if (not os.path.isfile(command.source_pdf)) and os.path.isdir(command.target_dir):
             raise FileNotFoundError(
@@ -48,52 +268,259 @@ class Runner(abstract.Runner):
 
         # The output folder does not exist.
         elif (os.path.isfile(command.source_pdf)) and (not os.path.isdir(command.target_dir)):
-            os.mkdir(command.target_dir)
-
-        else:
-            # Nothing needs to be done.
-            return
+            util.make_directory(command.target_dir)
 
-    def execute(command):
         # The target directory should be empty.
-        if not os.listdir(command.target_dir):
-            subprocess.run(command.as_subprocess())
-        else:
+        elif os.listdir(command.target_dir):
             raise FileExistsError(
                 'This directory contains other files. '
                 'Unpack PDF will not write to an occupied directory.'
             )
 
+        else:
+            # Nothing needs to be done.
+            return
+
+    def execute(command):
+        if isinstance(command, UnpackPDFShard):
+            return ShardRunner.execute(command)
+
+        if isinstance(command, ExtractImages):
+            return ExtractRunner.execute(command)
+
+        report_page = scheduler.page_reporter()
+        stream_pages(
+            command.as_subprocess(), command.page_file, lambda page: report_page()
+        )
+
     def cleanup(command):
         """
         The ``cleanup`` method is applied after a failure to clean up
         the target directory by removing the data created during setup or
         execution.
         """
-        files = os.listdir(command.target_dir)
-        for file in files:
-            file_path = os.path.join(command.target_dir, file)
-            os.remove(file_path)
+        if isinstance(command, UnpackPDFShard):
+            return ShardRunner.cleanup(command)
 
-        os.rmdir(command.target_dir)
+        if isinstance(command, ExtractImages):
+            return ExtractRunner.cleanup(command)
 
+        if os.path.isdir(command.target_dir):
+            shutil.rmtree(command.target_dir)
 
-def make(source_pdf, target_dir=''):
+
+def stream_pages(args, written_file, on_page, poll_interval=0.05):
+    """
+    Run the Ghostscript command ``args``, calling ``on_page`` with the
+    number of each page it writes, counting from one, as soon as the page
+    is finished in ``written_file(page)``. Ghostscript writes pages in
+    order, so a page is finished once the next page's file appears or the
+    process exits successfully. The last page of a failed run may be
+    incomplete, so it is not handed over.
+    """
+    child = process.start(args)
+    with process.Watchdog(child) as watchdog:
+        page = 1
+        while True:
+            returncode = child.reap(block=False)
+            while (os.path.exists(written_file(page + 1)) or
+                   (returncode == 0 and os.path.exists(written_file(page)))):
+                on_page(page)
+                page += 1
+
+            if returncode is not None:
+                break
+
+            time.sleep(poll_interval)
+
+    watchdog.check()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args)
+
+
+def page_count(source_pdf):
+    """
+    Count the pages in a pdf by walking its page tree. A pdf that cannot be
+    read that way is counted by Ghostscript, which is only allowed to read
+    the pdf itself. If Ghostscript is not available either, the page objects
+    in the file are counted, which works for pdf files that do not keep their
+    page objects in compressed object streams.
+    """
+    if not os.path.isfile(source_pdf):
+        raise FileNotFoundError(f'Input file does not exist: {source_pdf}')
+
+    try:
+        with pdf.Document(source_pdf) as document:
+            return len(document.pages())
+    except passthrough.READ_ERRORS:
+        pass
+
+    quoted_pdf = re.sub(r'([()\\])', r'\\\1', source_pdf)
+    args = [
+        'gs', '-q', '-dNODISPLAY', '-dSAFER', f'--permit-file-read={source_pdf}',
+        '-dBATCH', '-c', f'({quoted_pdf}) (r) file runpdfbegin pdfpagecount = quit'
+    ]
+    try:
+        result = process.run(
+            args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        return int(result.stdout.split()[-1])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        pass
+
+    with open(source_pdf, 'rb') as handle:
+        count = len(re.findall(rb'/Type\s*/Page(?![A-Za-z])', handle.read()))
+
+    if count == 0:
+        raise ValueError(f'Could not count the pages in: {source_pdf}')
+
+    return count
+
+
+def page_ranges(count, shards):
+    """
+    Split the pages ``1..count`` into at most ``shards`` contiguous ranges of
+    nearly equal size, returned as ``(first_page, last_page)`` pairs.
+    """
+    shards = max(1, min(shards, count))
+    size, remainder = divmod(count, shards)
+    ranges = []
+    first_page = 1
+    for shard in range(shards):
+        last_page = first_page + size - 1 + (1 if shard < remainder else 0)
+        ranges.append((first_page, last_page))
+        first_page = last_page + 1
+
+    return ranges
+
+
+def mode_ranges(modes, shards):
+    """
+    Split the pages of a pdf into at most ``shards`` contiguous ranges, and
+    split those ranges further wherever the color mode of the pages changes.
+    Returns ``(first_page, last_page, mode)`` triples, where ``modes`` holds
+    the color mode of every page in order.
+    """
+    ranges = []
+    for first_page, last_page in page_ranges(len(modes), shards):
+        start = first_page
+        for page in range(first_page + 1, last_page + 2):
+            if page > last_page or modes[page - 1] != modes[start - 1]:
+                ranges.append((start, page - 1, modes[start - 1]))
+                start = page
+
+    return ranges
+
+
+def page_modes(source_pdf, mode):
+    """
+    The color mode of every page of a pdf. In ``auto`` mode every page is
+    sampled and classified; if Ghostscript cannot sample the pdf, every page
+    is rendered in color.
+    """
+    if mode != color_mode.AUTO:
+        return [mode] * page_count(source_pdf)
+
+    try:
+        return color_mode.page_modes(source_pdf)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return [color_mode.COLOR] * page_count(source_pdf)
+
+
+def make(source_pdf, target_dir='', settings=None,
+         device=color_mode.DEVICES[color_mode.COLOR], resolution=300,
+         dimensions=None):
     """
     The ``make`` factory method unpacks a PDF file into a collection of TIFF 
     files--one per page--into the target directory. If a target directory is
     not specified, a default one is used in the directory of the source pdf
-    file.
+    file. The pages are rendered at ``resolution`` pixels per inch, and onto
+    a canvas of ``dimensions`` pixels if given.
     """
     if not target_dir:
         # Use a default directory.
         new_target_dir = os.path.join(
             os.path.dirname(source_pdf), util.default_subdirectory()
         )
-        return UnpackPDF(source_pdf, new_target_dir)
+        return UnpackPDF(
+            source_pdf, new_target_dir, resolution, settings, device, dimensions
+        )
     else:
         # use the target directory
-        return UnpackPDF(source_pdf, target_dir)
+        return UnpackPDF(
+            source_pdf, target_dir, resolution, settings, device, dimensions
+        )
+
+
+def multi_unpack_pdf(source_pdf, target_dir, shards, settings=None, modes=None,
+                     resolution=300, dimensions=None, resume=False):
+    """
+    Create multiple ``UnpackPDFShard`` actions that together unpack every
+    page of a pdf into the target directory, keeping the page numbering of
+    the whole pdf. When the color mode of every page is given in ``modes``,
+    each page is rendered with the device for its mode. A ``resume``d or
+    incremental unpack may write to a directory holding the pages of an
+    earlier run.
+    """
+    if not resume and os.path.isdir(target_dir) and os.listdir(target_dir):
+        raise FileExistsError(
+            'This directory contains other files. '
+            'Unpack PDF will not write to an occupied directory.'
+        )
+
+    if modes is None:
+        modes = [color_mode.COLOR] * page_count(source_pdf)
+
+    actions = {}
+    for first_page, last_page, mode in mode_ranges(modes, shards):
+        action = UnpackPDFShard(
+            source_pdf, target_dir, first_page, last_page, resolution,
+            settings, color_mode.DEVICES[mode], dimensions
+        )
+        actions[f'{first_page:04d}-{last_page:04d}'] = action
+
+    return actions
+
+
+def passthrough_unpack_pdf(source_pdf, target_dir, extractable, modes, jobs=1,
+                           settings=None, resolution=300, resume=False):
+    """
+    Create the actions that copy the images of the ``extractable`` pages out
+    of a pdf in ``jobs`` groups, and render every other page with
+    Ghostscript. The rendered pages are split into ``jobs`` groups as well,
+    one ``UnpackPDFShard`` per run of consecutive pages of a group in the
+    same color mode, so a pdf with few extractable pages renders as fast as
+    a plain unpack with as many jobs.
+    """
+    if not resume and os.path.isdir(target_dir) and os.listdir(target_dir):
+        raise FileExistsError(
+            'This directory contains other files. '
+            'Unpack PDF will not write to an occupied directory.'
+        )
+
+    actions = {}
+    if extractable:
+        for first, last in page_ranges(len(extractable), jobs):
+            pages = extractable[first - 1:last]
+            action = ExtractImages(source_pdf, target_dir, pages)
+            actions[f'{pages[0]:04d}-{pages[-1]:04d}'] = action
+
+    extracted = set(extractable)
+    rendered = [page for page in range(1, len(modes) + 1) if page not in extracted]
+    groups = page_ranges(len(rendered), jobs) if rendered else []
+    for first, last in groups:
+        pages = rendered[first - 1:last]
+        start = pages[0]
+        for previous, page in zip(pages, pages[1:] + [None]):
+            if page is None or page != previous + 1 or modes[page - 1] != modes[start - 1]:
+                action = UnpackPDFShard(
+                    source_pdf, target_dir, start, previous, resolution,
+                    settings, color_mode.DEVICES[modes[start - 1]]
+                )
+                actions[f'{start:04d}-{previous:04d}'] = action
+                start = page
+
+    return actions
 
 
 def process_args(arg_dict):
@@ -119,5 +546,79 @@ def process_args(arg_dict):
         # Derive a default output directory from the input file.
         output = util.temp_directory(file_path)
 
-    return make(input, output)
+    resolution = Resolution.make(
+        arg_dict.get('resolution') or 300,
+        arg_dict.get('units') or str(ResolutionUnits.PixelsPerInch)
+    ).dots_per_inch()
+
+    dimensions = arg_dict.get('dimensions')
+    if dimensions == 'auto':
+        raise ValueError(
+            'Unpack PDF cannot derive page dimensions before the pages '
+            'are unpacked.'
+        )
+
+    if dimensions is not None:
+        width, height = dimensions
+        if width <= 0 or height <= 0:
+            raise ValueError(
+                f'Dimensions must be positive integers: Got {width}x{height}'
+            )
+
+    jobs = arg_dict.get('jobs') or 1
+    # Resumed and incremental runs write to the directory of an earlier run.
+    resume = bool(arg_dict.get('resume') or arg_dict.get('incremental'))
+    settings = render_settings(arg_dict, jobs)
+    mode = arg_dict.get('color_mode') or color_mode.COLOR
+
+    if arg_dict.get('passthrough'):
+        if dimensions is not None:
+            raise ValueError(
+                'Extracted pages keep the size of their images, so passthrough '
+                'cannot be combined with page dimensions.'
+            )
+
+        extractable, count = passthrough.extractable_pages(input)
+        if count is not None:
+            if mode == color_mode.AUTO and len(extractable) < count:
+                modes = page_modes(input, mode)
+            else:
+                modes = [color_mode.COLOR if mode == color_mode.AUTO else mode] * count
+
+            return passthrough_unpack_pdf(
+                input, output, extractable, modes, jobs, settings, resolution,
+                resume
+            )
+
+    if jobs == 1 and mode != color_mode.AUTO:
+        return make(
+            input, output, settings, color_mode.DEVICES[mode],
+            resolution, dimensions
+        )
+
+    modes = page_modes(input, mode)
+    if jobs == 1 and len(set(modes)) == 1:
+        return make(
+            input, output, settings, color_mode.DEVICES[modes[0]],
+            resolution, dimensions
+        )
+
+    return multi_unpack_pdf(
+        input, output, jobs, settings, modes, resolution, dimensions, resume
+    )
+
+
+def render_settings(arg_dict, processes=1):
+    """
+    The Ghostscript tuning options given in ``arg_dict``, with the rest
+    derived from the host for ``processes`` concurrent Ghostscript processes.
+    """
+    return render.make(
+        threads=arg_dict.get('render_threads'),
+        buffer_space=arg_dict.get('buffer_space'),
+        max_bitmap=arg_dict.get('max_bitmap'),
+        band_height=arg_dict.get('band_height'),
+        downscale=arg_dict.get('downscale'),
+        processes=processes
+    )
 
@@ -1,3 +1,4 @@
+import os
 import os.path
 
 
@@ -48,6 +49,29 @@ def temp_directory(file_path):
     return os.path.join(file_path, default_subdirectory())
 
 
+def make_directory(path):
+    """
+    Create the directory ``path`` along with any missing parent directories.
+    Several workers may race to create the same target directory, so a
+    directory that already exists is not an error.
+    """
+    if path:
+        os.makedirs(path, exist_ok=True)
+
+
+def target_file_in(target_dir, source_file):
+    """
+    The function ``target_file_in`` names the output file for the page
+    ``source_file`` inside the directory ``target_dir``. Without a target
+    directory, the empty string is returned so that the page action derives
+    its own temporary file name next to the source page.
+    """
+    if not target_dir:
+        return ''
+
+    return os.path.join(target_dir, os.path.basename(source_file))
+
+
 def with_extension(extension, file_dict):
     """
     Get the collection of files in a directory with a given file extension.
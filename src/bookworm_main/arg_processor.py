@@ -27,6 +27,37 @@ def arg_processor():
         '-o', '--output',
         help='Output directory', required=False
     )
+    parser_unpack_pdf.add_argument(
+        '-r', '--resolution',
+        help='The RESOLUTION to render the pages at (default 300)',
+        type=check_positive
+    )
+    parser_unpack_pdf.add_argument(
+        '-u', '--units',
+        help='The units for RESOLUTION',
+        choices=['PixelsPerInch', 'PixelsPerCentimeter'],
+        default='PixelsPerInch'
+    )
+    parser_unpack_pdf.add_argument(
+        '-d', '--dimensions',
+        help='Render every page fitted and centered on a WIDTHxHEIGHT canvas',
+        type=check_dims
+    )
+    parser_unpack_pdf.add_argument(
+        '--passthrough',
+        help='Copy the scanned image of each page out of the pdf when possible',
+        action='store_true'
+    )
+
+    add_jobs_argument(parser_unpack_pdf)
+    add_incremental_argument(parser_unpack_pdf)
+    add_limit_arguments(parser_unpack_pdf)
+    add_telemetry_argument(parser_unpack_pdf)
+    add_metrics_argument(parser_unpack_pdf)
+    add_trace_argument(parser_unpack_pdf)
+    add_progress_argument(parser_unpack_pdf)
+    add_resume_argument(parser_unpack_pdf)
+    add_render_arguments(parser_unpack_pdf)
 
     # Subparser for the change-resolution command.
     parser_change_resolution = subparsers.add_parser(
@@ -52,6 +83,16 @@ def arg_processor():
         help='Output file'
     )
 
+    add_jobs_argument(parser_change_resolution)
+    add_incremental_argument(parser_change_resolution)
+    add_limit_arguments(parser_change_resolution)
+    add_telemetry_argument(parser_change_resolution)
+    add_metrics_argument(parser_change_resolution)
+    add_trace_argument(parser_change_resolution)
+    add_progress_argument(parser_change_resolution)
+    add_resume_argument(parser_change_resolution)
+    add_cache_arguments(parser_change_resolution)
+
     # Subparser for the expand-page command.
     parser_expand_page = subparsers.add_parser(
         'expand-page', 
@@ -67,10 +108,21 @@ def arg_processor():
     )
     parser_expand_page.add_argument(
         '-d', '--dimensions',
-        help='Dimensions to set the page to',
+        help='Dimensions to set the page to, or auto to fit the largest page',
         type=check_dims
     )
 
+    add_jobs_argument(parser_expand_page)
+    add_incremental_argument(parser_expand_page)
+    add_limit_arguments(parser_expand_page)
+    add_telemetry_argument(parser_expand_page)
+    add_metrics_argument(parser_expand_page)
+    add_trace_argument(parser_expand_page)
+    add_progress_argument(parser_expand_page)
+    add_resume_argument(parser_expand_page)
+    add_cache_arguments(parser_expand_page)
+    add_batch_argument(parser_expand_page)
+
     # Subparser for the resample-page command.
     parser_resample_page = subparsers.add_parser(
         'resample-page',
@@ -95,9 +147,421 @@ def arg_processor():
         choices=['PixelsPerInch', 'PixelsPerCentimeter']
     )
 
+    add_jobs_argument(parser_resample_page)
+    add_incremental_argument(parser_resample_page)
+    add_limit_arguments(parser_resample_page)
+    add_telemetry_argument(parser_resample_page)
+    add_metrics_argument(parser_resample_page)
+    add_trace_argument(parser_resample_page)
+    add_progress_argument(parser_resample_page)
+    add_resume_argument(parser_resample_page)
+    add_cache_arguments(parser_resample_page)
+    add_batch_argument(parser_resample_page)
+
+    # Subparser for the normalize-page command.
+    parser_normalize_page = subparsers.add_parser(
+        'normalize-page',
+        help='Change the resolution, resample and expand pages with one decode per page'
+    )
+    parser_normalize_page.add_argument(
+        '-i', '--input',
+        help='Input file'
+    )
+    parser_normalize_page.add_argument(
+        '-o', '--output',
+        help='Output file'
+    )
+    parser_normalize_page.add_argument(
+        '-r', '--resolution',
+        help='The RESOLUTION to assign to the page without resampling',
+        type=check_positive
+    )
+    parser_normalize_page.add_argument(
+        '-s', '--resample',
+        help='The RESOLUTION to resample the page at',
+        type=check_positive
+    )
+    parser_normalize_page.add_argument(
+        '-u', '--units',
+        help='The units for RESOLUTION',
+        choices=['PixelsPerInch', 'PixelsPerCentimeter'],
+        default='PixelsPerInch'
+    )
+    parser_normalize_page.add_argument(
+        '-d', '--dimensions',
+        help='Dimensions to set the page to',
+        type=check_dims
+    )
+
+    add_jobs_argument(parser_normalize_page)
+    add_incremental_argument(parser_normalize_page)
+    add_limit_arguments(parser_normalize_page)
+    add_telemetry_argument(parser_normalize_page)
+    add_metrics_argument(parser_normalize_page)
+    add_trace_argument(parser_normalize_page)
+    add_progress_argument(parser_normalize_page)
+    add_resume_argument(parser_normalize_page)
+    add_cache_arguments(parser_normalize_page)
+    add_batch_argument(parser_normalize_page)
+
+    # Subparser for the process-pdf command.
+    parser_process_pdf = subparsers.add_parser(
+        'process-pdf',
+        help='Unpack a PDF and normalize each page as soon as it is unpacked'
+    )
+    parser_process_pdf.add_argument(
+        '-i', '--input',
+        help='Input file'
+    )
+    parser_process_pdf.add_argument(
+        '-o', '--output',
+        help='Output directory'
+    )
+    parser_process_pdf.add_argument(
+        '-r', '--resolution',
+        help='The RESOLUTION to assign to the page without resampling',
+        type=check_positive
+    )
+    parser_process_pdf.add_argument(
+        '-s', '--resample',
+        help='The RESOLUTION to resample the page at',
+        type=check_positive
+    )
+    parser_process_pdf.add_argument(
+        '-u', '--units',
+        help='The units for RESOLUTION',
+        choices=['PixelsPerInch', 'PixelsPerCentimeter'],
+        default='PixelsPerInch'
+    )
+    parser_process_pdf.add_argument(
+        '-d', '--dimensions',
+        help='Dimensions to set the page to',
+        type=check_dims
+    )
+    parser_process_pdf.add_argument(
+        '--shards',
+        help='The number of page ranges to unpack concurrently',
+        type=check_positive,
+        default=1
+    )
+
+    add_jobs_argument(parser_process_pdf)
+    add_incremental_argument(parser_process_pdf)
+    add_limit_arguments(parser_process_pdf)
+    add_telemetry_argument(parser_process_pdf)
+    add_metrics_argument(parser_process_pdf)
+    add_trace_argument(parser_process_pdf)
+    add_progress_argument(parser_process_pdf)
+    add_render_arguments(parser_process_pdf)
+
+    # Subparser for the pack-pdf command.
+    parser_pack_pdf = subparsers.add_parser(
+        'pack-pdf',
+        help='Pack the TIFF files in the input directory into a PDF, one page per file'
+    )
+    parser_pack_pdf.add_argument(
+        '-i', '--input',
+        help='Input directory'
+    )
+    parser_pack_pdf.add_argument(
+        '-o', '--output',
+        help='Output PDF file', required=False
+    )
+
+    add_limit_arguments(parser_pack_pdf)
+    add_telemetry_argument(parser_pack_pdf)
+    add_metrics_argument(parser_pack_pdf)
+    add_trace_argument(parser_pack_pdf)
+    add_progress_argument(parser_pack_pdf)
+
+    # Subparser for the stats command.
+    parser_stats = subparsers.add_parser(
+        'stats',
+        help='Summarize a telemetry file per kind of action and per page'
+    )
+    parser_stats.add_argument(
+        '-i', '--input',
+        help='Telemetry file'
+    )
+    parser_stats.add_argument(
+        '--top',
+        help='The number of pages to show, those that used the most CPU time (default 10)',
+        type=check_positive,
+        default=10
+    )
+
     return parser
 
 
+def add_jobs_argument(parser):
+    """
+    Add the ``-j/--jobs`` option to a subparser. It sets the number of page
+    actions, or pdf page ranges, that run concurrently, and the processors
+    left to each of them become threads of its programs. With ``auto``, the
+    split is chosen from the size of the pages.
+    """
+    parser.add_argument(
+        '-j', '--jobs',
+        help='The number of pages to process concurrently, or auto to choose '
+             'it from the page size',
+        type=check_jobs,
+        default=1
+    )
+
+
+def add_incremental_argument(parser):
+    """
+    Add the ``--incremental`` option to a subparser. It skips the pages whose
+    outputs are already up to date.
+    """
+    parser.add_argument(
+        '--incremental',
+        help='Only process pages whose outputs are stale or missing',
+        action='store_true'
+    )
+
+
+def add_resume_argument(parser):
+    """
+    Add the ``--resume`` option to a subparser. It journals every finished
+    page as soon as it is written, and continues an interrupted run from the
+    pages that are missing from the journal.
+    """
+    parser.add_argument(
+        '--resume',
+        help='Journal finished pages, and only process the pages an interrupted run did not finish',
+        action='store_true'
+    )
+
+
+def add_limit_arguments(parser):
+    """
+    Add the time and memory limit options to a subparser. Every external
+    program a run starts is stopped once it exceeds a time limit, and the
+    page it was working on is retried a few times before it is reported as
+    failed. ImageMagick programs only start while their estimated memory
+    fits in the memory limit.
+    """
+    parser.add_argument(
+        '--timeout',
+        help='Stop any external program that runs for more than SECONDS',
+        metavar='SECONDS',
+        type=check_seconds
+    )
+    parser.add_argument(
+        '--cpu-time',
+        help='Stop any external program that uses more than SECONDS of CPU time',
+        metavar='SECONDS',
+        type=check_seconds
+    )
+    parser.add_argument(
+        '--retries',
+        help='The number of times to retry a page that ran out of time (default 2)',
+        type=check_non_negative,
+        default=2
+    )
+    parser.add_argument(
+        '--memory-limit',
+        help='The memory that concurrent ImageMagick programs may use together, e.g. 8G',
+        metavar='SIZE',
+        type=check_size
+    )
+
+
+def add_telemetry_argument(parser):
+    """
+    Add the ``--telemetry`` option to a subparser. It appends a JSON lines
+    record of every action, with the resources of the programs it ran, to a
+    file that ``stats`` summarizes.
+    """
+    parser.add_argument(
+        '--telemetry',
+        help='Append a record of every action and the resources it used to FILE',
+        metavar='FILE'
+    )
+
+
+def add_metrics_argument(parser):
+    """
+    Add the ``--metrics`` option to a subparser. It keeps Prometheus metrics
+    of the run in a file for node_exporter's textfile collector.
+    """
+    parser.add_argument(
+        '--metrics',
+        help='Write Prometheus metrics of the run to FILE, for the textfile '
+             'collector of node_exporter',
+        metavar='FILE'
+    )
+
+
+def add_trace_argument(parser):
+    """
+    Add the ``--trace`` option to a subparser. It writes a timeline of the
+    run, with a lane for every worker, that Chrome's trace viewer and
+    Perfetto open.
+    """
+    parser.add_argument(
+        '--trace',
+        help='Write a Chrome trace of the run, with a lane for every worker, to FILE',
+        metavar='FILE'
+    )
+
+
+def add_progress_argument(parser):
+    """
+    Add the ``--progress`` option to a subparser. It reports the pages
+    finished, the throughput and the time left while the run goes on.
+    """
+    parser.add_argument(
+        '--progress',
+        help='Show the pages finished, pages per second and time left on '
+             'stderr: redrawn in place on a terminal, and as JSON lines '
+             'every 10 seconds otherwise',
+        action='store_true'
+    )
+
+
+def add_cache_arguments(parser):
+    """
+    Add the result cache options to a page command subparser.
+    """
+    parser.add_argument(
+        '--cache',
+        help='Reuse page outputs from the result cache in this directory',
+        metavar='DIRECTORY',
+        nargs='?',
+        const='',
+        default=None
+    )
+    parser.add_argument(
+        '--cache-size',
+        help='The maximum size of the result cache, e.g. 500M or 20G',
+        type=check_size,
+        default=10 * 1024 ** 3
+    )
+    parser.add_argument(
+        '--cache-hardlink',
+        help='Hard link cached outputs instead of copying them',
+        action='store_true'
+    )
+
+
+def add_render_arguments(parser):
+    """
+    Add the Ghostscript rendering options to a pdf command subparser. The
+    tuning options that are not given are derived from the host's processors
+    and memory.
+    """
+    parser.add_argument(
+        '--color-mode',
+        help='Render pages in color (the default), gray or bilevel, or sample every page and pick one per page with auto',
+        choices=['auto', 'color', 'gray', 'bilevel'],
+        default='color'
+    )
+    parser.add_argument(
+        '--render-threads',
+        help='The number of threads rendering each page',
+        type=check_positive
+    )
+    parser.add_argument(
+        '--buffer-space',
+        help='The size of the band buffer of each rendering thread, e.g. 64M',
+        type=check_size
+    )
+    parser.add_argument(
+        '--max-bitmap',
+        help='The largest page raster rendered without banding, e.g. 256M',
+        type=check_size
+    )
+    parser.add_argument(
+        '--band-height',
+        help='The height of a rendering band in pixels',
+        type=check_positive
+    )
+    parser.add_argument(
+        '--downscale',
+        help='Render at N times the resolution and downscale, for smoother pages',
+        metavar='N',
+        type=check_positive
+    )
+
+
+def add_batch_argument(parser):
+    """
+    Add the ``--batch`` option to a page command subparser. It processes the
+    pages of a directory with a few ``mogrify`` invocations instead of one
+    ``convert`` per page.
+    """
+    parser.add_argument(
+        '--batch',
+        help='Process directory pages with mogrify, at most N pages per process',
+        metavar='N',
+        type=check_positive,
+        nargs='?',
+        const=64,
+        default=None
+    )
+
+
+def check_size(value):
+    """
+    Parse a positive size in bytes, with an optional K, M, G or T suffix.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    multiplier = units.get(value[-1:].upper(), 1)
+    digits = value[:-1] if value[-1:].upper() in units else value
+
+    try:
+        size = int(digits) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'{value} needs to be a size such as 1048576, 500M or 20G'
+        )
+
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f'{value} needs to be positive')
+
+    return size
+
+
+def check_seconds(value):
+    """
+    Parse a positive number of seconds.
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} needs to be a number of seconds')
+
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f'{value} needs to be positive')
+
+    return seconds
+
+
+def check_non_negative(value):
+    """
+    Determine whether the input value is a non-negative integer.
+    """
+    ivalue = int(value)
+    if ivalue < 0:
+        raise argparse.ArgumentTypeError(
+            f'{ivalue} needs to be a non-negative integer'
+        )
+
+    return ivalue
+
+
+def check_jobs(value):
+    """
+    Parse a positive number of jobs, or ``auto``.
+    """
+    if value == 'auto':
+        return value
+
+    return check_positive(value)
+
+
 def check_positive(value):
     """
     Determine whether the input value is a positive integer.
@@ -113,8 +577,12 @@ def check_positive(value):
 
 def check_dims(value):
     """
-    Check that the input dimensions for a page are valid.
+    Check that the input dimensions for a page are valid. The value ``auto``
+    asks for the dimensions to be derived from the input pages.
     """
+    if value == 'auto':
+        return value
+
     dims = value.split('x')
     if len(dims) != 2:
         raise argparse.ArgumentTypeError(
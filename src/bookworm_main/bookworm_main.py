@@ -1,8 +1,23 @@
 import bookworm.execute_command    as execute_command
+import bookworm.batch              as batch
 import bookworm.detect_user        as detect_user
+import bookworm.cache              as cache
+import bookworm.cost               as cost
+import bookworm.manifest           as manifest
+import bookworm.memory             as memory
+import bookworm.metrics            as metrics
+import bookworm.process            as process
+import bookworm.progress           as progress
+import bookworm.scheduler          as scheduler
+import bookworm.telemetry          as telemetry
+import bookworm.threads            as threads
+import bookworm.trace              as trace
 import bookworm_main.arg_processor as arg_processor
+import os.path
 import sys
 
+from bookworm.resolution import Resolution
+
 
 def warning(*objs):
     """
@@ -11,6 +26,139 @@ def warning(*objs):
     print('WARNING: ', *objs, file=sys.stderr)
 
 
+def make_manifests(args):
+    """
+    The function ``make_manifests`` creates the manifests that record the
+    pages of a run. Resumable runs force every record to disk.
+    """
+    return manifest.Manifests(durable=getattr(args, 'resume', False))
+
+
+def make_runner(args, runner, manifests=None):
+    """
+    The function ``make_runner`` wraps a command's runner with the execution
+    strategies requested on the command line.
+    """
+    if getattr(args, 'cache', None) is not None:
+        runner = cache.make(
+            runner, args.cache, args.cache_size, args.cache_hardlink
+        )
+
+    if getattr(args, 'resume', False):
+        runner = manifest.Journal(
+            runner, manifests if manifests is not None else make_manifests(args)
+        )
+
+    return runner
+
+
+def make_actions(args, action, runner, manifests=None):
+    """
+    The function ``make_actions`` pairs a command's action with its runner,
+    batching the pages of a directory when ``--batch`` is given. Cached runs
+    are not batched, since every page must be looked up in the cache.
+    """
+    runner = make_runner(args, runner, manifests)
+    batch_size = getattr(args, 'batch', None)
+    if batch_size is None or getattr(args, 'cache', None) is not None:
+        return [(action, runner)]
+
+    return batch.make(action, runner, batch_size, getattr(args, 'jobs', 1))
+
+
+def make_thread_plan(args):
+    """
+    The function ``make_thread_plan`` splits the host's processors between
+    the pages that run concurrently and the threads of each of their
+    programs. With ``-j auto``, the split is chosen from the size of the
+    input pages, rendered at the requested resolution for a pdf.
+    """
+    jobs = getattr(args, 'jobs', 1)
+    if jobs != 'auto':
+        return threads.make(jobs)
+
+    dots_per_inch = 300
+    if getattr(args, 'resolution', None):
+        dots_per_inch = Resolution.make(
+            args.resolution, getattr(args, 'units', None) or 'PixelsPerInch'
+        ).dots_per_inch()
+
+    pixels, tasks = threads.input_pixels(args.input, dots_per_inch)
+    return threads.make(pixels=pixels, tasks=tasks)
+
+
+def make_limits(args, plan=None):
+    """
+    The function ``make_limits`` creates the time and thread limits that
+    every external program is run under.
+    """
+    return process.Limits(
+        getattr(args, 'timeout', None), getattr(args, 'cpu_time', None),
+        threads=plan.threads if plan is not None else None
+    )
+
+
+def make_budget(args):
+    """
+    The function ``make_budget`` creates the memory budget that ImageMagick
+    programs are admitted under.
+    """
+    return memory.Budget(getattr(args, 'memory_limit', None))
+
+
+def make_cost_model(args):
+    """
+    The function ``make_cost_model`` creates the model that orders the
+    pages of a run, costliest first. A telemetry file left by earlier runs
+    tells it how long their pages took.
+    """
+    telemetry_file = getattr(args, 'telemetry', None)
+    if telemetry_file and os.path.isfile(telemetry_file):
+        return cost.make(telemetry.read_records(telemetry_file))
+
+    return cost.make()
+
+
+def make_retry(args):
+    """
+    The function ``make_retry`` creates the policy for retrying the pages
+    that run out of time.
+    """
+    return scheduler.Retry(getattr(args, 'retries', 0))
+
+
+def make_observers(args, manifests=None, command=''):
+    """
+    The function ``make_observers`` creates the observers requested on the
+    command line for a run of ``command``.
+    """
+    observers = []
+    if getattr(args, 'incremental', False) or getattr(args, 'resume', False):
+        observers.append(manifest.Recorder(manifests))
+
+    if getattr(args, 'telemetry', None):
+        observers.append(telemetry.Telemetry(args.telemetry))
+
+    if getattr(args, 'metrics', None):
+        observers.append(metrics.Metrics(args.metrics, command))
+
+    if getattr(args, 'progress', False):
+        observers.append(progress.Progress())
+
+    return observers
+
+
+def make_tracer(args, command):
+    """
+    The function ``make_tracer`` creates the tracer of a run when ``--trace``
+    asks for a timeline.
+    """
+    if not getattr(args, 'trace', None):
+        return None
+
+    return trace.Tracer(f'bookworm {command}')
+
+
 def main(argv=sys.argv):
     """
     The main pdf operations are:
@@ -19,6 +167,10 @@ def main(argv=sys.argv):
     2. Change image resolution.
     3. Rescale image.
     4. Expand image with fill.
+    5. Normalize a page with all of the above in one pass.
+    6. Unpack a PDF and normalize its pages in one pipelined pass.
+    7. Pack pages into a PDF.
+    8. Summarize the telemetry of earlier runs.
     """
     parser = arg_processor.arg_processor()
 
@@ -33,15 +185,45 @@ def main(argv=sys.argv):
 
     args = parser.parse_args(argv[1:])
     command = argv[1]
+    tracer = make_tracer(args, command)
+    trace.set_tracer(tracer)
 
     try:
+        with trace.span('plan'):
+            plan = make_thread_plan(args)
+        if hasattr(args, 'jobs'):
+            args.jobs = plan.workers
+
+        # Planning a run may already start Ghostscript, so the limits apply
+        # from here on.
+        process.set_limits(make_limits(args, plan))
+        memory.set_budget(make_budget(args))
+        cost.set_model(make_cost_model(args))
         command_dict = dict(command=command, args=vars(args))
-        action = execute_command.process_command(command_dict)
-        execute_command.run_command([action])
+        with trace.span('process_args'):
+            action, runner = execute_command.process_command(command_dict)
+        manifests = make_manifests(args)
+        with trace.span('make_actions'):
+            actions = make_actions(args, action, runner, manifests)
+        with trace.span('run', jobs=getattr(args, 'jobs', 1)):
+            run_report = execute_command.run_command(
+                actions,
+                jobs=getattr(args, 'jobs', 1),
+                observers=make_observers(args, manifests, command),
+                retry=make_retry(args)
+            )
     except Exception as e:
         print(e)
         sys.exit(1)
     except ValueError as e:
         print(e)
         sys.exit(1)
+    finally:
+        # A failed run is often the one worth looking at, so its trace is
+        # written too.
+        if tracer is not None:
+            tracer.write(args.trace)
 
+    if run_report.failed:
+        print(run_report)
+        sys.exit(1)
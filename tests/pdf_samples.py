@@ -0,0 +1,157 @@
+import struct
+import zlib
+
+
+def jpeg_header(width, height, components=3):
+    """
+    The start of a baseline JPEG stream: enough for its frame header to be
+    read, not to decode it.
+    """
+    factors = [0x22] + [0x11] * (components - 1)
+    frame = struct.pack('>BHHB', 8, height, width, components)
+    for index, factor in enumerate(factors):
+        frame += struct.pack('>BBB', index + 1, factor, 0)
+
+    return (b'\xff\xd8' + b'\xff\xc0' + struct.pack('>H', len(frame) + 2) +
+            frame + b'\xff\xd9')
+
+
+def image_page(dictionary, data, content=b'q 288 0 0 144 0 0 cm /Im0 Do Q'):
+    """
+    A page on a 288x144 point media box that draws one image XObject.
+    """
+    return dict(image=(dictionary, data), content=content)
+
+
+def text_page():
+    return dict(image=None, content=b'BT /F1 12 Tf 72 72 Td (Hello) Tj ET')
+
+
+def gray_image(width=1200, height=600, content=b'q 288 0 0 144 0 0 cm /Im0 Do Q'):
+    return image_page(
+        b'<< /Type /XObject /Subtype /Image /Width %d /Height %d '
+        b'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode' % (width, height),
+        zlib.compress(bytes(width * height)),
+        content
+    )
+
+
+def fax_image(width=1200, height=600, parameters=b'/K -1 /Columns 1200'):
+    return image_page(
+        b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ImageMask true '
+        b'/Filter /CCITTFaxDecode /DecodeParms << %s >>' % (width, height, parameters),
+        b'\x00\x10\x01'
+    )
+
+
+def jpeg_image(width=1200, height=600):
+    return image_page(
+        b'<< /Type /XObject /Subtype /Image /Width %d /Height %d '
+        b'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode' % (width, height),
+        jpeg_header(width, height)
+    )
+
+
+def build_pdf(file_path, pages, xref_stream=False):
+    """
+    Write a pdf with the given pages. With ``xref_stream``, the objects are
+    indexed by a compressed cross-reference stream and the page dictionaries
+    are kept in an object stream.
+    """
+    objects = {}
+    page_numbers = []
+    number = 3
+    for page in pages:
+        page_number, content_number = number, number + 1
+        number += 2
+        resources = b'<< >>'
+        if page['image'] is not None:
+            image_number = number
+            number += 1
+            dictionary, data = page['image']
+            objects[image_number] = (
+                dictionary + b' /Length %d >>\nstream\n' % len(data) + data + b'\nendstream'
+            )
+            resources = b'<< /XObject << /Im0 %d 0 R >> >>' % image_number
+        content = page['content']
+        objects[content_number] = (
+            b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+        )
+        objects[page_number] = (
+            b'<< /Type /Page /Parent 2 0 R /Contents %d 0 R /Resources %s >>'
+            % (content_number, resources)
+        )
+        page_numbers.append(page_number)
+
+    kids = b' '.join(b'%d 0 R' % page_number for page_number in page_numbers)
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = (
+        b'<< /Type /Pages /Kids [%s] /Count %d /MediaBox [0 0 288 144] >>'
+        % (kids, len(page_numbers))
+    )
+
+    compressed = {}
+    if xref_stream:
+        stream_number = number
+        number += 1
+        header = b''
+        body = b''
+        for index, page_number in enumerate(page_numbers):
+            header += b'%d %d ' % (page_number, len(body))
+            body += objects.pop(page_number) + b'\n'
+            compressed[page_number] = (stream_number, index)
+        data = zlib.compress(header + body)
+        objects[stream_number] = (
+            b'<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n'
+            % (len(page_numbers), len(header), len(data)) + data + b'\nendstream'
+        )
+
+    output = b'%PDF-1.5\n'
+    offsets = {}
+    for object_number in sorted(objects):
+        offsets[object_number] = len(output)
+        output += b'%d 0 obj\n' % object_number + objects[object_number] + b'\nendobj\n'
+
+    size = number + 1
+    if not xref_stream:
+        xref_offset = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % size
+        for object_number in range(1, size):
+            if object_number in offsets:
+                output += b'%010d 00000 n \n' % offsets[object_number]
+            else:
+                output += b'0000000000 00000 f \n'
+        output += b'trailer\n<< /Size %d /Root 1 0 R >>\n' % size
+    else:
+        xref_number = number
+        xref_offset = len(output)
+        offsets[xref_number] = xref_offset
+        rows = b''
+        for object_number in range(size):
+            if object_number in offsets:
+                fields = (1, offsets[object_number], 0)
+            elif object_number in compressed:
+                fields = (2,) + compressed[object_number]
+            else:
+                fields = (0, 0, 0)
+            rows += b'\x02' + struct.pack('>BIH', *fields)
+        # PNG Up predictor rows, as most writers produce.
+        previous = bytes(7)
+        predicted = b''
+        for start in range(0, len(rows), 8):
+            row = rows[start + 1:start + 8]
+            predicted += b'\x02' + bytes((a - b) & 0xFF for a, b in zip(row, previous))
+            previous = row
+        data = zlib.compress(predicted)
+        output += (
+            b'%d 0 obj\n<< /Type /XRef /Size %d /Root 1 0 R /W [1 4 2] '
+            b'/Filter /FlateDecode /DecodeParms << /Predictor 12 /Columns 7 >> '
+            b'/Length %d >>\nstream\n' % (xref_number, size, len(data)) +
+            data + b'\nendstream\nendobj\n'
+        )
+
+    output += b'startxref\n%d\n%%%%EOF\n' % xref_offset
+    with open(file_path, 'wb') as handle:
+        handle.write(output)
+
+    return file_path
@@ -0,0 +1,207 @@
+import pytest
+import bookworm.abstract          as abstract
+import bookworm.async_runner      as async_runner
+import bookworm.change_resolution as change_resolution
+import bookworm.report            as report
+import bookworm.sample_data       as sample
+import bookworm.telemetry         as telemetry
+import bookworm.tiff              as tiff
+import asyncio
+import os.path
+import subprocess
+import sys
+
+from bookworm.resolution import Resolution
+
+
+class PythonCommand(abstract.Command):
+    """
+    A ``Command`` that runs a short python program in a subprocess.
+    """
+    def __init__(self, program):
+        self.program = program
+
+    def as_subprocess(self):
+        return [sys.executable, '-c', self.program]
+
+    def as_terminal_command(self):
+        return ' '.join(self.as_subprocess())
+
+
+class FakeRunner(abstract.Runner):
+
+    cleaned_up = []
+
+    def setup(command):
+        return
+
+    def execute(command):
+        return
+
+    def cleanup(command):
+        FakeRunner.cleaned_up.append(command)
+
+
+@pytest.fixture
+def runner():
+    FakeRunner.cleaned_up = []
+    return FakeRunner
+
+
+class TestAsyncRunCommand:
+
+    def test_run_command_should_execute_every_page(self, runner):
+        """
+        Every page action should run as an asyncio subprocess.
+        """
+        pages = {f'page_{i}': PythonCommand('pass') for i in range(16)}
+        run_report = asyncio.run(
+            async_runner.run_command([(pages, runner)], jobs=4)
+        )
+
+        assert len(run_report.succeeded) == len(pages)
+        assert not run_report.failed
+
+
+    def test_run_command_should_report_nonzero_exit_status(self, runner):
+        """
+        A child that exits with an error should be reported as a failure
+        and cleaned up.
+        """
+        failing = PythonCommand('import sys; sys.exit(3)')
+        run_report = asyncio.run(
+            async_runner.run_command([(failing, runner)])
+        )
+
+        assert len(run_report.failed) == 1
+        assert isinstance(run_report.failed[0].error, subprocess.CalledProcessError)
+        assert runner.cleaned_up == [failing]
+
+
+    def test_programs_are_charged_to_their_own_actions(self, runner, tmp_path):
+        """
+        Telemetry should record the resources of every program, charged
+        only to the action that ran it, while the actions run concurrently
+        on one event loop.
+        """
+        path = os.path.join(str(tmp_path), 'telemetry.jsonl')
+        pages = {
+            f'page_{i}': PythonCommand('import time; time.sleep(0.2)') for i in range(3)
+        }
+        run_report = asyncio.run(async_runner.run_command(
+            [(pages, runner)], jobs=3, observers=[telemetry.Telemetry(path)]
+        ))
+
+        assert not run_report.failed
+        records = telemetry.read_records(path)
+        assert len(records) == 3
+        for entry in records:
+            assert [child['shared_by'] for child in entry['children']] == [1]
+            assert entry['peak_rss'] > 0
+
+
+    def test_batch_failures_should_be_reported(self):
+        """
+        The pages a batch runner reports as failed should be failures of
+        the run, and observers should hear about every page.
+        """
+        class Batch:
+            actions = [PythonCommand('pass'), PythonCommand('pass')]
+
+        class BatchRunner:
+            def run_batch(command, observers=()):
+                results = [
+                    report.ActionResult(command.actions[0], BatchRunner),
+                    report.ActionResult(command.actions[1], BatchRunner, RuntimeError('failed'))
+                ]
+                for result in results:
+                    for observer in observers:
+                        observer.finished(result)
+                return results
+
+        class Finished(abstract.Observer):
+            def __init__(self):
+                self.results = []
+
+            def finished(self, result):
+                self.results.append(result)
+
+        observer = Finished()
+        run_report = asyncio.run(
+            async_runner.run_command([(Batch(), BatchRunner)], observers=[observer])
+        )
+
+        assert len(run_report.succeeded) == 1
+        assert len(run_report.failed) == 1
+        assert len(observer.results) == 2
+
+
+class TestInProcess:
+
+    def test_commands_that_run_in_process_use_their_runner(self, tmp_path):
+        """
+        A change of resolution should patch the TIFF tags of the page like
+        the synchronous runner, instead of starting ImageMagick.
+        """
+        target_file = os.path.join(str(tmp_path), 'page.tiff')
+        action = change_resolution.make(
+            Resolution.make(150, 'PixelsPerInch'), sample.SAMPLE_TIFF, target_file
+        )
+        run_report = asyncio.run(
+            async_runner.run_command([(action, change_resolution.Runner)])
+        )
+
+        assert not run_report.failed
+        assert tiff.read_header(target_file).x_resolution == 150
+
+    def test_wrapped_runners_run_in_process(self):
+        class Wrapper:
+            def __init__(self, runner):
+                self.runner = runner
+                self.executed = []
+
+            def setup(self, command):
+                return
+
+            def execute(self, command):
+                self.executed.append(command)
+
+            def cleanup(self, command):
+                return
+
+        wrapper = Wrapper(FakeRunner)
+        command = PythonCommand('import sys; sys.exit(3)')
+        run_report = asyncio.run(async_runner.run_command([(command, wrapper)]))
+
+        assert not run_report.failed
+        assert wrapper.executed == [command]
+
+
+class TestScheduler:
+
+    def test_scheduler_should_reject_nonpositive_jobs(self):
+        with pytest.raises(ValueError):
+            async_runner.Scheduler(0)
+
+
+    def test_cancelled_actions_should_be_reported_and_cleaned_up(self, runner):
+        """
+        Cancelling the scheduler should stop running children and report
+        every unfinished action as a failure.
+        """
+        slow = [PythonCommand('import time; time.sleep(30)') for _ in range(3)]
+
+        async def run():
+            scheduler = async_runner.Scheduler(jobs=2)
+            for action in slow:
+                scheduler.submit(action, async_runner.make(runner))
+            await asyncio.sleep(0.5)
+            scheduler.cancel()
+            return await scheduler.join()
+
+        run_report = asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+        assert len(run_report.failed) == len(slow)
+        for result in run_report.failed:
+            assert isinstance(result.error, asyncio.CancelledError)
+        assert sorted(map(id, runner.cleaned_up)) == sorted(map(id, slow[:2]))
@@ -0,0 +1,157 @@
+import pytest
+import bookworm.abstract          as abstract
+import bookworm.batch             as batch
+import bookworm.change_resolution as change_resolution
+import bookworm.resample_page     as resample_page
+import bookworm.expand_page       as expand_page
+import bookworm.sample_data       as sample
+import bookworm.scheduler         as scheduler
+import os
+import shutil
+import stat
+import sys
+import threading
+
+from bookworm.resolution import Resolution
+
+
+FAKE_MOGRIFY = f'''#!{sys.executable}
+import os, shutil, sys
+args = sys.argv[1:]
+target_path = args[args.index('-path') + 1]
+for arg in args[args.index('-path') + 2:]:
+    if not os.path.isfile(arg):
+        continue
+    if 'sample_003' in arg:
+        print(f"mogrify: unable to open image `{{arg}}' @ error/blob.c/OpenBlob/2924.",
+              file=sys.stderr)
+        continue
+    shutil.copyfile(arg, os.path.join(target_path, os.path.basename(arg)))
+'''
+
+
+class CopyRunner(abstract.Runner):
+    """
+    A page ``Runner`` that copies the source page to the target page in place
+    of running ``convert``, recording the pages it executes.
+    """
+    lock = threading.Lock()
+    executed = []
+
+    def setup(command):
+        os.makedirs(command.target_path, exist_ok=True)
+
+    def execute(command):
+        with CopyRunner.lock:
+            CopyRunner.executed.append(os.path.basename(command.source_file))
+        shutil.copyfile(command.source_file, command.target_file)
+
+    def cleanup(command):
+        return
+
+
+@pytest.fixture
+def runner():
+    CopyRunner.executed = []
+    return CopyRunner
+
+
+@pytest.fixture
+def fake_mogrify(tmp_path, monkeypatch):
+    """
+    Put a ``mogrify`` on the path that copies pages, and reports an error for
+    ``sample_003.tiff`` without writing it.
+    """
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'mogrify'
+    script.write_text(FAKE_MOGRIFY)
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+
+def page_actions(tmp_path, output='output'):
+    resolution = Resolution.make(300, 'PixelsPerInch')
+    return resample_page.multi_resample_page(
+        resolution,
+        sample.TEST_TIFFS,
+        sorted(os.listdir(sample.TEST_TIFFS)),
+        os.path.join(str(tmp_path), output)
+    )
+
+
+class TestMakeBatches:
+
+    def test_pages_should_be_split_into_batches_of_at_most_batch_size(self, tmp_path):
+        batches, rest = batch.make_batches(page_actions(tmp_path), 2)
+
+        assert [len(item.actions) for item in batches] == [2, 2, 1]
+        assert rest == {}
+
+
+    def test_pages_should_be_split_between_jobs(self, tmp_path):
+        batches, rest = batch.make_batches(page_actions(tmp_path), 64, jobs=2)
+
+        assert [len(item.actions) for item in batches] == [3, 2]
+
+
+    def test_pages_should_be_grouped_by_target_directory_and_operations(self, tmp_path):
+        actions = page_actions(tmp_path, 'first')
+        actions.update({
+            'other_' + page: action
+            for page, action in page_actions(tmp_path, 'second').items()
+        })
+        actions['expand'] = expand_page.make(
+            2000, 3000, sample.SAMPLE_TIFF,
+            os.path.join(str(tmp_path), 'first', 'sample.tiff')
+        )
+        batches, rest = batch.make_batches(actions, 64)
+
+        assert sorted(len(item.actions) for item in batches) == [1, 5, 5]
+        for item in batches:
+            assert len({action.target_path for action in item.actions}) == 1
+
+
+    def test_change_resolution_should_not_be_batched(self, tmp_path):
+        resolution = Resolution.make(300, 'PixelsPerInch')
+        action = change_resolution.make(
+            resolution, sample.SAMPLE_TIFF,
+            os.path.join(str(tmp_path), 'sample.tiff')
+        )
+
+        assert not batch.is_batchable(action)
+
+
+    def test_mogrify_command_line(self, tmp_path):
+        batches, _ = batch.make_batches(page_actions(tmp_path), 64)
+        args = batches[0].as_subprocess()
+
+        assert args[:3] == ['mogrify', '-path', os.path.join(str(tmp_path), 'output')]
+        assert args[3:7] == ['-resample', '300x300', '-units', 'PixelsPerInch']
+        assert len(args[7:]) == 5
+
+
+class TestBatchRunner:
+
+    def test_batched_pages_should_be_reported_individually(self, tmp_path, runner, fake_mogrify):
+        """
+        Every page of a batch should have its own result, and only the page
+        that ``mogrify`` failed on should be run again on its own.
+        """
+        actions = batch.make(page_actions(tmp_path), runner, 64)
+        run_report = scheduler.run_command(actions)
+
+        assert len(run_report) == 5
+        assert not run_report.failed
+        assert runner.executed == ['sample_003.tiff']
+        for result in run_report.results:
+            assert os.path.isfile(result.action.target_file)
+
+
+    def test_pages_should_fall_back_without_mogrify(self, tmp_path, runner, monkeypatch):
+        monkeypatch.setenv('PATH', str(tmp_path))
+        actions = batch.make(page_actions(tmp_path), runner, 2)
+        run_report = scheduler.run_command(actions, jobs=2)
+
+        assert len(run_report) == 5
+        assert sorted(runner.executed) == sorted(os.listdir(sample.TEST_TIFFS))
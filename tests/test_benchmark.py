@@ -0,0 +1,147 @@
+import pytest
+import bookworm.benchmark as benchmark
+import bookworm.pdf       as pdf
+import bookworm.tiff      as tiff
+import os
+import os.path
+import sys
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return benchmark.generate(
+        benchmark.Corpus(os.path.join(str(tmp_path), 'corpus'), pages=3, dpi=50)
+    )
+
+
+class TestCorpus:
+
+    @pytest.mark.parametrize('color_mode', benchmark.COLOR_MODES)
+    def test_pages_have_the_requested_size(self, tmp_path, color_mode):
+        corpus = benchmark.generate(benchmark.Corpus(
+            str(tmp_path), pages=2, dpi=40, width=5, height=4, color_mode=color_mode
+        ))
+        page_files = sorted(os.listdir(corpus.page_dir))
+        header = tiff.read_header(os.path.join(corpus.page_dir, page_files[0]))
+
+        assert len(page_files) == 2
+        assert (header.width, header.height) == (200, 160)
+        assert header.bits_per_sample == benchmark.BITS_PER_SAMPLE[color_mode]
+        assert header.x_resolution == 40
+
+        with pdf.Document(corpus.source_pdf) as document:
+            pages = document.pages()
+            assert len(pages) == 2
+            assert [float(value) for value in pages[0].media_box] == [0, 0, 360, 288]
+
+    def test_generated_corpus_is_reused(self, corpus):
+        page_file = os.path.join(corpus.page_dir, '_Page_0001.tiff')
+        modified = os.stat(page_file).st_mtime_ns
+        benchmark.generate(corpus)
+
+        assert os.stat(page_file).st_mtime_ns == modified
+
+    def test_invalid_corpus(self, tmp_path):
+        with pytest.raises(ValueError):
+            benchmark.Corpus(str(tmp_path), color_mode='sepia')
+        with pytest.raises(ValueError):
+            benchmark.Corpus(str(tmp_path), pages=0)
+
+
+class TestCases:
+
+    def test_cases_by_subcommand(self):
+        names = [case.name for case in benchmark.find_cases(['expand-page'])]
+        assert names == ['expand-page/serial', 'expand-page/pool', 'expand-page/batch']
+
+    def test_unknown_cases(self):
+        with pytest.raises(ValueError):
+            benchmark.find_cases(['expand'])
+
+    def test_case_arguments(self, corpus):
+        case = benchmark.find_cases(['resample-page/batch'])[0]
+        args = case.args(corpus, 'out', 4)
+
+        assert args[0] == 'resample-page'
+        assert args[args.index('-j') + 1] == '4'
+        assert '--batch' in args
+
+        case = benchmark.find_cases(['resample-page/serial'])[0]
+        args = case.args(corpus, 'out', 4)
+        assert args[args.index('-j') + 1] == '1'
+
+
+class TestRun:
+
+    def test_measure_counts_child_cpu_time(self, tmp_path):
+        measurement = benchmark.measure(
+            [sys.executable, '-c', 'sum(range(3 * 10 ** 6))'],
+            os.path.join(str(tmp_path), 'log')
+        )
+
+        assert measurement.returncode == 0
+        assert measurement.cpu_seconds > 0
+        assert measurement.peak_rss > 0
+
+    def test_run_benchmark(self, corpus, tmp_path):
+        """
+        Packing a pdf runs without external programs, so it should succeed
+        and report its throughput.
+        """
+        results = benchmark.run_benchmark(
+            corpus, ['pack-pdf'], jobs=2, work_dir=str(tmp_path)
+        )
+
+        assert results['corpus'] == corpus.as_dict()
+        [result] = results['results']
+        assert result['name'] == 'pack-pdf/in-process'
+        assert result['succeeded']
+        assert result['pages_per_second'] > 0
+        assert result['cpu_seconds'] > 0
+
+    def test_failed_cases_are_reported(self, corpus, tmp_path):
+        case = benchmark.Case(
+            'pack-pdf/missing', 'pack-pdf', 'in-process',
+            lambda corpus, output, jobs: ['-i', 'missing', '-o', output]
+        )
+        result = benchmark.run_case(case, corpus, str(tmp_path))
+
+        assert not result['succeeded']
+        assert 'missing' in result['error']
+
+
+def results(**cases):
+    return {'results': [dict(name=name, **values) for name, values in cases.items()]}
+
+
+class TestCompare:
+
+    def test_regressions_are_flagged(self):
+        baseline = results(
+            fast=dict(succeeded=True, pages_per_second=10.0, cpu_seconds=5.0, peak_rss=100),
+            lean=dict(succeeded=True, pages_per_second=10.0, cpu_seconds=5.0, peak_rss=100),
+            working=dict(succeeded=True, pages_per_second=10.0, cpu_seconds=5.0, peak_rss=100),
+        )
+        current = results(
+            fast=dict(succeeded=True, pages_per_second=8.0, cpu_seconds=5.0, peak_rss=100),
+            lean=dict(succeeded=True, pages_per_second=10.0, cpu_seconds=5.2, peak_rss=150),
+            working=dict(succeeded=False, error='exit status 1'),
+        )
+
+        regressions = benchmark.compare(baseline, current, tolerance=0.1)
+
+        assert len(regressions) == 3
+        assert regressions[0].startswith('fast: pages/sec')
+        assert regressions[1].startswith('lean: peak RSS')
+        assert regressions[2].startswith('working: failed')
+
+    def test_improvements_and_new_cases_pass(self):
+        baseline = results(
+            case=dict(succeeded=True, pages_per_second=10.0, cpu_seconds=5.0, peak_rss=100)
+        )
+        current = results(
+            case=dict(succeeded=True, pages_per_second=20.0, cpu_seconds=2.0, peak_rss=50),
+            new=dict(succeeded=False, error='exit status 1')
+        )
+
+        assert benchmark.compare(baseline, current) == []
@@ -0,0 +1,164 @@
+import pytest
+import bookworm.abstract      as abstract
+import bookworm.sample_data   as sample
+import bookworm.resample_page as resample_page
+import bookworm.cache         as cache
+import bookworm.scheduler     as scheduler
+import bookworm_main.arg_processor as arg_processor
+import argparse
+import os
+import shutil
+import stat
+import time
+
+from bookworm.resolution import Resolution
+
+
+class CopyRunner(abstract.Runner):
+    """
+    A ``Runner`` that copies the source page to the target page in place of
+    running ImageMagick, counting how often it is executed.
+    """
+    executed = 0
+
+    def setup(command):
+        return
+
+    def execute(command):
+        CopyRunner.executed += 1
+        shutil.copyfile(command.source_file, command.target_file)
+
+    def cleanup(command):
+        return
+
+
+@pytest.fixture
+def runner():
+    CopyRunner.executed = 0
+    return CopyRunner
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return os.path.join(str(tmp_path), 'cache')
+
+
+def actions(tmp_path, output, resolution_val=300):
+    resolution = Resolution.make(resolution_val, 'PixelsPerInch')
+    return resample_page.multi_resample_page(
+        resolution,
+        sample.TEST_TIFFS,
+        sorted(os.listdir(sample.TEST_TIFFS)),
+        os.path.join(str(tmp_path), output)
+    )
+
+
+def run(page_actions, caching_runner):
+    for action in page_actions.values():
+        os.makedirs(action.target_path, exist_ok=True)
+
+    return scheduler.run_command([(page_actions, caching_runner)], jobs=2)
+
+
+class TestCache:
+
+    def test_second_run_should_be_served_from_the_cache(self, tmp_path, runner, cache_dir):
+        """
+        Running the same pages with the same parameters again should not
+        execute the wrapped runner, but should still produce every output.
+        """
+        caching_runner = cache.make(runner, cache_dir)
+        run(actions(tmp_path, 'first'), caching_runner)
+        second = actions(tmp_path, 'second')
+        run(second, caching_runner)
+
+        assert runner.executed == len(second)
+        assert caching_runner.cache.hits == len(second)
+        for action in second.values():
+            assert os.path.isfile(action.target_file)
+
+
+    def test_different_parameters_should_miss(self, tmp_path, runner, cache_dir):
+        caching_runner = cache.make(runner, cache_dir)
+        run(actions(tmp_path, 'first'), caching_runner)
+        run(actions(tmp_path, 'second', 600), caching_runner)
+
+        assert caching_runner.cache.hits == 0
+
+
+    def test_hardlink_hits_should_share_the_cached_object(self, tmp_path, runner, cache_dir):
+        caching_runner = cache.make(runner, cache_dir, hardlink=True)
+        run(actions(tmp_path, 'first'), caching_runner)
+        second = actions(tmp_path, 'second')
+        run(second, caching_runner)
+
+        for action in second.values():
+            assert os.stat(action.target_file).st_nlink == 2
+
+
+    def test_hardlink_outputs_should_stay_writable_after_eviction(self, tmp_path, runner, cache_dir):
+        """
+        Outputs linked to evicted objects should be writable again, and a
+        miss should replace an output left read only rather than write into
+        it.
+        """
+        caching_runner = cache.make(runner, cache_dir, hardlink=True)
+        run(actions(tmp_path, 'first'), caching_runner)
+        second = actions(tmp_path, 'second')
+        run(second, caching_runner)
+
+        caching_runner.cache.max_size = 1
+        caching_runner.cache.evict()
+        for action in second.values():
+            assert os.stat(action.target_file).st_mode & stat.S_IWUSR
+
+        for action in second.values():
+            os.chmod(action.target_file, stat.S_IRUSR)
+        run(second, cache.make(runner, os.path.join(str(tmp_path), 'other')))
+        for action in second.values():
+            assert os.stat(action.target_file).st_mode & stat.S_IWUSR
+
+
+    def test_cache_should_evict_least_recently_used_objects(self, tmp_path, runner, cache_dir):
+        """
+        Storing past the size cap should remove the oldest objects first.
+        """
+        page_size = os.path.getsize(os.path.join(sample.TEST_TIFFS, 'sample_001.tiff'))
+        caching_runner = cache.make(runner, cache_dir, max_size=int(2.5 * page_size))
+        page_actions = actions(tmp_path, 'first')
+        for page in sorted(page_actions):
+            run({page: page_actions[page]}, caching_runner)
+            time.sleep(0.01)
+
+        objects = caching_runner.cache.objects()
+        assert len(objects) == 2
+        assert caching_runner.cache.disk_size() <= caching_runner.cache.max_size
+
+        kept = {os.path.basename(path) for _, _, path in objects}
+        expected = {
+            caching_runner.cache.key(page_actions[page])
+            for page in sorted(page_actions)[-2:]
+        }
+        assert kept == expected
+
+
+    def test_pages_rewritten_in_place_should_not_be_cached(self):
+        resolution = Resolution.make(300, 'PixelsPerInch')
+        action = resample_page.make(resolution, sample.SAMPLE_TIFF, sample.SAMPLE_TIFF)
+
+        assert not cache.is_cacheable(action)
+
+
+class TestCheckSize:
+
+    @pytest.mark.parametrize('value,expected', [
+        ('1024', 1024), ('500M', 500 * 1024 ** 2), ('20g', 20 * 1024 ** 3),
+    ])
+    def test_check_size(self, value, expected):
+        assert arg_processor.check_size(value) == expected
+
+
+    @pytest.mark.parametrize('value', ['0', 'Potato', '-5G'])
+    def test_check_size_should_reject_invalid_sizes(self, value):
+        with pytest.raises(argparse.ArgumentTypeError):
+            arg_processor.check_size(value)
@@ -0,0 +1,204 @@
+import pytest
+import bookworm.color_mode    as color_mode
+import bookworm.unpack_pdf    as unpack_pdf
+import bookworm.resample_page as resample_page
+import bookworm.normalize_page as normalize_page
+import bookworm.sample_data   as sample
+import hypothesis.strategies as st
+import io
+import struct
+
+from bookworm.resolution import Resolution
+from hypothesis import given
+
+
+def tiff_with_depth(file_path, bits_per_sample, samples_per_pixel, photometric):
+    """
+    Write a TIFF header describing a one pixel image with the given sample
+    layout. Only the header is ever read.
+    """
+    entries = [
+        (256, 3, 1, 1),
+        (257, 3, 1, 1),
+        (258, 3, 1, bits_per_sample),
+        (262, 3, 1, photometric),
+        (277, 3, 1, samples_per_pixel),
+    ]
+    data = b'II' + struct.pack('<HI', 42, 8) + struct.pack('<H', len(entries))
+    for tag, type, count, value in entries:
+        data += struct.pack('<HHIHH', tag, type, count, value, 0)
+    data += struct.pack('<I', 0)
+
+    with open(file_path, 'wb') as handle:
+        handle.write(data)
+
+    return file_path
+
+
+def page(*pixels, background=(255, 255, 255), size=1000):
+    """
+    The RGB samples of a page of ``size`` pixels: the given pixels followed
+    by background.
+    """
+    samples = list(pixels) + [background] * (size - len(pixels))
+    return bytes(value for pixel in samples for value in pixel)
+
+
+def classify_each_pixel(pixels):
+    """
+    Classify ``pixels`` one pixel at a time.
+    """
+    count = len(pixels) // 3
+    allowed = count * color_mode.NOISE_FRACTION
+    colored = midtones = 0
+    for red, green, blue in zip(pixels[0::3], pixels[1::3], pixels[2::3]):
+        if max(red, green, blue) - min(red, green, blue) > color_mode.CHROMA_TOLERANCE:
+            colored += 1
+        elif color_mode.BILEVEL_MARGIN < green < 255 - color_mode.BILEVEL_MARGIN:
+            midtones += 1
+
+    if colored > allowed:
+        return color_mode.COLOR
+
+    return color_mode.GRAY if midtones > allowed else color_mode.BILEVEL
+
+
+class TestClassify:
+
+    def test_black_text_on_white_paper_should_be_bilevel(self):
+        pixels = page(*[(0, 0, 0)] * 200)
+
+        assert color_mode.classify(pixels) == color_mode.BILEVEL
+
+
+    def test_specks_should_not_make_a_page_color(self):
+        pixels = page((255, 0, 0), *[(0, 0, 0)] * 200)
+
+        assert color_mode.classify(pixels) == color_mode.BILEVEL
+
+
+    def test_midtones_should_make_a_page_gray(self):
+        pixels = page(*[(128, 128, 128)] * 100)
+
+        assert color_mode.classify(pixels) == color_mode.GRAY
+
+
+    def test_colored_pixels_should_make_a_page_color(self):
+        pixels = page(*[(200, 40, 40)] * 100)
+
+        assert color_mode.classify(pixels) == color_mode.COLOR
+
+
+    # Pixels close to gray, so that many of them lie on either side of the
+    # chroma tolerance.
+    near_gray = st.tuples(
+        st.integers(0, 255), st.integers(-30, 30), st.integers(-30, 30)
+    ).map(lambda pixel: tuple(
+        min(255, max(0, pixel[0] + offset)) for offset in (0, pixel[1], pixel[2])
+    ))
+
+    @given(st.lists(near_gray, max_size=400), st.integers(0, 400))
+    def test_classify_should_match_a_pixel_loop(self, pixels, background):
+        samples = page(*pixels, size=len(pixels) + background)
+
+        assert color_mode.classify(samples) == classify_each_pixel(samples)
+
+
+class TestReadPPMPages:
+
+    def test_read_ppm_pages_should_read_every_image(self):
+        stream = io.BytesIO(
+            b'P6\n# a comment\n2 1\n255\n' + bytes(6) +
+            b'P6 1 1 255\n' + bytes([1, 2, 3])
+        )
+        pages = list(color_mode.read_ppm_pages(stream))
+
+        assert pages == [bytes(6), bytes([1, 2, 3])]
+
+
+    def test_read_ppm_pages_should_reject_truncated_images(self):
+        stream = io.BytesIO(b'P6\n2 2\n255\n' + bytes(6))
+
+        with pytest.raises(ValueError):
+            list(color_mode.read_ppm_pages(stream))
+
+
+class TestDepthOperations:
+
+    def test_bilevel_pages_should_stay_bilevel(self, tmp_path):
+        file_path = tiff_with_depth(str(tmp_path / 'page.tiff'), 1, 1, 0)
+
+        assert '-type' in color_mode.depth_operations(file_path)
+        assert 'Bilevel' in color_mode.depth_operations(file_path)
+
+
+    def test_gray_pages_should_stay_gray(self, tmp_path):
+        file_path = tiff_with_depth(str(tmp_path / 'page.tiff'), 8, 1, 1)
+
+        assert color_mode.depth_operations(file_path) == ['-type', 'Grayscale']
+
+
+    @pytest.mark.parametrize('file_path', [
+        sample.SAMPLE_TIFF, sample.SAMPLE_PDF, 'does_not_exist.tiff'
+    ])
+    def test_other_pages_need_no_operations(self, file_path):
+        assert color_mode.depth_operations(file_path) == []
+
+
+    def test_palette_pages_need_no_operations(self, tmp_path):
+        file_path = tiff_with_depth(str(tmp_path / 'page.tiff'), 8, 1, 3)
+
+        assert color_mode.depth_operations(file_path) == []
+
+
+    def test_page_commands_should_keep_the_bit_depth(self, tmp_path):
+        file_path = tiff_with_depth(str(tmp_path / 'page.tiff'), 8, 1, 1)
+        target_file = str(tmp_path / 'output.tiff')
+        resolution = Resolution.make(300, 'PixelsPerInch')
+        resample = resample_page.make(resolution, file_path, target_file)
+        normalize = normalize_page.make(
+            file_path, target_file, resolution, resolution, (100, 100)
+        )
+
+        assert resample.as_subprocess()[-4:-2] == ['-type', 'Grayscale']
+        assert normalize.operations().count('Grayscale') == 1
+        assert normalize.operations()[-2:] == ['-type', 'Grayscale']
+
+
+class TestUnpackPDFColorModes:
+
+    def test_mode_ranges_should_split_where_the_mode_changes(self):
+        modes = ['bilevel', 'bilevel', 'color', 'gray', 'gray', 'gray']
+
+        assert unpack_pdf.mode_ranges(modes, 2) == [
+            (1, 2, 'bilevel'), (3, 3, 'color'), (4, 6, 'gray')
+        ]
+
+
+    def test_bilevel_pages_should_render_with_the_g4_device(self, tmp_path):
+        arg_dict = dict(
+            input = sample.SAMPLE_PDF,
+            output = str(tmp_path / 'output'),
+            color_mode = 'bilevel'
+        )
+        action = unpack_pdf.process_args(arg_dict)
+
+        assert '-sDEVICE=tiffg4' in action.args
+        assert '-sCompression=lzw' not in action.args
+
+
+    def test_auto_mode_should_render_each_range_with_its_device(self, tmp_path, monkeypatch):
+        modes = ['bilevel'] * 4 + ['color'] * 2 + ['gray'] * 4
+        monkeypatch.setattr(color_mode, 'page_modes', lambda source_pdf: modes)
+        arg_dict = dict(
+            input = sample.SAMPLE_PDF,
+            output = str(tmp_path / 'output'),
+            color_mode = 'auto'
+        )
+        actions = unpack_pdf.process_args(arg_dict)
+
+        devices = [
+            (action.first_page, action.device)
+            for _, action in sorted(actions.items())
+        ]
+        assert devices == [(1, 'tiffg4'), (5, 'tiff24nc'), (7, 'tiffgray')]
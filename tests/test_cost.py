@@ -0,0 +1,150 @@
+import pytest
+import bookworm.abstract  as abstract
+import bookworm.benchmark as benchmark
+import bookworm.cost      as cost
+import bookworm.scheduler as scheduler
+import os
+import os.path
+import threading
+
+
+class Page:
+
+    def __init__(self, source_file, target_file):
+        self.source_file = source_file
+        self.target_file = target_file
+
+
+class Batch:
+
+    def __init__(self, actions):
+        self.actions = actions
+
+
+def write_file(tmp_path, name, size):
+    file_path = os.path.join(str(tmp_path), name)
+    with open(file_path, 'wb') as handle:
+        handle.write(bytes(size))
+
+    return file_path
+
+
+def make_page(tmp_path, name, size):
+    return Page(write_file(tmp_path, name + '.src', size), name + '.tiff')
+
+
+class TestEstimate:
+
+    def test_tiff_pages_are_estimated_by_pixels(self, tmp_path):
+        corpus = benchmark.generate(benchmark.Corpus(
+            str(tmp_path), pages=1, dpi=20, width=3, height=2
+        ))
+        page_file = os.path.join(corpus.page_dir, os.listdir(corpus.page_dir)[0])
+
+        assert cost.file_size(page_file) == 60 * 40
+
+    def test_other_files_are_estimated_by_size(self, tmp_path):
+        assert cost.estimate(make_page(tmp_path, 'a', 1234)) == 1234
+        assert cost.file_size(os.path.join(str(tmp_path), 'missing')) == 0
+
+    def test_shards_are_estimated_by_pages(self, tmp_path):
+        class Shard:
+            source_pdf = write_file(tmp_path, 'book.pdf', 100)
+            pages = range(3, 7)
+
+        assert cost.estimate(Shard()) == 400
+
+
+class TestCostModel:
+
+    def test_largest_first(self, tmp_path):
+        pages = [make_page(tmp_path, name, size) for name, size in
+                 (('a', 10), ('b', 300), ('c', 20), ('d', 300))]
+        entries = [(page, None, 1, 0) for page in pages]
+
+        ordered = cost.CostModel().order(entries)
+
+        assert [entry[0].target_file for entry in ordered] == [
+            'b.tiff', 'd.tiff', 'c.tiff', 'a.tiff'
+        ]
+
+    def test_batches_cost_their_pages(self, tmp_path):
+        batch = Batch([make_page(tmp_path, 'a', 100), make_page(tmp_path, 'b', 100)])
+        single = make_page(tmp_path, 'c', 150)
+
+        assert cost.CostModel().costs([batch, single]) == [200, 150]
+
+    def test_history_refines_estimates(self, tmp_path):
+        """
+        Page ``a`` is small but took long the last time, and the scale of
+        the recorded pages carries over to page ``c``, which has no record.
+        """
+        pages = [make_page(tmp_path, name, size) for name, size in
+                 (('a', 100), ('b', 200), ('c', 300))]
+        records = [
+            dict(action='Page', page='a.tiff', succeeded=True, seconds=9.0),
+            dict(action='Page', page='b.tiff', succeeded=True, seconds=1.0),
+            dict(action='Page', page='c.tiff', succeeded=False, seconds=0.1),
+        ]
+
+        costs = cost.make(records).costs(pages)
+
+        assert costs[0] == 9.0
+        assert costs[1] == 1.0
+        assert costs[2] == pytest.approx(300 * 10.0 / 300)
+
+    def test_unrecorded_kinds_are_costed_in_seconds(self, tmp_path):
+        """
+        A kind of action without records should be scaled to seconds along
+        with the recorded kinds, rather than compared by its raw estimate.
+        """
+        class Shard(Page):
+            pass
+
+        page = make_page(tmp_path, 'a', 100)
+        shard = Shard(write_file(tmp_path, 'b.src', 300), 'b.tiff')
+        records = [dict(action='Page', page='a.tiff', succeeded=True, seconds=2.0)]
+
+        assert cost.make(records).costs([page, shard]) == pytest.approx([2.0, 6.0])
+
+        missing = Page(os.path.join(str(tmp_path), 'missing'), 'a.tiff')
+        costs = cost.make(records).costs([missing, shard])
+        assert costs == pytest.approx([2.0, 300 * cost.SECONDS_PER_PIXEL])
+
+
+class TestScheduler:
+
+    def test_costliest_actions_start_first(self, tmp_path):
+        """
+        The two costliest pages wait for each other, so the cheapest one
+        can only start once both of them have started.
+        """
+        started = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(2)
+
+        class RecordingRunner(abstract.Runner):
+
+            def setup(command):
+                return
+
+            def execute(command):
+                with lock:
+                    started.append(command.target_file)
+                if command.target_file != 'a.tiff' and not barrier.broken:
+                    barrier.wait(timeout=10)
+
+            def cleanup(command):
+                return
+
+        pages = {
+            name: make_page(tmp_path, name, size)
+            for name, size in (('a', 10), ('b', 30), ('c', 20))
+        }
+        scheduler.run_command([(pages, RecordingRunner)], jobs=2)
+        assert started[-1] == 'a.tiff'
+
+        started.clear()
+        barrier.abort()
+        scheduler.run_command([(pages, RecordingRunner)], jobs=1)
+        assert started == ['a.tiff', 'b.tiff', 'c.tiff']
@@ -0,0 +1,114 @@
+import pytest
+import bookworm.abstract        as abstract
+import bookworm.execute_command as execute_command
+import bookworm.scheduler       as scheduler
+import bookworm.sample_data     as sample
+import bookworm.expand_page     as expand_page
+import os
+import threading
+
+
+class FakeRunner(abstract.Runner):
+    """
+    A ``Runner`` that records the actions it executes instead of launching
+    any subprocesses. Actions whose name starts with ``fail`` raise an error.
+    """
+    lock = threading.Lock()
+    executed = []
+    cleaned_up = []
+
+    def setup(command):
+        return
+
+    def execute(command):
+        if command.startswith('fail'):
+            raise OSError(f'Failed: {command}')
+
+        with FakeRunner.lock:
+            FakeRunner.executed.append(command)
+
+    def cleanup(command):
+        with FakeRunner.lock:
+            FakeRunner.cleaned_up.append(command)
+
+
+@pytest.fixture
+def runner():
+    FakeRunner.executed = []
+    FakeRunner.cleaned_up = []
+    return FakeRunner
+
+
+class TestExpandActions:
+
+    def test_expand_actions_should_flatten_multiple_page_actions(self, runner):
+        """
+        A multiple page action should expand into one ``(action, runner)``
+        pair per page, in page name order.
+        """
+        actions = [({'page_2': 'page_2', 'page_1': 'page_1'}, runner)]
+        result = list(scheduler.expand_actions(actions))
+
+        assert result == [('page_1', runner), ('page_2', runner)]
+
+
+    def test_expand_actions_should_keep_single_actions(self, runner):
+        """
+        A single pdf or page action should pass through unchanged.
+        """
+        actions = [('page_1', runner)]
+        result = list(scheduler.expand_actions(actions))
+
+        assert result == actions
+
+
+class TestRunCommand:
+
+    @pytest.fixture
+    def pages(self):
+        return {f'page_{i:04d}': f'page_{i:04d}' for i in range(64)}
+
+    @pytest.mark.parametrize('jobs', [1, 8])
+    def test_run_command_should_execute_every_page(self, runner, pages, jobs):
+        """
+        Every page action should be executed exactly once, regardless of
+        how many workers are used.
+        """
+        run_report = execute_command.run_command([(pages, runner)], jobs=jobs)
+
+        assert sorted(runner.executed) == sorted(pages.values())
+        assert len(run_report.succeeded) == len(pages)
+        assert not run_report.failed
+
+
+    @pytest.mark.parametrize('jobs', [1, 8])
+    def test_run_command_should_collect_failures_from_all_pages(self, runner, pages, jobs):
+        """
+        A failing page should be cleaned up and reported without stopping
+        the remaining pages.
+        """
+        pages['fail_1'] = 'fail_1'
+        pages['fail_2'] = 'fail_2'
+        run_report = execute_command.run_command([(pages, runner)], jobs=jobs)
+
+        failed = sorted(result.action for result in run_report.failed)
+        assert failed == ['fail_1', 'fail_2']
+        assert sorted(runner.cleaned_up) == ['fail_1', 'fail_2']
+        assert len(run_report.succeeded) == len(pages) - 2
+
+
+class TestMultiplePageTargets:
+
+    def test_multiple_page_actions_should_write_one_file_per_page(self):
+        """
+        Each page action built from an input directory should write to its
+        own file inside the output directory.
+        """
+        output = os.path.join(sample.SAMPLE_ROOT, 'output')
+        arg_dict = dict(
+            input = sample.TEST_TIFFS, output = output, dimensions = (2160, 3060)
+        )
+        multi_actions = expand_page.process_args(arg_dict)
+
+        for source_file, action in multi_actions.items():
+            assert action.target_file == os.path.join(output, source_file)
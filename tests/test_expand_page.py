@@ -154,3 +154,23 @@ class TestRunner:
 
         assert os.path.exists(fixture.target_file)
 
+
+
+class TestAutoDimensions:
+
+    def test_process_args_should_derive_dimensions_from_the_largest_page(self):
+        """
+        With ``auto`` dimensions, every page should be expanded to the
+        dimensions of the largest page in the input directory.
+        """
+        arg_dict = dict(input = sample.TEST_TIFFS, dimensions = 'auto')
+        multi_actions = expand_page.process_args(arg_dict)
+
+        assert multi_actions
+        for action in multi_actions.values():
+            assert (action.width, action.height) == (1830, 2790)
+
+
+    def test_auto_dimensions_should_reject_non_existent_input(self):
+        with pytest.raises(FileNotFoundError):
+            expand_page.auto_dimensions('sample/directory/does/not/exist/')
@@ -0,0 +1,258 @@
+import pytest
+import bookworm.sample_data       as sample
+import bookworm.change_resolution as change_resolution
+import bookworm.unpack_pdf        as unpack_pdf
+import bookworm.manifest          as manifest
+import bookworm.report            as report
+import bookworm.scheduler         as scheduler
+import os
+import shutil
+import sys
+import tests.pdf_samples as samples
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source_dir = os.path.join(str(tmp_path), 'pages')
+    shutil.copytree(sample.TEST_TIFFS, source_dir)
+    return source_dir
+
+
+def change_resolution_actions(source_dir, resolution_val=600):
+    return change_resolution.process_args(dict(
+        input = source_dir,
+        output = os.path.join(source_dir, 'out'),
+        resolution = resolution_val,
+        units = 'PixelsPerInch'
+    ))
+
+
+def run_incremental(actions):
+    actions = manifest.stale_actions(actions)
+    scheduler.run_command(
+        [(actions, change_resolution.Runner)],
+        observers=[manifest.Recorder()]
+    )
+    return actions
+
+
+class TestStaleActions:
+
+    def test_first_run_should_process_every_page(self, source_dir):
+        actions = change_resolution_actions(source_dir)
+        assert manifest.stale_actions(actions) == actions
+
+
+    def test_second_run_should_skip_every_page(self, source_dir):
+        """
+        Once every page has been processed, nothing is stale.
+        """
+        run_incremental(change_resolution_actions(source_dir))
+
+        assert manifest.stale_actions(change_resolution_actions(source_dir)) == {}
+
+
+    def test_changed_sources_should_be_stale(self, source_dir):
+        """
+        Only the replaced scan should be processed again.
+        """
+        run_incremental(change_resolution_actions(source_dir))
+        shutil.copyfile(
+            sample.SAMPLE_TIFF, os.path.join(source_dir, 'sample_003.tiff')
+        )
+
+        stale = manifest.stale_actions(change_resolution_actions(source_dir))
+        assert list(stale) == ['sample_003.tiff']
+
+
+    def test_changed_parameters_should_be_stale(self, source_dir):
+        run_incremental(change_resolution_actions(source_dir))
+
+        stale = manifest.stale_actions(change_resolution_actions(source_dir, 300))
+        assert len(stale) == len(os.listdir(sample.TEST_TIFFS))
+
+
+    def test_damaged_outputs_should_be_stale(self, source_dir):
+        run_incremental(change_resolution_actions(source_dir))
+        with open(os.path.join(source_dir, 'out', 'sample_001.tiff'), 'ab') as handle:
+            handle.write(b'garbage')
+
+        stale = manifest.stale_actions(change_resolution_actions(source_dir))
+        assert list(stale) == ['sample_001.tiff']
+
+
+class TestStaleUnpackPDF:
+
+    def test_unpack_pdf_should_only_render_missing_pages(self, tmp_path):
+        """
+        An unpack action should be reduced to shards that render only the
+        pages that are missing.
+        """
+        target_dir = os.path.join(str(tmp_path), 'unpacked')
+        action = unpack_pdf.make(sample.SAMPLE_PDF, target_dir)
+        os.makedirs(target_dir)
+        for page in range(1, 11):
+            shutil.copyfile(sample.SAMPLE_TIFF, action.page_file(page))
+        manifest.Recorder().finished(report.ActionResult(action, unpack_pdf.Runner))
+
+        for page in (3, 4, 9):
+            os.remove(action.page_file(page))
+
+        stale = manifest.stale_actions(action)
+        ranges = [(shard.first_page, shard.last_page) for shard in stale.values()]
+        assert ranges == [(3, 4), (9, 9)]
+
+    def test_unpack_pdf_should_only_render_changed_pages(self, tmp_path):
+        """
+        Changing one page of a pdf, or appending an update to it, should only
+        make the pages whose contents changed stale.
+        """
+        pages = [samples.text_page(), samples.gray_image(), samples.text_page()]
+        source_pdf = samples.build_pdf(str(tmp_path / 'book.pdf'), pages)
+        target_dir = os.path.join(str(tmp_path), 'unpacked')
+        action = unpack_pdf.make(source_pdf, target_dir)
+        os.makedirs(target_dir)
+        for page in range(1, 4):
+            shutil.copyfile(sample.SAMPLE_TIFF, action.page_file(page))
+        manifest.Recorder().finished(report.ActionResult(action, unpack_pdf.Runner))
+
+        with open(source_pdf, 'ab') as handle:
+            handle.write(b'% an update\n')
+        assert manifest.stale_actions(action) == {}
+
+        pages[1] = samples.gray_image(content=b'q 144 0 0 72 72 36 cm /Im0 Do Q')
+        samples.build_pdf(source_pdf, pages)
+        stale = manifest.stale_actions(action)
+        ranges = [(shard.first_page, shard.last_page) for shard in stale.values()]
+        assert ranges == [(2, 2)]
+
+
+FAKE_GS = '''#!{python}
+import os, shutil, sys
+args = sys.argv[1:]
+if '-dNODISPLAY' in args:
+    print(10)
+    sys.exit(0)
+option = lambda name: next(arg[len(name):] for arg in args if arg.startswith(name))
+output = option('-sOutputFile=')
+first_page, last_page = int(option('-dFirstPage=')), int(option('-dLastPage='))
+fail_after = int(os.environ.get('FAKE_GS_FAIL_AFTER', '0'))
+for shard_page, page in enumerate(range(first_page, last_page + 1), start=1):
+    if fail_after and shard_page > fail_after:
+        with open(output % shard_page, 'wb') as handle:
+            handle.write(b'II*')
+        sys.exit(1)
+    shutil.copyfile(os.environ['FAKE_GS_PAGE'], output % shard_page)
+'''
+
+
+@pytest.fixture
+def fake_gs(tmp_path, monkeypatch):
+    """
+    A stand-in for Ghostscript that counts ten pages in any pdf and renders
+    every page as the sample page. It fails partway through writing a page
+    when ``FAKE_GS_FAIL_AFTER`` pages have been written.
+    """
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'gs'
+    script.write_text(FAKE_GS.format(python=sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setenv('FAKE_GS_PAGE', sample.SAMPLE_TIFF)
+    return monkeypatch
+
+
+def run_resumable(action):
+    manifests = manifest.Manifests(durable=True)
+    actions = manifest.resumable_actions(action)
+    run_report = scheduler.run_command(
+        [(actions, manifest.Journal(unpack_pdf.Runner, manifests))],
+        observers=[manifest.Recorder(manifests)]
+    )
+    return actions, run_report
+
+
+class TestResume:
+
+    @pytest.fixture
+    def action(self, tmp_path):
+        return unpack_pdf.make(sample.SAMPLE_PDF, os.path.join(str(tmp_path), 'unpacked'))
+
+    def test_interrupted_unpack_keeps_finished_pages(self, action, fake_gs):
+        """
+        Every page finished before a failure should be kept and journaled,
+        and the page being written should be discarded.
+        """
+        fake_gs.setenv('FAKE_GS_FAIL_AFTER', '6')
+        actions, run_report = run_resumable(action)
+
+        assert run_report.failed
+        assert [(shard.first_page, shard.last_page) for shard in actions.values()] == [(1, 10)]
+        assert sorted(os.listdir(action.target_dir)) == [
+            manifest.MANIFEST_FILE
+        ] + [os.path.basename(action.page_file(page)) for page in range(1, 7)]
+        assert len(manifest.Manifest(action.target_dir).entries) == 6
+
+    def test_resume_renders_only_unfinished_pages(self, action, fake_gs):
+        """
+        A resumed unpack should render only the pages missing from the
+        journal, and nothing once every page is journaled.
+        """
+        fake_gs.setenv('FAKE_GS_FAIL_AFTER', '6')
+        run_resumable(action)
+        fake_gs.delenv('FAKE_GS_FAIL_AFTER')
+
+        actions, run_report = run_resumable(action)
+        assert not run_report.failed
+        assert [(shard.first_page, shard.last_page) for shard in actions.values()] == [(7, 10)]
+        assert all(os.path.isfile(action.page_file(page)) for page in range(1, 11))
+
+        actions, _ = run_resumable(action)
+        assert actions == {}
+
+    def test_resume_discards_partial_files(self, action, fake_gs):
+        """
+        The shard directories and unjournaled pages of a killed run should
+        be replaced.
+        """
+        shard_dir = os.path.join(action.target_dir, '.shard_0001')
+        os.makedirs(shard_dir)
+        with open(os.path.join(shard_dir, '_Page_0001.tiff'), 'wb') as handle:
+            handle.write(b'II*')
+        with open(action.page_file(2), 'wb') as handle:
+            handle.write(b'II*')
+
+        actions = manifest.resumable_actions(action)
+        assert not os.path.exists(shard_dir)
+        assert [(shard.first_page, shard.last_page) for shard in actions.values()] == [(1, 10)]
+
+    def test_incremental_unpack_reruns_into_its_directory(self, action, fake_gs):
+        """
+        A second incremental multiple shard unpack into the directory of the
+        first should find every page up to date.
+        """
+        arg_dict = dict(
+            input=sample.SAMPLE_PDF, output=action.target_dir, jobs=2,
+            incremental=True
+        )
+        actions = manifest.stale_actions(unpack_pdf.process_args(arg_dict))
+        run_report = scheduler.run_command(
+            [(actions, unpack_pdf.Runner)], observers=[manifest.Recorder()]
+        )
+        assert not run_report.failed
+        assert all(os.path.isfile(action.page_file(page)) for page in range(1, 11))
+
+        assert manifest.stale_actions(unpack_pdf.process_args(arg_dict)) == {}
+
+    def test_resume_allows_occupied_directories(self, action, fake_gs):
+        """
+        Resumed multiple shard unpacks may write to a directory holding the
+        pages of an earlier run.
+        """
+        os.makedirs(action.target_dir)
+        shutil.copyfile(sample.SAMPLE_TIFF, action.page_file(1))
+        actions = unpack_pdf.multi_unpack_pdf(
+            sample.SAMPLE_PDF, action.target_dir, 2, resume=True
+        )
+        assert len(actions) == 2
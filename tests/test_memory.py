@@ -0,0 +1,186 @@
+import pytest
+import bookworm.abstract      as abstract
+import bookworm.batch         as batch
+import bookworm.memory        as memory
+import bookworm.resample_page as resample_page
+import bookworm.scheduler     as scheduler
+import bookworm.tiff          as tiff
+import collections
+import os.path
+import threading
+import time
+
+from bookworm.resolution import Resolution
+
+
+def write_page(tmp_path, name, width, height, bits_per_sample):
+    file_path = os.path.join(str(tmp_path), name)
+    tiff.write_image(file_path, width, height, bits_per_sample, 2, 1, b'\x00')
+    return file_path
+
+
+class Page:
+    """
+    A stand-in for an ImageMagick page action.
+    """
+    def __init__(self, source_file):
+        self.command = 'convert'
+        self.source_file = source_file
+
+    def __repr__(self):
+        return f'Page({self.source_file!r})'
+
+
+class TrackingRunner(abstract.Runner):
+    """
+    A runner that records the most memory its running actions held at once.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.peak = 0
+        self.limits = []
+
+    def setup(self, command):
+        return
+
+    def execute(self, command):
+        with self.lock:
+            self.peak = max(self.peak, self.budget.in_use)
+            self.limits.append(memory.current_limit())
+        time.sleep(0.05)
+
+    def cleanup(self, command):
+        return
+
+
+class TestEstimate:
+
+    def test_page_memory_uses_the_header(self, tmp_path):
+        """
+        A page should be estimated from its width, height and channels, at
+        ImageMagick's 16 bit quantum, for its source and its result.
+        """
+        gray = write_page(tmp_path, 'gray.tiff', 100, 50, (8,))
+        color = write_page(tmp_path, 'color.tiff', 100, 50, (8, 8, 8))
+
+        assert memory.page_memory(gray) == 100 * 50 * 1 * 2 * 2
+        assert memory.page_memory(color) == 100 * 50 * 3 * 2 * 2
+
+    def test_unreadable_pages_are_free(self, tmp_path):
+        file_path = os.path.join(str(tmp_path), 'page.tiff')
+        with open(file_path, 'wb') as handle:
+            handle.write(b'not a tiff')
+
+        assert memory.page_memory(file_path) == 0
+        assert memory.page_memory(os.path.join(str(tmp_path), 'missing.tiff')) == 0
+
+    def test_action_memory(self, tmp_path):
+        small = write_page(tmp_path, 'small.tiff', 10, 10, (8,))
+        large = write_page(tmp_path, 'large.tiff', 100, 100, (8,))
+        target = os.path.join(str(tmp_path), 'out')
+        actions = [
+            resample_page.make(Resolution.make(300, 'PixelsPerInch'), page,
+                               os.path.join(target, os.path.basename(page)))
+            for page in (small, large)
+        ]
+
+        assert memory.action_memory(actions[0]) == memory.page_memory(small)
+        assert memory.action_memory(batch.Batch(actions)) == memory.page_memory(large)
+        assert memory.action_memory('gs') == 0
+
+
+class TestBudget:
+
+    def test_budget_admits_what_fits(self):
+        budget = memory.Budget(100)
+        assert budget.try_acquire(60)
+        assert not budget.try_acquire(60)
+        assert budget.try_acquire(40)
+        budget.release(60)
+        budget.release(40)
+        assert budget.in_use == 0
+
+    def test_oversized_actions_run_alone(self):
+        budget = memory.Budget(100)
+        assert budget.try_acquire(500)
+        assert not budget.try_acquire(1)
+
+    def test_unbounded_budget_admits_everything(self, tmp_path):
+        budget = memory.Budget()
+        page = Page(write_page(tmp_path, 'page.tiff', 100, 100, (8,)))
+        assert budget.estimate(page) == 0
+        assert budget.try_acquire(10 ** 12)
+
+    def test_estimate_is_capped_by_the_limit(self, tmp_path):
+        page = Page(write_page(tmp_path, 'page.tiff', 100, 100, (8,)))
+        assert memory.Budget(1000).estimate(page) == 1000
+
+    def test_non_positive_limits_are_rejected(self):
+        with pytest.raises(ValueError):
+            memory.Budget(0)
+
+
+class TestLimits:
+
+    def test_imagemagick_programs_get_limits(self):
+        with memory.limited(1024):
+            assert memory.with_limits(['convert', 'a.tiff', 'b.tiff']) == [
+                'convert', '-limit', 'memory', '1024', '-limit', 'map', '1024',
+                '-limit', 'area', '1024', 'a.tiff', 'b.tiff'
+            ]
+            assert memory.with_limits(['gs', '-q']) == ['gs', '-q']
+
+        assert memory.with_limits(['convert', 'a.tiff']) == ['convert', 'a.tiff']
+
+    def test_limits_belong_to_a_thread(self):
+        seen = []
+        with memory.limited(1024):
+            thread = threading.Thread(target=lambda: seen.append(memory.current_limit()))
+            thread.start()
+            thread.join()
+
+        assert seen == [None]
+
+
+class TestAdmission:
+
+    def test_scheduler_keeps_running_pages_within_budget(self, tmp_path):
+        """
+        Pages should only run together while their estimates fit in the
+        budget, and each should be limited to its own estimate.
+        """
+        pages = {
+            f'{index}.tiff': Page(write_page(tmp_path, f'{index}.tiff', 50, 50, (8,)))
+            for index in range(6)
+        }
+        page_memory = memory.page_memory(pages['0.tiff'].source_file)
+        budget = memory.Budget(2 * page_memory)
+        runner = TrackingRunner(budget)
+
+        run_report = scheduler.run_command(
+            [(pages, runner)], jobs=6, budget=budget
+        )
+
+        assert not run_report.failed
+        assert len(run_report) == 6
+        assert runner.peak <= 2 * page_memory
+        assert runner.limits == [page_memory] * 6
+        assert budget.in_use == 0
+
+    def test_smaller_pages_start_ahead_of_a_large_one(self, tmp_path):
+        large = Page(write_page(tmp_path, 'large.tiff', 100, 100, (8,)))
+        small = Page(write_page(tmp_path, 'small.tiff', 10, 10, (8,)))
+        budget = memory.Budget(memory.page_memory(large.source_file))
+        pending = collections.deque([
+            (small, None, 1, budget.estimate(small)),
+            (large, None, 1, budget.estimate(large)),
+            (small, None, 1, budget.estimate(small)),
+        ])
+
+        first = scheduler.admit(pending, budget)
+        second = scheduler.admit(pending, budget)
+
+        assert first[0] is small and second[0] is small
+        assert scheduler.admit(pending, budget) is None
+        assert len(pending) == 1
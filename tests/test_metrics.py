@@ -0,0 +1,130 @@
+import pytest
+import bookworm.abstract  as abstract
+import bookworm.cache     as cache
+import bookworm.metrics   as metrics
+import bookworm.process   as process
+import bookworm.scheduler as scheduler
+import os
+import os.path
+import subprocess
+import sys
+
+
+class Page:
+
+    def __init__(self, source_file, target_file, fail=False):
+        self.source_file = source_file
+        self.target_file = target_file
+        self.fail = fail
+
+    def operations(self):
+        return ['-copy']
+
+
+class CopyRunner(abstract.Runner):
+
+    def setup(command):
+        return
+
+    def execute(command):
+        if command.fail:
+            process.run([sys.executable, '-c', 'raise SystemExit(1)'])
+        with open(command.source_file, 'rb') as source:
+            with open(command.target_file, 'wb') as target:
+                target.write(source.read())
+
+    def cleanup(command):
+        return
+
+
+def make_pages(tmp_path, count, size=100, failing=()):
+    pages = {}
+    for page in range(count):
+        source_file = os.path.join(str(tmp_path), f'{page}.src')
+        with open(source_file, 'wb') as handle:
+            handle.write(bytes([page]) * size)
+        pages[str(page)] = Page(
+            source_file, os.path.join(str(tmp_path), f'{page}.tiff'), page in failing
+        )
+
+    return pages
+
+
+def parse(text):
+    """
+    The samples of a Prometheus text file by name and labels.
+    """
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+
+    return samples
+
+
+class TestExposition:
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1.0, 5.0))
+        for value in (0.5, 2.0, 7.0):
+            histogram.observe(value)
+
+        assert histogram.counts == [1, 2, 3]
+        assert histogram.sum == 9.5
+
+    def test_labels_are_escaped(self):
+        labels = [('stage', 'a"b\\c\nd')]
+        assert metrics.format_labels(labels) == '{stage="a\\"b\\\\c\\nd"}'
+
+    def test_child_program(self):
+        error = subprocess.CalledProcessError(1, ['/usr/bin/convert', 'a.tiff'])
+        assert metrics.child_program(error) == 'convert'
+        assert metrics.child_program(process.TimeLimitExceeded(['gs'], 1, 'CPU time')) == 'gs'
+        assert metrics.child_program(RuntimeError('failed')) is None
+
+
+class TestMetrics:
+
+    def test_run_metrics(self, tmp_path):
+        prom_file = os.path.join(str(tmp_path), 'textfile', 'bookworm.prom')
+        observer = metrics.Metrics(prom_file, 'resample-page', interval=0)
+        scheduler.run_command(
+            [(make_pages(tmp_path, 4, failing=(3,)), CopyRunner)],
+            jobs=2, observers=[observer]
+        )
+
+        with open(prom_file) as handle:
+            text = handle.read()
+        samples = parse(text)
+
+        assert '# TYPE bookworm_stage_duration_seconds histogram' in text
+        assert samples['bookworm_pages_total{command="resample-page",stage="Page",status="succeeded"}'] == 3
+        assert samples['bookworm_pages_total{command="resample-page",stage="Page",status="failed"}'] == 1
+        assert samples['bookworm_pages_scheduled{command="resample-page"}'] == 4
+        assert samples['bookworm_stage_duration_seconds_count{command="resample-page",stage="Page"}'] == 4
+        assert samples['bookworm_stage_duration_seconds_bucket{command="resample-page",stage="Page",le="+Inf"}'] == 4
+        assert samples['bookworm_bytes_written_total{command="resample-page"}'] == 300
+        assert samples['bookworm_in_flight_actions{command="resample-page"}'] == 0
+        program = os.path.basename(sys.executable)
+        assert samples[
+            f'bookworm_child_failures_total{{command="resample-page",stage="Page",program="{program}"}}'
+        ] == 1
+        assert [file for file in os.listdir(os.path.dirname(prom_file))] == ['bookworm.prom']
+
+    def test_cache_hit_ratio(self, tmp_path):
+        prom_file = os.path.join(str(tmp_path), 'bookworm.prom')
+        runner = cache.make(CopyRunner, os.path.join(str(tmp_path), 'cache'))
+        pages = make_pages(tmp_path, 2)
+        for _ in range(2):
+            scheduler.run_command(
+                [(pages, runner)], observers=[metrics.Metrics(prom_file, interval=0)]
+            )
+
+        with open(prom_file) as handle:
+            samples = parse(handle.read())
+
+        assert samples['bookworm_cache_hits_total{command=""}'] == 2
+        assert samples['bookworm_cache_misses_total{command=""}'] == 2
+        assert samples['bookworm_cache_hit_ratio{command=""}'] == pytest.approx(0.5)
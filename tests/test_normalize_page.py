@@ -0,0 +1,104 @@
+import pytest
+import bookworm.sample_data    as sample
+import bookworm.normalize_page as normalize_page
+import bookworm.util           as util
+import os
+
+from bookworm.resolution import Resolution
+
+
+class TestNormalizePage:
+
+    @pytest.fixture
+    def resolution(self):
+        return Resolution.make(300, 'PixelsPerInch')
+
+    def test_normalize_page_should_fuse_operations_into_one_command(self, resolution):
+        """
+        A ``NormalizePage`` action should read the page once, apply every
+        step's operations in order, and write the page once.
+        """
+        source_file = sample.SAMPLE_TIFF
+        target_file = os.path.join(sample.SAMPLE_ROOT, 'sample2.tiff')
+        action = normalize_page.make(
+            source_file, target_file, resolution, resolution, (2160, 3060)
+        )
+
+        assert action.as_subprocess() == [
+            'convert', f'./{source_file}',
+            '-density', '300', '-units', 'PixelsPerInch',
+            '-resample', '300x300', '-units', 'PixelsPerInch',
+            '-background', 'white', '-gravity', 'Center', '-extent', '2160x3060',
+            f'./{target_file}'
+        ]
+
+
+    def test_normalize_page_should_omit_missing_steps(self):
+        """
+        Only the requested steps should appear in the command.
+        """
+        action = normalize_page.make(sample.SAMPLE_TIFF, dimensions=(2160, 3060))
+
+        assert '-resample' not in action.as_subprocess()
+        assert '-density' not in action.as_subprocess()
+        assert '-extent' in action.as_subprocess()
+
+
+    def test_normalize_page_should_reject_an_empty_pipeline(self):
+        with pytest.raises(ValueError):
+            normalize_page.make(sample.SAMPLE_TIFF)
+
+
+class TestNormalizePageProcessArgs:
+
+    @pytest.fixture
+    def arg_dict(self):
+        return dict(
+            input = sample.TEST_TIFFS,
+            resample = 300,
+            units = 'PixelsPerInch',
+            dimensions = (2160, 3060)
+        )
+
+    def test_process_args_should_generate_multiple_actions_from_input_directory(self, arg_dict):
+        """
+        Given an input directory, the argument processor should generate
+        one ``NormalizePage`` action per page.
+        """
+        multi_actions = normalize_page.process_args(arg_dict)
+
+        assert len(multi_actions) == len(os.listdir(sample.TEST_TIFFS))
+        for action in multi_actions.values():
+            assert isinstance(action, normalize_page.NormalizePage)
+
+
+    def test_process_args_should_default_outputs_like_the_other_page_commands(self, arg_dict):
+        """
+        Without an output, pages should be written next to their sources,
+        as ``resample-page`` writes them, and in place when the output is
+        missing from the arguments altogether.
+        """
+        arg_dict['output'] = None
+        actions = normalize_page.process_args(arg_dict)
+        for name, action in actions.items():
+            source_file = os.path.join(sample.TEST_TIFFS, name)
+            assert action.target_file == util.temp_file_name(source_file)
+
+        del arg_dict['output']
+        for name, action in normalize_page.process_args(arg_dict).items():
+            assert action.target_file == action.source_file
+
+        arg_dict['input'] = sample.SAMPLE_TIFF
+        assert normalize_page.process_args(arg_dict).target_file == sample.SAMPLE_TIFF
+
+
+    def test_process_args_should_reject_bad_dimensions(self, arg_dict):
+        arg_dict['dimensions'] = (0, 3060)
+        with pytest.raises(ValueError):
+            normalize_page.process_args(arg_dict)
+
+
+    def test_process_args_should_reject_non_existent_input(self, arg_dict):
+        arg_dict['input'] = 'sample/directory/does/not/exist/'
+        with pytest.raises(FileNotFoundError):
+            normalize_page.process_args(arg_dict)
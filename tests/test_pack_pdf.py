@@ -0,0 +1,177 @@
+import pytest
+import bookworm.pack_pdf as pack_pdf
+import bookworm.pdf      as pdf
+import bookworm.tiff     as tiff
+import os
+import zlib
+import tests.pdf_samples as samples
+
+
+def write_page(file_path, kind, width=850, height=1100, resolution=(100, 100)):
+    """
+    Write a single strip TIFF page with placeholder image data of ``kind``.
+    """
+    if kind == 'fax':
+        tiff.write_image(file_path, width, height, (1,), 0, pack_pdf.COMPRESSION_CCITT_G4,
+                         b'\x00\x10\x01', resolution)
+    elif kind == 'jpeg':
+        tiff.write_image(file_path, width, height, (8, 8, 8), 6, pack_pdf.COMPRESSION_JPEG,
+                         samples.jpeg_header(width, height), resolution)
+    elif kind == 'lzw':
+        tiff.write_image(file_path, width, height, (8, 8, 8), 2, pack_pdf.COMPRESSION_LZW,
+                         b'\x80\x00\x20', resolution,
+                         [(tiff.TAG_PREDICTOR, tiff.TYPE_SHORT, [2])])
+    elif kind == 'raw':
+        tiff.write_image(file_path, width, height, (8,), 1, pack_pdf.COMPRESSION_NONE,
+                         bytes(range(256)) * (width * height // 256) + bytes(width * height % 256),
+                         resolution)
+    return file_path
+
+
+@pytest.fixture
+def page_dir(tmp_path):
+    page_dir = tmp_path / 'pages'
+    page_dir.mkdir()
+    for number, kind in enumerate(['fax', 'jpeg', 'lzw', 'raw'], start=1):
+        write_page(str(page_dir / f'page_{number:04d}.tiff'), kind)
+
+    return str(page_dir)
+
+
+class TestPageImage:
+
+    @pytest.mark.parametrize('kind,filter', [
+        ('fax', 'CCITTFaxDecode'),
+        ('jpeg', 'DCTDecode'),
+        ('lzw', 'LZWDecode'),
+        ('raw', 'FlateDecode'),
+    ])
+    def test_page_image_filter(self, tmp_path, kind, filter):
+        """
+        Each page compression should map to the pdf filter that decodes it.
+        """
+        image = pack_pdf.page_image(write_page(str(tmp_path / 'page.tiff'), kind))
+        assert image.dictionary['Filter'] == filter
+        assert image.page_size() == (612, 792)
+
+    def test_fax_pages_are_copied_as_is(self, tmp_path):
+        """
+        Group 4 data should be copied without re-encoding, as white on black
+        runs for the usual WhiteIsZero fax pages.
+        """
+        image = pack_pdf.page_image(write_page(str(tmp_path / 'page.tiff'), 'fax'))
+        assert b''.join(image.chunks()) == b'\x00\x10\x01'
+        assert image.dictionary['DecodeParms']['BlackIs1'] is False
+        assert 'Decode' not in image.dictionary
+
+    def test_uncompressed_pages_are_compressed(self, tmp_path):
+        """
+        Uncompressed pages should be compressed as they are copied.
+        """
+        image = pack_pdf.page_image(write_page(str(tmp_path / 'page.tiff'), 'raw'))
+        data = zlib.decompress(b''.join(image.chunks()))
+        assert len(data) == 850 * 1100
+        assert data[:256] == bytes(range(256))
+
+    def test_jpeg_tables_are_spliced(self, tmp_path):
+        """
+        An abbreviated JPEG strip should follow the shared JPEG tables.
+        """
+        tables = b'\xff\xd8\xff\xdb\x00\x03\x00\xff\xd9'
+        file_path = str(tmp_path / 'page.tiff')
+        tiff.write_image(file_path, 8, 8, (8,), 1, pack_pdf.COMPRESSION_JPEG,
+                         b'\xff\xd8\xff\xc0\xff\xd9', (72, 72),
+                         [(tiff.TAG_JPEG_TABLES, tiff.TYPE_UNDEFINED, list(tables))])
+        image = pack_pdf.page_image(file_path)
+        assert b''.join(image.chunks()) == tables[:-2] + b'\xff\xc0\xff\xd9'
+
+    def test_unsupported_pages_need_rewriting(self, tmp_path):
+        """
+        Old style LZW, and compressed pages in several strips, cannot be
+        copied.
+        """
+        file_path = str(tmp_path / 'page.tiff')
+        tiff.write_image(file_path, 8, 8, (8,), 1, pack_pdf.COMPRESSION_LZW, b'\x00\x01', (72, 72))
+        with pytest.raises(tiff.TIFFError):
+            pack_pdf.page_image(file_path)
+
+        tiff.write_image(file_path, 8, 8, (8,), 1, pack_pdf.COMPRESSION_DEFLATE, b'\x00\x01', (72, 72),
+                         [(tiff.TAG_STRIP_OFFSETS, tiff.TYPE_LONG, [8, 9]),
+                          (tiff.TAG_STRIP_BYTE_COUNTS, tiff.TYPE_LONG, [1, 1])])
+        with pytest.raises(tiff.TIFFError):
+            pack_pdf.page_image(file_path)
+
+    def test_rewrite_args(self, tmp_path):
+        """
+        Bilevel pages should be rewritten as one Group 4 strip.
+        """
+        file_path = write_page(str(tmp_path / 'page.tiff'), 'fax')
+        args = pack_pdf.rewrite_args(file_path, 'out.tiff')
+        assert args[:4] == ['convert', file_path, '-define', 'tiff:rows-per-strip=1100']
+        assert args[-3:] == ['-compress', 'Group4', 'out.tiff']
+
+
+class TestPackPDF:
+
+    @pytest.fixture
+    def arg_dict(self, page_dir):
+        return dict(input = page_dir, output = None)
+
+    def test_process_args(self, arg_dict):
+        """
+        The pages of a directory should be packed in file name order into a
+        pdf named after the directory.
+        """
+        action = pack_pdf.process_args(arg_dict)
+        assert isinstance(action, pack_pdf.PackPDF)
+        assert [os.path.basename(page) for page in action.source_files] == [
+            'page_0001.tiff', 'page_0002.tiff', 'page_0003.tiff', 'page_0004.tiff'
+        ]
+        assert action.target_pdf == arg_dict['input'] + '.pdf'
+
+    def test_pack_pdf(self, arg_dict):
+        """
+        The packed pdf should have one page per file, sized from the page
+        resolution, drawing the page's image data unchanged.
+        """
+        action = pack_pdf.process_args(arg_dict)
+        pack_pdf.Runner.setup(action)
+        pack_pdf.Runner.execute(action)
+        assert not os.path.exists(action.target_pdf + '.part')
+
+        with pdf.Document(action.target_pdf) as document:
+            pages = document.pages()
+            assert len(pages) == 4
+            assert all(page.media_box == [0, 0, 612, 792] for page in pages)
+
+            image = document.resolve(
+                document.resolve(pages[1].resources['XObject'])['Im0']
+            )
+            assert image['Filter'] == 'DCTDecode'
+            assert image.raw == samples.jpeg_header(850, 1100)
+            assert document.contents(pages[1]) == b'q 612 0 0 792 0 0 cm /Im0 Do Q'
+
+    def test_pack_pdf_missing_pages(self, tmp_path):
+        """
+        Packing should refuse to start when a page is missing.
+        """
+        action = pack_pdf.make([str(tmp_path / 'missing.tiff')], str(tmp_path / 'out.pdf'))
+        with pytest.raises(FileNotFoundError):
+            pack_pdf.Runner.setup(action)
+
+
+class TestWriter:
+
+    def test_serialize(self):
+        """
+        Values should be written in pdf syntax.
+        """
+        value = {
+            'Type': pdf.Name('Page'), 'Box': [0, 1.5, -2], 'Ref': pdf.Reference(3, 0),
+            'Text': b'a (b)', 'Flag': True, 'None': None,
+        }
+        assert pdf.serialize(value) == (
+            b'<< /Type /Page /Box [0 1.5 -2] /Ref 3 0 R /Text (a \\(b\\)) '
+            b'/Flag true /None null >>'
+        )
+        assert pdf.serialize(pdf.Name('A B')) == b'/A#20B'
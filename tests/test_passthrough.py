@@ -0,0 +1,180 @@
+import pytest
+import bookworm.passthrough as passthrough
+import bookworm.pdf         as pdf
+import bookworm.tiff        as tiff
+import bookworm.unpack_pdf  as unpack_pdf
+import bookworm.color_mode  as color_mode
+import os
+import tests.pdf_samples as samples
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path):
+    """
+    A pdf of scanned pages in each format that can be copied, and two pages
+    that must be rendered.
+    """
+    return samples.build_pdf(str(tmp_path / 'scanned.pdf'), [
+        samples.gray_image(),
+        samples.fax_image(),
+        samples.jpeg_image(),
+        samples.text_page(),
+        samples.gray_image(content=b'q 144 0 0 72 72 36 cm /Im0 Do Q'),
+    ])
+
+
+class TestPageImage:
+
+    def test_extractable_pages(self, scanned_pdf):
+        """
+        Pages drawn by one image covering the page should be extractable;
+        text pages and images with margins should not.
+        """
+        pages, count = passthrough.extractable_pages(scanned_pdf)
+        assert pages == [1, 2, 3]
+        assert count == 5
+
+    def test_extractable_pages_of_unreadable_pdf(self, tmp_path):
+        """
+        A pdf that cannot be read should have an unknown page count.
+        """
+        file_path = tmp_path / 'broken.pdf'
+        file_path.write_bytes(b'%PDF-1.4\nnot really a pdf\n')
+        assert passthrough.extractable_pages(str(file_path)) == ([], None)
+
+    def test_fax_images_need_group_4(self, tmp_path):
+        """
+        Group 3 fax images should not be copied.
+        """
+        file_path = samples.build_pdf(str(tmp_path / 'fax.pdf'), [
+            samples.fax_image(parameters=b'/K 0 /Columns 1200')
+        ])
+        assert passthrough.extractable_pages(file_path) == ([], 1)
+
+    def test_page_image_resolution(self, scanned_pdf):
+        """
+        The resolution of an extracted page follows from the image size and
+        the page size.
+        """
+        with pdf.Document(scanned_pdf) as document:
+            image = passthrough.page_image(document, document.pages()[0])
+
+        assert image.resolution == (300, 300)
+        assert image.compression == passthrough.COMPRESSION_DEFLATE
+
+    def test_jpeg_frame(self):
+        """
+        The frame header of a baseline JPEG stream should be read.
+        """
+        width, height, factors, untransformed = passthrough.jpeg_frame(
+            samples.jpeg_header(640, 480)
+        )
+        assert (width, height) == (640, 480)
+        assert factors == [(2, 2), (1, 1), (1, 1)]
+        assert not untransformed
+
+
+class TestExtractPages:
+
+    @pytest.mark.parametrize('page,bits,photometric,compression', [
+        (1, (8,), passthrough.PHOTOMETRIC_BLACK_IS_ZERO, passthrough.COMPRESSION_DEFLATE),
+        (2, (1,), passthrough.PHOTOMETRIC_WHITE_IS_ZERO, passthrough.COMPRESSION_CCITT_G4),
+        (3, (8, 8, 8), passthrough.PHOTOMETRIC_YCBCR, passthrough.COMPRESSION_JPEG),
+    ])
+    def test_extract_pages(self, scanned_pdf, tmp_path, page, bits, photometric, compression):
+        """
+        Extracted pages should be TIFF files holding the page image as it is,
+        at the resolution it is drawn at.
+        """
+        page_file = str(tmp_path / f'page_{page}.tiff')
+        passthrough.extract_pages(scanned_pdf, {page: page_file})
+        header = tiff.read_header(page_file)
+
+        assert (header.width, header.height) == (1200, 600)
+        assert header.bits_per_sample == bits
+        assert header.photometric == photometric
+        assert header.compression == compression
+        assert (header.x_resolution, header.y_resolution) == (300, 300)
+        assert not os.path.exists(page_file + '.part')
+
+    def test_extract_pages_main(self, scanned_pdf, tmp_path):
+        """
+        The command line entry point should write each page it is given.
+        """
+        page_format = str(tmp_path / 'page_%04d.tiff')
+        passthrough.main(['passthrough', scanned_pdf, page_format, '1', '3'])
+        assert os.path.isfile(page_format % 1)
+        assert os.path.isfile(page_format % 3)
+        assert not os.path.exists(page_format % 2)
+
+
+class TestPassthroughUnpackPDF:
+
+    @pytest.fixture
+    def arg_dict(self, scanned_pdf, tmp_path):
+        return dict(
+            input = scanned_pdf,
+            output = str(tmp_path / 'pages'),
+            passthrough = True,
+            color_mode = color_mode.GRAY,
+            jobs = 2
+        )
+
+    def test_passthrough_plan(self, arg_dict):
+        """
+        Extractable pages should be copied out in ``jobs`` groups, and the
+        other pages rendered by shards.
+        """
+        actions = unpack_pdf.process_args(arg_dict)
+        extract = [
+            action for action in actions.values()
+            if isinstance(action, unpack_pdf.ExtractImages)
+        ]
+        shards = [
+            action for action in actions.values()
+            if isinstance(action, unpack_pdf.UnpackPDFShard)
+        ]
+
+        assert sorted(page for action in extract for page in action.pages) == [1, 2, 3]
+        assert len(extract) == 2
+        assert [(shard.first_page, shard.last_page) for shard in shards] == [(4, 4), (5, 5)]
+        assert all(shard.device == color_mode.DEVICES[color_mode.GRAY] for shard in shards)
+
+    def test_rendered_pages_are_split_over_jobs(self, tmp_path):
+        """
+        The pages left to render should be split into ``jobs`` groups, and
+        a group split further where extracted pages or color modes break it.
+        """
+        target_dir = str(tmp_path / 'pages')
+        gray = [color_mode.GRAY] * 10
+
+        def ranges(extractable, modes):
+            actions = unpack_pdf.passthrough_unpack_pdf(
+                'book.pdf', target_dir, extractable, modes, jobs=3
+            )
+            return [
+                (action.first_page, action.last_page) for action in actions.values()
+                if isinstance(action, unpack_pdf.UnpackPDFShard)
+            ]
+
+        assert ranges([], gray) == [(1, 4), (5, 7), (8, 10)]
+        assert ranges([5], gray) == [(1, 3), (4, 4), (6, 7), (8, 10)]
+        modes = gray[:1] + [color_mode.COLOR] + gray[2:]
+        assert ranges([], modes) == [(1, 1), (2, 2), (3, 4), (5, 7), (8, 10)]
+
+    def test_passthrough_rejects_dimensions(self, arg_dict):
+        """
+        Passthrough cannot resize pages.
+        """
+        arg_dict['dimensions'] = (2550, 3300)
+        with pytest.raises(ValueError):
+            unpack_pdf.process_args(arg_dict)
+
+    def test_extract_images_subprocess(self, arg_dict):
+        """
+        An ``ExtractImages`` command should run the passthrough module.
+        """
+        action = unpack_pdf.ExtractImages(arg_dict['input'], arg_dict['output'], [1, 2])
+        args = action.as_subprocess()
+        assert args[1:3] == ['-m', 'bookworm.passthrough']
+        assert args[-2:] == ['1', '2']
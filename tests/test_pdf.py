@@ -0,0 +1,126 @@
+import pytest
+import bookworm.pdf as pdf
+import bookworm.sample_data as sample
+import tests.pdf_samples as samples
+
+
+class TestParser:
+
+    def test_parser_reads_objects(self):
+        """
+        The parser should read the basic pdf objects, resolving escapes in
+        literal and hexadecimal strings.
+        """
+        parser = pdf.Parser(
+            b'<< /Type /Page /Count 3 /Box [0 -1.5 +2 .5] '
+            b'/Title (a \\(b\\) \\101) /Hex <41 42 4> /Ref 12 0 R /Flag true >>'
+        )
+        value = parser.parse_object()
+        assert value['Type'] == 'Page'
+        assert isinstance(value['Type'], pdf.Name)
+        assert value['Count'] == 3
+        assert value['Box'] == [0, -1.5, 2, 0.5]
+        assert value['Title'] == b'a (b) A'
+        assert value['Hex'] == b'AB@'
+        assert value['Ref'] == pdf.Reference(12, 0)
+        assert value['Flag'] is True
+
+    def test_parser_reads_keywords(self):
+        """
+        Content stream operators should come back as keywords after their
+        operands.
+        """
+        parser = pdf.Parser(b'q 1 0 0 1 0 0 cm % comment\n/Im0 Do Q')
+        tokens = []
+        while not parser.at_end():
+            tokens.append(parser.parse_object())
+
+        assert tokens[0] == pdf.Keyword(b'q')
+        assert tokens[7] == pdf.Keyword(b'cm')
+        assert tokens[8] == 'Im0'
+        assert tokens[-1] == pdf.Keyword(b'Q')
+
+    def test_png_unpredict(self):
+        """
+        Rows stored with the PNG Up predictor should be restored.
+        """
+        data = b'\x02\x01\x02' + b'\x02\x01\x01'
+        assert pdf.png_unpredict(data, 2) == b'\x01\x02\x02\x03'
+
+
+class TestDocument:
+
+    @pytest.fixture(params=[False, True], ids=['xref-table', 'xref-stream'])
+    def document(self, request, tmp_path):
+        file_path = samples.build_pdf(
+            str(tmp_path / 'sample.pdf'),
+            [samples.gray_image(), samples.text_page(), samples.fax_image()],
+            xref_stream=request.param
+        )
+        with pdf.Document(file_path) as document:
+            yield document
+
+    def test_document_reads_pages(self, document):
+        """
+        Every page should be found, with the media box inherited from the
+        page tree.
+        """
+        pages = document.pages()
+        assert [page.number for page in pages] == [1, 2, 3]
+        assert all(page.media_box == [0, 0, 288, 144] for page in pages)
+        assert all(page.crop_box == page.media_box for page in pages)
+        assert all(page.rotate == 0 for page in pages)
+
+    def test_document_reads_contents(self, document):
+        """
+        A page's content stream should be decoded.
+        """
+        page = document.pages()[1]
+        assert document.contents(page).startswith(b'BT /F1 12 Tf')
+
+    def test_document_reads_image_streams(self, document):
+        """
+        The raw data of an image stream should be available undecoded.
+        """
+        page = document.pages()[2]
+        xobjects = document.resolve(page.resources['XObject'])
+        image = document.resolve(xobjects['Im0'])
+        assert isinstance(image, pdf.Stream)
+        assert image.raw == b'\x00\x10\x01'
+
+    def test_page_digests_follow_page_contents(self, tmp_path):
+        """
+        A page's digest should change with what draws the page, and not with
+        the other pages, the layout of the file, or an update appended to it.
+        """
+        def digests(name, pages, xref_stream=False):
+            file_path = samples.build_pdf(str(tmp_path / name), pages, xref_stream)
+            with open(file_path, 'ab') as handle:
+                handle.write(b'% an update\n')
+            with pdf.Document(file_path) as document:
+                return [document.page_digest(page) for page in document.pages()]
+
+        pages = [samples.gray_image(), samples.text_page(), samples.fax_image()]
+        first = digests('first.pdf', pages)
+        assert digests('second.pdf', pages, xref_stream=True) == first
+
+        pages[0] = samples.gray_image(content=b'q 144 0 0 72 72 36 cm /Im0 Do Q')
+        pages[2] = samples.fax_image(parameters=b'/K -1 /Columns 1200 /BlackIs1 true')
+        changed = digests('changed.pdf', pages)
+        assert [old == new for old, new in zip(first, changed)] == [False, True, False]
+
+    def test_document_reads_sample_pdf(self):
+        """
+        The sample pdf should be readable.
+        """
+        with pdf.Document(sample.SAMPLE_PDF) as document:
+            assert len(document.pages()) > 0
+
+    def test_document_rejects_other_files(self, tmp_path):
+        """
+        A file that is not a pdf should raise a ``PDFError``.
+        """
+        file_path = tmp_path / 'not.pdf'
+        file_path.write_bytes(b'GIF89a' + bytes(64))
+        with pytest.raises(pdf.PDFError):
+            pdf.Document(str(file_path))
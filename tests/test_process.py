@@ -0,0 +1,177 @@
+import pytest
+import bookworm.process as process
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+class TestRun:
+
+    def test_run_returns_output(self):
+        completed = process.run(
+            [sys.executable, '-c', 'print("done")'], stdout=subprocess.PIPE
+        )
+        assert completed.returncode == 0
+        assert completed.stdout.strip() == b'done'
+
+    def test_run_reads_both_pipes(self):
+        """
+        A program that fills both pipes should not block on either.
+        """
+        program = (
+            'import sys\n'
+            'sys.stderr.write("e" * 10 ** 6)\n'
+            'sys.stdout.write("o" * 10 ** 6)\n'
+        )
+        completed = process.run(
+            [sys.executable, '-c', program],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        assert (completed.stdout, completed.stderr) == (b'o' * 10 ** 6, b'e' * 10 ** 6)
+
+    def test_run_raises_on_failure(self):
+        with pytest.raises(subprocess.CalledProcessError):
+            process.run([sys.executable, '-c', 'raise SystemExit(3)'])
+
+    def test_run_stops_hung_programs(self):
+        """
+        A program that runs past its wall clock limit should be stopped,
+        along with the programs it started.
+        """
+        limits = process.Limits(timeout=0.2, grace_period=0.2)
+        start = time.monotonic()
+        with pytest.raises(process.TimeLimitExceeded) as error:
+            process.run(['sh', '-c', 'sleep 30 & wait'], limits=limits)
+
+        assert error.value.kind == 'wall clock'
+        assert time.monotonic() - start < 5
+
+    def test_run_kills_programs_that_ignore_sigterm(self):
+        """
+        A program that ignores SIGTERM should be killed after the grace
+        period.
+        """
+        limits = process.Limits(timeout=0.2, grace_period=0.2)
+        start = time.monotonic()
+        with pytest.raises(process.TimeLimitExceeded):
+            process.run(['sh', '-c', 'trap "" TERM; sleep 30 & wait'], limits=limits)
+
+        assert time.monotonic() - start < 5
+
+    @pytest.mark.skipif(
+        process.resource is None or not hasattr(process.resource, 'prlimit'),
+        reason='CPU time limits need prlimit'
+    )
+    def test_run_stops_programs_out_of_cpu_time(self):
+        limits = process.Limits(cpu_time=1, grace_period=1)
+        with pytest.raises(process.TimeLimitExceeded) as error:
+            process.run([sys.executable, '-c', 'while True: pass'], limits=limits)
+
+        assert error.value.kind == 'CPU time'
+
+    @pytest.mark.skipif(
+        process.resource is None or not hasattr(process.resource, 'prlimit'),
+        reason='CPU time limits need prlimit'
+    )
+    def test_run_stops_programs_that_ignore_sigxcpu(self):
+        """
+        A program that ignores SIGXCPU is killed at the hard limit, which
+        still counts as running out of CPU time.
+        """
+        limits = process.Limits(cpu_time=1, grace_period=1)
+        program = (
+            'import signal\n'
+            'signal.signal(signal.SIGXCPU, signal.SIG_IGN)\n'
+            'while True: pass\n'
+        )
+        with pytest.raises(process.TimeLimitExceeded) as error:
+            process.run([sys.executable, '-c', program], limits=limits)
+
+        assert error.value.kind == 'CPU time'
+
+    def test_run_does_not_blame_other_kills_on_cpu_time(self):
+        """
+        A program killed before its CPU time ran out, as by the kernel when
+        memory runs out, failed for another reason.
+        """
+        limits = process.Limits(cpu_time=30)
+        program = 'import os, signal; os.kill(os.getpid(), signal.SIGKILL)'
+        with pytest.raises(subprocess.CalledProcessError) as error:
+            process.run([sys.executable, '-c', program], limits=limits)
+
+        assert error.value.returncode == -signal.SIGKILL
+
+    @pytest.mark.skipif(not hasattr(os, 'waitid'), reason='Needs waitid')
+    def test_programs_that_exit_in_time_are_not_stopped(self):
+        """
+        A program that has exited when its time runs out, but has not been
+        reaped yet, finished in time.
+        """
+        limits = process.Limits(timeout=0.05)
+        child = process.start([sys.executable, '-c', 'pass'], limits)
+        os.waitid(os.P_PID, child.pid, os.WEXITED | os.WNOWAIT)
+        with process.Watchdog(child, limits) as watchdog:
+            time.sleep(0.2)
+            child.reap()
+
+        watchdog.check()
+        assert child.returncode == 0
+
+    def test_limits_must_be_positive(self):
+        with pytest.raises(ValueError):
+            process.Limits(timeout=0)
+
+    def test_run_limits_threads(self):
+        """
+        A program should see its share of threads in the variables that
+        ImageMagick and OpenMP read.
+        """
+        completed = process.run(
+            [sys.executable, '-c',
+             'import os; print(os.environ["MAGICK_THREAD_LIMIT"], os.environ["OMP_NUM_THREADS"])'],
+            limits=process.Limits(threads=3),
+            stdout=subprocess.PIPE
+        )
+        assert completed.stdout.split() == [b'3', b'3']
+
+    def test_limited_threads_apply_to_the_current_thread(self):
+        script = 'import os; print(os.environ.get("MAGICK_THREAD_LIMIT"))'
+        limits = process.Limits(timeout=60, threads=2)
+        run_limits = process.current_limits()
+        with process.limited(limits.with_threads(5)):
+            completed = process.run(
+                [sys.executable, '-c', script], stdout=subprocess.PIPE
+            )
+            assert process.current_limits().timeout == 60
+
+        assert completed.stdout.split() == [b'5']
+        assert process.current_limits() is run_limits
+
+    def test_unlimited_threads_keep_the_environment(self):
+        assert process.Limits().environment() is None
+        assert process.Limits(threads=2).environment({'PATH': '/bin'}) == {
+            'PATH': '/bin', 'MAGICK_THREAD_LIMIT': '2', 'OMP_NUM_THREADS': '2'
+        }
+
+    def test_collected_output_is_shown_once_the_program_exits(self):
+        """
+        While ``set_output`` collects the output of programs, a program
+        should not write to the terminal, and the output it leaves should
+        be shown when it is reaped.
+        """
+        program = 'import sys; print("page 1"); sys.stderr.write("warning\\n")'
+        shown = []
+        process.set_output(shown.append)
+        try:
+            completed = process.run([sys.executable, '-c', program])
+            piped = process.run(
+                [sys.executable, '-c', 'print("kept")'], stdout=subprocess.PIPE
+            )
+        finally:
+            process.set_output(None)
+
+        assert completed.stdout is None
+        assert shown == ['page 1\nwarning\n']
+        assert piped.stdout == b'kept\n'
@@ -0,0 +1,178 @@
+import pytest
+import bookworm.abstract       as abstract
+import bookworm.sample_data    as sample
+import bookworm.unpack_pdf     as unpack_pdf
+import bookworm.normalize_page as normalize_page
+import bookworm.process_pdf    as process_pdf
+import bookworm.scheduler      as scheduler
+import os
+import shutil
+import sys
+
+
+class FakeShard(unpack_pdf.UnpackPDFShard):
+    """
+    An ``UnpackPDFShard`` whose renderer is a python program that writes
+    one page every ``delay`` seconds instead of running Ghostscript.
+    """
+    delay = 0.3
+
+    def as_subprocess(self):
+        program = (
+            'import shutil, sys, time\n'
+            'for page in range(1, int(sys.argv[2]) + 1):\n'
+            '    shutil.copyfile(sys.argv[3], sys.argv[1] % page)\n'
+            f'    time.sleep({self.delay})\n'
+        )
+        return [
+            sys.executable, '-c', program,
+            os.path.join(self.shard_dir, unpack_pdf.PAGE_FILE_FORMAT),
+            str(len(self.pages)),
+            sample.SAMPLE_TIFF
+        ]
+
+
+class FailingShard(FakeShard):
+    """
+    A ``FakeShard`` whose renderer fails after writing its second page, so
+    that only its first page is finished.
+    """
+    def as_subprocess(self):
+        args = super().as_subprocess()
+        args[2] = args[2].replace(
+            'time.sleep', 'page == 2 and sys.exit(1); time.sleep'
+        )
+        return args
+
+
+class Pages(abstract.Observer):
+    """
+    An ``Observer`` that counts the pages scheduled and reported.
+    """
+    def __init__(self):
+        self.scheduled_pages = 0
+        self.reported = 0
+
+    def scheduled(self, count):
+        self.scheduled_pages += count
+
+    def progressed(self, action, pages):
+        self.reported += pages
+
+
+@pytest.fixture
+def target_dir(tmp_path):
+    return os.path.join(str(tmp_path), 'unpacked')
+
+
+class TestStreamPages:
+
+    def test_stream_should_hand_over_pages_before_the_render_finishes(self, target_dir):
+        """
+        Each page should be handed over, under its page number in the whole
+        pdf, while later pages of the shard are still being rendered.
+        """
+        shard = FakeShard(sample.SAMPLE_PDF, target_dir, 4, 6)
+        pages = []
+
+        def on_page(page_file):
+            pages.append(page_file)
+            if len(pages) == 1:
+                assert not os.path.exists(shard.shard_page_file(3))
+
+        unpack_pdf.ShardRunner.stream(shard, on_page)
+
+        assert pages == [shard.page_file(page) for page in (4, 5, 6)]
+        assert not os.path.exists(shard.shard_dir)
+
+
+    def test_executed_shards_should_report_every_page(self, target_dir):
+        FakeShard.delay = 0.01
+        shard = FakeShard(sample.SAMPLE_PDF, target_dir, 4, 6)
+        observer = Pages()
+
+        scheduler.run_command([(shard, unpack_pdf.Runner)], observers=[observer])
+
+        assert observer.scheduled_pages == observer.reported == 3
+        assert sorted(os.listdir(target_dir)) == [
+            f'_Page_{page:04d}.tiff' for page in (4, 5, 6)
+        ]
+
+
+class TestProcessPDF:
+
+    @pytest.fixture
+    def copy_pages(self, monkeypatch):
+        def execute(command):
+            shutil.copyfile(command.source_file, command.target_file)
+
+        monkeypatch.setattr(normalize_page.Runner, 'execute', execute)
+
+
+    def test_process_pdf_should_normalize_every_page(self, target_dir, copy_pages):
+        """
+        Every unpacked page should be normalized into the default
+        subdirectory of the target directory.
+        """
+        FakeShard.delay = 0.01
+        action = process_pdf.make(
+            sample.SAMPLE_PDF, target_dir, shards=3, jobs=2, dimensions=(400, 500)
+        )
+        action.shards = [
+            FakeShard(shard.source_pdf, target_dir, shard.first_page, shard.last_page)
+            for shard in action.shards
+        ]
+
+        observer = Pages()
+        scheduler.run_command([(action, process_pdf.Runner)], observers=[observer])
+
+        expected = [f'_Page_{page:04d}.tiff' for page in range(1, 11)]
+        assert sorted(os.listdir(action.page_dir)) == expected
+        assert observer.scheduled_pages == observer.reported == 10
+
+
+    def test_failed_pages_should_keep_the_finished_pages(self, target_dir, monkeypatch):
+        """
+        A page that fails, and the pages of a range that failed before
+        rendering them, should be reported one by one, while every other
+        page is kept.
+        """
+        def execute(command):
+            if command.source_file.endswith('_Page_0002.tiff'):
+                raise RuntimeError('The page failed.')
+            shutil.copyfile(command.source_file, command.target_file)
+
+        monkeypatch.setattr(normalize_page.Runner, 'execute', execute)
+        FakeShard.delay = 0.01
+        action = process_pdf.make(
+            sample.SAMPLE_PDF, target_dir, shards=2, jobs=2, dimensions=(400, 500)
+        )
+        first, second = action.shards
+        action.shards = [
+            FakeShard(first.source_pdf, target_dir, first.first_page, first.last_page),
+            FailingShard(second.source_pdf, target_dir, second.first_page, second.last_page)
+        ]
+
+        result = scheduler.run_action(action, process_pdf.Runner)
+
+        message = str(result.error)
+        assert '5 of 10 actions succeeded.' in message
+        assert [page for page in range(1, 11) if f'_Page_{page:04d}' in message] == [2, 7, 8, 9, 10]
+        assert sorted(os.listdir(action.page_dir)) == [
+            f'_Page_{page:04d}.tiff' for page in (1, 3, 4, 5, 6)
+        ]
+        assert sorted(os.listdir(target_dir)) == sorted(
+            [f'_Page_{page:04d}.tiff' for page in range(1, 7)] +
+            [os.path.basename(os.path.normpath(action.page_dir))]
+        )
+
+
+    def test_process_args_should_reject_auto_dimensions(self):
+        arg_dict = dict(input = sample.SAMPLE_PDF, dimensions = 'auto')
+        with pytest.raises(ValueError):
+            process_pdf.process_args(arg_dict)
+
+
+    def test_make_should_reject_an_empty_pipeline(self, target_dir):
+        with pytest.raises(ValueError):
+            process_pdf.make(sample.SAMPLE_PDF, target_dir)
@@ -0,0 +1,173 @@
+import pytest
+import bookworm.abstract  as abstract
+import bookworm.process   as process
+import bookworm.progress  as progress
+import bookworm.report    as report
+import bookworm.scheduler as scheduler
+import io
+import json
+import sys
+import time
+
+
+class Page:
+
+    def __init__(self, name, fail=False):
+        self.target_file = name
+        self.fail = fail
+
+
+class PageRunner(abstract.Runner):
+
+    def setup(command):
+        return
+
+    def execute(command):
+        time.sleep(0.01)
+        if command.fail:
+            raise RuntimeError('The page failed.')
+
+    def cleanup(command):
+        return
+
+
+class Terminal(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+def finish(observer, action, succeeded=True):
+    error = None if succeeded else RuntimeError('failed')
+    observer.started(action)
+    observer.finished(report.ActionResult(action, PageRunner, error))
+
+
+class TestSnapshot:
+
+    def test_rate_and_eta(self):
+        observer = progress.Progress(io.StringIO(), window=10.0)
+        observer.total = 10
+        now = time.monotonic()
+        observer.start = now - 20.0
+        for _ in range(4):
+            finish(observer, Page('a'))
+        # Pages finished before the window do not count towards the rate.
+        observer.finish_times = progress.collections.deque(
+            [now - 15.0, now - 5.0, now - 4.0, now - 1.0]
+        )
+
+        snapshot = observer.snapshot(now)
+
+        assert snapshot.done == 4
+        assert snapshot.rate == pytest.approx(0.3)
+        assert snapshot.eta == pytest.approx(20.0)
+
+    def test_nothing_finished(self):
+        observer = progress.Progress(io.StringIO())
+        observer.total = 3
+        observer.started(Page('a'))
+
+        snapshot = observer.snapshot()
+
+        assert snapshot.rate is None
+        assert snapshot.eta is None
+        assert snapshot.running == 1
+        assert 'ETA --:--' in str(snapshot)
+
+    def test_format(self):
+        snapshot = progress.Snapshot(10.0, 5, 120, 1, 2, 4, 2.5, 3725)
+
+        assert str(snapshot) == (
+            '[  5/120]   4%  2.50 pages/s  ETA 1:02:05  4 running  1 failed  2 retried'
+        )
+
+
+class TestProgress:
+
+    def test_log_lines(self):
+        stream = io.StringIO()
+        pages = {str(page): Page(str(page), fail=(page == 2)) for page in range(6)}
+        scheduler.run_command(
+            [(pages, PageRunner)], jobs=2,
+            observers=[progress.Progress(stream, interval=0.01)]
+        )
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert lines[-1]['final']
+        assert lines[-1]['done'] == lines[-1]['total'] == 6
+        assert lines[-1]['failed'] == 1
+        assert lines[-1]['running'] == 0
+        assert all(not line['final'] for line in lines[:-1])
+
+    def test_terminal_is_redrawn_in_place(self):
+        stream = Terminal()
+        observer = progress.Progress(stream)
+        observer.scheduled(2)
+        finish(observer, Page('a'))
+        finish(observer, Page('b'))
+        observer.closed(report.Report())
+
+        output = stream.getvalue()
+        assert output.startswith(progress.CLEAR_LINE)
+        assert output.endswith('\n')
+        assert '[2/2] 100%' in output
+        assert observer.interval == progress.TERMINAL_INTERVAL
+
+    def test_pages_are_counted_as_they_finish(self):
+        """
+        An action that writes several pages should count each page as its
+        runner reports it, and the pages it did not report when it finishes.
+        """
+        class Book:
+            target_file = 'book'
+            pages = range(1, 4)
+
+        class BookRunner(abstract.Runner):
+
+            def setup(command):
+                return
+
+            def execute(command):
+                report_page = scheduler.page_reporter()
+                for page in command.pages[:-1]:
+                    report_page()
+                    snapshots.append(observer.snapshot().done)
+
+            def cleanup(command):
+                return
+
+        snapshots = []
+        observer = progress.Progress(io.StringIO(), interval=60)
+        scheduler.run_command(
+            [(Book(), BookRunner), ({'a': Page('a')}, PageRunner)],
+            observers=[observer]
+        )
+
+        assert scheduler.count_pages([(Book(), BookRunner, 1, 0)]) == 3
+        assert snapshots == [1, 2]
+        assert (observer.done, observer.total) == (4, 4)
+
+    def test_batches_count_their_pages(self):
+        class Batch:
+            actions = [Page('a'), Page('b'), Page('c')]
+
+        class BatchRunner:
+            def run_batch(command, observers=()):
+                return []
+
+        entries = [(Batch(), BatchRunner, 1, 0), (Page('d'), PageRunner, 1, 0)]
+        assert scheduler.count_pages(entries) == 4
+
+    def test_program_output_is_written_above_the_line(self):
+        stream = Terminal()
+        observer = progress.Progress(stream, interval=60)
+        observer.scheduled(1)
+        process.run([sys.executable, '-c', 'print("Page 1")'])
+        finish(observer, Page('a'))
+        observer.closed(report.Report())
+
+        output = stream.getvalue()
+        assert output.startswith(progress.CLEAR_LINE + 'Page 1\n[0/1]')
+        assert output.split(progress.CLEAR_LINE)[-1].startswith('[1/1] 100%')
+        assert process._output is None
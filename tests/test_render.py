@@ -0,0 +1,86 @@
+import pytest
+import bookworm.render      as render
+import bookworm.unpack_pdf  as unpack_pdf
+import bookworm.manifest    as manifest
+import bookworm.sample_data as sample
+
+
+GIB = 1024 ** 3
+
+
+class TestRenderSettings:
+
+    def test_settings_should_share_the_host_between_processes(self):
+        """
+        The processors and memory of the host should be divided between the
+        concurrent Ghostscript processes.
+        """
+        settings = render.make(processes=4, cpus=16, memory=16 * GIB)
+
+        assert settings.threads == 4
+        assert settings.buffer_space == 2 * GIB // (4 * 4)
+        assert settings.max_bitmap == render.BANDING_THRESHOLD
+
+
+    def test_single_threaded_pages_should_render_in_memory(self):
+        settings = render.make(processes=4, cpus=4, memory=16 * GIB)
+
+        assert settings.threads == 1
+        assert settings.max_bitmap == GIB
+        assert '-dNumRenderingThreads=1' not in settings.args()
+
+
+    def test_buffer_space_should_be_bounded(self):
+        small = render.make(cpus=8, memory=256 * 1024 ** 2)
+        large = render.make(cpus=2, memory=1024 * GIB)
+
+        assert small.buffer_space == render.MIN_BUFFER_SPACE
+        assert large.buffer_space == render.MAX_BUFFER_SPACE
+
+
+    def test_unknown_memory_should_leave_memory_options_to_ghostscript(self, monkeypatch):
+        monkeypatch.setattr(render, 'memory_size', lambda: None)
+        settings = render.make(threads=1, cpus=8)
+
+        assert settings.args() == []
+
+
+    def test_given_options_should_be_kept(self):
+        settings = render.make(
+            threads=3, buffer_space=1000, max_bitmap=2000, band_height=64,
+            downscale=2, cpus=16, memory=16 * GIB
+        )
+
+        assert settings.args() == [
+            '-dNumRenderingThreads=3', '-dBufferSpace=1000', '-dMaxBitmap=2000',
+            '-dBandHeight=64', '-dDownScaleFactor=2'
+        ]
+
+
+    def test_invalid_downscale_should_fail(self):
+        with pytest.raises(ValueError):
+            render.make(downscale=0, cpus=1, memory=None)
+
+
+class TestUnpackPDFSettings:
+
+    def test_downscale_should_render_at_a_multiple_of_the_resolution(self, tmp_path):
+        settings = render.RenderSettings(downscale=3)
+        action = unpack_pdf.make(sample.SAMPLE_PDF, str(tmp_path), settings)
+
+        assert '-r900x900' in action.args
+        assert '-dDownScaleFactor=3' in action.args
+
+
+    def test_speed_options_should_not_change_the_manifest_parameters(self, tmp_path):
+        """
+        Pages unpacked with more threads or memory are the same pages, so
+        they should not be considered stale.
+        """
+        fast = unpack_pdf.make(
+            sample.SAMPLE_PDF, str(tmp_path),
+            render.make(threads=8, cpus=8, memory=16 * GIB)
+        )
+        slow = unpack_pdf.make(sample.SAMPLE_PDF, str(tmp_path))
+
+        assert manifest.parameters(fast) == manifest.parameters(slow)
@@ -122,3 +122,20 @@ class TestRunner:
 
         assert os.path.exists(fixture.action.target_file)
 
+
+
+class TestMultiResamplePage:
+
+    def test_process_args_should_generate_multiple_actions_from_input_directory(self):
+        """
+        Given an input directory, the argument processor should generate one
+        ``ResamplePage`` action per page.
+        """
+        arg_dict = dict(
+            input = sample.TEST_TIFFS, resolution = 300, units = 'PixelsPerInch'
+        )
+        multi_actions = resample_page.process_args(arg_dict)
+
+        assert len(multi_actions) == len(os.listdir(sample.TEST_TIFFS))
+        for action in multi_actions.values():
+            assert isinstance(action, resample_page.ResamplePage)
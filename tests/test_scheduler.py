@@ -0,0 +1,107 @@
+import bookworm.abstract  as abstract
+import bookworm.process   as process
+import bookworm.scheduler as scheduler
+
+
+class FlakyRunner(abstract.Runner):
+    """
+    A runner whose actions run out of time a given number of times before
+    they succeed.
+    """
+    def __init__(self, timeouts):
+        self.timeouts = dict(timeouts)
+        self.attempts = []
+
+    def setup(self, command):
+        return
+
+    def execute(self, command):
+        self.attempts.append(command)
+        if self.timeouts.get(command, 0) > 0:
+            self.timeouts[command] -= 1
+            raise process.TimeLimitExceeded(['convert', command], 1, 'wall clock')
+        if command == 'broken':
+            raise ValueError('Broken page.')
+
+    def cleanup(self, command):
+        return
+
+
+class Events(abstract.Observer):
+
+    def __init__(self):
+        self.events = []
+
+    def started(self, action):
+        self.events.append(('started', action))
+
+    def finished(self, result):
+        self.events.append(('finished', result.action, result.succeeded))
+
+    def retrying(self, result, delay):
+        self.events.append(('retrying', result.action, delay))
+
+
+class TestRetry:
+
+    def test_timed_out_pages_are_retried(self):
+        """
+        A page that ran out of time should be run again, and only its final
+        attempt reported.
+        """
+        runner = FlakyRunner({'slow': 2})
+        observer = Events()
+        run_report = scheduler.run_command(
+            [({'a': 'slow', 'b': 'fast'}, runner)], jobs=2, observers=[observer],
+            retry=scheduler.Retry(3, backoff=0.01)
+        )
+
+        assert not run_report.failed
+        assert len(run_report) == 2
+        assert runner.attempts.count('slow') == 3
+        assert ('retrying', 'slow', 0.01) in observer.events
+        assert ('retrying', 'slow', 0.02) in observer.events
+        assert observer.events.count(('finished', 'slow', True)) == 1
+
+    def test_retries_are_bounded(self):
+        runner = FlakyRunner({'slow': 5})
+        run_report = scheduler.run_command(
+            [('slow', runner)], retry=scheduler.Retry(2, backoff=0.01)
+        )
+
+        assert len(run_report.failed) == 1
+        assert isinstance(run_report.failed[0].error, process.TimeLimitExceeded)
+        assert runner.attempts.count('slow') == 3
+
+    def test_other_failures_are_not_retried(self):
+        runner = FlakyRunner({})
+        run_report = scheduler.run_command(
+            [('broken', runner)], retry=scheduler.Retry(2, backoff=0.01)
+        )
+
+        assert len(run_report.failed) == 1
+        assert runner.attempts == ['broken']
+
+    def test_failures_that_are_not_retried_are_finished(self):
+        """
+        A page that fails for a reason other than time should be reported
+        to the observers as finished, even while retries are allowed.
+        """
+        observer = Events()
+        scheduler.run_command(
+            [({'a': 'broken', 'b': 'slow'}, FlakyRunner({'slow': 1}))],
+            observers=[observer], retry=scheduler.Retry(2, backoff=0.01)
+        )
+
+        assert observer.events == [
+            ('started', 'broken'),
+            ('finished', 'broken', False),
+            ('started', 'slow'),
+            ('retrying', 'slow', 0.01),
+            ('started', 'slow'),
+            ('finished', 'slow', True),
+        ]
+
+    def test_backoff_is_capped(self):
+        retry = scheduler.Retry(10, backoff=1, max_backoff=5)
+        assert [retry.delay(attempt) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
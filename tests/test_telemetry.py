@@ -0,0 +1,242 @@
+import pytest
+import bookworm.abstract  as abstract
+import bookworm.process   as process
+import bookworm.scheduler as scheduler
+import bookworm.telemetry as telemetry
+import json
+import os.path
+import sys
+import threading
+import time
+
+
+BUSY = [sys.executable, '-c', 'sum(range(2 * 10 ** 6))']
+
+
+class Page:
+    """
+    A stand-in for a page action that copies its source to its target with
+    an external program.
+    """
+    def __init__(self, source_file, target_file, fail=False):
+        self.source_file = source_file
+        self.target_file = target_file
+        self.fail = fail
+
+
+class CopyRunner(abstract.Runner):
+
+    def setup(command):
+        return
+
+    def execute(command):
+        process.run(BUSY)
+        if command.fail:
+            process.run([sys.executable, '-c', 'raise SystemExit(3)'])
+        with open(command.source_file, 'rb') as source:
+            with open(command.target_file, 'wb') as target:
+                target.write(source.read())
+
+    def cleanup(command):
+        return
+
+
+def make_page(tmp_path, name, size, fail=False):
+    source_file = os.path.join(str(tmp_path), name + '.src')
+    with open(source_file, 'wb') as handle:
+        handle.write(bytes(size))
+
+    return Page(source_file, os.path.join(str(tmp_path), name + '.tiff'), fail)
+
+
+class TestAccounts:
+
+    def test_programs_are_charged_to_open_accounts(self):
+        account = process.open_account()
+        try:
+            process.run(BUSY)
+        finally:
+            process.close_account(account)
+        process.run(BUSY)
+
+        [usage] = account
+        assert usage.args == BUSY
+        assert usage.returncode == 0
+        assert usage.user_time > 0
+        assert usage.peak_rss > 0
+        assert usage.seconds > 0
+        assert usage.shared_by == 1
+
+    def test_shared_programs(self):
+        first, second = process.open_account(), process.open_account()
+        try:
+            process.run(BUSY)
+        finally:
+            process.close_account(first)
+            process.close_account(second)
+
+        assert first[0] is second[0]
+        assert first[0].shared_by == 2
+
+    def test_accounts_can_be_handed_to_other_threads(self):
+        account = process.open_account()
+        accounts = process.current_accounts()
+
+        def work():
+            with process.charging(accounts):
+                process.run(BUSY)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        process.close_account(account)
+
+        assert len(account) == 1
+        assert process.current_accounts() == []
+
+    def test_accounts_closed_by_another_thread_are_not_charged(self):
+        closing = threading.Thread(target=process.close_account, args=(process.open_account(),))
+        closing.start()
+        closing.join()
+
+        account = process.open_account()
+        try:
+            process.run(BUSY)
+        finally:
+            process.close_account(account)
+
+        assert [usage.shared_by for usage in account] == [1]
+
+    def test_polled_programs_are_charged(self):
+        """
+        A program whose caller looks whether it has exited, as a streamed
+        page range does, should be charged once it has.
+        """
+        account = process.open_account()
+        try:
+            child = process.start(BUSY)
+            while child.reap(block=False) is None:
+                time.sleep(0.01)
+        finally:
+            process.close_account(account)
+
+        assert [usage.args for usage in account] == [BUSY]
+        assert account[0].user_time > 0
+
+
+class TestTelemetry:
+
+    def test_every_action_is_recorded(self, tmp_path):
+        telemetry_file = os.path.join(str(tmp_path), 'logs', 'telemetry.jsonl')
+        pages = {
+            'a': make_page(tmp_path, 'a', 100),
+            'b': make_page(tmp_path, 'b', 200, fail=True),
+        }
+        scheduler.run_command(
+            [(pages, CopyRunner)], jobs=2,
+            observers=[telemetry.Telemetry(telemetry_file)]
+        )
+
+        records = {entry['page']: entry for entry in telemetry.read_records(telemetry_file)}
+        assert set(records) == {'a.tiff', 'b.tiff'}
+
+        assert records['a.tiff']['succeeded']
+        assert records['a.tiff']['action'] == 'Page'
+        assert records['a.tiff']['bytes_read'] == 100
+        assert records['a.tiff']['bytes_written'] == 100
+        assert records['a.tiff']['user_time'] > 0
+        assert [child['args'] for child in records['a.tiff']['children']] == [BUSY]
+
+        assert not records['b.tiff']['succeeded']
+        assert records['b.tiff']['children'][-1]['returncode'] == 3
+
+    def test_failures_do_not_share_later_programs(self, tmp_path):
+        telemetry_file = os.path.join(str(tmp_path), 'telemetry.jsonl')
+        pages = {
+            'a': make_page(tmp_path, 'a', 10, fail=True),
+            'b': make_page(tmp_path, 'b', 10),
+            'c': make_page(tmp_path, 'c', 10),
+        }
+        scheduler.run_command(
+            [(pages, CopyRunner)], observers=[telemetry.Telemetry(telemetry_file)],
+            retry=scheduler.Retry(2, backoff=0.01)
+        )
+
+        records = {entry['page']: entry for entry in telemetry.read_records(telemetry_file)}
+        assert set(records) == {'a.tiff', 'b.tiff', 'c.tiff'}
+        assert not records['a.tiff']['succeeded']
+        assert [
+            child['shared_by'] for page in ('b.tiff', 'c.tiff')
+            for child in records[page]['children']
+        ] == [1, 1]
+
+    def test_retried_attempts_are_recorded(self, tmp_path):
+        class SlowRunner(CopyRunner):
+            attempts = 0
+
+            def execute(command):
+                SlowRunner.attempts += 1
+                if SlowRunner.attempts == 1:
+                    raise process.TimeLimitExceeded(BUSY, 1, 'wall clock')
+                CopyRunner.execute(command)
+
+        telemetry_file = os.path.join(str(tmp_path), 'telemetry.jsonl')
+        scheduler.run_command(
+            [(make_page(tmp_path, 'a', 10), SlowRunner)],
+            observers=[telemetry.Telemetry(telemetry_file)],
+            retry=scheduler.Retry(1, backoff=0.01)
+        )
+
+        records = telemetry.read_records(telemetry_file)
+        assert [(entry['retried'], entry['succeeded']) for entry in records] == [
+            (True, False), (False, True)
+        ]
+
+
+class TestStats:
+
+    RECORDS = [
+        dict(action='ResamplePage', page='1.tiff', succeeded=True, seconds=2.0,
+             user_time=1.5, system_time=0.5, peak_rss=100, bytes_read=10, bytes_written=20),
+        dict(action='ResamplePage', page='2.tiff', succeeded=False, seconds=1.0,
+             user_time=0.5, system_time=0.0, peak_rss=300, bytes_read=10, bytes_written=0),
+        dict(action='ExpandPage', page='1.tiff', succeeded=True, seconds=4.0,
+             user_time=3.0, system_time=1.0, peak_rss=200, bytes_read=20, bytes_written=40),
+    ]
+
+    def test_summarize_per_action(self):
+        groups = telemetry.summarize(self.RECORDS, 'action')
+
+        assert [group['name'] for group in groups] == ['ExpandPage', 'ResamplePage']
+        assert groups[1]['runs'] == 2
+        assert groups[1]['failed'] == 1
+        assert groups[1]['user_time'] == 2.0
+        assert groups[1]['peak_rss'] == 300
+
+    def test_summarize_per_page(self):
+        groups = telemetry.summarize(self.RECORDS, 'page')
+
+        assert groups[0]['name'] == '1.tiff'
+        assert groups[0]['seconds'] == 6.0
+        assert groups[0]['bytes_written'] == 60
+
+    def test_stats_command(self, tmp_path, capsys):
+        telemetry_file = os.path.join(str(tmp_path), 'telemetry.jsonl')
+        with open(telemetry_file, 'w') as handle:
+            for entry in self.RECORDS:
+                handle.write(json.dumps(entry) + '\n')
+            handle.write('{"cut short')
+
+        action = telemetry.process_args({'input': telemetry_file, 'top': 1})
+        telemetry.Runner.setup(action)
+        telemetry.Runner.execute(action)
+        output = capsys.readouterr().out
+
+        assert 'Per action:' in output
+        assert 'ExpandPage' in output
+        assert 'Per page (top 1 of 2 by CPU time):' in output
+        assert '2.tiff' not in output
+
+    def test_stats_needs_a_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            telemetry.process_args({'input': os.path.join(str(tmp_path), 'missing')})
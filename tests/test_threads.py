@@ -0,0 +1,85 @@
+import pytest
+import bookworm.threads as threads
+import bookworm.tiff    as tiff
+import os.path
+
+from tests.pdf_samples import build_pdf, text_page
+
+
+class TestSplit:
+
+    def test_small_pages_get_more_workers(self):
+        plan = threads.split(8, pixels=2550 * 3300)
+        assert (plan.workers, plan.threads) == (8, 1)
+
+    def test_large_pages_get_more_threads(self):
+        """
+        A 1200 dpi letter page should be given every processor.
+        """
+        plan = threads.split(8, pixels=10200 * 13200)
+        assert (plan.workers, plan.threads) == (1, 8)
+
+        plan = threads.split(8, pixels=5100 * 6600)
+        assert (plan.workers, plan.threads) == (2, 4)
+
+    def test_few_tasks_leave_processors_to_threads(self):
+        plan = threads.split(8, pixels=1000 * 1000, tasks=2)
+        assert (plan.workers, plan.threads) == (2, 4)
+
+    def test_unknown_page_sizes_get_one_thread(self):
+        plan = threads.split(4)
+        assert (plan.workers, plan.threads) == (4, 1)
+
+    def test_jobs_share_the_processors(self):
+        plan = threads.make(jobs=3, cpus=8)
+        assert (plan.workers, plan.threads) == (3, 2)
+
+        plan = threads.make(jobs=16, cpus=8)
+        assert (plan.workers, plan.threads) == (16, 1)
+
+    def test_pipelines_share_one_budget(self):
+        """
+        Ghostscript and the page workers of a pipeline run at the same time,
+        so together they should not use more threads than there are
+        processors, unless every process already has only one.
+        """
+        render_plan, page_plan = threads.pipeline(2, 2, cpus=16)
+        assert (render_plan.threads, page_plan.threads) == (4, 4)
+
+        render_plan, page_plan = threads.pipeline(1, 3, cpus=8)
+        assert (render_plan.threads, page_plan.threads) == (2, 2)
+
+        render_plan, page_plan = threads.pipeline(4, 8, cpus=8)
+        assert (render_plan.threads, page_plan.threads) == (1, 1)
+
+    def test_pipelines_keep_the_given_render_threads(self):
+        render_plan, page_plan = threads.pipeline(2, 2, cpus=16, render_threads=6)
+        assert (render_plan.threads, page_plan.threads) == (6, 2)
+
+    def test_plans_must_be_positive(self):
+        with pytest.raises(ValueError):
+            threads.ThreadPlan(0, 1)
+
+
+class TestInputPixels:
+
+    def test_directory_of_pages(self, tmp_path):
+        for index, width in enumerate((100, 200, 300)):
+            tiff.write_image(
+                os.path.join(str(tmp_path), f'{index}.tiff'), width, 10, (8,), 1, 1, b'\x00'
+            )
+
+        assert threads.input_pixels(str(tmp_path)) == (2000, 3)
+
+    def test_pdf_pages_at_a_resolution(self, tmp_path):
+        """
+        The 288x144 point pages should be 1200x600 pixels at 300 dpi.
+        """
+        source_pdf = build_pdf(
+            os.path.join(str(tmp_path), 'book.pdf'), [text_page(), text_page()]
+        )
+
+        assert threads.input_pixels(source_pdf, 300) == (1200 * 600, 2)
+
+    def test_unreadable_inputs(self, tmp_path):
+        assert threads.input_pixels(os.path.join(str(tmp_path), 'missing.pdf')) == (None, None)
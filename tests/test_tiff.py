@@ -0,0 +1,136 @@
+import pytest
+import bookworm.sample_data as sample
+import bookworm.tiff        as tiff
+import os
+import shutil
+import struct
+
+from bookworm.resolution import Resolution
+
+
+def read_resolution_tags(file_path):
+    with open(file_path, 'rb') as handle:
+        order, first_offset = tiff.read_byte_order(handle)
+        ifds = tiff.read_ifds(handle, order, first_offset)
+        return [
+            tuple(
+                tiff.read_values(handle, order, ifd.entries[tag])[0]
+                for tag in (
+                    tiff.TAG_X_RESOLUTION,
+                    tiff.TAG_Y_RESOLUTION,
+                    tiff.TAG_RESOLUTION_UNIT
+                )
+            )
+            for ifd in ifds
+        ]
+
+
+def minimal_tiff(file_path, pages=1):
+    """
+    Write a TIFF file with ``pages`` one pixel images and no resolution tags.
+    """
+    data = b'II' + struct.pack('<HI', 42, 8)
+    for page in range(pages):
+        offset = len(data)
+        next_offset = 0 if page == pages - 1 else offset + 2 + 12 * 3 + 4 + 2
+        data += struct.pack('<H', 3)
+        data += struct.pack('<HHIHH', 256, 3, 1, 1, 0)
+        data += struct.pack('<HHIHH', 257, 3, 1, 1, 0)
+        data += struct.pack('<HHII', 273, 4, 1, offset + 2 + 12 * 3 + 4)
+        data += struct.pack('<I', next_offset)
+        data += b'\xff\x00'
+
+    with open(file_path, 'wb') as handle:
+        handle.write(data)
+
+
+class TestSetResolution:
+
+    @pytest.fixture
+    def resolution(self):
+        return Resolution.make(600, 'PixelsPerCentimeter')
+
+    def test_set_resolution_should_patch_existing_tags_in_place(self, tmp_path, resolution):
+        """
+        Rewriting the resolution of a page that already has resolution tags
+        should not change the size of the file.
+        """
+        source_file = os.path.join(sample.TEST_TIFFS, 'sample_001.tiff')
+        target_file = os.path.join(str(tmp_path), 'sample_001.tiff')
+        shutil.copyfile(source_file, target_file)
+
+        tiff.set_resolution(target_file, resolution)
+
+        assert os.path.getsize(target_file) == os.path.getsize(source_file)
+        for tags in read_resolution_tags(target_file):
+            assert tags == ((600, 1), (600, 1), 3)
+
+
+    def test_set_resolution_should_add_tags_to_pages_without_them(self, tmp_path, resolution):
+        target_file = os.path.join(str(tmp_path), 'sample.tiff')
+        shutil.copyfile(sample.SAMPLE_TIFF, target_file)
+
+        tiff.set_resolution(target_file, resolution)
+
+        assert read_resolution_tags(target_file) == [((600, 1), (600, 1), 3)]
+
+
+    @pytest.mark.parametrize('pages', [1, 3])
+    def test_set_resolution_should_add_missing_tags(self, tmp_path, resolution, pages):
+        """
+        Pages without resolution tags should gain them in every image.
+        """
+        target_file = os.path.join(str(tmp_path), 'minimal.tiff')
+        minimal_tiff(target_file, pages)
+
+        tiff.set_resolution(target_file, resolution)
+
+        tags = read_resolution_tags(target_file)
+        assert tags == [((600, 1), (600, 1), 3)] * pages
+
+
+    def test_set_resolution_should_reject_non_tiff_files(self, tmp_path, resolution):
+        target_file = os.path.join(str(tmp_path), 'sample.pdf')
+        shutil.copyfile(sample.SAMPLE_PDF, target_file)
+
+        with pytest.raises(tiff.TIFFError):
+            tiff.set_resolution(target_file, resolution)
+
+
+class TestReadHeader:
+
+    def test_read_header(self):
+        """
+        The header reader should recover the page properties recorded in the
+        first image file directory.
+        """
+        header = tiff.read_header(os.path.join(sample.TEST_TIFFS, 'sample_001.tiff'))
+
+        assert (header.width, header.height) == (1830, 2790)
+        assert header.bit_depth == 32
+        assert header.compression == 5
+        assert (header.x_resolution, header.y_resolution) == (300.0, 300.0)
+        assert header.resolution_unit == 2
+
+
+    def test_read_header_without_resolution(self):
+        header = tiff.read_header(sample.SAMPLE_TIFF)
+
+        assert (header.width, header.height) == (318, 454)
+        assert header.x_resolution is None
+
+
+    def test_read_headers_should_read_every_page(self):
+        file_paths = [
+            os.path.join(sample.TEST_TIFFS, file)
+            for file in os.listdir(sample.TEST_TIFFS)
+        ] + [sample.SAMPLE_TIFF]
+        headers = tiff.read_headers(file_paths, jobs=4)
+
+        assert sorted(headers) == sorted(file_paths)
+        assert tiff.max_dimensions(list(headers.values())) == (1830, 2790)
+
+
+    def test_read_header_should_reject_non_tiff_files(self):
+        with pytest.raises(tiff.TIFFError):
+            tiff.read_header(sample.SAMPLE_PDF)
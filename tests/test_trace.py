@@ -0,0 +1,129 @@
+import pytest
+import bookworm.abstract  as abstract
+import bookworm.process   as process
+import bookworm.scheduler as scheduler
+import bookworm.trace     as trace
+import json
+import os.path
+import sys
+import threading
+
+
+class Page:
+
+    def __init__(self, target_file, fail=False):
+        self.target_file = target_file
+        self.fail = fail
+
+
+class PageRunner(abstract.Runner):
+
+    def setup(command):
+        return
+
+    def execute(command):
+        process.run([sys.executable, '-c', 'pass'])
+        if command.fail:
+            raise RuntimeError('The page failed.')
+
+    def cleanup(command):
+        return
+
+
+@pytest.fixture
+def tracer():
+    tracer = trace.Tracer('test')
+    trace.set_tracer(tracer)
+    yield tracer
+    trace.set_tracer(None)
+
+
+def spans(tracer, category=None):
+    return [
+        event for event in tracer.trace_events()
+        if event['ph'] == 'X' and category in (None, event['cat'])
+    ]
+
+
+class TestTracer:
+
+    def test_spans_are_recorded_per_thread(self, tracer):
+        with trace.span('outer', pages=2):
+            with trace.span('inner'):
+                pass
+
+        def work():
+            with trace.span('other'):
+                pass
+
+        thread = threading.Thread(target=work, name='helper')
+        thread.start()
+        thread.join()
+
+        events = {event['name']: event for event in spans(tracer)}
+        assert set(events) == {'outer', 'inner', 'other'}
+        assert events['outer']['args'] == {'pages': 2}
+        assert events['outer']['tid'] == events['inner']['tid']
+        assert events['other']['tid'] != events['outer']['tid']
+        assert events['outer']['ts'] <= events['inner']['ts']
+        assert events['inner']['dur'] <= events['outer']['dur']
+
+        lanes = {
+            event['args']['name'] for event in tracer.trace_events()
+            if event['name'] == 'thread_name'
+        }
+        assert 'helper' in lanes
+
+    def test_spans_without_a_tracer_are_not_recorded(self):
+        trace.set_tracer(None)
+        with trace.span('nothing'):
+            trace.instant('nothing')
+
+        assert trace.current_tracer() is None
+
+    def test_failed_spans_are_recorded(self, tracer):
+        with pytest.raises(RuntimeError):
+            with trace.span('failing'):
+                raise RuntimeError('failed')
+
+        assert [event['name'] for event in spans(tracer)] == ['failing']
+
+    def test_write(self, tracer, tmp_path):
+        with trace.span('run'):
+            trace.instant('retry', 'scheduler', attempt=1)
+        trace_file = os.path.join(str(tmp_path), 'traces', 'run.json')
+        tracer.write(trace_file)
+
+        with open(trace_file) as handle:
+            document = json.load(handle)
+
+        phases = [event['ph'] for event in document['traceEvents']]
+        assert phases[0] == 'M'
+        assert 'X' in phases
+        assert 'i' in phases
+
+
+class TestScheduler:
+
+    def test_runner_stages_run_in_worker_lanes(self, tracer, tmp_path):
+        pages = {
+            name: Page(os.path.join(str(tmp_path), name + '.tiff'), fail=(name == 'b'))
+            for name in ('a', 'b', 'c')
+        }
+        scheduler.run_command([(pages, PageRunner)], jobs=2)
+
+        actions = spans(tracer, 'action')
+        assert sorted(event['name'] for event in actions) == ['a.tiff', 'b.tiff', 'c.tiff']
+        assert all(event['args']['action'] == 'Page' for event in actions)
+
+        stages = [event['name'] for event in spans(tracer, 'runner')]
+        assert stages.count('setup') == 3
+        assert stages.count('execute') == 3
+        assert stages.count('cleanup') == 1
+        assert len(spans(tracer, 'program')) == 3
+
+        lanes = {
+            event['tid']: event['args']['name'] for event in tracer.trace_events()
+            if event['name'] == 'thread_name'
+        }
+        assert all(lanes[event['tid']].startswith('worker') for event in actions)
@@ -2,7 +2,9 @@ import pytest
 import bookworm.sample_data as sample
 import bookworm.unpack_pdf as unpack_pdf
 import bookworm.util       as util
+import bookworm.render     as render
 import os
+import stat
 
 
 class TestUnpackPDF:
@@ -26,13 +28,16 @@ class TestUnpackPDF:
 
     def test_unpack_pdf_generates_correct_terminal_command(self, arg_dict):
         """
-        An ``UnpackPDF`` object should be a valid python subprocess.
+        An ``UnpackPDF`` object should be a valid python subprocess. The
+        Ghostscript tuning options derived from the host come before the
+        resolution.
         """
         action = unpack_pdf.process_args(arg_dict)
         target_path = arg_dict['output']
+        settings_args = unpack_pdf.render_settings(arg_dict).args()
         terminal_command = [
             'gs', '-q', '-dNOPAUSE', '-dBATCH',   '-sDEVICE=tiff24nc', 
-            '-sCompression=lzw',     '-r300x300', 
+            '-sCompression=lzw',     *settings_args,  '-r300x300', 
             f'-sOutputFile={target_path}_Page_%04d.tiff',
             arg_dict['input']
         ]
@@ -158,3 +163,150 @@ class TestRunner:
         finally:
             unpack_pdf.Runner.cleanup(action)
 
+
+
+class TestShardedUnpackPDF:
+
+    @pytest.fixture
+    def target_dir(self, tmp_path):
+        return os.path.join(str(tmp_path), 'unpacked')
+
+    def test_page_count(self):
+        """
+        The page counter should find every page in the sample pdf.
+        """
+        assert unpack_pdf.page_count(sample.SAMPLE_PDF) == 10
+
+
+    def test_page_count_should_keep_ghostscript_safe(self, tmp_path, monkeypatch):
+        """
+        Ghostscript should only be asked to count the pages of a pdf that
+        bookworm cannot read itself, and only with SAFER restrictions.
+        """
+        bin_dir = tmp_path / 'bin'
+        bin_dir.mkdir()
+        args_file = tmp_path / 'args'
+        script = bin_dir / 'gs'
+        script.write_text(f'#!/bin/sh\nprintf "%s\\n" "$@" > {args_file}\necho 7\n')
+        script.chmod(script.stat().st_mode | stat.S_IXUSR)
+        monkeypatch.setenv('PATH', str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+        assert unpack_pdf.page_count(sample.SAMPLE_PDF) == 10
+        assert not args_file.exists()
+
+        broken_pdf = tmp_path / 'broken.pdf'
+        broken_pdf.write_bytes(b'%PDF-1.4\n1 0 obj << /Type /Page >> endobj\n')
+        assert unpack_pdf.page_count(str(broken_pdf)) == 7
+
+        args = args_file.read_text().splitlines()
+        assert '-dNOSAFER' not in args
+        assert '-dSAFER' in args
+        assert f'--permit-file-read={broken_pdf}' in args
+
+
+    @pytest.mark.parametrize('count,shards,expected', [
+        (10, 3, [(1, 4), (5, 7), (8, 10)]),
+        (10, 1, [(1, 10)]),
+        (2, 8, [(1, 1), (2, 2)]),
+    ])
+    def test_page_ranges_should_cover_every_page_once(self, count, shards, expected):
+        assert unpack_pdf.page_ranges(count, shards) == expected
+
+
+    def test_process_args_with_jobs_should_generate_shards(self, target_dir):
+        """
+        With more than one job, unpack-pdf should split the pdf into page
+        ranges that render into separate shard directories.
+        """
+        arg_dict = dict(input = sample.SAMPLE_PDF, output = target_dir, jobs = 3)
+        shards = unpack_pdf.process_args(arg_dict)
+
+        assert len(shards) == 3
+        for shard in shards.values():
+            assert isinstance(shard, unpack_pdf.UnpackPDFShard)
+            args = shard.as_subprocess()
+            assert f'-dFirstPage={shard.first_page}' in args
+            assert f'-dLastPage={shard.last_page}' in args
+            assert f'-sOutputFile={shard.shard_dir}/_Page_%04d.tiff' in args
+
+
+    def test_multi_unpack_pdf_should_not_write_to_an_occupied_directory(self):
+        with pytest.raises(FileExistsError):
+            unpack_pdf.multi_unpack_pdf(sample.SAMPLE_PDF, sample.TEST_TIFFS, 2)
+
+
+    def test_shard_cleanup_should_only_remove_its_own_pages(self, target_dir):
+        """
+        Cleaning up a failed shard should leave the pages of the other
+        shards in place.
+        """
+        first = unpack_pdf.UnpackPDFShard(sample.SAMPLE_PDF, target_dir, 1, 5)
+        second = unpack_pdf.UnpackPDFShard(sample.SAMPLE_PDF, target_dir, 6, 10)
+        unpack_pdf.Runner.setup(second)
+        for page in range(1, 11):
+            open(first.page_file(page), 'w').close()
+
+        unpack_pdf.Runner.cleanup(second)
+
+        assert sorted(os.listdir(target_dir)) == [
+            f'_Page_{page:04d}.tiff' for page in range(1, 6)
+        ]
+
+
+class TestNormalizedUnpackPDF:
+
+    @pytest.fixture
+    def arg_dict(self, tmp_path):
+        return dict(
+            input = sample.SAMPLE_PDF,
+            output = str(tmp_path / 'output'),
+            resolution = 150,
+            units = 'PixelsPerInch',
+            dimensions = (1275, 1650)
+        )
+
+    def test_pages_should_render_onto_the_normalized_canvas(self, arg_dict):
+        """
+        Unpacking with dimensions should have Ghostscript fit every page onto
+        a canvas of exactly that size, at the requested resolution.
+        """
+        action = unpack_pdf.process_args(arg_dict)
+
+        assert '-r150x150' in action.args
+        assert '-g1275x1650' in action.args
+        assert '-dFIXEDMEDIA' in action.args
+        assert '-dPDFFitPage' in action.args
+
+
+    def test_centimeter_resolutions_should_render_in_dots_per_inch(self, arg_dict):
+        arg_dict['resolution'] = 50
+        arg_dict['units'] = 'PixelsPerCentimeter'
+        action = unpack_pdf.process_args(arg_dict)
+
+        assert '-r127x127' in action.args
+
+
+    def test_canvas_should_scale_with_supersampling(self, tmp_path):
+        settings = render.RenderSettings(downscale=2)
+        action = unpack_pdf.make(
+            sample.SAMPLE_PDF, str(tmp_path), settings,
+            resolution=150, dimensions=(100, 200)
+        )
+
+        assert '-r300x300' in action.args
+        assert '-g200x400' in action.args
+
+
+    def test_shards_should_render_onto_the_normalized_canvas(self, arg_dict):
+        arg_dict['jobs'] = 2
+        actions = unpack_pdf.process_args(arg_dict)
+
+        for action in actions.values():
+            assert '-g1275x1650' in action.args
+
+
+    def test_auto_dimensions_should_be_rejected(self, arg_dict):
+        arg_dict['dimensions'] = 'auto'
+
+        with pytest.raises(ValueError):
+            unpack_pdf.process_args(arg_dict)
@@ -190,3 +190,38 @@ class TestQuotedString:
         expected = util.quoted_string(test_case['string'])      
         assert util.quoted_string(expected) == expected
 
+
+
+class TestMakeDirectory:
+
+    def test_make_directory_should_tolerate_concurrent_creation(self, tmp_path):
+        """
+        Several workers creating the same target directory at once should
+        all succeed.
+        """
+        import concurrent.futures
+
+        target = os.path.join(str(tmp_path), 'a', 'b', 'c')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(util.make_directory, target) for _ in range(32)]
+            for future in futures:
+                future.result()
+
+        assert os.path.isdir(target)
+
+
+class TestTargetFileIn:
+
+    def test_target_file_in(self):
+        """
+        A page should be written under its own name inside the target directory.
+        """
+        result = util.target_file_in('/foo/bar/', '/baz/quux.tiff')
+        assert result == '/foo/bar/quux.tiff'
+
+
+    def test_target_file_in_without_target_directory(self):
+        """
+        Without a target directory, no target file name is derived.
+        """
+        assert util.target_file_in(None, '/baz/quux.tiff') == ''